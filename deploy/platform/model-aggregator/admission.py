@@ -0,0 +1,322 @@
+"""
+Per-tenant admission control for the aggregator proxy.
+
+Kuadrant's TokenRateLimitPolicy only counts tokens after a response is done,
+and vLLM queues requests FIFO. So one tenant flooding a model pushes every
+other tenant's TTFT up until the gateway quota finally triggers. This layer
+decides before any backend work is spent:
+
+  * token bucket – each tenant has a bucket sized by its tier's shortest
+                   window in the TokenRateLimitPolicy (free: 5k tokens/min).
+                   A request is charged its estimated cost up front and gets a
+                   429 with Retry-After when the bucket cannot cover it
+  * fair queueing – at most SLOTS requests per replica are outstanding per
+                   model. The rest wait here and are dispatched by start-time
+                   fair queueing (weighted by tier), not in arrival order,
+                   so a flood only delays the flooding tenant
+  * early shedding – when the model's queue (waiting here plus waiting on the
+                   engines, which includes traffic through the gateway's direct
+                   routes) reaches SHED_DEPTH × replicas × weight / max weight,
+                   the request gets a 503 with Retry-After. Lower tiers shed
+                   first, and nothing is held that would only time out later
+
+Cost is estimated as prompt characters / 4 + max_tokens (DEFAULT_MAX_TOKENS
+when unset). That is an upper bound, while the gateway counts actual
+usage, so the bucket may stop a tenant slightly early. A single request is
+never charged more than its tier's bucket holds.
+
+The tenant comes from `x-token-labs-tenant` / `x-token-labs-tier`. The gateway
+AuthPolicy sets both from the API key Secret (policies/auth-policy.yaml). Any
+client can send those headers, so they are only believed when the connection
+comes from ADMISSION_TRUSTED_PEERS, the gateway's addresses. The HTTPRoute only
+sends /v1/models through the gateway. Proxied completions reach the aggregator
+directly from in-cluster callers, whose headers are ignored so nobody can
+claim a tier. Requests without trusted headers are tenant "anonymous" in
+DEFAULT_TIER.
+
+Configuration (env):
+    ADMISSION               on | off (default); needs PROXY_MODE=on
+    ADMISSION_POLICY        TokenRateLimitPolicy YAML with per-tier token limits
+                            (default /app/token-rate-limit-policy.yaml); empty = no buckets
+    ADMISSION_WEIGHTS       JSON {"tier": weight} (default free 1, pro 4, enterprise 8)
+    ADMISSION_SLOTS         outstanding requests per replica (default 32)
+    ADMISSION_SHED_DEPTH    queued requests per replica at which the top tier is shed (default 64)
+    ADMISSION_DEFAULT_TIER  tier of requests without tenant headers (default free)
+    ADMISSION_TRUSTED_PEERS comma-separated IPs / CIDRs whose tenant headers are believed,
+                            i.e. the gateway pods (default: none, every request is anonymous)
+"""
+import asyncio
+import heapq
+import ipaddress
+import itertools
+import json
+import logging
+import math
+import os
+import re
+import time
+
+import yaml
+from fastapi.responses import JSONResponse
+
+log = logging.getLogger("model-aggregator.admission")
+
+POLICY_PATH = os.getenv("ADMISSION_POLICY", "/app/token-rate-limit-policy.yaml")
+WEIGHTS = json.loads(os.getenv("ADMISSION_WEIGHTS") or '{"free": 1, "pro": 4, "enterprise": 8}')
+SLOTS = int(os.getenv("ADMISSION_SLOTS", "32"))
+SHED_DEPTH = float(os.getenv("ADMISSION_SHED_DEPTH", "64"))
+DEFAULT_TIER = os.getenv("ADMISSION_DEFAULT_TIER", "free")
+TRUSTED_PEERS = [ipaddress.ip_network(p.strip(), strict=False)
+                 for p in os.getenv("ADMISSION_TRUSTED_PEERS", "").split(",") if p.strip()]
+DEFAULT_MAX_TOKENS = 256
+CHARS_PER_TOKEN = 4
+TENANT_HEADER = "x-token-labs-tenant"
+TIER_HEADER = "x-token-labs-tier"
+
+_WINDOW = re.compile(r"^(\d+)([smhd])$")
+_WINDOW_S = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_TIER_PREDICATE = re.compile(r'g == "([\w-]+)"')
+
+
+def enabled() -> bool:
+    return os.getenv("ADMISSION", "off").lower() == "on"
+
+
+def load_limits(path: str) -> dict[str, tuple[float, float]]:
+    """Tier → (bucket capacity, refill tokens/s) from the shortest window of each TokenRateLimitPolicy limit."""
+    if not path:
+        return {}
+    try:
+        with open(path) as f:
+            policy = yaml.safe_load(f)
+    except FileNotFoundError:
+        log.warning("admission policy %s not found, token buckets disabled", path)
+        return {}
+    limits = {}
+    for limit in (policy.get("spec") or {}).get("limits", {}).values():
+        tiers = {t for w in limit.get("when", []) for t in _TIER_PREDICATE.findall(w.get("predicate", ""))}
+        rates = []
+        for rate in limit.get("rates", []):
+            m = _WINDOW.match(str(rate.get("window", "")))
+            if m:
+                rates.append((int(m.group(1)) * _WINDOW_S[m.group(2)], float(rate["limit"])))
+        if not rates:
+            continue
+        window_s, tokens = min(rates)
+        for tier in tiers:
+            limits[tier] = (tokens, tokens / window_s)
+    return limits
+
+
+def estimate_cost(payload: dict) -> int:
+    """Prompt tokens (characters / CHARS_PER_TOKEN) plus the completion budget."""
+    messages = payload.get("messages")
+    if isinstance(messages, list):
+        chars = 0
+        for m in messages:
+            content = m.get("content") if isinstance(m, dict) else None
+            if isinstance(content, list):
+                chars += sum(len(p.get("text", "")) for p in content if isinstance(p, dict))
+            elif content:
+                chars += len(str(content))
+    else:
+        prompt = payload.get("prompt") or ""
+        chars = len(prompt) if isinstance(prompt, str) else len(json.dumps(prompt))
+    try:
+        max_tokens = int(payload.get("max_tokens") or payload.get("max_completion_tokens") or DEFAULT_MAX_TOKENS)
+    except (TypeError, ValueError):
+        max_tokens = DEFAULT_MAX_TOKENS
+    return chars // CHARS_PER_TOKEN + 1 + max(0, max_tokens)
+
+
+def _reject(status: int, message: str, retry_after: float) -> JSONResponse:
+    return JSONResponse({"error": {"message": message, "type": "rate_limit_exceeded" if status == 429
+                                   else "service_unavailable", "code": status}},
+                        status_code=status, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+# ── Token buckets ───────────────────────────────────────────────────────────
+
+class TokenBucket:
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, cost: float) -> float:
+        """Charge `cost`; 0 on success, else seconds until it would fit."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        cost = min(cost, self.capacity)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+# ── Fair queue ──────────────────────────────────────────────────────────────
+
+class FairQueue:
+    """
+    Start-time fair queueing over one model's outstanding-request slots.
+
+    Each request gets start = max(virtual time, tenant's last finish) and
+    finish = start + cost / weight. The smallest finish tag is dispatched next,
+    and virtual time advances to its start tag.
+    """
+
+    def __init__(self):
+        self.inflight = 0
+        self.vtime = 0.0
+        self._finish: dict[str, float] = {}
+        self._heap: list = []
+        self._seq = itertools.count()
+        self.service_s = 1.0        # EWMA of request duration, for Retry-After
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, tenant: str, cost: float, weight: float) -> asyncio.Future:
+        start = max(self.vtime, self._finish.get(tenant, 0.0))
+        finish = self._finish[tenant] = start + cost / weight
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (finish, next(self._seq), start, waiter))
+        return waiter
+
+    def dispatch(self, capacity: int):
+        while self._heap and self.inflight < capacity:
+            _, _, start, waiter = heapq.heappop(self._heap)
+            if waiter.done():           # client went away while queued
+                continue
+            self.vtime = max(self.vtime, start)
+            self.inflight += 1
+            waiter.set_result(None)
+        if not self._heap:
+            # Idle: forget tenants whose tags are behind virtual time
+            self._finish = {t: f for t, f in self._finish.items() if f > self.vtime}
+
+
+# ── Controller ──────────────────────────────────────────────────────────────
+
+class Controller:
+    """Admission for proxied requests; `balancer` supplies replica counts and engine queue depth."""
+
+    def __init__(self, balancer, limits: dict[str, tuple[float, float]] | None = None):
+        self.balancer = balancer
+        self.limits = load_limits(POLICY_PATH) if limits is None else limits
+        self.max_weight = max(WEIGHTS.values(), default=1)
+        self.buckets: dict[str, TokenBucket] = {}
+        self.queues: dict[str, FairQueue] = {}
+        self.tenants: dict[str, dict] = {}
+        self.untrusted = 0              # requests whose tenant headers were ignored
+        log.info("admission: weights=%s token limits=%s trusted peers=%s",
+                 WEIGHTS, self.limits, [str(n) for n in TRUSTED_PEERS])
+
+    def identify(self, headers, peer: str | None) -> tuple[str, str]:
+        """(tenant, tier) from the gateway's headers; anonymous unless `peer` is a trusted gateway address."""
+        if not trusted(peer):
+            if headers.get(TENANT_HEADER) or headers.get(TIER_HEADER):
+                self.untrusted += 1
+            return "anonymous", DEFAULT_TIER
+        tier = headers.get(TIER_HEADER) or DEFAULT_TIER
+        # Kuadrant groups may hold several tiers ("pro,beta"); the first known one wins
+        tier = next((t for t in tier.split(",") if t.strip() in WEIGHTS), tier.split(",")[0]).strip()
+        return headers.get(TENANT_HEADER) or "anonymous", tier
+
+    def _capacity(self, model: str) -> int:
+        return SLOTS * len(self.balancer.candidates(model))
+
+    def _depth(self, model: str) -> float:
+        backend = sum(r.waiting for r in self.balancer.candidates(model))
+        return len(self.queues.get(model, ())) + backend
+
+    def _count(self, tenant: str, tier: str, event: str, n: float = 1):
+        stats = self.tenants.setdefault(tenant, {"tier": tier})
+        stats[event] = stats.get(event, 0) + n
+
+    def check(self, model: str, tenant: str, tier: str, cost: float) -> JSONResponse | None:
+        """Shed or throttle up front; None if the request may queue."""
+        replicas = len(self.balancer.candidates(model))
+        if not replicas:
+            return None                 # unknown model: let the proxy answer 404
+        weight = WEIGHTS.get(tier, 1)
+        depth = self._depth(model)
+        if depth >= SHED_DEPTH * replicas * weight / self.max_weight:
+            self._count(tenant, tier, "shed")
+            queue = self.queues.get(model)
+            retry = depth * (queue.service_s if queue else 1.0) / max(1, self._capacity(model))
+            return _reject(503, f"`{model}` is overloaded; retry later.", retry)
+        if tier in self.limits:
+            bucket = self.buckets.get(tenant)
+            if bucket is None:
+                bucket = self.buckets[tenant] = TokenBucket(*self.limits[tier])
+            wait = bucket.take(cost)
+            if wait:
+                self._count(tenant, tier, "throttled")
+                return _reject(429, f"Token rate limit for tier `{tier}` exceeded.", wait)
+        return None
+
+    async def acquire(self, model: str, tenant: str, tier: str, cost: float):
+        """Wait for a dispatch slot in fair-queue order; returns the release callback."""
+        queue = self.queues.get(model)
+        if queue is None:
+            queue = self.queues[model] = FairQueue()
+        capacity = self._capacity(model)
+        t0 = time.monotonic()
+        if capacity and (len(queue) or queue.inflight >= capacity):
+            waiter = queue.push(tenant, cost, WEIGHTS.get(tier, 1))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    queue.inflight -= 1     # slot was granted just before the cancel
+                    queue.dispatch(self._capacity(model))
+                raise
+        else:
+            queue.inflight += 1
+        started = time.monotonic()
+        self._count(tenant, tier, "admitted")
+        self._count(tenant, tier, "queued_s", started - t0)
+
+        def release():
+            queue.inflight -= 1
+            queue.service_s = 0.9 * queue.service_s + 0.1 * (time.monotonic() - started)
+            queue.dispatch(self._capacity(model))
+        return release
+
+    def stats(self) -> dict:
+        tenants = {}
+        for tenant, counts in self.tenants.items():
+            admitted = counts.get("admitted", 0)
+            tenants[tenant] = {k: v for k, v in counts.items() if k != "queued_s"}
+            tenants[tenant]["mean_queue_ms"] = round(counts.get("queued_s", 0) / admitted * 1000, 1) if admitted else None
+        return {
+            "weights": WEIGHTS,
+            "token_limits": {t: {"burst": c, "per_s": round(r, 3)} for t, (c, r) in self.limits.items()},
+            "models": {m: {"queued": len(q), "inflight": q.inflight, "capacity": self._capacity(m),
+                           "service_ms": round(q.service_s * 1000, 1)} for m, q in self.queues.items()},
+            "tenants": tenants,
+            "untrusted_tenant_headers": self.untrusted,
+        }
+
+
+def trusted(peer: str | None) -> bool:
+    try:
+        addr = ipaddress.ip_address(peer or "")
+    except ValueError:
+        return False
+    return any(addr in net for net in TRUSTED_PEERS)
+
+
+async def released(chunks, release):
+    """Pass `chunks` through and free the admission slot once the stream ends."""
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        release()
+
+
+controller: Controller | None = None
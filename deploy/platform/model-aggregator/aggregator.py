@@ -1,12 +1,24 @@
 import asyncio
+import hashlib
+import json
 import httpx
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi.responses import PlainTextResponse
+
+import admission
+import discovery
+import health
+import proxy
 
 app = FastAPI()
 
-REFRESH_INTERVAL = 28.0
+# Clients may reuse a listing this long without revalidating. The listing is
+# republished as soon as discovery or a health probe changes it, so keep this
+# short enough that a backend going down is noticed within seconds.
+CACHE_MAX_AGE = 10
 
+# Fallback when Kubernetes discovery is off (DISCOVERY=off or not in a cluster).
+# In-cluster, backends are the Services labelled token-labs/model=true.
 STATIC_MODELS = [
     {"id": "nvidia/Nemotron-3-Nano-Omni-30B-A3B-Reasoning-NVFP4", "object": "model", "owned_by": "token-labs", "probe_url": "http://nemotron-nano-nvfp4-vllm.token-labs.svc.cluster.local:8000/v1/models"},
     {"id": "Qwen/Qwen3.6-27B-FP8", "object": "model", "owned_by": "token-labs", "probe_url": "http://qwen36-27b-vllm.token-labs.svc.cluster.local:8000/v1/models"},
@@ -15,66 +27,154 @@ STATIC_MODELS = [
 
 _cache: list = [{"id": m["id"], "object": m["object"], "owned_by": m["owned_by"]} for m in STATIC_MODELS]
 _http_client: httpx.AsyncClient | None = None
+_registry = discovery.Registry()
+_watcher: discovery.Watcher | None = None
+
+
+def backends() -> list[dict]:
+    """Discovered backends once both watches have synced, else the static list."""
+    return _registry.backends() if _registry.ready else STATIC_MODELS
+
+
+def replica_map() -> dict[str, list[str]]:
+    """Model id → replica base URLs for the proxy: ready endpoints, else the Service itself."""
+    static = proxy.static_backends()
+    if static is not None:
+        return static
+    replicas, down = {}, {}
+    for b in backends():
+        urls = [f"http://{ep}" for ep in b.get("endpoints") or []]
+        target = replicas if _monitor.available(b["probe_url"]) else down
+        target.setdefault(b["id"], []).extend(urls or [b.get("base_url") or b["probe_url"].removesuffix("/v1/models")])
+    # A model whose circuits are all open keeps its replicas: the proxy then answers 503, not 404
+    for model_id, urls in down.items():
+        replicas.setdefault(model_id, urls)
+    return replicas
+
+
+def _entries(models: list) -> list:
+    seen = {}
+    for m in models:
+        if m["id"] not in seen:
+            entry = seen[m["id"]] = {"id": m["id"], "object": "model", "owned_by": m["owned_by"]}
+            status = _monitor.model_extension(m["id"])
+            if status is not None:
+                entry["x_token_labs"] = status
+    return list(seen.values())
+
+
+def _build_listing(models: list) -> dict:
+    """Serialize the /v1/models listing once, as ready-to-send ASGI messages."""
+    body = json.dumps({"object": "list", "data": models}, separators=(",", ":")).encode()
+    etag = b'"' + hashlib.sha256(body).hexdigest()[:32].encode() + b'"'
+    headers = [(b"etag", etag), (b"cache-control", f"public, max-age={CACHE_MAX_AGE}".encode())]
+    return {
+        "etag": etag,
+        "ok": {"type": "http.response.start", "status": 200, "headers": headers + [
+            (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]},
+        "not_modified": {"type": "http.response.start", "status": 304, "headers": headers},
+        "body": {"type": "http.response.body", "body": body},
+    }
+
+
+_EMPTY_BODY = {"type": "http.response.body", "body": b""}
+_listing = _build_listing(_cache)
+
+
+def _publish(models: list):
+    global _cache, _listing
+    _cache = models
+    _listing = _build_listing(models)
 
 
-async def fetch_live_model(model: dict) -> dict | None:
-    try:
-        r = await _http_client.get(model["probe_url"])
-        if r.status_code == 200:
-            data = r.json().get("data", [])
-            if data:
-                return {"id": model["id"], "object": "model", "owned_by": model["owned_by"]}
-    except Exception:
-        pass
-    return None
-
-
-async def refresh_cache():
-    global _cache
-    results = await asyncio.gather(*[fetch_live_model(m) for m in STATIC_MODELS])
-    models = []
-    for i, live in enumerate(results):
-        if live:
-            models.append(live)
-        else:
-            m = STATIC_MODELS[i]
-            models.append({"id": m["id"], "object": m["object"], "owned_by": m["owned_by"]})
-    _cache = models
+def refresh_cache():
+    models = _entries(backends())
+    if models != _cache:
+        _publish(models)
 
 
-async def background_refresh():
-    while True:
-        await asyncio.sleep(REFRESH_INTERVAL)
-        await refresh_cache()
+def on_backends_change():
+    """Republish right away on a watch event or a health change, and re-sync the proxy's replicas."""
+    _monitor.sync()
+    refresh_cache()
+    if proxy.balancer:
+        proxy.balancer.sync()
+
+
+_monitor = health.Monitor(backends, on_change=on_backends_change)
 
 
 @app.on_event("startup")
 async def startup():
-    global _http_client
+    global _http_client, _watcher
     _http_client = httpx.AsyncClient(timeout=5.0)
-    await refresh_cache()
-    asyncio.create_task(background_refresh())
+    if discovery.enabled():
+        _watcher = discovery.Watcher(_registry, on_change=on_backends_change)
+        asyncio.create_task(_watcher.run())
+    if proxy.enabled():
+        proxy.balancer = proxy.Balancer(replica_map)
+        proxy.balancer.start()
+        if admission.enabled():
+            admission.controller = admission.Controller(proxy.balancer)
+    _monitor.start(_http_client)
+    await _monitor.probe_all()
+    refresh_cache()
 
 
 @app.on_event("shutdown")
 async def shutdown():
+    _monitor.close()
     if _http_client:
         await _http_client.aclose()
+    if _watcher:
+        await _watcher.close()
+    if proxy.balancer:
+        await proxy.balancer.close()
+
+
+def _etag_matches(etag: bytes, if_none_match: bytes) -> bool:
+    return if_none_match.strip() == b"*" or etag in (t.strip().removeprefix(b"W/") for t in if_none_match.split(b","))
+
+
+class ModelsFastPath:
+    """
+    Serves GET/HEAD /v1/models and /models from the prebuilt listing.
+
+    Clients such as OpenWebUI poll the listing constantly; answering here,
+    ahead of FastAPI routing, costs a path lookup and a send of cached bytes.
+    A matching If-None-Match gets an empty 304.
+    """
+    PATHS = frozenset(("/v1/models", "/models"))
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.PATHS or scope["method"] not in ("GET", "HEAD"):
+            return await self.app(scope, receive, send)
+        listing = _listing
+        for name, value in scope["headers"]:
+            if name == b"if-none-match" and _etag_matches(listing["etag"], value):
+                await send(listing["not_modified"])
+                await send(_EMPTY_BODY)
+                return
+        await send(listing["ok"])
+        await send(listing["body"] if scope["method"] == "GET" else _EMPTY_BODY)
 
 
-@app.get("/v1/models")
-async def list_models():
-    return JSONResponse({"object": "list", "data": _cache})
+app.add_middleware(ModelsFastPath)
+if proxy.enabled():
+    app.include_router(proxy.router)
 
 
 @app.get("/health")
-async def health():
+async def liveness():
     return {"status": "ok"}
 
 
-@app.get("/models")
-async def models_compat():
-    return await list_models()
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(_monitor.metrics(), media_type="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
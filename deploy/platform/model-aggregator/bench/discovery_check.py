@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Scripted check of discovery.Watcher against bench/fake_apiserver.py.
+
+Runs the fake API server and a Watcher in one process and walks through:
+
+  1. initial list of Services and EndpointSlices (only ready endpoints kept)
+  2. ADDED Service + EndpointSlice through the watch
+  3. EndpointSlice readiness flips (MODIFIED) in both directions
+  4. DELETED Service
+  5. ERROR 410 on an open Service watch → relist picks up a change whose
+     event was compacted away
+  6. EndpointSlice watch closed after compaction → re-watch gets HTTP 410 →
+     relist
+
+Each step waits up to --timeout seconds for the Registry to converge. Exits 1
+on the first step that does not.
+
+Usage:
+    python3 bench/discovery_check.py
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import uvicorn
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import discovery  # noqa: E402
+from fake_apiserver import FakeApiServer, endpoint_slice, service  # noqa: E402
+
+NS = "token-labs"
+
+
+async def converge(what: str, check, timeout: float):
+    deadline = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() > deadline:
+            raise AssertionError(what)
+        await asyncio.sleep(0.02)
+    print(f"ok  {what}")
+
+
+async def run(args) -> int:
+    api = FakeApiServer()
+    api.put("services", service("llama", model_id="meta-llama/Llama-3.1-8B-Instruct"))
+    api.put("services", service("unlabelled", labels={"app": "other"}))
+    api.put("endpointslices", endpoint_slice("llama-abc", "llama", {"10.0.0.1": True, "10.0.0.2": False}))
+
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=args.port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    registry = discovery.Registry()
+    changes = []
+    watcher = discovery.Watcher(registry, on_change=lambda: changes.append(registry.version),
+                                base_url=f"http://127.0.0.1:{args.port}", ns=NS)
+    watching = asyncio.create_task(watcher.run())
+    llama, qwen = "meta-llama/Llama-3.1-8B-Instruct", "qwen"
+
+    def endpoints(model):
+        return [e for b in registry.backends(model) for e in b["endpoints"]]
+
+    try:
+        await converge("list: labelled Service with its ready endpoint",
+                       lambda: registry.ready and registry.models() == [llama]
+                       and endpoints(llama) == ["10.0.0.1:8000"], args.timeout)
+
+        api.put("services", service("qwen"))
+        api.put("endpointslices", endpoint_slice("qwen-xyz", "qwen", {"10.0.1.1": True}))
+        await converge("watch: ADDED Service and EndpointSlice",
+                       lambda: sorted(registry.models()) == sorted([llama, qwen])
+                       and endpoints(qwen) == ["10.0.1.1:8000"], args.timeout)
+
+        api.put("endpointslices", endpoint_slice("llama-abc", "llama", {"10.0.0.1": True, "10.0.0.2": True}))
+        await converge("watch: endpoint turns ready",
+                       lambda: endpoints(llama) == ["10.0.0.1:8000", "10.0.0.2:8000"], args.timeout)
+        api.put("endpointslices", endpoint_slice("llama-abc", "llama", {"10.0.0.1": False, "10.0.0.2": True}))
+        await converge("watch: endpoint turns unready", lambda: endpoints(llama) == ["10.0.0.2:8000"], args.timeout)
+
+        api.delete("services", NS, "qwen")
+        await converge("watch: DELETED Service", lambda: registry.models() == [llama], args.timeout)
+
+        lists = api.count("services", "list")
+        api.put("services", service("mistral"), record=False)
+        api.expire("services")
+        await converge("410 ERROR event: relist finds the compacted change",
+                       lambda: "mistral" in registry.models() and api.count("services", "list") > lists,
+                       args.timeout)
+
+        lists = api.count("endpointslices", "list")
+        api.put("endpointslices", endpoint_slice("llama-abc", "llama", {"10.0.0.1": True, "10.0.0.2": True}),
+                record=False)
+        api.expire("endpointslices", close=True)
+        await converge("HTTP 410 on re-watch: relist finds the compacted change",
+                       lambda: api.count("endpointslices", "gone") >= 1
+                       and api.count("endpointslices", "list") > lists
+                       and endpoints(llama) == ["10.0.0.1:8000", "10.0.0.2:8000"], args.timeout)
+    except AssertionError as e:
+        print(f"FAIL {e}: models={registry.models()} backends={registry.backends()} requests={api.requests}")
+        return 1
+    finally:
+        watching.cancel()
+        await watcher.close()
+        server.should_exit = True
+        await serving
+    print(f"all checks passed ({len(changes)} on_change calls)")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check discovery.Watcher against a fake API server")
+    parser.add_argument("--port", type=int, default=9400)
+    parser.add_argument("--timeout", type=float, default=5.0, help="Seconds each step may take to converge")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Multi-tenant fairness benchmark for the aggregator's admission control.
+
+A noisy free-tier tenant floods the model at --flood-rate req/s. At the same
+time a pro-tier tenant sends --pro-rate req/s. Both use open-loop Poisson
+arrivals. Requests carry the x-token-labs-tenant / x-token-labs-tier headers
+the gateway AuthPolicy would inject; the aggregator only believes them from
+ADMISSION_TRUSTED_PEERS, hence 127.0.0.1 below. Reported per tenant: TTFT percentiles of
+the successful requests and the status mix (200 / 429 throttled / 503 shed).
+
+Without admission both tenants share the engines' FIFO queues, so pro TTFT
+follows the flood. With ADMISSION=on, pro requests jump the fair queue and
+the flood is shed or throttled instead.
+
+Usage:
+    python3 bench/mock_backend.py --ports 9001 9002 9003 --max-running 2 --tpot-ms 30 &
+    PROXY_MODE=on ADMISSION=on ADMISSION_SLOTS=2 ADMISSION_POLICY= ADMISSION_TRUSTED_PEERS=127.0.0.1 \\
+        PROXY_BACKENDS='{"mock": ["http://127.0.0.1:9001", "http://127.0.0.1:9002", "http://127.0.0.1:9003"]}' \\
+        DISCOVERY=off uvicorn aggregator:app --port 8000 &
+    python3 bench/fairness_bench.py --url http://127.0.0.1:8000 --flood-rate 20 --pro-rate 1 --duration 15
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+from ttft_bench import one_request, percentiles
+
+
+async def tenant_load(client: httpx.AsyncClient, url: str, model: str, tenant: str, tier: str, rate: float,
+                      duration: float, max_tokens: int, rng: random.Random) -> list[dict]:
+    payload = {"model": model, "stream": True, "max_tokens": max_tokens,
+               "messages": [{"role": "user", "content": f"Hello from {tenant}."}]}
+    headers = {"x-token-labs-tenant": tenant, "x-token-labs-tier": tier}
+    tasks = []
+    start = time.perf_counter()
+    next_at = start + rng.expovariate(rate)
+    while next_at - start < duration:
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        tasks.append(asyncio.create_task(one_request(client, url, payload, headers)))
+        next_at += rng.expovariate(rate)
+    return await asyncio.gather(*tasks)
+
+
+def summarize(results: list[dict]) -> dict:
+    ok = [r for r in results if r["status"] == 200 and r["ttft"] is not None]
+    statuses = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    return {"requests": len(results), "statuses": dict(sorted(statuses.items())),
+            "ttft": percentiles([r["ttft"] for r in ok]), "e2e": percentiles([r["e2e"] for r in ok])}
+
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=2000, max_keepalive_connections=2000)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(300.0), limits=limits) as client:
+        flood, pro = await asyncio.gather(
+            tenant_load(client, args.url, args.model, "noisy-free", "free", args.flood_rate, args.duration,
+                        args.max_tokens, random.Random(args.seed)),
+            tenant_load(client, args.url, args.model, "steady-pro", "pro", args.pro_rate, args.duration,
+                        args.max_tokens, random.Random(args.seed + 1)),
+        )
+        out = {"noisy-free": summarize(flood), "steady-pro": summarize(pro)}
+        try:
+            out["admission"] = (await client.get(f"{args.url}/proxy/admission")).json()
+        except (httpx.HTTPError, ValueError):
+            pass
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Free-tier flood vs pro-tier TTFT through the aggregator proxy")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--model", default="mock")
+    parser.add_argument("--flood-rate", type=float, default=20.0, help="Free-tier arrivals per second")
+    parser.add_argument("--pro-rate", type=float, default=1.0, help="Pro-tier arrivals per second")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--max-tokens", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Minimal fake Kubernetes API server for exercising discovery.py without a cluster.
+
+Serves list and watch for Services and EndpointSlices in any namespace, the
+way discovery.Watcher uses them:
+
+  * list   – GET .../services?labelSelector=k=v, GET .../endpointslices;
+             returns the items and the current resourceVersion
+  * watch  – ?watch=1&resourceVersion=N streams newline-delimited events
+             (ADDED / MODIFIED / DELETED) newer than N, then live events until
+             timeoutSeconds. A resourceVersion older than the last compaction
+             gets HTTP 410. expire() compacts the history and sends open watches
+             an ERROR event with code 410, or just closes them, so both relist
+             paths can be driven
+
+Objects are changed through the FakeApiServer methods (put / delete /
+expire) in-process, or over HTTP when run standalone:
+
+    POST   /fake/{services|endpointslices}           body: the object (ADDED or MODIFIED)
+    DELETE /fake/{services|endpointslices}/{ns}/{name}
+    POST   /fake/{services|endpointslices}/expire    ?close=1 closes watches without an ERROR event
+
+Usage:
+    python3 bench/fake_apiserver.py --port 9400 &
+    K8S_API_URL=http://127.0.0.1:9400 DISCOVERY=on DISCOVERY_NAMESPACE=token-labs \\
+        uvicorn aggregator:app --port 8000
+    python3 bench/discovery_check.py          # scripted list → watch → 410 relist check
+"""
+import argparse
+import asyncio
+import copy
+import json
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+KINDS = ("services", "endpointslices")
+_LIST_KIND = {"services": "ServiceList", "endpointslices": "EndpointSliceList"}
+
+
+def _matches(obj: dict, selector: str | None) -> bool:
+    """Equality-based label selector (k=v,k2=v2), which is all discovery uses."""
+    labels = obj["metadata"].get("labels") or {}
+    for term in filter(None, (selector or "").split(",")):
+        key, _, value = term.partition("=")
+        if labels.get(key.strip()) != value.strip():
+            return False
+    return True
+
+
+class FakeApiServer:
+    def __init__(self):
+        self.rv = 0
+        self.objects: dict[str, dict[tuple[str, str], dict]] = {k: {} for k in KINDS}
+        self.history: dict[str, list[tuple[int, str, dict]]] = {k: [] for k in KINDS}
+        self.floor: dict[str, int] = {k: 0 for k in KINDS}     # oldest resourceVersion a watch may resume from
+        self.watchers: dict[str, set[asyncio.Queue]] = {k: set() for k in KINDS}
+        self.requests: list[tuple[str, str]] = []              # (kind, "list" | "watch" | "gone")
+        self.app = self._make_app()
+
+    def count(self, kind: str, verb: str) -> int:
+        return sum(1 for k, v in self.requests if (k, v) == (kind, verb))
+
+    # ── Mutations ──
+
+    def _emit(self, kind: str, event: str, obj: dict):
+        self.history[kind].append((self.rv, event, obj))
+        for queue in self.watchers[kind]:
+            queue.put_nowait({"type": event, "object": obj})
+
+    def put(self, kind: str, obj: dict, record: bool = True) -> dict:
+        """Create or replace an object. record=False changes it without any watch event (lost to compaction)."""
+        obj = copy.deepcopy(obj)
+        meta = obj["metadata"]
+        key = (meta["namespace"], meta["name"])
+        event = "MODIFIED" if key in self.objects[kind] else "ADDED"
+        self.rv += 1
+        meta["resourceVersion"] = str(self.rv)
+        self.objects[kind][key] = obj
+        if record:
+            self._emit(kind, event, obj)
+        return obj
+
+    def delete(self, kind: str, ns: str, name: str) -> bool:
+        obj = self.objects[kind].pop((ns, name), None)
+        if obj is None:
+            return False
+        self.rv += 1
+        obj = {**obj, "metadata": {**obj["metadata"], "resourceVersion": str(self.rv)}}
+        self._emit(kind, "DELETED", obj)
+        return True
+
+    def expire(self, kind: str, close: bool = False):
+        """Compact the history: open watches get an ERROR 410 (or are closed) and must relist."""
+        self.history[kind].clear()
+        self.floor[kind] = self.rv + 1
+        gone = {"type": "ERROR", "object": {"kind": "Status", "code": 410, "reason": "Expired",
+                                            "message": "too old resource version"}}
+        for queue in self.watchers[kind]:
+            queue.put_nowait(None if close else gone)
+
+    # ── HTTP ──
+
+    async def _list(self, request: Request, kind: str, ns: str):
+        selector = request.query_params.get("labelSelector")
+        if request.query_params.get("watch") in ("1", "true"):
+            return await self._watch(request, kind, ns, selector)
+        self.requests.append((kind, "list"))
+        items = [o for (o_ns, _), o in sorted(self.objects[kind].items()) if o_ns == ns and _matches(o, selector)]
+        return JSONResponse({"kind": _LIST_KIND[kind], "apiVersion": "v1",
+                             "metadata": {"resourceVersion": str(self.rv)}, "items": items})
+
+    async def _watch(self, request: Request, kind: str, ns: str, selector: str | None):
+        since = int(request.query_params.get("resourceVersion") or 0)
+        if since + 1 < self.floor[kind]:
+            self.requests.append((kind, "gone"))
+            return JSONResponse({"kind": "Status", "code": 410, "reason": "Expired"}, status_code=410)
+        self.requests.append((kind, "watch"))
+        timeout = float(request.query_params.get("timeoutSeconds") or 300)
+        queue: asyncio.Queue = asyncio.Queue()
+        for rv, event, obj in self.history[kind]:
+            if rv > since:
+                queue.put_nowait({"type": event, "object": obj})
+        self.watchers[kind].add(queue)
+
+        def wanted(event: dict) -> bool:
+            meta = event["object"].get("metadata")
+            return meta is None or (meta["namespace"] == ns and _matches(event["object"], selector))
+
+        async def stream():
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            try:
+                while True:
+                    try:
+                        event = await asyncio.wait_for(queue.get(), max(0.0, deadline - loop.time()))
+                    except asyncio.TimeoutError:
+                        return
+                    if event is None:
+                        return
+                    if wanted(event):
+                        yield json.dumps(event) + "\n"
+                    if event["type"] == "ERROR":
+                        return
+            finally:
+                self.watchers[kind].discard(queue)
+
+        return StreamingResponse(stream(), media_type="application/json")
+
+    def _make_app(self) -> Starlette:
+        async def services(request: Request):
+            return await self._list(request, "services", request.path_params["ns"])
+
+        async def slices(request: Request):
+            return await self._list(request, "endpointslices", request.path_params["ns"])
+
+        async def control(request: Request):
+            kind = request.path_params["kind"]
+            if kind not in KINDS:
+                return JSONResponse({"error": f"unknown kind {kind}"}, status_code=404)
+            if request.method == "DELETE":
+                found = self.delete(kind, request.path_params["ns"], request.path_params["name"])
+                return JSONResponse({"deleted": found}, status_code=200 if found else 404)
+            return JSONResponse(self.put(kind, await request.json()))
+
+        async def expire(request: Request):
+            kind = request.path_params["kind"]
+            if kind not in KINDS:
+                return JSONResponse({"error": f"unknown kind {kind}"}, status_code=404)
+            self.expire(kind, close=request.query_params.get("close") in ("1", "true"))
+            return JSONResponse({"floor": self.floor[kind]})
+
+        return Starlette(routes=[
+            Route("/api/v1/namespaces/{ns}/services", services),
+            Route("/apis/discovery.k8s.io/v1/namespaces/{ns}/endpointslices", slices),
+            Route("/fake/{kind}/expire", expire, methods=["POST"]),
+            Route("/fake/{kind}", control, methods=["POST"]),
+            Route("/fake/{kind}/{ns}/{name}", control, methods=["DELETE"]),
+        ])
+
+
+# ── Object builders ──
+
+def service(name: str, ns: str = "token-labs", model_id: str | None = None, port: int = 8000,
+            labels: dict | None = None) -> dict:
+    annotations = {"token-labs/model-id": model_id} if model_id else {}
+    return {"metadata": {"name": name, "namespace": ns, "labels": labels or {"token-labs/model": "true"},
+                         "annotations": annotations},
+            "spec": {"ports": [{"name": "http", "port": port}]}}
+
+
+def endpoint_slice(name: str, service_name: str, endpoints: dict[str, bool], ns: str = "token-labs",
+                   port: int = 8000) -> dict:
+    """EndpointSlice of `service_name` with {address: ready} endpoints."""
+    return {"metadata": {"name": name, "namespace": ns, "labels": {"kubernetes.io/service-name": service_name}},
+            "ports": [{"name": "http", "port": port}],
+            "endpoints": [{"addresses": [addr], "conditions": {"ready": ready}} for addr, ready in endpoints.items()]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Kubernetes API server (Services + EndpointSlices)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9400)
+    args = parser.parse_args()
+    uvicorn.run(FakeApiServer().app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Closed-loop HTTP load test for the model aggregator.
+
+Keeps --connections keep-alive HTTP/1.1 connections busy issuing GET requests
+for --duration seconds and reports requests/s and latency percentiles. The
+client is raw asyncio streams rather than httpx so that the load generator,
+not the server, is the cheap side even when both share a core.
+
+Usage:
+    uvicorn aggregator:app --port 8000 &
+    python3 bench/loadtest.py --url http://127.0.0.1:8000/v1/models
+    python3 bench/loadtest.py --url http://127.0.0.1:8000/v1/models --revalidate   # If-None-Match → 304s
+"""
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+
+async def _read_response(reader: asyncio.StreamReader) -> tuple[int, dict]:
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            k, v = line.split(":", 1)
+            headers[k.strip().lower()] = v.strip()
+    length = int(headers.get("content-length", 0))
+    if length:
+        await reader.readexactly(length)
+    return status, headers
+
+
+async def worker(host: str, port: int, path: str, deadline: float, revalidate: bool,
+                 latencies: list, statuses: dict):
+    reader, writer = await asyncio.open_connection(host, port)
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n\r\n".encode()
+    try:
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            writer.write(request)
+            status, headers = await _read_response(reader)
+            latencies.append(time.perf_counter() - t0)
+            statuses[status] = statuses.get(status, 0) + 1
+            if revalidate and "etag" in headers:
+                request = (f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n"
+                           f"If-None-Match: {headers['etag']}\r\n\r\n").encode()
+    finally:
+        writer.close()
+
+
+async def run(url: str, connections: int, duration: float, warmup: float, revalidate: bool) -> dict:
+    parts = urlsplit(url)
+    host, port, path = parts.hostname, parts.port or 80, parts.path or "/"
+
+    if warmup:
+        await asyncio.gather(*[worker(host, port, path, time.perf_counter() + warmup, revalidate, [], {})
+                               for _ in range(connections)])
+
+    latencies, statuses = [], {}
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(host, port, path, start + duration, revalidate, latencies, statuses)
+                           for _ in range(connections)])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    pct = lambda p: round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 3)
+    return {
+        "url": url,
+        "connections": connections,
+        "revalidate": revalidate,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": pct(0.50),
+        "p99_ms": pct(0.99),
+        "statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test an HTTP GET endpoint")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/v1/models")
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--revalidate", action="store_true",
+                        help="Send the last ETag as If-None-Match (conditional polling)")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.connections, args.duration, args.warmup, args.revalidate))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
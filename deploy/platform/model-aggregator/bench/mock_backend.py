@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Local multi-replica mock of a vLLM OpenAI server, for exercising the aggregator.
+
+Each replica behaves like a continuous-batching engine: at most --max-running
+requests decode at once, the rest wait in a FIFO queue. Time to first token is
+queue wait + prefill, then tokens stream every tpot. --speed scales all timings
+per replica (0.25 = four times slower), which is how uneven load is produced.
+Prefill is only paid for prompt tokens past the longest cached prefix: each
+replica keeps an LRU of message-boundary prefix hashes, like vLLM's automatic
+prefix caching. Each replica exports the gauges and counters the proxy scrapes:
+
+    vllm:num_requests_waiting  vllm:num_requests_running  vllm:kv_cache_usage_perc
+    vllm:prefix_cache_queries_total  vllm:prefix_cache_hits_total
+
+Responses carry `x-mock-backend: <port>` so benchmarks can see where requests
+went.
+
+Usage:
+    python3 bench/mock_backend.py --ports 9001 9002 9003 --speed 1 1 0.25
+    PROXY_MODE=on PROXY_BACKENDS='{"mock": ["http://127.0.0.1:9001", "http://127.0.0.1:9002", "http://127.0.0.1:9003"]}' \\
+        DISCOVERY=off uvicorn aggregator:app --port 8000
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+
+class Engine:
+    def __init__(self, name: str, speed: float, max_running: int, prefill_ms: float,
+                 prefill_ms_per_token: float, tpot_ms: float, cache_entries: int = 4096):
+        self.name = name
+        self.speed = speed
+        self.max_running = max_running
+        self.prefill_ms = prefill_ms
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self.tpot_ms = tpot_ms
+        self.slots = asyncio.Semaphore(max_running)
+        self.waiting = 0
+        self.running = 0
+        self.served = 0
+        self.cache: OrderedDict[str, None] = OrderedDict()
+        self.cache_entries = cache_entries
+        self.prefix_queries = 0
+        self.prefix_hits = 0
+
+    def cached_tokens(self, prefixes: list[tuple[str, int]]) -> int:
+        """Longest cached prefix (in tokens) of a prompt given as (hash, cumulative tokens) boundaries."""
+        hit = 0
+        for digest, tokens in prefixes:
+            if digest in self.cache:
+                self.cache.move_to_end(digest)
+                hit = tokens
+            self.cache[digest] = None
+        while len(self.cache) > self.cache_entries:
+            self.cache.popitem(last=False)
+        return hit
+
+    def prefill_s(self, new_tokens: int) -> float:
+        return (self.prefill_ms + self.prefill_ms_per_token * new_tokens) / 1000 / self.speed
+
+    async def generate(self, prefixes: list[tuple[str, int]], max_tokens: int):
+        """Yield one token index at a time, after queueing and prefill of the uncached suffix."""
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            prompt_tokens = prefixes[-1][1]
+            cached = self.cached_tokens(prefixes)
+            self.prefix_queries += prompt_tokens
+            self.prefix_hits += cached
+            await asyncio.sleep(self.prefill_s(prompt_tokens - cached))
+            for i in range(max_tokens):
+                if i:
+                    await asyncio.sleep(self.tpot_ms / 1000 / self.speed)
+                yield i
+        finally:
+            self.running -= 1
+            self.served += 1
+            self.slots.release()
+
+    def metrics(self) -> str:
+        labels = f'{{model_name="mock",engine="{self.name}"}}'
+        return "\n".join([
+            "# TYPE vllm:num_requests_waiting gauge",
+            f"vllm:num_requests_waiting{labels} {self.waiting}",
+            "# TYPE vllm:num_requests_running gauge",
+            f"vllm:num_requests_running{labels} {self.running}",
+            "# TYPE vllm:kv_cache_usage_perc gauge",
+            f"vllm:kv_cache_usage_perc{labels} {self.running / self.max_running}",
+            "# TYPE vllm:prefix_cache_queries counter",
+            f"vllm:prefix_cache_queries_total{labels} {self.prefix_queries}",
+            "# TYPE vllm:prefix_cache_hits counter",
+            f"vllm:prefix_cache_hits_total{labels} {self.prefix_hits}",
+            "# TYPE vllm:request_success counter",
+            f"vllm:request_success_total{labels} {self.served}",
+        ]) + "\n"
+
+
+def _prefixes(payload: dict) -> list[tuple[str, int]]:
+    """(running hash, cumulative tokens) at every message boundary; ~4 characters per token."""
+    if "messages" in payload:
+        segments = [f"{m.get('role')}:{m.get('content', '')}" for m in payload["messages"]] or [""]
+    else:
+        segments = [str(payload.get("prompt", ""))]
+    h = hashlib.blake2b(digest_size=16)
+    out, tokens = [], 0
+    for seg in segments:
+        h.update(seg.encode() + b"\x1e")
+        tokens += max(1, len(seg) // 4)
+        out.append((h.copy().hexdigest(), tokens))
+    return out
+
+
+def make_app(engine: Engine) -> Starlette:
+    headers = {"x-mock-backend": engine.name}
+
+    async def completions(request: Request):
+        payload = await request.json()
+        chat = request.url.path.endswith("/chat/completions")
+        prefixes = _prefixes(payload)
+        prompt_tokens = prefixes[-1][1]
+        max_tokens = int(payload.get("max_tokens") or payload.get("max_completion_tokens") or 32)
+        rid = f"cmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = payload.get("model", "mock")
+
+        def chunk(i: int | None) -> dict:
+            if chat:
+                delta = {"content": f"t{i} "} if i is not None else {}
+                choice = {"index": 0, "delta": delta, "finish_reason": None if i is not None else "length"}
+                return {"id": rid, "object": "chat.completion.chunk", "created": created, "model": model,
+                        "choices": [choice]}
+            return {"id": rid, "object": "text_completion", "created": created, "model": model,
+                    "choices": [{"index": 0, "text": f"t{i} " if i is not None else "",
+                                 "finish_reason": None if i is not None else "length"}]}
+
+        if payload.get("stream"):
+            async def sse():
+                async for i in engine.generate(prefixes, max_tokens):
+                    yield f"data: {json.dumps(chunk(i))}\n\n"
+                yield f"data: {json.dumps(chunk(None))}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(sse(), media_type="text/event-stream", headers=headers)
+
+        tokens = [i async for i in engine.generate(prefixes, max_tokens)]
+        text = "".join(f"t{i} " for i in tokens)
+        choice = ({"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "length"}
+                  if chat else {"index": 0, "text": text, "finish_reason": "length"})
+        return JSONResponse({
+            "id": rid, "object": "chat.completion" if chat else "text_completion", "created": created,
+            "model": model, "choices": [choice],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                      "total_tokens": prompt_tokens + len(tokens)},
+        }, headers=headers)
+
+    async def models(request: Request):
+        return JSONResponse({"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]})
+
+    async def metrics(request: Request):
+        return PlainTextResponse(engine.metrics())
+
+    async def health(request: Request):
+        return PlainTextResponse("ok")
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", completions, methods=["POST"]),
+        Route("/v1/completions", completions, methods=["POST"]),
+        Route("/v1/models", models),
+        Route("/metrics", metrics),
+        Route("/health", health),
+    ])
+
+
+async def serve(args):
+    speeds = args.speed + [1.0] * (len(args.ports) - len(args.speed))
+    servers = []
+    for port, speed in zip(args.ports, speeds):
+        engine = Engine(str(port), speed, args.max_running, args.prefill_ms, args.prefill_ms_per_token,
+                        args.tpot_ms, args.cache_entries)
+        config = uvicorn.Config(make_app(engine), host=args.host, port=port, log_level="warning", access_log=False)
+        servers.append(uvicorn.Server(config))
+        print(f"mock replica :{port} speed={speed}")
+    await asyncio.gather(*(s.serve() for s in servers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock vLLM replicas for aggregator testing")
+    parser.add_argument("--ports", type=int, nargs="+", default=[9001, 9002, 9003])
+    parser.add_argument("--speed", type=float, nargs="*", default=[], help="Per-replica speed factor (default 1.0)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--max-running", type=int, default=8, help="Concurrent decode slots per replica")
+    parser.add_argument("--prefill-ms", type=float, default=20.0)
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.05)
+    parser.add_argument("--tpot-ms", type=float, default=10.0)
+    parser.add_argument("--cache-entries", type=int, default=4096, help="Prefix-cache LRU size (message boundaries)")
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
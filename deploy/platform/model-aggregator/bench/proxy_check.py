@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Scripted check of the proxy (proxy.py) against bench/mock_backend.py replicas.
+
+Runs two mock replicas (one decode slot each), the proxy router with
+PROXY_BALANCE=load, and a replica URL that refuses connections, all in one
+process, and checks:
+
+  1. streaming pass-through – SSE chunks reach the client as they are
+     produced (first chunk well before the last), every token and [DONE]
+     arrive, and date / server are not duplicated
+  2. least-loaded pick      – with replica A backed up by direct requests,
+     proxied requests all go to B
+  3. retry on refusal       – with A and B both busy, the idle-looking refused
+     replica is picked first; the request is retried on B and succeeds, and
+     the refused replica is counted as an error
+
+Exits 1 on the first failed check.
+
+Usage:
+    python3 bench/proxy_check.py
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+
+os.environ.update(PROXY_MODE="on", PROXY_BALANCE="load", PROXY_SCRAPE_INTERVAL="0.2")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import proxy  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from mock_backend import Engine, make_app  # noqa: E402
+
+
+def check(what: str, ok: bool, detail=""):
+    if not ok:
+        raise AssertionError(f"{what}: {detail}")
+    print(f"ok  {what}")
+
+
+async def serve(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+
+async def hold(client: httpx.AsyncClient, url: str, n: int, max_tokens: int) -> list[asyncio.Task]:
+    """Occupy a replica directly (not through the proxy) with n long streaming requests."""
+    async def one():
+        payload = {"model": "mock", "stream": True, "max_tokens": max_tokens,
+                   "messages": [{"role": "user", "content": "hold"}]}
+        async with client.stream("POST", f"{url}/v1/chat/completions", json=payload) as r:
+            async for _ in r.aiter_raw():
+                pass
+    return [asyncio.create_task(one()) for _ in range(n)]
+
+
+async def run(args) -> int:
+    a, b, dead = (f"http://127.0.0.1:{args.base_port + i}" for i in (1, 2, 3))
+    proxy_url = f"http://127.0.0.1:{args.base_port}"
+    servers = [await serve(make_app(Engine(name, 1.0, 1, 5.0, 0.0, args.tpot_ms)), port)
+               for name, port in (("A", args.base_port + 1), ("B", args.base_port + 2))]
+
+    app = FastAPI()
+    app.include_router(proxy.router)
+    proxy.balancer = proxy.Balancer(lambda: {"stream": [a], "mock": [a, b], "retry": [dead, a, b]})
+    servers.append(await serve(app, args.base_port))
+    proxy.balancer.start()
+
+    holders = []
+    try:
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            # 1. Streaming pass-through
+            payload = {"model": "stream", "stream": True, "max_tokens": 20,
+                       "messages": [{"role": "user", "content": "stream"}]}
+            t0 = time.perf_counter()
+            arrivals, lines = [], []
+            async with client.stream("POST", f"{proxy_url}/v1/chat/completions", json=payload) as r:
+                headers = r.headers
+                async for line in r.aiter_lines():
+                    if line.startswith("data: "):
+                        arrivals.append(time.perf_counter() - t0)
+                        lines.append(line)
+            check("stream: 200 from replica A", r.status_code == 200 and headers.get("x-mock-backend") == "A",
+                  (r.status_code, dict(headers)))
+            check("stream: every token and [DONE] forwarded",
+                  len(lines) == 22 and lines[-1] == "data: [DONE]", len(lines))
+            check("stream: chunks arrive incrementally", arrivals[0] < arrivals[-1] / 2,
+                  f"first {arrivals[0]:.3f}s, last {arrivals[-1]:.3f}s")
+            check("stream: date and server set once",
+                  len(headers.get_list("date")) == 1 and len(headers.get_list("server")) == 1,
+                  headers.multi_items())
+
+            # 2. Least-loaded pick
+            # 8 queued on A outscore B even when a scrape catches B mid-request (kv 1.0 + pending)
+            holders += await hold(client, a, 8, args.hold_tokens)
+            await asyncio.sleep(0.6)        # a few scrapes
+            picked = []
+            for i in range(5):
+                r = await client.post(f"{proxy_url}/v1/chat/completions", json={
+                    "model": "mock", "max_tokens": 2, "messages": [{"role": "user", "content": f"pick {i}"}]})
+                picked.append(r.headers.get("x-mock-backend"))
+            check("load: every request avoids the backed-up replica", picked == ["B"] * 5, picked)
+
+            # 3. Retry on a refused replica
+            holders += await hold(client, b, 2, args.hold_tokens)
+            await asyncio.sleep(0.6)
+            r = await client.post(f"{proxy_url}/v1/chat/completions", json={
+                "model": "retry", "max_tokens": 2, "messages": [{"role": "user", "content": "retry"}]})
+            stats = {s["url"]: s for s in (await client.get(f"{proxy_url}/proxy/replicas")).json()["retry"]}
+            check("retry: refused replica tried first and counted", stats[dead]["errors"] == 1, stats[dead])
+            check("retry: request served by the less loaded live replica",
+                  r.status_code == 200 and r.headers.get("x-mock-backend") == "B",
+                  (r.status_code, r.headers.get("x-mock-backend")))
+    except AssertionError as e:
+        print(f"FAIL {e}")
+        return 1
+    finally:
+        for t in holders:
+            t.cancel()
+        await proxy.balancer.close()
+        for s in servers:
+            s.should_exit = True
+        await asyncio.sleep(0.3)
+    print("all checks passed")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check proxy streaming, load balancing and retry with mock replicas")
+    parser.add_argument("--base-port", type=int, default=9200,
+                        help="Proxy port; replicas use the next two ports, the refused replica the third")
+    parser.add_argument("--tpot-ms", type=float, default=20.0)
+    parser.add_argument("--hold-tokens", type=int, default=400, help="Length of the requests that occupy a replica")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Open-loop streaming TTFT benchmark for the aggregator proxy.
+
+Sends streaming chat completions with Poisson arrivals at --rate req/s for
+--duration seconds and reports TTFT / end-to-end latency percentiles, plus how
+requests were spread over replicas (x-token-labs-replica or x-mock-backend
+response header). Open loop means a slow replica does not slow down the
+arrival rate, which is what exposes tail TTFT.
+
+Usage:
+    python3 bench/mock_backend.py --ports 9001 9002 9003 --speed 1 1 0.25 &
+    PROXY_MODE=on PROXY_BALANCE=round_robin PROXY_BACKENDS='{"mock": [...]}' DISCOVERY=off \\
+        uvicorn aggregator:app --port 8000 &
+    python3 bench/ttft_bench.py --url http://127.0.0.1:8000 --model mock --rate 40 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {}
+    values = sorted(values)
+    pick = lambda p: round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 1)
+    return {"p50_ms": pick(0.50), "p90_ms": pick(0.90), "p99_ms": pick(0.99), "max_ms": round(values[-1] * 1000, 1)}
+
+
+async def one_request(client: httpx.AsyncClient, url: str, payload: dict, headers: dict | None = None) -> dict:
+    t0 = time.perf_counter()
+    ttft = None
+    try:
+        async with client.stream("POST", f"{url}/v1/chat/completions", json=payload, headers=headers) as r:
+            replica = r.headers.get("x-token-labs-replica") or r.headers.get("x-mock-backend") or "?"
+            async for line in r.aiter_lines():
+                if ttft is None and line.startswith("data: ") and '"content"' in line:
+                    ttft = time.perf_counter() - t0
+            status = r.status_code
+    except httpx.HTTPError as e:
+        return {"status": 0, "error": str(e), "replica": "?", "ttft": None, "e2e": time.perf_counter() - t0}
+    return {"status": status, "replica": replica, "ttft": ttft, "e2e": time.perf_counter() - t0}
+
+
+async def run(url: str, model: str, rate: float, duration: float, max_tokens: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    payload = {"model": model, "stream": True, "max_tokens": max_tokens,
+               "messages": [{"role": "user", "content": "Say something."}]}
+    limits = httpx.Limits(max_connections=1000, max_keepalive_connections=1000)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(120.0), limits=limits) as client:
+        tasks = []
+        start = time.perf_counter()
+        next_at = start
+        while next_at - start < duration:
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            tasks.append(asyncio.create_task(one_request(client, url, payload)))
+            next_at += rng.expovariate(rate)
+        results = await asyncio.gather(*tasks)
+
+    ok = [r for r in results if r["status"] == 200 and r["ttft"] is not None]
+    by_replica = {}
+    for r in ok:
+        by_replica[r["replica"]] = by_replica.get(r["replica"], 0) + 1
+    return {
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "ttft": percentiles([r["ttft"] for r in ok]),
+        "e2e": percentiles([r["e2e"] for r in ok]),
+        "by_replica": dict(sorted(by_replica.items())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming TTFT benchmark through the aggregator proxy")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--model", default="mock")
+    parser.add_argument("--rate", type=float, default=20.0, help="Arrivals per second (Poisson)")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--max-tokens", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.url, args.model, args.rate, args.duration, args.max_tokens, args.seed)),
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Request coalescing and exact-match response cache for the aggregator proxy.
+
+Eval jobs, the incident harness and dashboards send identical temperature=0
+requests, often at the same moment. For opted-in models this layer makes sure
+each distinct deterministic request is computed once:
+
+  * single flight – the first request (leader) opens one upstream stream; any
+                    identical request arriving while it runs subscribes to the
+                    same flight and receives every chunk, from the start,
+                    as it arrives (SSE streams fan out unchanged)
+  * cache         – a completed 200 response is kept in a bounded LRU with a
+                    TTL and replayed byte-for-byte on later exact matches
+                    (including the original response id and timestamps)
+
+The key is sha256 over the path and the canonical JSON body (sorted keys), so
+any difference in messages, sampling parameters, max_tokens or stream flag is
+a different key. Only requests with temperature == 0 and n == 1 qualify. A
+client can bypass the layer with `Cache-Control: no-cache` / `no-store`.
+
+The upstream read runs in its own task, so a leader that disconnects does not
+cut off the followers. Failed or truncated upstream responses are passed on
+but never cached.
+
+Configuration (env):
+    COALESCE_MODELS           comma-separated model ids, or "*"; empty (default) = off
+    COALESCE_TTL_S            cache entry lifetime (default 600)
+    COALESCE_MAX_ENTRIES      cache entries (default 2048)
+    COALESCE_MAX_MB           total cached response bytes (default 64); keep it well under the
+                              container memory limit, which also holds the interpreter and
+                              in-flight streams (deployment.yaml sets both)
+    COALESCE_MAX_ENTRY_KB     larger responses are coalesced but not cached (default 4096)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+MODELS = {m.strip() for m in os.getenv("COALESCE_MODELS", "").split(",") if m.strip()}
+TTL_S = float(os.getenv("COALESCE_TTL_S", "600"))
+MAX_ENTRIES = int(os.getenv("COALESCE_MAX_ENTRIES", "2048"))
+MAX_BYTES = int(float(os.getenv("COALESCE_MAX_MB", "64")) * 1024 * 1024)
+MAX_ENTRY_BYTES = int(float(os.getenv("COALESCE_MAX_ENTRY_KB", "4096")) * 1024)
+CACHE_HEADER = "x-token-labs-cache"
+
+
+def enabled_for(model: str) -> bool:
+    return "*" in MODELS or model in MODELS
+
+
+def deterministic(payload: dict) -> bool:
+    try:
+        return float(payload.get("temperature", 1.0)) == 0.0 and int(payload.get("n") or 1) == 1
+    except (TypeError, ValueError):
+        return False
+
+
+def eligible(model: str, payload: dict, headers) -> bool:
+    if not enabled_for(model) or not deterministic(payload):
+        return False
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-cache" in cache_control or "no-store" in cache_control:
+        _count(model, "bypass")
+        return False
+    return True
+
+
+def request_key(path: str, payload: dict) -> str:
+    canonical = json.dumps({"path": path, "body": payload}, sort_keys=True, separators=(",", ":"),
+                           ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+# ── Cache ───────────────────────────────────────────────────────────────────
+
+class ResponseCache:
+    """LRU + TTL cache of complete responses, bounded by entry count and bytes."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES, ttl_s: float = TTL_S):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._entries: OrderedDict[str, tuple[float, int, dict, bytes]] = OrderedDict()
+        self.size = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> tuple[int, dict, bytes] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, status, headers, body = entry
+        if expires < time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return status, headers, body
+
+    def put(self, key: str, status: int, headers: dict, body: bytes):
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic() + self.ttl_s, status, headers, body)
+        self.size += len(body)
+        while self._entries and (len(self._entries) > self.max_entries or self.size > self.max_bytes):
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key: str):
+        self.size -= len(self._entries.pop(key)[3])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# ── Single flight ───────────────────────────────────────────────────────────
+
+class Flight:
+    """One upstream response shared by every identical request that arrives while it runs."""
+
+    def __init__(self):
+        self.status: int | None = None
+        self.headers: dict = {}
+        self.error: Response | None = None      # upstream could not be opened at all
+        self.chunks: list[bytes] = []
+        self.done = False
+        self.complete = False                   # finished without an upstream error
+        self._changed = asyncio.Condition()
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def wait_head(self):
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.status is not None or self.error is not None or self.done)
+
+    async def iterate(self):
+        i = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.chunks) > i or self.done)
+                new = self.chunks[i:]
+                finished = self.done
+            for chunk in new:
+                yield chunk
+            i += len(new)
+            if finished and i == len(self.chunks):
+                return
+
+    async def pump(self, fetch):
+        try:
+            opened = await fetch()
+            if isinstance(opened, Response):
+                self.error = opened
+                return
+            self.status, self.headers, chunks = opened
+            await self._notify()
+            async for chunk in chunks:
+                self.chunks.append(chunk)
+                await self._notify()
+            self.complete = True
+        finally:
+            self.done = True
+            await self._notify()
+
+
+_cache = ResponseCache()
+_inflight: dict[str, Flight] = {}
+_stats: dict[str, dict[str, int]] = {}
+_tasks: set[asyncio.Task] = set()
+
+
+def _count(model: str, event: str, n: int = 1):
+    per_model = _stats.setdefault(model, {})
+    per_model[event] = per_model.get(event, 0) + n
+
+
+async def _run_flight(key: str, model: str, flight: Flight, fetch):
+    try:
+        await flight.pump(fetch)
+    finally:
+        _inflight.pop(key, None)
+        body_size = sum(map(len, flight.chunks))
+        if flight.complete and flight.status == 200 and body_size <= MAX_ENTRY_BYTES:
+            _cache.put(key, flight.status, flight.headers, b"".join(flight.chunks))
+            _count(model, "stored")
+
+
+async def serve(path: str, payload: dict, model: str, fetch):
+    """
+    Answer a deterministic request from the cache, an in-flight twin, or `fetch`.
+
+    `fetch()` opens the upstream and returns (status, headers, chunk iterator)
+    or an error Response.
+    """
+    key = request_key(path, payload)
+    cached = _cache.get(key)
+    if cached is not None:
+        _count(model, "hit")
+        status, headers, body = cached
+        return Response(body, status_code=status, headers={**headers, CACHE_HEADER: "hit"})
+
+    flight = _inflight.get(key)
+    if flight is None:
+        _count(model, "miss")
+        outcome = "miss"
+        flight = _inflight[key] = Flight()
+        task = asyncio.create_task(_run_flight(key, model, flight, fetch))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+    else:
+        _count(model, "coalesced")
+        outcome = "coalesced"
+
+    await flight.wait_head()
+    if flight.error is not None:
+        return flight.error
+    if flight.status is None:
+        return JSONResponse({"error": {"message": "Upstream failed before responding.", "code": 502}},
+                            status_code=502)
+    return StreamingResponse(flight.iterate(), status_code=flight.status,
+                             headers={**flight.headers, CACHE_HEADER: outcome})
+
+
+def stats() -> dict:
+    out = {"models": sorted(MODELS), "cache": {"entries": len(_cache), "size_mb": round(_cache.size / 2**20, 2),
+                                              "evictions": _cache.evictions, "inflight": len(_inflight)}}
+    per_model = {}
+    for model, counts in _stats.items():
+        lookups = counts.get("hit", 0) + counts.get("coalesced", 0) + counts.get("miss", 0)
+        per_model[model] = {**counts, "hit_rate": round((counts.get("hit", 0) + counts.get("coalesced", 0))
+                                                       / lookups, 4) if lookups else None}
+    out["per_model"] = per_model
+    return out
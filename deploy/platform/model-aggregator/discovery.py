@@ -0,0 +1,271 @@
+"""
+Kubernetes backend discovery for the model aggregator.
+
+Instead of a hardcoded model list, backends are the Services labelled
+token-labs/model=true in the aggregator's namespace. Two watch streams are
+held open against the API server, with no polling:
+
+  * Services        – which models exist. Model id comes from the
+                      token-labs/model-id annotation (default: Service name),
+                      port from the port named "http" (default: first port).
+  * EndpointSlices  – ready replica addresses per Service, so a rollout shows
+                      up as soon as the kubelet flips readiness.
+
+Each stream does list → watch from the list's resourceVersion, and relists on
+410 Gone or a dropped connection (with jittered backoff). Events go to an
+indexed in-memory Registry, and every change calls `on_change` so the
+aggregator can republish /v1/models immediately. bench/discovery_check.py runs
+the Watcher against bench/fake_apiserver.py, including both 410 relist paths.
+
+Configuration (env):
+    DISCOVERY                 auto (default: on when running in a cluster) | on | off
+    K8S_API_URL               API server URL (default: in-cluster https://$KUBERNETES_SERVICE_HOST)
+    DISCOVERY_NAMESPACE       namespace to watch (default: the pod's namespace)
+    DISCOVERY_LABEL_SELECTOR  Service label selector (default: token-labs/model=true)
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+from pathlib import Path
+
+import httpx
+
+log = logging.getLogger("model-aggregator.discovery")
+
+SA_DIR = Path("/var/run/secrets/kubernetes.io/serviceaccount")
+LABEL_SELECTOR = os.getenv("DISCOVERY_LABEL_SELECTOR", "token-labs/model=true")
+MODEL_ID_ANNOTATION = "token-labs/model-id"
+OWNED_BY_ANNOTATION = "token-labs/owned-by"
+SERVICE_NAME_LABEL = "kubernetes.io/service-name"
+WATCH_TIMEOUT_S = 300
+BACKOFF_MAX_S = 30.0
+
+
+def api_url() -> str | None:
+    if os.getenv("K8S_API_URL"):
+        return os.environ["K8S_API_URL"].rstrip("/")
+    host = os.getenv("KUBERNETES_SERVICE_HOST")
+    if host:
+        return f"https://{host}:{os.getenv('KUBERNETES_SERVICE_PORT', '443')}"
+    return None
+
+
+def enabled() -> bool:
+    mode = os.getenv("DISCOVERY", "auto").lower()
+    return mode == "on" or (mode == "auto" and api_url() is not None)
+
+
+def namespace() -> str:
+    if os.getenv("DISCOVERY_NAMESPACE"):
+        return os.environ["DISCOVERY_NAMESPACE"]
+    ns_file = SA_DIR / "namespace"
+    return ns_file.read_text().strip() if ns_file.exists() else "token-labs"
+
+
+# ── Registry ────────────────────────────────────────────────────────────────
+
+def _service_backend(svc: dict) -> dict:
+    meta = svc["metadata"]
+    annotations = meta.get("annotations") or {}
+    ports = svc.get("spec", {}).get("ports") or [{"port": 8000}]
+    port = next((p for p in ports if p.get("name") == "http"), ports[0])["port"]
+    host = f"{meta['name']}.{meta['namespace']}.svc.cluster.local"
+    return {
+        "id": annotations.get(MODEL_ID_ANNOTATION, meta["name"]),
+        "object": "model",
+        "owned_by": annotations.get(OWNED_BY_ANNOTATION, "token-labs"),
+        "service": meta["name"],
+        "namespace": meta["namespace"],
+        "base_url": f"http://{host}:{port}",
+        "probe_url": f"http://{host}:{port}/v1/models",
+    }
+
+
+def _ready_addresses(eps: dict) -> frozenset[str]:
+    ports = eps.get("ports") or []
+    port = next((p for p in ports if p.get("name") == "http"), ports[0] if ports else {}).get("port", 8000)
+    return frozenset(
+        f"{addr}:{port}"
+        for ep in eps.get("endpoints") or []
+        if (ep.get("conditions") or {}).get("ready", True)
+        for addr in ep.get("addresses") or []
+    )
+
+
+class Registry:
+    """Discovered backends, indexed by Service and by model id."""
+
+    def __init__(self):
+        self._services: dict[tuple[str, str], dict] = {}
+        self._by_model: dict[str, list[tuple[str, str]]] = {}
+        # (namespace, service) → {slice name: ready addresses}
+        self._slices: dict[tuple[str, str], dict[str, frozenset[str]]] = {}
+        self.synced: set[str] = set()      # resources whose initial list has been applied
+        self.version = 0
+
+    @property
+    def ready(self) -> bool:
+        return {"services", "endpointslices"} <= self.synced
+
+    def _reindex(self):
+        by_model: dict[str, list[tuple[str, str]]] = {}
+        for key, backend in sorted(self._services.items()):
+            by_model.setdefault(backend["id"], []).append(key)
+        self._by_model = by_model
+        self.version += 1
+
+    # Services
+    def replace_services(self, items: list[dict]) -> bool:
+        services = {(s["metadata"]["namespace"], s["metadata"]["name"]): _service_backend(s) for s in items}
+        self.synced.add("services")
+        if services == self._services:
+            return False
+        self._services = services
+        self._reindex()
+        return True
+
+    def apply_service(self, event: str, svc: dict) -> bool:
+        key = (svc["metadata"]["namespace"], svc["metadata"]["name"])
+        if event == "DELETED":
+            changed = self._services.pop(key, None) is not None
+        else:
+            backend = _service_backend(svc)
+            changed = self._services.get(key) != backend
+            self._services[key] = backend
+        if changed:
+            self._reindex()
+        return changed
+
+    # EndpointSlices
+    def replace_slices(self, items: list[dict]) -> bool:
+        slices: dict[tuple[str, str], dict[str, frozenset[str]]] = {}
+        for eps in items:
+            meta = eps["metadata"]
+            service = (meta.get("labels") or {}).get(SERVICE_NAME_LABEL)
+            if service:
+                slices.setdefault((meta["namespace"], service), {})[meta["name"]] = _ready_addresses(eps)
+        self.synced.add("endpointslices")
+        if slices == self._slices:
+            return False
+        self._slices = slices
+        self.version += 1
+        return True
+
+    def apply_slice(self, event: str, eps: dict) -> bool:
+        meta = eps["metadata"]
+        service = (meta.get("labels") or {}).get(SERVICE_NAME_LABEL)
+        if not service:
+            return False
+        per_service = self._slices.setdefault((meta["namespace"], service), {})
+        if event == "DELETED":
+            changed = per_service.pop(meta["name"], None) is not None
+        else:
+            addresses = _ready_addresses(eps)
+            changed = per_service.get(meta["name"]) != addresses
+            per_service[meta["name"]] = addresses
+        if changed:
+            self.version += 1
+        return changed
+
+    # Queries
+    def endpoints(self, namespace: str, service: str) -> list[str]:
+        return sorted(set().union(*self._slices.get((namespace, service), {}).values()))
+
+    def backends(self, model_id: str | None = None) -> list[dict]:
+        """Backends (one per Service) with their ready endpoints, optionally for one model."""
+        keys = self._by_model.get(model_id, []) if model_id is not None else sorted(self._services)
+        return [{**self._services[k], "endpoints": self.endpoints(*k)} for k in keys]
+
+    def models(self) -> list[str]:
+        return list(self._by_model)
+
+
+# ── Watcher ─────────────────────────────────────────────────────────────────
+
+class _Gone(Exception):
+    """The watch's resourceVersion expired (410); relist."""
+
+
+class Watcher:
+    """List+watch Services and EndpointSlices into a Registry."""
+
+    def __init__(self, registry: Registry, on_change=None, base_url: str | None = None, ns: str | None = None):
+        self.registry = registry
+        self.on_change = on_change or (lambda: None)
+        self.base_url = base_url or api_url()
+        self.namespace = ns or namespace()
+        ca = SA_DIR / "ca.crt"
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            verify=str(ca) if ca.exists() and self.base_url.startswith("https") else True,
+            timeout=httpx.Timeout(10.0, read=WATCH_TIMEOUT_S + 30),
+        )
+
+    def _headers(self) -> dict:
+        # Projected service-account tokens rotate; re-read on every (re)connect
+        token_file = SA_DIR / "token"
+        return {"Authorization": f"Bearer {token_file.read_text().strip()}"} if token_file.exists() else {}
+
+    async def run(self):
+        services = f"/api/v1/namespaces/{self.namespace}/services"
+        slices = f"/apis/discovery.k8s.io/v1/namespaces/{self.namespace}/endpointslices"
+        await asyncio.gather(
+            self._list_watch(services, {"labelSelector": LABEL_SELECTOR},
+                             self.registry.replace_services, self.registry.apply_service),
+            self._list_watch(slices, {}, self.registry.replace_slices, self.registry.apply_slice),
+        )
+
+    async def close(self):
+        await self._client.aclose()
+
+    def _changed(self):
+        try:
+            self.on_change()
+        except Exception:
+            log.exception("discovery on_change callback failed")
+
+    async def _list_watch(self, path: str, params: dict, replace, apply):
+        resource_version = None
+        backoff = 1.0
+        while True:
+            try:
+                if resource_version is None:
+                    r = await self._client.get(path, params=params, headers=self._headers())
+                    r.raise_for_status()
+                    body = r.json()
+                    resource_version = body["metadata"]["resourceVersion"]
+                    if replace(body.get("items") or []):
+                        self._changed()
+                resource_version = await self._watch(path, params, resource_version, apply)
+                backoff = 1.0
+            except _Gone:
+                resource_version = None
+            except (httpx.HTTPError, json.JSONDecodeError, KeyError) as e:
+                log.warning("watch %s failed (%s); retrying in %.0fs", path, e, backoff)
+                resource_version = None
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+                backoff = min(backoff * 2, BACKOFF_MAX_S)
+
+    async def _watch(self, path: str, params: dict, resource_version: str, apply) -> str:
+        """Consume one watch stream; returns the last resourceVersion seen."""
+        params = {**params, "watch": "1", "resourceVersion": resource_version,
+                  "allowWatchBookmarks": "true", "timeoutSeconds": str(WATCH_TIMEOUT_S)}
+        async with self._client.stream("GET", path, params=params, headers=self._headers()) as r:
+            if r.status_code == 410:
+                raise _Gone()
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                obj = event.get("object") or {}
+                if event["type"] == "ERROR":
+                    if obj.get("code") == 410:
+                        raise _Gone()
+                    raise httpx.HTTPError(f"watch error: {obj.get('message')}")
+                resource_version = obj["metadata"]["resourceVersion"]
+                if event["type"] != "BOOKMARK" and apply(event["type"], obj):
+                    self._changed()
+        return resource_version
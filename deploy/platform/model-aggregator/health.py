@@ -0,0 +1,262 @@
+"""
+Backend health monitor for the model aggregator.
+
+Each backend (one Service, or one static entry) gets its own probe schedule
+and circuit breaker:
+
+  * liveness probe – GET <probe_url> (/v1/models), timed; a non-200 or empty
+                     model list is a failure
+  * TTFT probe     – every TTFT_INTERVAL, a one-token streaming completion
+                     ("max_tokens": 1) timed to the first SSE chunk. This
+                     is real prefill + scheduling latency, which /v1/models
+                     does not see (the API server answers it while the engine
+                     is wedged). A failed TTFT probe counts as a failure
+  * circuit        – closed → open after FAILURE_THRESHOLD consecutive
+                     failures. An open backend is only re-probed (half-open)
+                     on a backoff schedule, and one success closes it again
+
+Probe intervals are jittered (±JITTER) so backends are not probed in lockstep,
+and adaptive: INTERVAL while healthy, FAST_INTERVAL after a failure, then
+doubling from FAST_INTERVAL up to INTERVAL while the circuit stays open.
+
+Status per backend: ok, degraded (TTFT over SLOW_TTFT_MS or probe over
+SLOW_PROBE_MS), down (circuit open) or unknown (not probed yet). A model's
+status is its best backend's. The aggregator publishes it in /v1/models as
+an `x_token_labs` extension, exports it on /metrics, and leaves open-circuit
+backends out of the proxy's replica map.
+
+The extension only carries values that change on a state transition: status,
+circuit, TTFT rounded up to a TTFT_BUCKETS_MS bound, and backend counts. The
+listing's ETag therefore stays put between probes, and clients revalidating
+with If-None-Match keep getting 304s. Raw probe latency, TTFT and last probe
+time change on every probe, so they are only on /metrics. Probe errors are
+logged when a circuit opens.
+
+A backend is a Service (or a static entry), not a pod. The probe goes to the
+Service address, so kube-proxy sends it to any one ready endpoint, and the
+circuit describes the Service as a whole. The proxy routes to the
+EndpointSlice endpoints directly. A single bad pod is handled there: it
+leaves the slice when its readiness probe fails, and a replica that refuses
+connections sits out proxy.DOWN_COOLDOWN_S.
+
+Configuration (env):
+    HEALTH_INTERVAL            seconds between probes of a healthy backend (default 28)
+    HEALTH_FAST_INTERVAL       first retry after a failure (default 2)
+    HEALTH_FAILURE_THRESHOLD   consecutive failures that open the circuit (default 3)
+    HEALTH_TTFT_INTERVAL       seconds between TTFT probes; 0 disables them (default 60)
+    HEALTH_SLOW_TTFT_MS        TTFT above this marks a backend degraded (default 3000)
+    HEALTH_SLOW_PROBE_MS       probe latency above this marks it degraded (default 1000)
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+
+import httpx
+
+log = logging.getLogger("model-aggregator.health")
+
+INTERVAL = float(os.getenv("HEALTH_INTERVAL", "28"))
+FAST_INTERVAL = float(os.getenv("HEALTH_FAST_INTERVAL", "2"))
+FAILURE_THRESHOLD = int(os.getenv("HEALTH_FAILURE_THRESHOLD", "3"))
+TTFT_INTERVAL = float(os.getenv("HEALTH_TTFT_INTERVAL", "60"))
+SLOW_TTFT_MS = float(os.getenv("HEALTH_SLOW_TTFT_MS", "3000"))
+SLOW_PROBE_MS = float(os.getenv("HEALTH_SLOW_PROBE_MS", "1000"))
+JITTER = 0.2
+PROBE_TIMEOUT_S = 5.0
+TTFT_TIMEOUT_S = 30.0
+TICK_S = 0.5
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+_CIRCUIT_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+_STATUS_RANK = {"ok": 0, "degraded": 1, "unknown": 2, "down": 3}
+TTFT_BUCKETS_MS = (250, 500, 1000, 2000, 3000, 5000, 10000, 30000)
+
+
+def _jittered(seconds: float) -> float:
+    return seconds * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+class BackendHealth:
+    def __init__(self, model_id: str, probe_url: str, base_url: str):
+        self.model_id = model_id
+        self.probe_url = probe_url
+        self.base_url = base_url
+        self.circuit = CLOSED
+        self.failures = 0               # consecutive
+        self.probes = 0
+        self.failures_total = 0
+        self.latency_ms: float | None = None
+        self.ttft_ms: float | None = None
+        self.checked_at: float | None = None    # wall clock, for clients
+        self.next_probe = time.monotonic() + random.uniform(0, FAST_INTERVAL)
+        self.next_ttft = 0.0
+
+    def status(self) -> str:
+        if self.circuit == OPEN:
+            return "down"
+        if self.checked_at is None:
+            return "unknown"
+        if (self.ttft_ms or 0) > SLOW_TTFT_MS or (self.latency_ms or 0) > SLOW_PROBE_MS or self.failures:
+            return "degraded"
+        return "ok"
+
+    def succeeded(self, latency_ms: float, ttft_ms: float | None):
+        self.probes += 1
+        self.latency_ms = round(latency_ms, 1)
+        if ttft_ms is not None:
+            self.ttft_ms = round(ttft_ms, 1)
+        self.failures = 0
+        self.circuit = CLOSED
+        self.checked_at = time.time()
+        self.next_probe = time.monotonic() + _jittered(INTERVAL)
+
+    def failed(self, error: str):
+        self.probes += 1
+        self.failures += 1
+        self.failures_total += 1
+        self.checked_at = time.time()
+        if self.failures >= FAILURE_THRESHOLD:
+            if self.circuit == CLOSED:
+                log.warning("circuit open for %s (%s): %s", self.model_id, self.probe_url, error)
+            self.circuit = OPEN
+            backoff = min(INTERVAL, FAST_INTERVAL * 2 ** (self.failures - FAILURE_THRESHOLD))
+        else:
+            backoff = FAST_INTERVAL
+        self.next_probe = time.monotonic() + _jittered(backoff)
+
+    def ttft_le_ms(self) -> int | None:
+        """Smallest TTFT_BUCKETS_MS bound at or above the last TTFT; None if unmeasured or above the last bound."""
+        if self.ttft_ms is None:
+            return None
+        return next((b for b in TTFT_BUCKETS_MS if self.ttft_ms <= b), None)
+
+    def extension(self) -> dict:
+        return {"status": self.status(), "circuit": self.circuit, "ttft_le_ms": self.ttft_le_ms()}
+
+
+class Monitor:
+    """Probes every backend returned by `resolve()` and calls `on_change()` after each probe."""
+
+    def __init__(self, resolve, on_change=None):
+        self.resolve = resolve              # () -> [{"id", "probe_url", "base_url"?}, ...]
+        self.on_change = on_change
+        self.backends: dict[str, BackendHealth] = {}
+        self._client: httpx.AsyncClient | None = None
+        self._running: set[str] = set()
+        self._task: asyncio.Task | None = None
+
+    def sync(self):
+        wanted = {}
+        for b in self.resolve():
+            base_url = b.get("base_url") or b["probe_url"].removesuffix("/v1/models")
+            wanted[b["probe_url"]] = (b["id"], base_url)
+        for url in self.backends.keys() - wanted.keys():
+            del self.backends[url]
+        for url, (model_id, base_url) in wanted.items():
+            if url not in self.backends or self.backends[url].model_id != model_id:
+                self.backends[url] = BackendHealth(model_id, url, base_url)
+
+    async def _ttft(self, backend: BackendHealth) -> float:
+        payload = {"model": backend.model_id, "prompt": "Hi", "max_tokens": 1, "temperature": 0, "stream": True}
+        t0 = time.perf_counter()
+        async with self._client.stream("POST", f"{backend.base_url}/v1/completions", json=payload,
+                                       timeout=TTFT_TIMEOUT_S) as r:
+            if r.status_code != 200:
+                raise RuntimeError(f"completion probe HTTP {r.status_code}")
+            async for line in r.aiter_lines():
+                if line.startswith("data: "):
+                    return (time.perf_counter() - t0) * 1000
+        raise RuntimeError("completion probe returned no data")
+
+    async def probe(self, backend: BackendHealth):
+        if backend.circuit == OPEN:
+            backend.circuit = HALF_OPEN
+        try:
+            t0 = time.perf_counter()
+            r = await self._client.get(backend.probe_url, timeout=PROBE_TIMEOUT_S)
+            latency_ms = (time.perf_counter() - t0) * 1000
+            if r.status_code != 200 or not r.json().get("data"):
+                raise RuntimeError(f"models probe HTTP {r.status_code}")
+            ttft_ms = None
+            if TTFT_INTERVAL > 0 and time.monotonic() >= backend.next_ttft:
+                ttft_ms = await self._ttft(backend)
+                backend.next_ttft = time.monotonic() + _jittered(TTFT_INTERVAL)
+            backend.succeeded(latency_ms, ttft_ms)
+        except Exception as e:      # anything (e.g. a non-dict JSON body) is a failed probe
+            backend.failed(f"{type(e).__name__}: {e}"[:200])
+            if backend.circuit != OPEN:
+                backend.circuit = CLOSED
+        if self.on_change:
+            self.on_change()
+
+    async def _guarded(self, backend: BackendHealth):
+        try:
+            await self.probe(backend)
+        except Exception:
+            # probe() turns every probe error into a failure; this only catches on_change
+            log.exception("health update for %s failed", backend.probe_url)
+        finally:
+            self._running.discard(backend.probe_url)
+
+    async def probe_all(self):
+        """Probe everything once now (startup)."""
+        self.sync()
+        due = [b for url, b in self.backends.items() if url not in self._running]
+        self._running.update(b.probe_url for b in due)
+        await asyncio.gather(*(self._guarded(b) for b in due))
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(TICK_S)
+            self.sync()
+            now = time.monotonic()
+            for url, backend in list(self.backends.items()):
+                if backend.next_probe <= now and url not in self._running:
+                    self._running.add(url)
+                    asyncio.create_task(self._guarded(backend))
+
+    def start(self, client: httpx.AsyncClient):
+        self._client = client
+        self._task = asyncio.create_task(self._loop())
+
+    def close(self):
+        if self._task:
+            self._task.cancel()
+
+    def available(self, probe_url: str) -> bool:
+        backend = self.backends.get(probe_url)
+        return backend is None or backend.circuit != OPEN
+
+    def model_extension(self, model_id: str) -> dict | None:
+        """The best backend's extension for a model, plus how many of its backends are up."""
+        mine = [b for b in self.backends.values() if b.model_id == model_id]
+        if not mine:
+            return None
+        best = min(mine, key=lambda b: (_STATUS_RANK[b.status()], b.ttft_le_ms() or 0, b.probe_url))
+        return {**best.extension(), "backends_up": sum(b.circuit != OPEN for b in mine), "backends": len(mine)}
+
+    def metrics(self) -> str:
+        series = {
+            "token_labs_backend_up": ("gauge", "1 unless the backend's circuit is open",
+                                      lambda b: int(b.circuit != OPEN)),
+            "token_labs_backend_circuit_state": ("gauge", "0 closed, 1 half-open, 2 open",
+                                                 lambda b: _CIRCUIT_VALUE[b.circuit]),
+            "token_labs_backend_probe_latency_seconds": ("gauge", "Latency of the last /v1/models probe",
+                                                         lambda b: b.latency_ms and b.latency_ms / 1000),
+            "token_labs_backend_ttft_seconds": ("gauge", "TTFT of the last one-token completion probe",
+                                                lambda b: b.ttft_ms and b.ttft_ms / 1000),
+            "token_labs_backend_last_probe_timestamp_seconds": ("gauge", "Wall-clock time of the last probe",
+                                                                 lambda b: b.checked_at and round(b.checked_at, 3)),
+            "token_labs_backend_probes_total": ("counter", "Probes sent", lambda b: b.probes),
+            "token_labs_backend_probe_failures_total": ("counter", "Failed probes", lambda b: b.failures_total),
+        }
+        lines = []
+        for name, (kind, help_text, value) in series.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for b in self.backends.values():
+                v = value(b)
+                if v is not None:
+                    lines.append(f'{name}{{model="{b.model_id}",backend="{b.base_url}"}} {v}')
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,348 @@
+"""
+Load-aware OpenAI proxy mode for the model aggregator.
+
+With PROXY_MODE=on the aggregator also serves /v1/chat/completions and
+/v1/completions. For every request it picks a replica of the requested
+model, by prompt-prefix affinity with bounded load (routing.py) or by lowest
+load score, forwards the body untouched and streams the upstream response back
+chunk by chunk (no buffering, SSE works as-is).
+
+Load signals, scraped from each replica's Prometheus /metrics every
+PROXY_SCRAPE_INTERVAL seconds (vLLM and SGLang metric names):
+
+    score = waiting + RUNNING_WEIGHT × running + KV_WEIGHT × kv_usage + pending
+
+`pending` counts requests this aggregator dispatched since the last scrape,
+so a burst does not all land on the replica that looked idle a second ago.
+Without fresh metrics a replica is scored by its local in-flight count.
+
+Every replica has its own pooled httpx.AsyncClient (keep-alive connections are
+reused across requests). A replica that refuses the connection is skipped and
+the request retried on the next best one; nothing has been sent at that point,
+so the retry is safe. The failed replica sits out DOWN_COOLDOWN_S seconds or
+until its next successful scrape.
+
+Configuration (env):
+    PROXY_MODE             on | off (default)
+    PROXY_BALANCE          prefix (default, see routing.py) | load | round_robin
+    PROXY_SCRAPE_INTERVAL  seconds between /metrics scrapes (default 1.0)
+    PROXY_BACKENDS         JSON {"model id": ["http://host:port", ...]} – static
+                           replica map, overrides discovery (local testing)
+
+Per-tenant admission (token buckets, fair queueing, shedding) is in admission.py.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import time
+
+import httpx
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+import admission
+import coalesce
+import routing
+
+log = logging.getLogger("model-aggregator.proxy")
+
+SCRAPE_INTERVAL = float(os.getenv("PROXY_SCRAPE_INTERVAL", "1.0"))
+BALANCE = os.getenv("PROXY_BALANCE", "prefix")
+RUNNING_WEIGHT = 0.1    # running requests mostly cost decode share, waiting ones cost TTFT
+KV_WEIGHT = 4.0         # a full KV cache is worth ~4 queued requests (preemption risk)
+STALE_AFTER = 5         # scrape intervals without fresh metrics before falling back to in-flight
+DOWN_COOLDOWN_S = 5.0   # a replica that refused a connection is skipped this long
+MAX_CONNECTIONS = 256
+
+# Prometheus metric → load field; vLLM and SGLang names
+METRICS = {
+    "vllm:num_requests_waiting": "waiting",
+    "vllm:num_requests_running": "running",
+    "vllm:kv_cache_usage_perc": "kv_usage",
+    "vllm:gpu_cache_usage_perc": "kv_usage",
+    "sglang:num_queue_reqs": "waiting",
+    "sglang:num_running_reqs": "running",
+    "sglang:token_usage": "kv_usage",
+    "vllm:prefix_cache_queries_total": "prefix_queries",
+    "vllm:prefix_cache_queries": "prefix_queries",
+    "vllm:prefix_cache_hits_total": "prefix_hits",
+    "vllm:prefix_cache_hits": "prefix_hits",
+}
+_METRIC_LINE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{[^}]*\})?\s+([-+0-9.eEinfNa]+)")
+# Request/response headers that must not be forwarded verbatim. date and server
+# are set by the aggregator's own HTTP server; forwarding the upstream's duplicates them
+HOP_BY_HOP = {"connection", "keep-alive", "transfer-encoding", "te", "trailer", "upgrade",
+              "proxy-authorization", "proxy-authenticate", "host", "content-length", "date", "server"}
+
+
+def enabled() -> bool:
+    return os.getenv("PROXY_MODE", "off").lower() == "on"
+
+
+def static_backends() -> dict[str, list[str]] | None:
+    raw = os.getenv("PROXY_BACKENDS")
+    return json.loads(raw) if raw else None
+
+
+def parse_metrics(text: str) -> dict:
+    """Sum the load metrics over all label sets (one engine may export per-DP-rank series)."""
+    load = {}
+    for line in text.splitlines():
+        if not line or line[0] == "#":
+            continue
+        m = _METRIC_LINE.match(line)
+        if m and m.group(1) in METRICS:
+            field = METRICS[m.group(1)]
+            load[field] = load.get(field, 0.0) + float(m.group(2))
+    return load
+
+
+# ── Replicas ────────────────────────────────────────────────────────────────
+
+class Replica:
+    def __init__(self, url: str):
+        self.url = url
+        self.client = httpx.AsyncClient(
+            base_url=url,
+            timeout=httpx.Timeout(10.0, read=None),
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+        )
+        self.waiting = 0.0
+        self.running = 0.0
+        self.kv_usage = 0.0
+        self.prefix_queries = 0.0   # engine-lifetime counters (tokens)
+        self.prefix_hits = 0.0
+        self.scraped_at: float | None = None
+        self.down_until = 0.0
+        self.inflight = 0       # requests currently streaming through this aggregator
+        self.pending = 0        # dispatched since the last scrape
+        self.requests = 0
+        self.errors = 0
+
+    def score(self) -> float:
+        if self.scraped_at is None or time.monotonic() - self.scraped_at > STALE_AFTER * SCRAPE_INTERVAL:
+            return float(self.inflight)
+        return self.waiting + RUNNING_WEIGHT * self.running + KV_WEIGHT * self.kv_usage + self.pending
+
+    async def scrape(self):
+        try:
+            r = await self.client.get("/metrics", timeout=max(0.5, SCRAPE_INTERVAL))
+            r.raise_for_status()
+        except httpx.HTTPError:
+            return
+        load = parse_metrics(r.text)
+        self.waiting = load.get("waiting", 0.0)
+        self.running = load.get("running", 0.0)
+        self.kv_usage = load.get("kv_usage", 0.0)
+        self.prefix_queries = load.get("prefix_queries", 0.0)
+        self.prefix_hits = load.get("prefix_hits", 0.0)
+        self.scraped_at = time.monotonic()
+        self.down_until = 0.0
+        self.pending = 0
+
+    def stats(self) -> dict:
+        return {"url": self.url, "score": round(self.score(), 3), "waiting": self.waiting,
+                "running": self.running, "kv_usage": round(self.kv_usage, 4), "inflight": self.inflight,
+                "requests": self.requests, "errors": self.errors,
+                "prefix_cache_hit_rate": round(self.prefix_hits / self.prefix_queries, 4)
+                if self.prefix_queries else None}
+
+
+class Balancer:
+    """Replica set per model, kept in sync with `resolve()` and scored from scraped load."""
+
+    def __init__(self, resolve):
+        self.resolve = resolve              # () -> {model id: [replica base URL, ...]}
+        self.replicas: dict[str, Replica] = {}
+        self.models: dict[str, list[str]] = {}
+        self.rings: dict[str, routing.HashRing] = {}
+        self.routing = routing.RoutingStats()
+        self._rr = itertools.count()
+        self._task: asyncio.Task | None = None
+
+    def sync(self):
+        models = self.resolve()
+        wanted = {url for urls in models.values() for url in urls}
+        for url in wanted - self.replicas.keys():
+            self.replicas[url] = Replica(url)
+        for url in self.replicas.keys() - wanted:
+            asyncio.get_running_loop().create_task(self._retire(self.replicas.pop(url)))
+        self.rings = {model: self.rings[model] if model in self.rings and self.rings[model].urls == sorted(set(urls))
+                      else routing.HashRing(urls) for model, urls in models.items()}
+        self.models = models
+
+    @staticmethod
+    async def _retire(replica: Replica):
+        # Let responses still streaming from a removed replica finish first
+        while replica.inflight:
+            await asyncio.sleep(1.0)
+        await replica.client.aclose()
+
+    def candidates(self, model: str) -> list[Replica]:
+        return [self.replicas[url] for url in self.models.get(model, []) if url in self.replicas]
+
+    def pick(self, model: str, exclude=(), key: str | None = None) -> tuple[Replica, str] | None:
+        """(replica, decision) for one request; decision is affinity, spill, load or round_robin."""
+        candidates = [r for r in self.candidates(model) if r.url not in exclude]
+        if not candidates:
+            return None
+        now = time.monotonic()
+        candidates = [r for r in candidates if r.down_until <= now] or candidates
+        if BALANCE == "round_robin":
+            return candidates[next(self._rr) % len(candidates)], "round_robin"
+        if BALANCE == "prefix" and key is not None and model in self.rings:
+            chosen = routing.choose({r.url: r for r in candidates}, self.rings[model], key, Replica.score)
+            if chosen is not None:
+                return chosen
+        best = min(r.score() for r in candidates)
+        return random.choice([r for r in candidates if r.score() == best]), "load"
+
+    async def _scrape_loop(self):
+        while True:
+            self.sync()
+            await asyncio.gather(*(r.scrape() for r in list(self.replicas.values())))
+            await asyncio.sleep(SCRAPE_INTERVAL)
+
+    def start(self):
+        self.sync()
+        self._task = asyncio.create_task(self._scrape_loop())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+        await asyncio.gather(*(r.client.aclose() for r in self.replicas.values()))
+
+    def stats(self) -> dict:
+        return {model: [self.replicas[u].stats() for u in urls if u in self.replicas]
+                for model, urls in self.models.items()}
+
+
+# ── Routes ──────────────────────────────────────────────────────────────────
+
+router = APIRouter()
+balancer: Balancer | None = None
+
+
+def _error(status: int, message: str, headers: dict | None = None) -> JSONResponse:
+    return JSONResponse({"error": {"message": message, "type": "invalid_request_error" if status < 500
+                                   else "service_unavailable", "code": status}},
+                        status_code=status, headers=headers)
+
+
+async def open_upstream(headers: dict, path: str, body: bytes, model: str, key: str | None = None):
+    """
+    Send `body` to the best replica of `model`.
+
+    Returns (status, response headers, body chunk iterator), or an error
+    JSONResponse when no replica can take the request.
+    """
+    tried = set()
+    while True:
+        picked = balancer.pick(model, exclude=tried, key=key)
+        if picked is None:
+            if not balancer.candidates(model):
+                return _error(404, f"The model `{model}` does not exist.")
+            return _error(503, f"No reachable replica for `{model}`.", {"Retry-After": "1"})
+        target, decision = picked
+        target.inflight += 1
+        target.pending += 1
+        target.requests += 1
+        try:
+            upstream = await target.client.send(
+                target.client.build_request("POST", path, content=body, headers=headers), stream=True)
+            break
+        except httpx.TransportError as e:
+            target.inflight -= 1
+            target.errors += 1
+            target.down_until = time.monotonic() + DOWN_COOLDOWN_S
+            log.warning("replica %s failed: %s", target.url, e)
+            tried.add(target.url)
+    balancer.routing.record(model, decision, target.url)
+
+    async def chunks():
+        try:
+            async for chunk in upstream.aiter_raw():
+                yield chunk
+        finally:
+            await upstream.aclose()
+            target.inflight -= 1
+
+    response_headers = {k: v for k, v in upstream.headers.items() if k.lower() not in HOP_BY_HOP}
+    response_headers["x-token-labs-replica"] = target.url
+    response_headers["x-token-labs-routing"] = decision
+    return upstream.status_code, response_headers, chunks()
+
+
+async def _proxy(request: Request, path: str):
+    body = await request.body()
+    try:
+        payload = json.loads(body)
+        model = payload["model"]
+    except (ValueError, KeyError, TypeError):
+        return _error(400, "Request body must be JSON with a `model` field.")
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP}
+    key = routing.prefix_key(payload, request.headers)
+    gate = admission.controller
+    if gate is not None:
+        tenant, tier = gate.identify(request.headers, request.client.host if request.client else None)
+        cost = admission.estimate_cost(payload)
+        rejected = gate.check(model, tenant, tier, cost)
+        if rejected is not None:
+            return rejected
+
+    async def fetch():
+        if gate is None:
+            return await open_upstream(headers, path, body, model, key)
+        release = await gate.acquire(model, tenant, tier, cost)
+        try:
+            opened = await open_upstream(headers, path, body, model, key)
+        except BaseException:
+            release()
+            raise
+        if isinstance(opened, JSONResponse):
+            release()
+            return opened
+        status, response_headers, chunks = opened
+        return status, response_headers, admission.released(chunks, release)
+
+    if coalesce.eligible(model, payload, request.headers):
+        return await coalesce.serve(path, payload, model, fetch)
+    opened = await fetch()
+    if isinstance(opened, JSONResponse):
+        return opened
+    status, response_headers, chunks = opened
+    return StreamingResponse(chunks, status_code=status, headers=response_headers)
+
+
+@router.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    return await _proxy(request, "/v1/chat/completions")
+
+
+@router.post("/v1/completions")
+async def completions(request: Request):
+    return await _proxy(request, "/v1/completions")
+
+
+@router.get("/proxy/replicas")
+async def replicas():
+    return balancer.stats()
+
+
+@router.get("/proxy/routing")
+async def routing_stats():
+    return {"balance": BALANCE, "models": balancer.routing.snapshot(balancer.models)}
+
+
+@router.get("/proxy/coalesce")
+async def coalesce_stats():
+    return coalesce.stats()
+
+
+@router.get("/proxy/admission")
+async def admission_stats():
+    return admission.controller.stats() if admission.controller else {"enabled": False}
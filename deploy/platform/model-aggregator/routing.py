@@ -0,0 +1,143 @@
+"""
+Prefix-affinity routing for the aggregator proxy.
+
+Multi-turn and agent sessions resend the same growing prefix every turn. A
+replica that served the previous turn still holds that prefix in its KV cache
+(vLLM/SGLang automatic prefix caching), so sending the session back there
+skips most of the prefill. Load-only routing scatters turns over replicas and
+recomputes the prefix each time.
+
+The affinity key is a hash of the normalized prompt prefix: system messages
+plus the first PREFIX_TURNS non-system messages (content whitespace-collapsed).
+That prefix is identical in every turn of a session, and later turns only
+append, so one session keeps one key. An explicit `x-session-id` header
+overrides it. Completions hash their first PREFIX_CHARS prompt characters.
+
+Keys map onto replicas with consistent hashing (VNODES virtual nodes per
+replica), so adding or removing a replica only moves the keys it owned.
+Bounded loads (Mirrokni et al.) stop a hot prefix from piling onto one
+replica: walking the ring clockwise, the first replica whose load score is
+within BOUND × the mean score (+1) takes the request. Otherwise it spills to
+the next one.
+
+Decisions are counted per model: affinity (the prefix owner), spill (bounded
+load overflow) and load (no key, least loaded). Stats also include imbalance
+(max / mean requests per replica) over the model's current replica set, so a
+replica that received nothing counts as 0 rather than being left out.
+"""
+import bisect
+import hashlib
+import os
+import re
+
+PREFIX_TURNS = int(os.getenv("ROUTING_PREFIX_TURNS", "1"))
+PREFIX_CHARS = int(os.getenv("ROUTING_PREFIX_CHARS", "2048"))
+BOUND = float(os.getenv("ROUTING_BOUND", "1.25"))
+VNODES = 100
+SESSION_HEADER = "x-session-id"
+
+_WS = re.compile(r"\s+")
+
+
+def _hash(data: str) -> int:
+    return int.from_bytes(hashlib.blake2b(data.encode(), digest_size=8).digest(), "big")
+
+
+def _text(content) -> str:
+    if isinstance(content, list):       # OpenAI content parts
+        content = " ".join(p.get("text", "") for p in content if isinstance(p, dict))
+    return _WS.sub(" ", str(content or "")).strip()
+
+
+def prefix_key(payload: dict, headers=None) -> str | None:
+    """Affinity key of a request, or None when it has no usable prefix."""
+    if headers is not None and headers.get(SESSION_HEADER):
+        return "session:" + headers[SESSION_HEADER]
+    messages = payload.get("messages")
+    if isinstance(messages, list) and messages:
+        system = [m for m in messages if m.get("role") in ("system", "developer")]
+        turns = [m for m in messages if m.get("role") not in ("system", "developer")][:PREFIX_TURNS]
+        parts = [f"{m.get('role')}:{_text(m.get('content'))}" for m in system + turns]
+        return "chat:" + "\x1e".join(parts) if parts else None
+    prompt = payload.get("prompt")
+    if isinstance(prompt, str) and prompt:
+        return "prompt:" + _WS.sub(" ", prompt[:PREFIX_CHARS])
+    return None
+
+
+class HashRing:
+    """Consistent-hash ring over replica URLs."""
+
+    def __init__(self, urls: list[str]):
+        self.urls = sorted(set(urls))
+        points = sorted((_hash(f"{url}#{i}"), url) for url in self.urls for i in range(VNODES))
+        self._hashes = [h for h, _ in points]
+        self._owners = [u for _, u in points]
+
+    def walk(self, key: str):
+        """Distinct replica URLs in ring order starting at the key's position."""
+        if not self._hashes:
+            return
+        start = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        seen = set()
+        for i in range(len(self._owners)):
+            url = self._owners[(start + i) % len(self._owners)]
+            if url not in seen:
+                seen.add(url)
+                yield url
+                if len(seen) == len(self.urls):
+                    return
+
+
+def choose(candidates: dict, ring: HashRing, key: str, load) -> tuple[object, str] | None:
+    """
+    Bounded-load consistent-hash choice among `candidates` ({url: replica}).
+
+    Returns (replica, "affinity" | "spill"), or None if no ring node is a candidate.
+    """
+    if not candidates:
+        return None
+    scores = {url: load(r) for url, r in candidates.items()}
+    limit = BOUND * sum(scores.values()) / len(scores) + 1
+    first = None
+    for url in ring.walk(key):
+        if url not in candidates:
+            continue
+        if first is None:
+            first = url
+        if scores[url] <= limit:
+            return candidates[url], "affinity" if url == first else "spill"
+    if first is None:
+        return None
+    # Everything is over the bound: least loaded, still counted as a spill
+    url = min(scores, key=scores.get)
+    return candidates[url], "affinity" if url == first else "spill"
+
+
+class RoutingStats:
+    def __init__(self):
+        self.decisions: dict[str, dict[str, int]] = {}    # model → decision → count
+        self.assigned: dict[str, dict[str, int]] = {}     # model → replica → count
+
+    def record(self, model: str, decision: str, url: str):
+        per_model = self.decisions.setdefault(model, {})
+        per_model[decision] = per_model.get(decision, 0) + 1
+        per_replica = self.assigned.setdefault(model, {})
+        per_replica[url] = per_replica.get(url, 0) + 1
+
+    def snapshot(self, replicas: dict[str, list[str]] | None = None) -> dict:
+        """Per-model stats; `replicas` (model → current replica URLs) adds idle replicas as 0."""
+        out = {}
+        for model, decisions in self.decisions.items():
+            keyed = decisions.get("affinity", 0) + decisions.get("spill", 0)
+            assigned = self.assigned.get(model, {})
+            current = list(dict.fromkeys((replicas or {}).get(model) or assigned))
+            counts = [assigned.get(url, 0) for url in current]
+            mean = sum(counts) / len(counts) if counts else 0
+            out[model] = {
+                "decisions": dict(decisions),
+                "affinity_rate": round(decisions.get("affinity", 0) / keyed, 4) if keyed else None,
+                "imbalance": round(max(counts) / mean, 3) if mean else None,
+                "requests_by_replica": {**dict.fromkeys(current, 0), **assigned},
+            }
+        return out
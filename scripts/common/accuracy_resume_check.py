@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Scripted check of evaluate_accuracy.py resuming from a partially filled checkpoint.
+
+Serves a canned OpenAI-compatible /v1/chat/completions endpoint in a thread,
+writes a checkpoint that already answers some prompts of every adaptive look
+(including looks after the first), then runs an adaptive evaluate_ifeval
+against it and checks:
+
+  1. the run finishes and scores every prompt of its last look
+  2. only the prompts missing from the checkpoint are sent to the server
+  3. the checkpoint is removed afterwards
+
+The intervals are made too wide to stop early (tiny --alpha), so every look
+is taken. Needs the ifeval library, like evaluate_accuracy.py. Exits 1 on the
+first failed check.
+
+Usage:
+    python scripts/common/accuracy_resume_check.py
+    python scripts/common/accuracy_resume_check.py --score-workers 0
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from accuracy_stats import instruction_category, stratified_order
+from evaluate_accuracy import checkpoint_header, evaluate_ifeval, get_default_dataset
+
+MODEL = "resume-check"
+
+
+def check(what: str, ok: bool, detail=""):
+    if not ok:
+        raise AssertionError(f"{what}: {detail}")
+    print(f"ok  {what}")
+
+
+def make_app(served: list[str]) -> Starlette:
+    async def chat(request: Request):
+        body = await request.json()
+        served.append(body["messages"][0]["content"])
+        return JSONResponse({"choices": [{"message": {"role": "assistant", "content": "Generated answer."}}],
+                             "usage": {"prompt_tokens": 10, "completion_tokens": 3}})
+
+    return Starlette(routes=[Route("/v1/chat/completions", chat, methods=["POST"])])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that evaluate_accuracy resumes from a partial checkpoint")
+    parser.add_argument("--port", type=int, default=9500)
+    parser.add_argument("--score-workers", type=int, default=2)
+    args = parser.parse_args()
+
+    served: list[str] = []
+    server = uvicorn.Server(uvicorn.Config(make_app(served), host="127.0.0.1", port=args.port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    # The same sample evaluate_ifeval draws: looks at 10, 20 and 30 prompts
+    dataset = get_default_dataset("en")
+    categories = [instruction_category(e.instruction_id_list[0]) if e.instruction_id_list else "none"
+                  for e in dataset]
+    sample = [dataset[i].prompt for i in stratified_order(categories, 0)[:30]]
+    resumed = sample[5:25]          # part of every look, all of the second
+
+    workdir = tempfile.mkdtemp(prefix="accuracy-resume-")
+    checkpoint = os.path.join(workdir, "ifeval.checkpoint.jsonl")
+    with open(checkpoint, "w") as f:
+        f.write(json.dumps(checkpoint_header(base_url, MODEL)) + "\n")
+        for prompt in resumed:
+            f.write(json.dumps({"prompt": prompt, "response": "Checkpointed answer.", "attempts": 1,
+                                "latency_ms": 1.0, "prompt_tokens": 10, "completion_tokens": 2}) + "\n")
+
+    try:
+        results = evaluate_ifeval(base_url, MODEL, num_samples=30, checkpoint=checkpoint, adaptive=True,
+                                  baseline_accuracy=50.0, alpha=1e-9, min_samples=10, batch_size=10,
+                                  score_workers=args.score_workers)
+        looks = results["sampling"]["adaptive"]["looks"]
+        check("resume: every look taken and scored",
+              [look["n"] for look in looks] == [10, 20, 30] and results["num_samples"] == 30,
+              [(look["n"], look["decision"]) for look in looks])
+        check("resume: only prompts missing from the checkpoint generated",
+              sorted(served) == sorted(p for p in sample if p not in resumed), f"{len(served)} requests")
+        check("resume: checkpoint removed", not os.path.exists(checkpoint))
+    except AssertionError as e:
+        print(f"FAIL {e}")
+        sys.exit(1)
+    finally:
+        server.should_exit = True
+    print("all checks passed")
+
+
+if __name__ == "__main__":
+    main()
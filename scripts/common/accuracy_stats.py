@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Sampling and confidence intervals for pass/fail accuracy benchmarks (IFEval).
+
+Taking the first N IFEval prompts over-represents whatever instruction types
+happen to come first, and a point estimate from ~100 prompts carries a ±10
+point sampling error. This module provides:
+
+  * stratified_order  – a seeded ordering of the dataset in which every prefix
+                        is (close to) proportionally stratified by instruction
+                        category, so "the first N" is a stratified sample and
+                        adaptive runs can simply extend the prefix
+  * wilson_interval   – score interval for a binomial proportion (prompt level)
+  * newcombe_interval – CI of the difference of two proportions (run vs baseline)
+  * cluster_bootstrap_ci – CI for instruction-level accuracy, resampling whole
+                        prompts because instructions of one prompt are correlated
+  * regression_decision – FAIL / PASS / IMPROVED / INCONCLUSIVE from a CI on
+                        (current − baseline) and a regression threshold
+
+All accuracies are in percent, like the rest of the accuracy pipeline. The
+interval and decision helpers are stdlib-only, so compare_baseline.py's
+accuracy gate runs on a bare python3; the sampling helpers import NumPy
+when called.
+
+Usage (library):
+    from accuracy_stats import stratified_order, wilson_interval, regression_decision
+    order = stratified_order(categories, seed=0)
+    lo, hi = wilson_interval(k, n, confidence=0.95)
+    status = regression_decision(lo - baseline, hi - baseline, threshold=5.0)
+"""
+from math import hypot, sqrt
+from statistics import NormalDist
+
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_N_BOOT = 2000
+
+
+def instruction_category(instruction_id: str) -> str:
+    """IFEval instruction ids look like "keywords:existence"; the category is the prefix."""
+    return instruction_id.split(":", 1)[0]
+
+
+def stratified_order(categories: list[str], seed: int = 0) -> list[int]:
+    """
+    Indices of all items, ordered so that every prefix is proportionally stratified.
+
+    Items are shuffled within their stratum, then interleaved by always taking
+    the next item of the stratum that is furthest behind its target share
+    (largest-remainder allocation applied incrementally). Deterministic for a
+    given seed.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    strata: dict[str, list[int]] = {}
+    for i, cat in enumerate(categories):
+        strata.setdefault(cat, []).append(i)
+    queues = {cat: list(rng.permutation(idx)) for cat, idx in sorted(strata.items())}
+    total = len(categories)
+    share = {cat: len(idx) / total for cat, idx in queues.items()}
+    taken = dict.fromkeys(queues, 0)
+
+    order = []
+    for n in range(1, total + 1):
+        cat = max((c for c in queues if taken[c] < len(queues[c])),
+                  key=lambda c: (share[c] * n - taken[c], share[c]))
+        order.append(int(queues[cat][taken[cat]]))
+        taken[cat] += 1
+    return order
+
+
+def _z(confidence: float) -> float:
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def wilson_interval(k: int, n: int, confidence: float = DEFAULT_CONFIDENCE) -> tuple[float, float]:
+    """Wilson score interval for k successes out of n, in percent."""
+    if n <= 0:
+        return 0.0, 100.0
+    z = _z(confidence)
+    p = k / n
+    denom = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denom
+    half = z * sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return float(max(0.0, centre - half)) * 100, float(min(1.0, centre + half)) * 100
+
+
+def newcombe_interval(k1: int, n1: int, k2: int, n2: int,
+                      confidence: float = DEFAULT_CONFIDENCE) -> tuple[float, float]:
+    """Newcombe hybrid score interval for p1 − p2 (percentage points)."""
+    p1, p2 = k1 / n1 * 100, k2 / n2 * 100
+    l1, u1 = wilson_interval(k1, n1, confidence)
+    l2, u2 = wilson_interval(k2, n2, confidence)
+    d = p1 - p2
+    return d - hypot(p1 - l1, u2 - p2), d + hypot(u1 - p1, p2 - l2)
+
+
+def cluster_bootstrap_ci(per_prompt: list[list[bool]], confidence: float = DEFAULT_CONFIDENCE,
+                         n_boot: int = DEFAULT_N_BOOT, seed: int = 0) -> tuple[float, float]:
+    """
+    Percentile bootstrap CI of instruction-level accuracy (percent).
+
+    `per_prompt` holds the followed/not-followed flags of each prompt's
+    instructions; prompts are resampled as units.
+    """
+    import numpy as np
+
+    per_prompt = [flags for flags in per_prompt if flags]
+    if not per_prompt:
+        return 0.0, 100.0
+    followed = np.array([sum(flags) for flags in per_prompt], dtype=np.float64)
+    counts = np.array([len(flags) for flags in per_prompt], dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(per_prompt), size=(n_boot, len(per_prompt)))
+    acc = followed[idx].sum(axis=1) / counts[idx].sum(axis=1) * 100
+    alpha = 1 - confidence
+    lo, hi = np.percentile(acc, [alpha / 2 * 100, (1 - alpha / 2) * 100])
+    return float(lo), float(hi)
+
+
+def regression_decision(diff_lo: float, diff_hi: float, threshold: float) -> str:
+    """
+    Classify a CI on (current − baseline) against a regression threshold.
+
+    FAIL only when the whole interval lies below −threshold, so the false-alarm
+    rate is bounded by the CI's one-sided error rate regardless of sample size;
+    INCONCLUSIVE when the interval straddles −threshold. A small sample makes
+    the interval wide, and then nearly every comparison is INCONCLUSIVE, so
+    callers must report it as such rather than as a pass.
+    """
+    if diff_hi < -threshold:
+        return "FAIL"
+    if diff_lo < -threshold:
+        return "INCONCLUSIVE"
+    if diff_lo > threshold:
+        return "IMPROVED"
+    return "PASS"
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Capacity planner: replicas needed for a traffic mix under TTFT/ITL SLOs.
+
+Sizing comes from the measured combo × concurrency grid of one
+framework/quant/technique in the results warehouse:
+
+  1. Per measured ISL/OSL combo, find the highest concurrency that still
+     meets the SLO, interpolating linearly between the last compliant and the
+     first violating level, and the request rate one replica sustains there.
+     This is the replica's SLO capacity for that combo.
+  2. For each request class of the traffic mix, interpolate machine seconds
+     per request (1 / capacity) across combos. Inside the triangle of three
+     measured combos this uses barycentric interpolation in (ISL, OSL). Outside
+     the measured region it starts from the nearest measured combo (log-scale
+     distance) and shifts it by the fitted per-token costs of cost_model.py:
+     s = s₀ + a·(ISL − ISL₀) + b·(OSL − OSL₀), floored at s₀ scaled by the
+     smaller token ratio. This is monotone in ISL and OSL. Without a fit the
+     nearest combo's cost is used as is. Either way the class is planned and
+     flagged as unsupported.
+  3. A replica-second buys one request per `s(isl, osl)` seconds, so the load
+     of a mix at R req/s is R · Σ wₖ·sₖ replicas. Replicas are sized so
+     utilisation stays under --max-utilization.
+
+Traffic mix (JSON):
+    {"mix": [{"isl": 1024, "osl": 512, "weight": 0.7}, {"isl": 4096, "osl": 1024, "weight": 0.3}],
+     "rate_by_hour": [2.0, 1.5, ..., 6.0]}          # req/s, any number of hours
+
+or a recorded trace (JSONL, one request per line):
+    {"timestamp": "2026-04-20T09:12:03Z", "input_tokens": 812, "output_tokens": 377}
+
+Trace requests are binned to the nearest power of two in ISL and OSL, and
+req/s is the hourly mean.
+
+Usage:
+    python3 capacity_planner.py --traffic traffic.json --framework vllm --quantization gptq-int4 \\
+        --technique baseline --slo-ttft-p99-ms 2000 --slo-itl-p99-ms 100 --output plan.json
+"""
+import argparse
+import itertools
+import json
+import math
+from datetime import datetime, timezone
+
+import numpy as np
+
+from cost_model import fit_token_costs
+
+DEFAULT_MAX_UTILIZATION = 0.8
+
+SUPPORT_NOTES = {
+    "capped": "SLO limit lies beyond the highest measured concurrency; capacity is a lower bound",
+    "extrapolated": "outside the measured ISL/OSL region; nearest measured combo shifted by the fitted token costs",
+    "nearest": "outside the measured ISL/OSL region and no token-cost fit; nearest measured combo's cost",
+    "none": "no SLO-compliant measurement to estimate from",
+}
+
+
+# ── Traffic ──
+
+def load_traffic(path: str) -> dict:
+    """Traffic mix {"mix": [{isl, osl, weight}], "rate_by_hour": [...]} from a spec or a JSONL trace."""
+    with open(path) as f:
+        text = f.read()
+    try:
+        spec = json.loads(text)
+    except ValueError:
+        spec = None
+    if isinstance(spec, dict) and "mix" in spec:
+        total = sum(c["weight"] for c in spec["mix"])
+        return {
+            "mix": [{"isl": int(c["isl"]), "osl": int(c["osl"]), "weight": c["weight"] / total} for c in spec["mix"]],
+            "rate_by_hour": [float(r) for r in spec["rate_by_hour"]],
+        }
+    return traffic_from_trace([json.loads(line) for line in text.splitlines() if line.strip()])
+
+
+def _bin(tokens: int) -> int:
+    return 2 ** max(0, round(math.log2(max(tokens, 1))))
+
+
+def _ts(value) -> datetime:
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+def traffic_from_trace(records: list[dict]) -> dict:
+    classes: dict[tuple[int, int], int] = {}
+    per_hour: dict[datetime, int] = {}
+    for r in records:
+        isl = r.get("input_tokens", r.get("isl"))
+        osl = r.get("output_tokens", r.get("osl"))
+        if not isl or not osl:
+            continue
+        key = (_bin(int(isl)), _bin(int(osl)))
+        classes[key] = classes.get(key, 0) + 1
+        hour = _ts(r["timestamp"]).replace(minute=0, second=0, microsecond=0)
+        per_hour[hour] = per_hour.get(hour, 0) + 1
+    if not classes:
+        raise ValueError("trace has no requests with input/output token counts")
+
+    n = sum(classes.values())
+    start, end = min(per_hour), max(per_hour)
+    hours = int((end - start).total_seconds() // 3600) + 1
+    rate_by_hour = [0.0] * hours
+    for hour, count in per_hour.items():
+        rate_by_hour[int((hour - start).total_seconds() // 3600)] = count / 3600.0
+    return {
+        "mix": [{"isl": isl, "osl": osl, "weight": c / n} for (isl, osl), c in sorted(classes.items())],
+        "rate_by_hour": rate_by_hour,
+        "trace_start": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+
+
+# ── Per-combo SLO capacity ──
+
+def _median_by_concurrency(rows: list[dict]) -> list[dict]:
+    """Repeated cells (re-runs, several nodes) collapse to their per-metric median."""
+    by_c: dict[int, list[dict]] = {}
+    for r in rows:
+        if r.get("concurrency") and r.get("throughput_tok_s"):
+            by_c.setdefault(r["concurrency"], []).append(r)
+    levels = []
+    for c, cell in sorted(by_c.items()):
+        level = {"concurrency": c}
+        for k in ("throughput_tok_s", "ttft_p99_ms", "itl_p99_ms"):
+            vals = [r[k] for r in cell if r.get(k) is not None]
+            level[k] = float(np.median(vals)) if vals else None
+        levels.append(level)
+    return levels
+
+
+def _violation(level: dict, slo_ttft_p99_ms: float | None, slo_itl_p99_ms: float | None) -> float | None:
+    """Largest metric/SLO ratio (≤ 1 means compliant); None if a constrained metric is missing."""
+    ratios = []
+    for metric, slo in (("ttft_p99_ms", slo_ttft_p99_ms), ("itl_p99_ms", slo_itl_p99_ms)):
+        if slo is None:
+            continue
+        if level.get(metric) is None:
+            return None
+        ratios.append(level[metric] / slo)
+    return max(ratios) if ratios else 0.0
+
+
+def slo_capacity(rows: list[dict], slo_ttft_p99_ms: float | None = None,
+                 slo_itl_p99_ms: float | None = None) -> dict:
+    """
+    Highest SLO-compliant operating point of one combo.
+
+    Between the last compliant and first violating level the SLO crossing is
+    interpolated linearly in concurrency. If every measured level is
+    compliant, capacity is capped at the highest measured level
+    (`capped=True`); the true limit lies beyond the grid.
+    """
+    isl, osl = rows[0].get("isl"), rows[0].get("osl")
+    levels = _median_by_concurrency(rows)
+    scored = [(lv, _violation(lv, slo_ttft_p99_ms, slo_itl_p99_ms)) for lv in levels]
+    scored = [(lv, v) for lv, v in scored if v is not None]
+    out = {"combo": rows[0].get("combo"), "isl": isl, "osl": osl, "measured_levels": [lv["concurrency"] for lv in levels]}
+
+    compliant = [i for i, (_, v) in enumerate(scored) if v <= 1.0]
+    if not compliant:
+        return {**out, "feasible": False}
+    i = compliant[-1]
+    lo, v_lo = scored[i]
+    concurrency, tput, capped = float(lo["concurrency"]), lo["throughput_tok_s"], True
+    if i + 1 < len(scored):
+        hi, v_hi = scored[i + 1]
+        capped = False
+        if v_hi > v_lo:
+            t = (1.0 - v_lo) / (v_hi - v_lo)
+            concurrency = lo["concurrency"] + t * (hi["concurrency"] - lo["concurrency"])
+            tput = lo["throughput_tok_s"] + t * (hi["throughput_tok_s"] - lo["throughput_tok_s"])
+    req_s = tput / osl
+    return {
+        **out,
+        "feasible": True,
+        "capped": capped,
+        "concurrency": round(concurrency, 2),
+        "throughput_tok_s": round(tput, 2),
+        "req_s": round(req_s, 5),
+        "machine_s_per_req": round(1.0 / req_s, 4),
+    }
+
+
+# ── Interpolation over (ISL, OSL) ──
+
+def _barycentric(p: np.ndarray, tri: np.ndarray) -> np.ndarray | None:
+    """Barycentric weights of p in triangle tri (3×2), or None if degenerate / outside."""
+    T = np.column_stack([tri[0] - tri[2], tri[1] - tri[2]])
+    if abs(np.linalg.det(T)) < 1e-9:
+        return None
+    l1, l2 = np.linalg.solve(T, p - tri[2])
+    w = np.array([l1, l2, 1.0 - l1 - l2])
+    return w if (w >= -1e-9).all() else None
+
+
+class CapacityGrid:
+    """Machine seconds per request s(isl, osl) of one replica at the SLO."""
+
+    def __init__(self, points: list[dict]):
+        self.points = [p for p in points if p.get("feasible")]
+        self.infeasible = [p["combo"] for p in points if not p.get("feasible")]
+        self.fit = fit_token_costs(self.points)
+
+    def seconds_per_request(self, isl: int, osl: int) -> tuple[float | None, str]:
+        """(s, support) with support one of measured / capped / interpolated / extrapolated / nearest / none."""
+        for p in self.points:
+            if p["isl"] == isl and p["osl"] == osl:
+                return p["machine_s_per_req"], "capped" if p["capped"] else "measured"
+
+        q = np.array([isl, osl], dtype=np.float64)
+        best = None
+        for tri in itertools.combinations(self.points, 3):
+            xy = np.array([[t["isl"], t["osl"]] for t in tri], dtype=np.float64)
+            w = _barycentric(q, xy)
+            if w is None:
+                continue
+            area = abs(np.linalg.det(np.column_stack([xy[0] - xy[2], xy[1] - xy[2]])))
+            if best is None or area < best[0]:
+                best = (area, tri, w)
+        if best is not None:
+            _, tri, w = best
+            s = float(sum(wi * t["machine_s_per_req"] for wi, t in zip(w, tri)))
+            return s, "capped" if any(t["capped"] for t in tri) else "interpolated"
+
+        if not self.points:
+            return None, "none"
+        near = min(self.points, key=lambda p: math.hypot(math.log2(isl / p["isl"]), math.log2(osl / p["osl"])))
+        s0 = near["machine_s_per_req"]
+        if self.fit is None:
+            return s0, "nearest"
+        s = s0 + (isl - near["isl"]) * self.fit["sec_per_input_token"] \
+            + (osl - near["osl"]) * self.fit["sec_per_output_token"]
+        floor = s0 * min(1.0, isl / near["isl"], osl / near["osl"])
+        return max(s, floor), "extrapolated"
+
+
+# ── Plan ──
+
+def plan(traffic: dict, grid: CapacityGrid, max_utilization: float = DEFAULT_MAX_UTILIZATION) -> dict:
+    classes, unsupported = [], []
+    s_mix = 0.0
+    for c in traffic["mix"]:
+        s, support = grid.seconds_per_request(c["isl"], c["osl"])
+        classes.append({**c, "machine_s_per_req": round(s, 4) if s is not None else None, "support": support})
+        if support not in ("measured", "interpolated"):
+            unsupported.append({"isl": c["isl"], "osl": c["osl"], "weight": round(c["weight"], 4),
+                                "support": support, "note": SUPPORT_NOTES[support]})
+        if s is not None:
+            s_mix += c["weight"] * s
+
+    plan_out = {
+        "classes": classes,
+        "unsupported": unsupported,
+        "infeasible_combos": grid.infeasible,
+        "max_utilization": max_utilization,
+    }
+    if s_mix <= 0 or any(c["support"] == "none" for c in classes):
+        plan_out["hours"] = []
+        plan_out["error"] = "no capacity estimate for at least one traffic class"
+        return plan_out
+
+    replica_req_s = 1.0 / s_mix
+    hours = []
+    for h, rate in enumerate(traffic["rate_by_hour"]):
+        load = rate * s_mix
+        replicas = max(1, math.ceil(load / max_utilization - 1e-9))
+        hours.append({
+            "hour": h,
+            "req_s": round(rate, 4),
+            "replicas": replicas,
+            "utilization": round(load / replicas, 4),
+            "headroom_req_s": round(replicas * replica_req_s - rate, 4),
+        })
+    peak = max(hours, key=lambda x: x["replicas"]) if hours else None
+    plan_out.update(
+        replica_capacity_req_s=round(replica_req_s, 5),
+        hours=hours,
+        peak_replicas=peak["replicas"] if peak else 0,
+        replica_hours=sum(x["replicas"] for x in hours),
+    )
+    return plan_out
+
+
+def print_plan(result: dict) -> None:
+    print(f"\n{'='*72}")
+    print(f"  CAPACITY PLAN  {result['config']}  SLO {result['slo'] or 'none'}")
+    print(f"{'='*72}")
+    for p in result["grid"]:
+        if not p["feasible"]:
+            print(f"  {p['combo']:<18}  no SLO-compliant concurrency in {p['measured_levels']}")
+        else:
+            cap = "  (capped at max measured concurrency)" if p["capped"] else ""
+            print(f"  {p['combo']:<18}  c={p['concurrency']:<6}  {p['req_s']:.4f} req/s per replica{cap}")
+    print()
+    for c in result["plan"]["classes"]:
+        s = f"{c['machine_s_per_req']:.2f}s/req" if c["machine_s_per_req"] is not None else "N/A"
+        print(f"  class ISL{c['isl']}/OSL{c['osl']}  w={c['weight']:.3f}  {s:>12}  [{c['support']}]")
+    if result["plan"].get("error"):
+        print(f"\n  ERROR: {result['plan']['error']}")
+        return
+    print(f"\n  Replica capacity for this mix: {result['plan']['replica_capacity_req_s']:.4f} req/s")
+    header = f"  {'Hour':>4}  {'req/s':>8}  {'Replicas':>8}  {'Util':>6}  {'Headroom req/s':>14}"
+    print(header)
+    print("  " + "-" * (len(header) - 2))
+    for h in result["plan"]["hours"]:
+        print(f"  {h['hour']:>4}  {h['req_s']:>8.3f}  {h['replicas']:>8}  {h['utilization']:>6.1%}  {h['headroom_req_s']:>14.3f}")
+    print(f"\n  Peak replicas: {result['plan']['peak_replicas']}   Replica-hours: {result['plan']['replica_hours']}")
+    for u in result["plan"]["unsupported"]:
+        print(f"  ⚠️  ISL{u['isl']}/OSL{u['osl']} (w={u['weight']}): {SUPPORT_NOTES[u['support']]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replicas needed for a traffic mix under TTFT/ITL SLOs")
+    parser.add_argument("--traffic", required=True, help="Traffic mix JSON or JSONL request trace")
+    parser.add_argument("--family", default="qwen35-27b", help="Warehouse result family (default: qwen35-27b)")
+    parser.add_argument("--model", help="Restrict to one model")
+    parser.add_argument("--framework", required=True)
+    parser.add_argument("--quantization", required=True)
+    parser.add_argument("--technique", default="baseline")
+    parser.add_argument("--hardware", help="Restrict to one node (hardware string in the results)")
+    parser.add_argument("--slo-ttft-p99-ms", type=float)
+    parser.add_argument("--slo-itl-p99-ms", type=float)
+    parser.add_argument("--max-utilization", type=float, default=DEFAULT_MAX_UTILIZATION,
+                        help="Target ceiling for per-replica utilisation (default: 0.8)")
+    parser.add_argument("--output", help="Write the plan JSON here")
+    args = parser.parse_args()
+
+    from results_store import ingest, query_rows
+    ingest()
+    filters = {"family": args.family, "framework": args.framework,
+               "quantization": args.quantization, "technique": args.technique}
+    for key in ("model", "hardware"):
+        if getattr(args, key):
+            filters[key] = getattr(args, key)
+    rows = [r for r in query_rows(filters) if r.get("isl") and r.get("osl")]
+    if not rows:
+        print("No ISL/OSL rows in the warehouse for", filters)
+        raise SystemExit(1)
+
+    by_combo: dict[str, list[dict]] = {}
+    for r in rows:
+        by_combo.setdefault(r["combo"], []).append(r)
+    grid_points = [slo_capacity(combo_rows, args.slo_ttft_p99_ms, args.slo_itl_p99_ms)
+                   for _, combo_rows in sorted(by_combo.items())]
+
+    traffic = load_traffic(args.traffic)
+    result = {
+        "generated": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "config": f"{args.framework}/{args.quantization}/{args.technique}",
+        "filters": filters,
+        "slo": {k: v for k, v in (("ttft_p99_ms", args.slo_ttft_p99_ms), ("itl_p99_ms", args.slo_itl_p99_ms))
+                if v is not None},
+        "grid": grid_points,
+        "plan": plan(traffic, CapacityGrid(grid_points), args.max_utilization),
+    }
+    print_plan(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nCapacity plan saved to {args.output}")
+    if result["plan"].get("error"):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
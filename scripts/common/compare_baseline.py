@@ -3,19 +3,46 @@
 Compare model accuracy against baseline.
 
 This script compares IFEval accuracy results from a model benchmark run
-against established baseline values.
+against established baseline values. A metric fails only when a confidence
+interval on (current − baseline) lies entirely below −5 points, so a 100-prompt
+stratified run and a full-dataset run share the same false-alarm rate. For
+prompt-level metrics the interval is a Newcombe interval that accounts for the
+sampling error of both the run and the baseline (counts when the run has them,
+else accuracy × num_samples, as in lighteval output). Instruction-level
+metrics use the run's own CI (evaluate_accuracy.py) or a Wilson interval from
+accuracy and num_samples. Intervals that straddle the threshold are
+INCONCLUSIVE: the run is too small to rule a regression in or out. That is
+reported as a warning and exits 0 (exit 1 with --fail-inconclusive), since a
+50-prompt CI run is nearly always INCONCLUSIVE and would otherwise fail every
+time. evaluate_accuracy.py --adaptive grows the sample until the CI resolves.
+
+With --perf it instead compares throughput and latency of a benchmark run
+(bench_results.json) against earlier runs of the same model in
+docs/benchmark-history.json. When both sides carry per-request samples, the
+median and p99 differences get hierarchical bootstrap CIs. These treat the
+run, not the request, as the unit: earlier runs are resampled first, then
+requests within them. Cliff's delta is reported as the effect size.
+Otherwise the comparison falls back to a robust z-score of the run summary
+against the history. Only statistically significant, non-negligible
+regressions fail. The history keeps (thinned) samples only for the most
+recent runs of each model, see trim_history(); the full samples are in each
+run's bench_results.json artifact.
 
 Usage:
     python scripts/compare_baseline.py --results ifeval_results.json --baseline baselines/llama-3.1-8b-instruct.json
     python scripts/compare_baseline.py --results ifeval_results.json --baseline baselines/llama-3.1-8b-instruct.json --update-baseline
+    python scripts/compare_baseline.py --perf --results bench_results.json --history docs/benchmark-history.json
 """
 
 import argparse
 import json
+import statistics
 import sys
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+
+from accuracy_stats import newcombe_interval, regression_decision, wilson_interval
 
 
 def load_json(filepath: str) -> Dict[str, Any]:
@@ -30,7 +57,40 @@ def save_json(filepath: str, data: Dict[str, Any]) -> None:
         json.dump(data, f, indent=2)
 
 
-def compare_accuracy(results: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+def _count(accuracy: float, n: int) -> int:
+    return int(round(accuracy / 100 * n))
+
+
+def accuracy_diff_ci(result_ifeval: Dict[str, Any], result_key: str, result_value: float,
+                     baseline_ifeval: Dict[str, Any], baseline_value: float,
+                     confidence: float) -> Optional[Dict[str, Any]]:
+    """
+    Confidence interval on (current − baseline) for one accuracy metric, or None.
+
+    Instruction-level metrics without instruction counts use the prompt count
+    as n, which over-states the variance (instructions are clustered in
+    prompts) and so errs towards INCONCLUSIVE rather than FAIL.
+    """
+    level, mode = ("prompt" if result_key.startswith("prompt") else "instruction",
+                   "loose" if result_key.endswith("_loose") else "strict")
+    n = result_ifeval.get("num_samples") or 0
+    counts = (result_ifeval.get("counts") or {}).get(f"{level}_{mode}") or (
+        [_count(result_value, n), n] if level == "prompt" else None)
+    baseline_n = baseline_ifeval.get("num_samples") or 0
+    if level == "prompt" and counts and counts[1] and baseline_n:
+        lo, hi = newcombe_interval(counts[0], counts[1], _count(baseline_value, baseline_n), baseline_n, confidence)
+        return {"low": lo, "high": hi, "method": "newcombe", "confidence": confidence}
+    ci = (result_ifeval.get("ci") or {}).get(result_key)
+    if ci:
+        return {"low": ci["low"] - baseline_value, "high": ci["high"] - baseline_value,
+                "method": ci.get("method", "run-ci"), "confidence": result_ifeval.get("confidence")}
+    if n:
+        lo, hi = wilson_interval(_count(result_value, n), n, confidence)
+        return {"low": lo - baseline_value, "high": hi - baseline_value, "method": "wilson", "confidence": confidence}
+    return None
+
+
+def compare_accuracy(results: Dict[str, Any], baseline: Dict[str, Any], confidence: float = 0.95) -> Dict[str, Any]:
     """
     Compare accuracy results against baseline.
     
@@ -76,17 +136,21 @@ def compare_accuracy(results: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[
             continue
         
         delta = result_value - baseline_value
-        # Check if degradation exceeds threshold
-        if delta < -threshold:
+        ci = accuracy_diff_ci(result_ifeval, result_key, result_value, baseline_ifeval, baseline_value, confidence)
+        if ci is not None:
+            status = regression_decision(ci["low"], ci["high"], threshold)
+        # Without sample counts fall back to the point estimate
+        elif delta < -threshold:
             status = "FAIL"
-            comparison["status"] = "FAIL"
-            symbol = "❌"
         elif delta <= threshold:  # Simplified: covers -threshold <= delta <= threshold
             status = "PASS"
-            symbol = "✅"
         else:  # delta > threshold (improved significantly)
             status = "IMPROVED"
-            symbol = "🎉"
+        symbol = {"FAIL": "❌", "PASS": "✅", "IMPROVED": "🎉", "INCONCLUSIVE": "⚠️ "}[status]
+        if status == "FAIL":
+            comparison["status"] = "FAIL"
+        elif status == "INCONCLUSIVE" and comparison["status"] == "PASS":
+            comparison["status"] = "INCONCLUSIVE"
         
         # Create message based on delta
         if delta == 0:
@@ -101,14 +165,18 @@ def compare_accuracy(results: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[
             "current": result_value,
             "baseline": baseline_value,
             "delta": delta,
+            "delta_ci": [round(ci["low"], 2), round(ci["high"], 2)] if ci else None,
+            "ci_method": ci["method"] if ci else None,
+            "confidence": ci["confidence"] if ci else None,
             "threshold": threshold,
             "status": status,
             "message": f"Current {result_value:.2f}% vs baseline {baseline_value:.2f}% ({change_msg})"
         }
         
+        ci_msg = f", CI [{ci['low']:+.2f}, {ci['high']:+.2f}] {ci['method']}" if ci else ""
         comparison["summary"].append(
             f"{symbol} {metric_name}: {result_value:.2f}% "
-            f"(baseline: {baseline_value:.2f}%, Δ {delta:+.2f}%)"
+            f"(baseline: {baseline_value:.2f}%, Δ {delta:+.2f}%{ci_msg})"
         )
     
     return comparison
@@ -145,6 +213,253 @@ def update_baseline(baseline_path: str, results: Dict[str, Any], run_id: Optiona
     print(f"✅ Baseline updated: {baseline_path}")
 
 
+# ---------------------------------------------------------------------------
+# Performance regression mode
+# ---------------------------------------------------------------------------
+
+PERF_PHASES = ["prefill", "decode", "cached"]
+
+# Per-request sample name -> (summary fallback keys, higher_is_better).
+# Summary keys are looked up in the phase block, then in its "latency" block.
+PERF_METRICS = {
+    "tok_s": (["tokens_per_second"], True),
+    "ttft_ms": (["median_ttft_ms", "p99_ttft_ms"], False),
+    "tpot_ms": (["median_tpot_ms", "p99_tpot_ms"], False),
+}
+
+# Romano et al. thresholds for |Cliff's delta|.
+CLIFF_NEGLIGIBLE = 0.147
+CLIFF_SMALL = 0.33
+CLIFF_MEDIUM = 0.474
+
+ROBUST_Z_LIMIT = 3.5     # Iglewicz & Hoaglin outlier cut-off for modified z-scores
+MIN_HISTORY_RUNS = 3     # summary-only fallback needs at least this many runs
+HISTORY_WINDOW = 5       # earlier runs compared against; also the runs that keep samples in the history
+MAX_HISTORY_SAMPLES = 200  # per phase and metric in the history; the run artifact keeps all of them
+
+
+def _median(values: List[float]) -> float:
+    return statistics.median(values)
+
+
+def cliffs_magnitude(delta: float) -> str:
+    d = abs(delta)
+    if d < CLIFF_NEGLIGIBLE:
+        return "negligible"
+    if d < CLIFF_SMALL:
+        return "small"
+    if d < CLIFF_MEDIUM:
+        return "medium"
+    return "large"
+
+
+def _summary_value(block: Dict[str, Any], key: str) -> Optional[float]:
+    value = block.get(key, block.get("latency", {}).get(key))
+    return value if value else None   # 0 means "not measured" in bench_results.json
+
+
+def select_history(history: List[Dict[str, Any]], results: Dict[str, Any], window: int) -> List[Dict[str, Any]]:
+    """Most recent `window` earlier runs of the same model (the current run excluded)."""
+    same_model = [
+        e for e in history
+        if e.get("model") == results.get("model")
+        and not (e.get("timestamp") == results.get("timestamp") and e.get("image_tag") == results.get("image_tag"))
+    ]
+    same_model.sort(key=lambda e: e.get("timestamp", ""))
+    return same_model[-window:]
+
+
+def thin_samples(values: List[float], max_samples: int = MAX_HISTORY_SAMPLES) -> List[float]:
+    """At most `max_samples` evenly spaced order statistics of `values`, minimum and maximum included."""
+    if len(values) <= max_samples:
+        return values
+    ordered = sorted(values)
+    step = (len(ordered) - 1) / (max_samples - 1)
+    return [ordered[round(i * step)] for i in range(max_samples)]
+
+
+def trim_history(history: List[Dict[str, Any]], keep_runs: int = HISTORY_WINDOW,
+                 max_samples: int = MAX_HISTORY_SAMPLES) -> List[Dict[str, Any]]:
+    """
+    Bound the per-request samples stored in docs/benchmark-history.json (in place).
+
+    Only the `keep_runs` most recent runs of each model, the ones --perf
+    compares against, keep samples, thinned to `max_samples` per metric.
+    Older runs keep only their summary statistics.
+    """
+    by_model: Dict[Any, List[Dict[str, Any]]] = {}
+    for e in sorted(history, key=lambda e: e.get("timestamp", ""), reverse=True):
+        by_model.setdefault(e.get("model"), []).append(e)
+    recent = {id(e) for runs in by_model.values() for e in runs[:keep_runs]}
+    for e in history:
+        for phase in PERF_PHASES:
+            block = e.get(phase)
+            if not isinstance(block, dict) or "samples" not in block:
+                continue
+            if id(e) in recent and block["samples"]:
+                block["samples"] = {k: thin_samples(v, max_samples) for k, v in block["samples"].items()}
+            else:
+                del block["samples"]
+    return history
+
+
+def _compare_samples(current: List[float], reference_runs: List[List[float]], higher_is_better: bool,
+                     alpha: float, min_rel_change: float) -> Dict[str, Any]:
+    # NumPy is only needed for sample-based --perf comparisons; the accuracy gate runs on stdlib python3
+    from latency_stats import hierarchical_diff_ci, mann_whitney_greater, pct
+
+    # Orient so that a positive difference / delta always means "worse".
+    sign = -1.0 if higher_is_better else 1.0
+    reference = [v for run in reference_runs for v in run]
+    # Cliff's delta over the pooled reference is only an effect size; the
+    # decision comes from run-level CIs, since requests within a run are not
+    # independent of that run's conditions.
+    _, delta = mann_whitney_greater([sign * v for v in current], [sign * v for v in reference])
+    confidence = 1.0 - 2 * alpha      # two-sided CI whose lower tail is the one-sided test
+
+    def worse_ci(q: float):
+        point, lo, hi = hierarchical_diff_ci(current, reference_runs, q, confidence=confidence)
+        return point, (lo, hi) if not higher_is_better else (-hi, -lo), (lo, hi)
+
+    point, (worse_lo, _), ci = worse_ci(50)
+    cur_median, ref_median = _median(current), _median(reference)
+    rel_change = point / ref_median if ref_median else 0.0
+    shift_regressed = worse_lo > 0 and delta >= CLIFF_NEGLIGIBLE
+
+    out = {
+        "test": "hierarchical-bootstrap",
+        "n_current": len(current),
+        "n_reference": len(reference),
+        "n_reference_runs": len(reference_runs),
+        "current_median": round(cur_median, 3),
+        "reference_median": round(ref_median, 3),
+        "median_diff_ci": [round(ci[0], 3), round(ci[1], 3)],
+        "rel_change": round(rel_change, 4),
+        "cliffs_delta": round(delta, 4),
+        "effect": cliffs_magnitude(delta),
+        "regressed": shift_regressed,
+    }
+
+    if not higher_is_better:
+        # Tail latency: a rank/median shift says little about the last percent of requests.
+        point, (lo, hi), _ = worse_ci(99)
+        ref_p99 = pct(reference, 99, digits=None)
+        p99_rel = point / ref_p99 if ref_p99 else 0.0
+        p99_regressed = lo > 0 and p99_rel > min_rel_change
+        out["p99"] = {
+            "current": round(pct(current, 99, digits=None), 3),
+            "reference": round(ref_p99, 3),
+            "diff": round(point, 3),
+            "ci": [round(lo, 3), round(hi, 3)],
+            "rel_change": round(p99_rel, 4),
+            "regressed": p99_regressed,
+        }
+        out["regressed"] = shift_regressed or p99_regressed
+    return out
+
+
+def _compare_summary(current: float, reference: List[float], higher_is_better: bool) -> Dict[str, Any]:
+    ref_median = _median(reference)
+    mad = _median([abs(v - ref_median) for v in reference])
+    scale = mad if mad > 0 else max(abs(ref_median) * 0.01, 1e-9)
+    z = 0.6745 * (current - ref_median) / scale
+    worse_z = -z if higher_is_better else z
+    return {
+        "test": "robust-z",
+        "n_reference": len(reference),
+        "current": current,
+        "reference_median": round(ref_median, 3),
+        "rel_change": round((current - ref_median) / ref_median, 4) if ref_median else 0.0,
+        "robust_z": round(worse_z, 3),
+        "regressed": len(reference) >= MIN_HISTORY_RUNS and worse_z > ROBUST_Z_LIMIT,
+    }
+
+
+def compare_performance(results: Dict[str, Any], history: List[Dict[str, Any]], window: int = HISTORY_WINDOW,
+                        alpha: float = 0.05, min_rel_change: float = 0.05) -> Dict[str, Any]:
+    """
+    Compare a benchmark run against earlier runs of the same model.
+
+    `alpha` is the family-wise significance level; it is Bonferroni-split
+    across the metrics that get a sample-based test.
+
+    Returns:
+        Dictionary with per-metric test results and an overall status, in the
+        same shape as compare_accuracy() so print_comparison() works on both.
+    """
+    reference_runs = select_history(history, results, window)
+    comparison = {
+        "model": results.get("model", "unknown"),
+        "baseline_model": f"history ({len(reference_runs)} earlier runs)",
+        "mode": "performance",
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "reference_runs": [{"version": e.get("version"), "timestamp": e.get("timestamp")} for e in reference_runs],
+        "metrics": {},
+        "status": "PASS",
+        "summary": [],
+    }
+    if not reference_runs:
+        comparison["status"] = "NO_BASELINE"
+        comparison["summary"].append("⚠️  No earlier runs of this model in the history")
+        return comparison
+
+    planned = []
+    for phase in PERF_PHASES:
+        block = results.get(phase) or {}
+        if not block.get("tokens_per_second"):
+            continue
+        for sample_key, (summary_keys, higher_is_better) in PERF_METRICS.items():
+            current_samples = (block.get("samples") or {}).get(sample_key)
+            reference_samples = [
+                run for e in reference_runs
+                if (run := ((e.get(phase) or {}).get("samples") or {}).get(sample_key))
+            ]
+            planned.append((phase, sample_key, summary_keys, higher_is_better, current_samples, reference_samples))
+
+    n_tests = sum(1 for p in planned if p[4] and p[5]) or 1
+    test_alpha = alpha / n_tests
+
+    for phase, sample_key, summary_keys, higher_is_better, current_samples, reference_samples in planned:
+        if current_samples and reference_samples:
+            entries = {f"{phase}.{sample_key}": _compare_samples(
+                current_samples, reference_samples, higher_is_better, test_alpha, min_rel_change)}
+        else:
+            entries = {}
+            for key in summary_keys:
+                current = _summary_value(results[phase], key)
+                reference = [v for e in reference_runs if (v := _summary_value(e.get(phase) or {}, key)) is not None]
+                if current is None or not reference:
+                    continue
+                entries[f"{phase}.{key}"] = _compare_summary(current, reference, higher_is_better)
+
+        for name, entry in entries.items():
+            comparison["metrics"][name] = entry
+            if entry["regressed"]:
+                comparison["status"] = "FAIL"
+                symbol = "❌"
+            else:
+                symbol = "✅"
+            if entry["test"] == "hierarchical-bootstrap":
+                ci = entry["median_diff_ci"]
+                detail = (f"median {entry['current_median']:.2f} vs {entry['reference_median']:.2f} "
+                          f"(Δ {entry['rel_change']:+.1%}, CI Δ [{ci[0]:+.2f}, {ci[1]:+.2f}] over "
+                          f"{entry['n_reference_runs']} runs, Cliff's δ={entry['cliffs_delta']:+.2f} {entry['effect']})")
+                if "p99" in entry:
+                    p99 = entry["p99"]
+                    detail += (f"; p99 {p99['current']:.2f} vs {p99['reference']:.2f} "
+                               f"(CI Δ [{p99['ci'][0]:+.2f}, {p99['ci'][1]:+.2f}])")
+            else:
+                detail = (f"{entry['current']:.2f} vs history median {entry['reference_median']:.2f} "
+                          f"(Δ {entry['rel_change']:+.1%}, robust z={entry['robust_z']:+.2f}, "
+                          f"n={entry['n_reference']})")
+            comparison["summary"].append(f"{symbol} {name}: {detail}")
+
+    if not comparison["metrics"]:
+        comparison["status"] = "NO_BASELINE"
+        comparison["summary"].append("⚠️  No comparable metrics between this run and the history")
+    return comparison
+
+
 def print_comparison(comparison: Dict[str, Any]) -> None:
     """Print comparison results in a readable format."""
     print("\n" + "=" * 80)
@@ -163,7 +478,7 @@ def print_comparison(comparison: Dict[str, Any]) -> None:
 
 def main():
     parser = argparse.ArgumentParser(
-        description="Compare model accuracy against baseline"
+        description="Compare model accuracy against baseline, or performance against benchmark history"
     )
     parser.add_argument(
         "--results",
@@ -172,8 +487,40 @@ def main():
     )
     parser.add_argument(
         "--baseline",
-        required=True,
-        help="Path to baseline JSON file",
+        help="Path to baseline JSON file (accuracy mode)",
+    )
+    parser.add_argument(
+        "--perf",
+        action="store_true",
+        help="Performance regression mode: compare bench_results.json against --history",
+    )
+    parser.add_argument(
+        "--history",
+        default="docs/benchmark-history.json",
+        help="Benchmark history for --perf (default: docs/benchmark-history.json)",
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=HISTORY_WINDOW,
+        help=f"Number of earlier runs of the same model to compare against (default: {HISTORY_WINDOW})",
+    )
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=0.05,
+        help="Family-wise significance level for --perf; accuracy CIs use 1 - alpha (default: 0.05)",
+    )
+    parser.add_argument(
+        "--min-rel-change",
+        type=float,
+        default=0.05,
+        help="Smallest relative p99 increase that counts as a regression (default: 0.05)",
+    )
+    parser.add_argument(
+        "--fail-inconclusive",
+        action="store_true",
+        help="Exit 1 when the accuracy comparison is INCONCLUSIVE (default: warn and exit 0)",
     )
     parser.add_argument(
         "--update-baseline",
@@ -191,7 +538,30 @@ def main():
     )
     
     args = parser.parse_args()
-    
+
+    if args.perf:
+        try:
+            results = load_json(args.results)
+            history = load_json(args.history)
+        except FileNotFoundError as e:
+            print(f"Error: File not found - {e}")
+            sys.exit(2)
+        except json.JSONDecodeError as e:
+            print(f"Error: Invalid JSON - {e}")
+            sys.exit(2)
+        comparison = compare_performance(results, history, args.window, args.alpha, args.min_rel_change)
+        save_json(args.output, comparison)
+        print(f"Comparison results saved to: {args.output}")
+        print_comparison(comparison)
+        if comparison["status"] == "FAIL":
+            print("❌ Performance regression: statistically significant degradation vs history")
+            sys.exit(1)
+        print("✅ No statistically significant performance regression")
+        return comparison
+
+    if not args.baseline:
+        parser.error("--baseline is required unless --perf is given")
+
     # Load results and baseline
     try:
         results = load_json(args.results)
@@ -222,7 +592,7 @@ def main():
         sys.exit(0)
     
     # Compare results against baseline
-    comparison = compare_accuracy(results, baseline)
+    comparison = compare_accuracy(results, baseline, confidence=1.0 - args.alpha)
     
     # Save comparison results
     save_json(args.output, comparison)
@@ -235,8 +605,13 @@ def main():
     if comparison["status"] == "FAIL":
         print("❌ Comparison FAILED: Model accuracy degraded beyond acceptable threshold")
         sys.exit(1)
-    elif comparison["status"] == "PASS":
-        print("✅ Comparison PASSED: Model accuracy within acceptable range")
+    elif comparison["status"] == "INCONCLUSIVE":
+        print("⚠️  Comparison INCONCLUSIVE: too few samples to rule a regression in or out; "
+              "rerun with more samples (or evaluate_accuracy.py --adaptive)")
+        if args.fail_inconclusive:
+            sys.exit(1)
+        return comparison
+    print("✅ Comparison PASSED: Model accuracy within acceptable range")
     
     return comparison
 
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Adaptive concurrency ladder with knee detection.
+
+Instead of measuring every entry of a fixed CONCURRENCY_LEVELS list, double
+concurrency until the marginal throughput gain drops below a threshold or the
+latency SLO breaks, then bisect the last interval to locate the knee.
+Concurrencies above the stopping point are saturated and are skipped.
+
+The caller supplies a `measure(concurrency)` callback that runs one cell and
+returns the usual level dict (throughput_tok_s, ttft_p99_ms, itl_p99_ms, ...)
+or None on failure. Levels already on disk (resume) are passed in via `known`
+and are never re-measured.
+
+Usage (library):
+    from concurrency_ladder import explore_concurrency
+    knee = explore_concurrency(measure, max_concurrency=64, min_gain=0.10,
+                               slo={"itl_p99_ms": 250})
+"""
+
+DEFAULT_MAX_CONCURRENCY = 64
+DEFAULT_MIN_GAIN = 0.10      # stop doubling once 2x concurrency buys < 10% throughput
+DEFAULT_RESOLUTION = 0.25    # stop bisecting once the interval is within 25% of its low end
+
+
+def slo_violations(level: dict, slo: dict | None) -> list[str]:
+    """Return the SLO metric names (e.g. 'itl_p99_ms') that `level` breaks."""
+    if not slo:
+        return []
+    broken = []
+    for metric, limit in slo.items():
+        if limit is None:
+            continue
+        value = level.get(metric)
+        if value is not None and value > limit:
+            broken.append(metric)
+    return broken
+
+
+def marginal_gain(prev: dict, cur: dict) -> float | None:
+    """Relative throughput gain going from `prev` to `cur` (0.25 = +25%)."""
+    a = prev.get("throughput_tok_s")
+    b = cur.get("throughput_tok_s")
+    if not a or b is None:
+        return None
+    return (b - a) / a
+
+
+def _doubling_sequence(start: int, max_concurrency: int) -> list[int]:
+    seq = []
+    c = start
+    while c <= max_concurrency:
+        seq.append(c)
+        c *= 2
+    return seq
+
+
+def explore_concurrency(
+    measure,
+    start: int = 1,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    min_gain: float = DEFAULT_MIN_GAIN,
+    slo: dict | None = None,
+    resolution: float = DEFAULT_RESOLUTION,
+    known: dict | None = None,
+) -> dict:
+    """
+    Explore concurrency adaptively and return the knee summary.
+
+    Returns a dict with:
+      knee_concurrency      — highest SLO-compliant concurrency before throughput
+                              plateaus (None if even `start` breaks the SLO)
+      knee_throughput_tok_s — throughput measured at the knee
+      peak_concurrency / peak_throughput_tok_s — best SLO-compliant cell seen
+      stop_reason           — plateau | slo | error | max_concurrency
+      measured              — concurrencies measured (including resumed ones)
+      skipped               — ladder rungs above the stopping point
+    """
+    cache = dict(known or {})
+
+    def get(c: int) -> dict | None:
+        if c not in cache:
+            cache[c] = measure(c)
+        return cache[c]
+
+    def ok(level: dict | None) -> bool:
+        return level is not None and not slo_violations(level, slo)
+
+    ladder = _doubling_sequence(start, max_concurrency)
+    lo = None          # last concurrency that was still scaling within SLO
+    hi = None          # first concurrency that plateaued / broke SLO / failed
+    stop_reason = "max_concurrency"
+
+    for c in ladder:
+        level = get(c)
+        if level is None:
+            stop_reason, hi = "error", c
+            break
+        if slo_violations(level, slo):
+            stop_reason, hi = "slo", c
+            break
+        if lo is not None:
+            gain = marginal_gain(cache[lo], level)
+            if gain is not None and gain < min_gain:
+                stop_reason, hi = "plateau", c
+                break
+        lo = c
+
+    skipped = [c for c in ladder if hi is not None and c > hi]
+
+    def close_enough(a: int, b: int) -> bool:
+        return b - a <= max(1, int(a * resolution))
+
+    knee = lo
+    if stop_reason in ("slo", "error") and lo is not None:
+        # Largest concurrency in (lo, hi) that still meets the SLO.
+        a, b = lo, hi
+        while not close_enough(a, b):
+            mid = (a + b) // 2
+            if ok(get(mid)):
+                a = mid
+            else:
+                b = mid
+        knee = a
+    elif stop_reason == "plateau":
+        # Smallest concurrency in (lo/2, lo] already within min_gain of the peak.
+        peak = max(cache[lo]["throughput_tok_s"], cache[hi]["throughput_tok_s"] or 0)
+        target = peak / (1.0 + min_gain)
+        a, b = (lo // 2, lo) if lo > start else (lo, lo)
+        while b > a and not close_enough(a, b):
+            mid = (a + b) // 2
+            level = get(mid)
+            if ok(level) and (level.get("throughput_tok_s") or 0) >= target:
+                b = mid
+            else:
+                a = mid
+        knee = b
+
+    compliant = {c: lv for c, lv in cache.items() if ok(lv) and lv.get("throughput_tok_s") is not None}
+    peak_c = max(compliant, key=lambda c: compliant[c]["throughput_tok_s"]) if compliant else None
+
+    return {
+        "knee_concurrency": knee,
+        "knee_throughput_tok_s": cache[knee].get("throughput_tok_s") if knee is not None else None,
+        "peak_concurrency": peak_c,
+        "peak_throughput_tok_s": compliant[peak_c]["throughput_tok_s"] if peak_c is not None else None,
+        "stop_reason": stop_reason,
+        "min_gain": min_gain,
+        "slo": {k: v for k, v in (slo or {}).items() if v is not None},
+        "measured": sorted(c for c, lv in cache.items() if lv is not None),
+        "skipped": skipped,
+    }
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+$/M-token cost model from full ISL/OSL × concurrency sweeps.
+
+Today's site prices come from a single 10-prompt run per phase. This derives
+input, output and cached-input prices per model and config from the whole
+sweep instead:
+
+  1. Pick one operating concurrency per config: the level at which the most
+     ISL/OSL combos keep TTFT p99 and ITL p99 within the SLO (the highest
+     such level on ties). All combos are compared at that concurrency, since
+     machine time per request depends on the batch size it was measured at;
+     combos that miss the SLO there are excluded.
+  2. At that point the machine completes λ = throughput / OSL requests per
+     second, i.e. spends 1/λ seconds of machine time per request.
+  3. Fit  1/λ = c + a·ISL + b·OSL  across combos, least squares with a, b ≥ 0
+     (exact NNLS by active-set enumeration). a and b are the marginal machine
+     seconds per input and per output token. The per-request intercept c is
+     unconstrained: decode slows as the context grows, so per-request time is
+     convex in OSL and a straight plane through the sweep usually has c < 0.
+     Without c, that curvature pushes the input coefficient negative. With
+     fewer than three independent combos the fit drops c. A fit with no more
+     combos than parameters passes through every point, so it is marked
+     "validated": false and reports no R² or error; the standard three-combo
+     sweep is in that case; pricing it needs a fourth ISL/OSL combo.
+  4. $/M input = $/s · a · 1e6,  $/M output = $/s · b · 1e6, where $/s comes
+     from dgx_cost_per_hour. Cached input is priced at a fixed fraction of
+     input (--cached-ratio, default 0.5 as on the site today) because the
+     sweeps do not measure prefix-cache hits separately.
+
+The result is a pricing table (docs/pricing-table.json) that update_pricing.py
+consumes with --pricing-table.
+
+Usage:
+    python3 cost_model.py --dgx-cost-per-hour 0.172 --slo-ttft-p99-ms 30000 --slo-itl-p99-ms 250 \\
+        --output docs/pricing-table.json
+"""
+import argparse
+import itertools
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+from pareto import CONFIG_FIELDS, config_label
+
+# Workflow formula: hardware $/h × GPU share + electricity $/h (deploy-and-benchmark.yml)
+DEFAULT_COST_PER_HOUR = float(os.getenv(
+    "DGX_COST",
+    float(os.getenv("DGX_HARDWARE_COST_PER_HOUR", "0.152")) + float(os.getenv("DGX_ELECTRICITY_COST_PER_HOUR", "0.02")),
+))
+DEFAULT_CACHED_RATIO = 0.5
+DEFAULT_BLEND = (3, 1)        # input:output token mix used to pick a model's recommended config
+PRICING_TABLE = "docs/pricing-table.json"
+
+
+def meets_slo(row: dict, slo_ttft_p99_ms: float | None, slo_itl_p99_ms: float | None) -> bool:
+    if slo_ttft_p99_ms is not None and (row.get("ttft_p99_ms") is None or row["ttft_p99_ms"] > slo_ttft_p99_ms):
+        return False
+    if slo_itl_p99_ms is not None and (row.get("itl_p99_ms") is None or row["itl_p99_ms"] > slo_itl_p99_ms):
+        return False
+    return True
+
+
+def operating_points(rows: list[dict], slo_ttft_p99_ms: float | None = None,
+                     slo_itl_p99_ms: float | None = None) -> tuple[list[dict], list[str]]:
+    """
+    SLO-compliant cell per ISL/OSL combo of one config, all at one concurrency.
+
+    The concurrency is the level at which the most combos meet the SLO, the
+    highest one on ties. Returns (points, excluded_combos). Combos that miss
+    the SLO at that level, and combos without ISL/OSL (dataset runs such as
+    sharegpt), cannot be used for the per-token fit and are excluded.
+    """
+    ok = [r for r in rows
+          if r.get("isl") and r.get("osl") and r.get("throughput_tok_s") and r.get("concurrency")
+          and meets_slo(r, slo_ttft_p99_ms, slo_itl_p99_ms)]
+    combos_at: dict[float, set[str]] = {}
+    for r in ok:
+        combos_at.setdefault(r["concurrency"], set()).add(r["combo"])
+    level = max(combos_at, key=lambda c: (len(combos_at[c]), c)) if combos_at else None
+
+    by_combo: dict[str, list[dict]] = {r["combo"]: [] for r in rows}
+    for r in ok:
+        if r["concurrency"] == level:
+            by_combo[r["combo"]].append(r)
+
+    points, excluded = [], []
+    for combo, combo_rows in sorted(by_combo.items()):
+        if not combo_rows:
+            excluded.append(combo)
+            continue
+        best = max(combo_rows, key=lambda r: r["throughput_tok_s"])
+        req_s = best["throughput_tok_s"] / best["osl"]
+        points.append({
+            "combo": combo,
+            "isl": best["isl"],
+            "osl": best["osl"],
+            "concurrency": best["concurrency"],
+            "throughput_tok_s": best["throughput_tok_s"],
+            "ttft_p99_ms": best.get("ttft_p99_ms"),
+            "itl_p99_ms": best.get("itl_p99_ms"),
+            "req_s": round(req_s, 5),
+            "machine_s_per_req": round(1.0 / req_s, 4),
+        })
+    return points, excluded
+
+
+def _nnls(X: np.ndarray, y: np.ndarray, nonneg: list[int]) -> np.ndarray | None:
+    """
+    Least squares with the `nonneg` columns constrained to ≥ 0, the rest free.
+
+    Exact for the handful of columns used here: the optimum has some subset of
+    the constrained coefficients at zero and the rest an unconstrained
+    least-squares solution, so every subset is tried and the best feasible one
+    kept.
+    """
+    best = None
+    for k in range(len(nonneg) + 1):
+        for zeroed in itertools.combinations(nonneg, k):
+            keep = [j for j in range(X.shape[1]) if j not in zeroed]
+            coef = np.zeros(X.shape[1])
+            if keep:
+                if np.linalg.matrix_rank(X[:, keep]) < len(keep):
+                    continue
+                coef[keep], *_ = np.linalg.lstsq(X[:, keep], y, rcond=None)
+            if any(coef[j] < 0 for j in nonneg):
+                continue
+            ss = float(np.sum((y - X @ coef) ** 2))
+            if best is None or ss < best[0] - 1e-12:
+                best = (ss, coef)
+    return best[1] if best else None
+
+
+def fit_token_costs(points: list[dict]) -> dict | None:
+    """
+    Fit of machine seconds per request = c + a·ISL + b·OSL with a, b ≥ 0.
+
+    Returns None when the two token costs are not identifiable: fewer than two
+    combos with different ISL/OSL ratios, or an optimum that makes either
+    token type free (a or b pinned at 0). Such configs are left unpriced rather
+    than given a one-sided price. With no more combos than parameters the fit
+    is exact by construction: "validated" is False and r2 / max_rel_error are
+    None.
+    """
+    if len(points) < 2:
+        return None
+    tokens = np.array([[p["isl"], p["osl"]] for p in points], dtype=np.float64)
+    y = np.array([p["machine_s_per_req"] for p in points], dtype=np.float64)
+    if np.linalg.matrix_rank(tokens) < 2:
+        return None
+    X = np.column_stack([tokens, np.ones(len(points))])
+    if np.linalg.matrix_rank(X) < 3:
+        X = tokens
+    coef = _nnls(X, y, nonneg=[0, 1])
+    if coef is None or (coef[:2] <= 0).any():
+        return None
+
+    pred = X @ coef
+    ss_res = float(np.sum((y - pred) ** 2))
+    ss_tot = float(np.sum((y - y.mean()) ** 2))
+    validated = len(points) > X.shape[1]
+    return {
+        "sec_per_input_token": float(coef[0]),
+        "sec_per_output_token": float(coef[1]),
+        "sec_per_request": float(coef[2]) if len(coef) > 2 else 0.0,
+        "n_combos": len(points),
+        "n_params": X.shape[1],
+        "validated": validated,
+        "r2": round(1.0 - ss_res / ss_tot, 4) if validated and ss_tot > 0 else None,
+        "max_rel_error": round(float(np.max(np.abs(pred - y) / y)), 4) if validated else None,
+    }
+
+
+def price_config(rows: list[dict], cost_per_hour: float, slo_ttft_p99_ms: float | None = None,
+                 slo_itl_p99_ms: float | None = None, cached_ratio: float = DEFAULT_CACHED_RATIO) -> dict:
+    """Pricing entry for one model × config from its sweep rows."""
+    points, excluded = operating_points(rows, slo_ttft_p99_ms, slo_itl_p99_ms)
+    fit = fit_token_costs(points)
+    entry = {
+        **{f: rows[0].get(f) for f in CONFIG_FIELDS},
+        "concurrency": points[0]["concurrency"] if points else None,
+        "operating_points": points,
+        "excluded_combos": excluded,
+        "fit": fit,
+    }
+    if fit is None:
+        entry.update(input_per_m=None, cached_input_per_m=None, output_per_m=None)
+        return entry
+    cost_per_s = cost_per_hour / 3600.0
+    input_per_m = cost_per_s * fit["sec_per_input_token"] * 1e6
+    output_per_m = cost_per_s * fit["sec_per_output_token"] * 1e6
+    entry.update(
+        input_per_m=round(input_per_m, 4),
+        cached_input_per_m=round(input_per_m * cached_ratio, 4),
+        output_per_m=round(output_per_m, 4),
+        validated=fit["validated"],
+    )
+    return entry
+
+
+def blended_price(entry: dict, blend: tuple[int, int] = DEFAULT_BLEND) -> float | None:
+    if entry.get("input_per_m") is None:
+        return None
+    n_in, n_out = blend
+    return (entry["input_per_m"] * n_in + entry["output_per_m"] * n_out) / (n_in + n_out)
+
+
+def pricing_table(rows: list[dict], cost_per_hour: float = DEFAULT_COST_PER_HOUR,
+                  slo_ttft_p99_ms: float | None = None, slo_itl_p99_ms: float | None = None,
+                  cached_ratio: float = DEFAULT_CACHED_RATIO, blend: tuple[int, int] = DEFAULT_BLEND) -> dict:
+    """
+    Price every model × config in `rows`. Each model gets a recommended config:
+    the cheapest blended one among validated fits, or among all priced configs
+    when none is validated.
+    """
+    groups: dict[str, dict[str, list[dict]]] = {}
+    for row in rows:
+        groups.setdefault(row.get("model") or "?", {}).setdefault(
+            f"{config_label(row)}@{row.get('hardware') or '?'}", []).append(row)
+
+    models = {}
+    for model, configs in sorted(groups.items()):
+        priced = {
+            label: price_config(cfg_rows, cost_per_hour, slo_ttft_p99_ms, slo_itl_p99_ms, cached_ratio)
+            for label, cfg_rows in sorted(configs.items())
+        }
+        ranked = sorted((not e["validated"], p, label) for label, e in priced.items()
+                        if (p := blended_price(e, blend)) is not None)
+        models[model] = {
+            "recommended": ranked[0][2] if ranked else None,
+            "configs": priced,
+        }
+    return {
+        "generated": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "dgx_cost_per_hour": cost_per_hour,
+        "slo": {k: v for k, v in (("ttft_p99_ms", slo_ttft_p99_ms), ("itl_p99_ms", slo_itl_p99_ms)) if v is not None},
+        "cached_ratio": cached_ratio,
+        "blend_input_output": list(blend),
+        "models": models,
+    }
+
+
+def selected_prices(table: dict, model: str, config: str | None = None) -> dict | None:
+    """Prices of `config` (default: the recommended one) for `model`, or None."""
+    entry = table.get("models", {}).get(model)
+    if not entry:
+        return None
+    label = config or entry.get("recommended")
+    priced = entry["configs"].get(label) if label else None
+    if not priced or priced.get("input_per_m") is None:
+        return None
+    return {"config": label, **{k: priced[k] for k in ("input_per_m", "cached_input_per_m", "output_per_m",
+                                                        "validated")}}
+
+
+def print_table(table: dict) -> None:
+    print(f"\n{'='*128}")
+    print(f"  PRICING @ ${table['dgx_cost_per_hour']:.4f}/h  SLO {table['slo'] or 'none'}")
+    print(f"{'='*128}")
+    header = f"{'Model':<28}  {'Config':<66}  {'$/M in':>8}  {'$/M cached':>10}  {'$/M out':>8}  {'R²':>9}"
+    print(header)
+    print("-" * len(header))
+    for model, entry in table["models"].items():
+        for label, p in entry["configs"].items():
+            mark = "*" if label == entry["recommended"] else " "
+            if p["input_per_m"] is None:
+                print(f"{model[:28]:<28} {mark}{label[:66]:<66}  {'not priced (see excluded_combos/fit)':>36}")
+                continue
+            r2 = p["fit"]["r2"]
+            r2 = "saturated" if not p["validated"] else r2 if r2 is not None else "N/A"
+            print(f"{model[:28]:<28} {mark}{label[:66]:<66}  {p['input_per_m']:>8.4f}  {p['cached_input_per_m']:>10.4f}  "
+                  f"{p['output_per_m']:>8.4f}  {r2:>9}")
+    print("\n* recommended (cheapest at the blended input:output mix, validated fits first)")
+    print("saturated: no more ISL/OSL combos than fit parameters, so the fit is exact and unvalidated")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Derive $/M-token prices from full sweep results")
+    parser.add_argument("--family", default="qwen35-27b", help="Warehouse result family (default: qwen35-27b)")
+    parser.add_argument("--model", help="Restrict to one model")
+    parser.add_argument("--dgx-cost-per-hour", type=float, default=DEFAULT_COST_PER_HOUR)
+    parser.add_argument("--slo-ttft-p99-ms", type=float)
+    parser.add_argument("--slo-itl-p99-ms", type=float)
+    parser.add_argument("--cached-ratio", type=float, default=DEFAULT_CACHED_RATIO,
+                        help="Cached-input price as a fraction of input price (default: 0.5)")
+    parser.add_argument("--blend", default="3:1", help="input:output token mix for picking a recommended config")
+    parser.add_argument("--output", help=f"Write the pricing table here (e.g. {PRICING_TABLE})")
+    args = parser.parse_args()
+
+    from results_store import ingest, query_rows
+    ingest()
+    filters = {"family": args.family}
+    if args.model:
+        filters["model"] = args.model
+    rows = query_rows(filters)
+    if not rows:
+        print("No rows in the warehouse for", filters)
+        raise SystemExit(1)
+
+    blend = tuple(int(x) for x in args.blend.split(":"))
+    table = pricing_table(rows, args.dgx_cost_per_hour, args.slo_ttft_p99_ms, args.slo_itl_p99_ms,
+                          args.cached_ratio, blend)
+    print_table(table)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(table, f, indent=2)
+        print(f"\nPricing table saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Per-instruction and per-prompt IFEval diff between two lighteval runs.
+
+compare_baseline.py only sees four aggregate percentages. lighteval's
+--save-details output already holds every sample:
+
+    <root>/details/<org>/<model>/<timestamp>/details_ifeval|0_<timestamp>.parquet
+
+This tool reads those files with pyarrow.dataset, projecting only the
+nested columns it needs (doc.id, doc.specific.instructions_id_list and the
+metric flags) and pushing prompt-id filters down into the scan. Response text
+is read in a second, filtered scan, and only for prompts that flipped. The
+two runs are hash-joined on doc.id and the report covers:
+
+  * prompt flips       – prompts followed by A but not by B ("broke") and vice
+                         versa ("fixed"), with an exact McNemar p-value
+  * per instruction    – followed rate in A and B, broke/fixed counts, for
+                         every instruction id and every category (id prefix)
+
+Typical use: A = the unquantized baseline, B = an FP8 / NVFP4 build, to see
+which instruction types the quantization actually breaks.
+
+Usage:
+    python3 diff_ifeval_details.py --list
+    python3 diff_ifeval_details.py meta-llama/Llama-3.1-8B-Instruct tokenlabsdotrun/Llama-3.1-8B-ModelOpt-NVFP4
+    python3 diff_ifeval_details.py runA/details_ifeval|0_….parquet runB/ --mode loose --show-responses 5 \\
+        --output ifeval_diff.json
+"""
+import argparse
+import json
+from math import comb
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+DEFAULT_ROOTS = ("test_results", "lighteval_results")
+DETAILS_GLOB = "details_ifeval*.parquet"
+
+
+# ── Run discovery ───────────────────────────────────────────────────────────
+
+def discover_runs(roots=DEFAULT_ROOTS) -> list[dict]:
+    """All IFEval detail files under `roots`, oldest first (path layout only, nothing is read)."""
+    runs = []
+    for root in map(Path, roots):
+        for path in sorted(root.glob(f"details/**/{DETAILS_GLOB}")):
+            rel = path.relative_to(root / "details")
+            runs.append({"model": "/".join(rel.parts[:-2]), "timestamp": rel.parts[-2], "path": path})
+    return sorted(runs, key=lambda r: (r["model"], r["timestamp"]))
+
+
+def _run_from_path(path: Path) -> dict:
+    parts = path.resolve().parts
+    model_parts = parts[parts.index("details") + 1:-2] if "details" in parts[:-2] else parts[-3:-2]
+    return {"model": "/".join(model_parts), "timestamp": path.parent.name, "path": path}
+
+
+def resolve_run(spec: str, roots=DEFAULT_ROOTS) -> dict:
+    """A parquet file, a run directory, or "<model>[@<timestamp>]" (latest run of the model)."""
+    path = Path(spec)
+    if path.is_file():
+        return _run_from_path(path)
+    if path.is_dir():
+        files = sorted(path.glob(DETAILS_GLOB)) or sorted(path.glob(f"**/{DETAILS_GLOB}"), key=lambda f: f.parent.name)
+        if not files:
+            raise SystemExit(f"No {DETAILS_GLOB} under {path}")
+        return _run_from_path(files[-1])
+
+    model, _, timestamp = spec.partition("@")
+    runs = [r for r in discover_runs(roots) if r["model"] == model and r["timestamp"].startswith(timestamp)]
+    if not runs:
+        raise SystemExit(f"No IFEval details for {spec!r} under {', '.join(map(str, roots))} (see --list)")
+    return runs[-1]
+
+
+# ── Loading ─────────────────────────────────────────────────────────────────
+
+def load_flags(path: Path, mode: str = "strict", ids: list[str] | None = None) -> pa.Table:
+    """id, instructions, inst_followed, prompt_followed for one run (optionally only `ids`)."""
+    columns = {
+        "id": pc.field("doc", "id"),
+        "instructions": pc.field("doc", "specific", "instructions_id_list"),
+        "inst_followed": pc.field("metric", f"inst_level_{mode}_acc"),
+        "prompt_followed": pc.field("metric", f"prompt_level_{mode}_acc"),
+    }
+    flt = pc.field("doc", "id").isin(ids) if ids is not None else None
+    table = ds.dataset(str(path), format="parquet").to_table(columns=columns, filter=flt)
+    return table.set_column(3, "prompt_followed", pc.cast(table["prompt_followed"], pa.bool_()))
+
+
+def load_responses(path: Path, ids: list[str]) -> dict[str, str]:
+    """Response text of `ids` only; the filter is pushed into the scan."""
+    if not ids:
+        return {}
+    table = ds.dataset(str(path), format="parquet").to_table(
+        columns={"id": pc.field("doc", "id"), "text": pc.field("model_response", "text")},
+        filter=pc.field("doc", "id").isin(ids),
+    )
+    return {row["id"]: (row["text"] or [""])[0] for row in table.to_pylist()}
+
+
+def join_runs(a: pa.Table, b: pa.Table) -> pa.Table:
+    """Inner join on prompt id; columns of B get a _b suffix."""
+    # Acero joins cannot carry list columns, so join row positions and gather
+    a_pos = pa.table({"id": a["id"], "_a": pa.array(range(a.num_rows), pa.int64())})
+    b_pos = pa.table({"id": b["id"], "_b": pa.array(range(b.num_rows), pa.int64())})
+    pos = a_pos.join(b_pos, keys="id", join_type="inner").sort_by("_a")
+    joined = a.take(pos["_a"])
+    for name in b.column_names:
+        if name != "id":
+            joined = joined.append_column(f"{name}_b", b[name].take(pos["_b"]))
+    return joined
+
+
+# ── Diff ────────────────────────────────────────────────────────────────────
+
+def mcnemar_exact(broke: int, fixed: int) -> float:
+    """Two-sided exact McNemar p-value (binomial test on the discordant pairs)."""
+    n = broke + fixed
+    if n == 0:
+        return 1.0
+    k = min(broke, fixed)
+    tail = sum(comb(n, i) for i in range(k + 1)) / 2 ** n
+    return min(1.0, 2 * tail)
+
+
+def instruction_table(joined: pa.Table) -> pa.Table:
+    """One row per (prompt, instruction) with A/B followed flags."""
+    usable = joined.filter(pc.equal(pc.list_value_length(joined["inst_followed"]),
+                                    pc.list_value_length(joined["inst_followed_b"])))
+    parents = pc.list_parent_indices(usable["instructions"])
+    inst = pc.list_flatten(usable["instructions"])
+    return pa.table({
+        "id": pc.take(usable["id"], parents),
+        "instruction": inst,
+        "category": pc.list_element(pc.split_pattern(inst, ":", max_splits=1), 0),
+        "a": pc.list_flatten(usable["inst_followed"]),
+        "b": pc.list_flatten(usable["inst_followed_b"]),
+    })
+
+
+def _grouped(flat: pa.Table, key: str) -> list[dict]:
+    flat = flat.append_column("broke", pc.and_(flat["a"], pc.invert(flat["b"])))
+    flat = flat.append_column("fixed", pc.and_(pc.invert(flat["a"]), flat["b"]))
+    counts = {name: pc.cast(flat[name], pa.int64()) for name in ("a", "b", "broke", "fixed")}
+    table = pa.table({key: flat[key], **counts})
+    grouped = table.group_by(key).aggregate([
+        ("a", "count"), ("a", "sum"), ("b", "sum"), ("broke", "sum"), ("fixed", "sum"),
+    ]).to_pylist()
+    out = []
+    for g in grouped:
+        n = g["a_count"]
+        out.append({
+            key: g[key],
+            "n": n,
+            "a_rate": round(g["a_sum"] / n * 100, 2),
+            "b_rate": round(g["b_sum"] / n * 100, 2),
+            "delta": round((g["b_sum"] - g["a_sum"]) / n * 100, 2),
+            "broke": g["broke_sum"],
+            "fixed": g["fixed_sum"],
+        })
+    out.sort(key=lambda r: (r["fixed"] - r["broke"], r["delta"], r[key]))
+    return out
+
+
+def diff_runs(run_a: dict, run_b: dict, mode: str = "strict", show_responses: int = 0) -> dict:
+    a = load_flags(run_a["path"], mode)
+    # Predicate pushdown: only prompts A has are read from B
+    b = load_flags(run_b["path"], mode, ids=a["id"].to_pylist())
+    joined = join_runs(a, b)
+
+    pa_flag, pb_flag = joined["prompt_followed"], joined["prompt_followed_b"]
+    broke_mask = pc.and_(pa_flag, pc.invert(pb_flag))
+    fixed_mask = pc.and_(pc.invert(pa_flag), pb_flag)
+    broke = joined.filter(broke_mask)
+    fixed = joined.filter(fixed_mask)
+    n = joined.num_rows
+    n_broke, n_fixed = broke.num_rows, fixed.num_rows
+    a_acc = pc.sum(pc.cast(pa_flag, pa.int64())).as_py() or 0
+    b_acc = pc.sum(pc.cast(pb_flag, pa.int64())).as_py() or 0
+
+    flat = instruction_table(joined)
+
+    def flips(table: pa.Table) -> list[dict]:
+        rows = []
+        for r in table.to_pylist():
+            changed = [inst for inst, fa, fb in zip(r["instructions"], r["inst_followed"], r["inst_followed_b"])
+                       if fa != fb]
+            rows.append({"id": r["id"], "instructions": r["instructions"], "changed_instructions": changed})
+        return sorted(rows, key=lambda x: x["id"])
+
+    report = {
+        "a": {"model": run_a["model"], "timestamp": run_a["timestamp"], "path": str(run_a["path"])},
+        "b": {"model": run_b["model"], "timestamp": run_b["timestamp"], "path": str(run_b["path"])},
+        "mode": mode,
+        "prompts": {
+            "n_a": a.num_rows,
+            "n_b": b.num_rows,
+            "n_joined": n,
+            "a_accuracy": round(a_acc / n * 100, 2) if n else None,
+            "b_accuracy": round(b_acc / n * 100, 2) if n else None,
+            "broke": n_broke,
+            "fixed": n_fixed,
+            "mcnemar_p": round(mcnemar_exact(n_broke, n_fixed), 6),
+        },
+        "categories": _grouped(flat, "category") if flat.num_rows else [],
+        "instructions": _grouped(flat, "instruction") if flat.num_rows else [],
+        "broke": flips(broke),
+        "fixed": flips(fixed),
+    }
+
+    if show_responses:
+        ids = [r["id"] for r in report["broke"][:show_responses]]
+        text_a, text_b = load_responses(run_a["path"], ids), load_responses(run_b["path"], ids)
+        for r in report["broke"][:show_responses]:
+            r["response_a"], r["response_b"] = text_a.get(r["id"]), text_b.get(r["id"])
+    return report
+
+
+# ── Output ──────────────────────────────────────────────────────────────────
+
+def print_report(report: dict, top: int = 15) -> None:
+    p = report["prompts"]
+    print(f"\n{'='*96}")
+    print(f"  IFEval diff ({report['mode']})")
+    print(f"  A: {report['a']['model']} @ {report['a']['timestamp']}")
+    print(f"  B: {report['b']['model']} @ {report['b']['timestamp']}")
+    print(f"{'='*96}")
+    print(f"Prompts joined: {p['n_joined']} (A {p['n_a']}, B {p['n_b']})")
+    if p["n_joined"]:
+        print(f"Prompt-level: A {p['a_accuracy']:.2f}%  B {p['b_accuracy']:.2f}%  "
+              f"broke {p['broke']}  fixed {p['fixed']}  (McNemar p={p['mcnemar_p']:.3g})")
+
+    for title, key, rows in (("Category", "category", report["categories"]),
+                             ("Instruction", "instruction", report["instructions"][:top])):
+        if not rows:
+            continue
+        header = f"{title:<48}  {'n':>4}  {'A %':>6}  {'B %':>6}  {'Δ':>6}  {'broke':>5}  {'fixed':>5}"
+        print(f"\n{header}")
+        print("-" * len(header))
+        for r in rows:
+            print(f"{r[key][:48]:<48}  {r['n']:>4}  {r['a_rate']:>6.1f}  {r['b_rate']:>6.1f}  "
+                  f"{r['delta']:>+6.1f}  {r['broke']:>5}  {r['fixed']:>5}")
+
+    for r in report["broke"][:top]:
+        print(f"\n  broke #{r['id']}: {', '.join(r['changed_instructions']) or '(prompt-level only)'}")
+        if "response_b" in r:
+            print(f"    A: {(r['response_a'] or '')[:160]!r}")
+            print(f"    B: {(r['response_b'] or '')[:160]!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two lighteval IFEval runs per instruction and per prompt")
+    parser.add_argument("run_a", nargs="?", help="Reference run: parquet file, run directory or model[@timestamp]")
+    parser.add_argument("run_b", nargs="?", help="Run to compare against the reference")
+    parser.add_argument("--root", action="append", help=f"Results root(s) to search (default: {', '.join(DEFAULT_ROOTS)})")
+    parser.add_argument("--mode", choices=["strict", "loose"], default="strict")
+    parser.add_argument("--top", type=int, default=15, help="Instructions and flipped prompts to print (default: 15)")
+    parser.add_argument("--show-responses", type=int, default=0, metavar="N",
+                        help="Include both responses for the first N broken prompts")
+    parser.add_argument("--list", action="store_true", help="List the runs found under the roots and exit")
+    parser.add_argument("--output", help="Write the full diff JSON here")
+    args = parser.parse_args()
+    roots = args.root or DEFAULT_ROOTS
+
+    if args.list:
+        for run in discover_runs(roots):
+            rows = pq.ParquetFile(run["path"]).metadata.num_rows
+            print(f"{run['model']:<56}  {run['timestamp']:<28}  {rows:>5} prompts")
+        return
+    if not (args.run_a and args.run_b):
+        parser.error("two runs are required (or --list)")
+
+    report = diff_runs(resolve_run(args.run_a, roots), resolve_run(args.run_b, roots), args.mode, args.show_responses)
+    print_report(report, args.top)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nDiff saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Server-side engine metrics scraping.
+
+Polls an inference server's Prometheus `/metrics` endpoint in a background
+thread while a benchmark cell runs, so client-side numbers (throughput, TTFT,
+ITL) can be explained by what the engine saw: running/waiting requests, KV
+cache usage, preemptions, prefix-cache hits and spec-decode acceptance.
+
+Gauges are kept as a (downsampled) time series; counters are stored as deltas
+between the first and last scrape of the cell.
+
+Usage (library):
+    from engine_metrics import EngineMetricsPoller
+    with EngineMetricsPoller("http://10.0.0.5:8000", framework="vllm") as poller:
+        run_cell()
+    level["engine"] = poller.summary()
+
+Usage (one-shot scrape, for debugging the metric names):
+    python3 engine_metrics.py --url http://10.0.0.5:8000 --framework vllm
+"""
+import argparse
+import json
+import threading
+import time
+
+import requests
+
+# Logical name → candidate metric names (first one present wins). Names moved
+# between vLLM releases (e.g. gpu_cache_usage_perc → kv_cache_usage_perc).
+GAUGES = {
+    "vllm": {
+        "running":        ["vllm:num_requests_running"],
+        "waiting":        ["vllm:num_requests_waiting"],
+        "kv_cache_usage": ["vllm:kv_cache_usage_perc", "vllm:gpu_cache_usage_perc"],
+    },
+    "sglang": {
+        "running":             ["sglang:num_running_reqs"],
+        "waiting":             ["sglang:num_queue_reqs"],
+        "kv_cache_usage":      ["sglang:token_usage"],
+        "prefix_cache_hit_rate": ["sglang:cache_hit_rate"],
+        "spec_accept_length":  ["sglang:spec_accept_length"],
+    },
+}
+
+COUNTERS = {
+    "vllm": {
+        "preemptions":          ["vllm:num_preemptions_total"],
+        "prefix_cache_queries": ["vllm:prefix_cache_queries_total", "vllm:gpu_prefix_cache_queries_total"],
+        "prefix_cache_hits":    ["vllm:prefix_cache_hits_total", "vllm:gpu_prefix_cache_hits_total"],
+        "spec_draft_tokens":    ["vllm:spec_decode_num_draft_tokens_total"],
+        "spec_accepted_tokens": ["vllm:spec_decode_num_accepted_tokens_total"],
+        "prompt_tokens":        ["vllm:prompt_tokens_total"],
+        "generation_tokens":    ["vllm:generation_tokens_total"],
+    },
+    "sglang": {
+        "prompt_tokens":     ["sglang:prompt_tokens_total"],
+        "generation_tokens": ["sglang:generation_tokens_total"],
+    },
+}
+
+DEFAULT_INTERVAL_S = 0.5
+MAX_SERIES_POINTS = 120
+
+
+def parse_prometheus(text: str, wanted: set[str]) -> dict[str, float]:
+    """
+    Parse Prometheus text exposition, keeping only metric names in `wanted`.
+
+    Samples of the same metric with different label sets (per model, per
+    engine) are summed. Comment lines and unwanted families are skipped with
+    a cheap prefix check before any splitting happens.
+    """
+    values: dict[str, float] = {}
+    for line in text.splitlines():
+        if not line or line[0] == "#":
+            continue
+        brace = line.find("{")
+        space = line.find(" ")
+        end = brace if 0 <= brace < space else space
+        if end <= 0:
+            continue
+        name = line[:end]
+        if name not in wanted:
+            continue
+        # Value is the first field after the label block; an optional timestamp may follow.
+        rest = line[line.rfind("}") + 1:] if brace == end else line[end:]
+        fields = rest.split()
+        if not fields:
+            continue
+        try:
+            values[name] = values.get(name, 0.0) + float(fields[0])
+        except ValueError:
+            continue
+    return values
+
+
+def resolve(values: dict[str, float], mapping: dict[str, list[str]]) -> dict[str, float]:
+    """Map raw metric names to logical names using the first candidate present."""
+    out = {}
+    for logical, candidates in mapping.items():
+        for name in candidates:
+            if name in values:
+                out[logical] = values[name]
+                break
+    return out
+
+
+def _downsample(ts: list[float], vals: list[float], max_points: int) -> tuple[list[float], list[float]]:
+    """Bucket-average a series down to at most `max_points` points."""
+    n = len(vals)
+    if n <= max_points:
+        return ts, vals
+    step = n / max_points
+    out_t, out_v = [], []
+    for i in range(max_points):
+        a, b = int(i * step), int((i + 1) * step)
+        out_t.append(ts[a])
+        out_v.append(sum(vals[a:b]) / (b - a))
+    return out_t, out_v
+
+
+class EngineMetricsPoller:
+    """Background thread that scrapes `<base_url>/metrics` every `interval_s`."""
+
+    def __init__(self, base_url: str, framework: str = "vllm", interval_s: float = DEFAULT_INTERVAL_S):
+        self.url = f"{base_url.rstrip('/')}/metrics"
+        self.framework = framework
+        self.interval_s = interval_s
+        self.gauge_map = GAUGES.get(framework, {})
+        self.counter_map = COUNTERS.get(framework, {})
+        self.wanted = {n for m in (self.gauge_map, self.counter_map) for names in m.values() for n in names}
+        self._session = requests.Session()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._t0 = 0.0
+        self.times: list[float] = []
+        self.gauges: list[dict[str, float]] = []
+        self.first_counters: dict[str, float] | None = None
+        self.last_counters: dict[str, float] = {}
+        self.errors = 0
+
+    def scrape(self) -> dict[str, float] | None:
+        try:
+            r = self._session.get(self.url, timeout=max(1.0, self.interval_s * 2))
+            r.raise_for_status()
+        except requests.RequestException:
+            self.errors += 1
+            return None
+        return parse_prometheus(r.text, self.wanted)
+
+    def _record(self, values: dict[str, float]) -> None:
+        self.times.append(round(time.time() - self._t0, 2))
+        self.gauges.append(resolve(values, self.gauge_map))
+        counters = resolve(values, self.counter_map)
+        if self.first_counters is None:
+            self.first_counters = counters
+        self.last_counters = counters
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            t = time.time()
+            values = self.scrape()
+            if values is not None:
+                self._record(values)
+            self._stop.wait(max(0.0, self.interval_s - (time.time() - t)))
+
+    def start(self) -> "EngineMetricsPoller":
+        if not self.wanted:
+            return self   # framework without a Prometheus endpoint (e.g. trtllm)
+        self._t0 = time.time()
+        self._thread = threading.Thread(target=self._run, name="engine-metrics", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        # Final scrape so counter deltas cover the whole cell.
+        values = self.scrape()
+        if values is not None:
+            self._record(values)
+        self._session.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def summary(self, max_points: int = MAX_SERIES_POINTS) -> dict | None:
+        """Per-cell summary: gauge stats + series, counter deltas and derived rates."""
+        if not self.gauges:
+            return None
+
+        gauges = {}
+        for logical in self.gauge_map:
+            pts = [(t, g[logical]) for t, g in zip(self.times, self.gauges) if logical in g]
+            if not pts:
+                continue
+            ts, vals = [p[0] for p in pts], [p[1] for p in pts]
+            ts, series = _downsample(ts, vals, max_points)
+            gauges[logical] = {
+                "mean": round(sum(vals) / len(vals), 4),
+                "max": round(max(vals), 4),
+                "t": ts,
+                "series": [round(v, 4) for v in series],
+            }
+
+        first = self.first_counters or {}
+        deltas = {
+            k: round(self.last_counters[k] - first[k], 2)
+            for k in self.last_counters if k in first
+        }
+
+        derived = {}
+        if deltas.get("prefix_cache_queries"):
+            derived["prefix_cache_hit_rate"] = round(
+                deltas.get("prefix_cache_hits", 0) / deltas["prefix_cache_queries"], 4)
+        if deltas.get("spec_draft_tokens"):
+            derived["spec_acceptance_rate"] = round(
+                deltas.get("spec_accepted_tokens", 0) / deltas["spec_draft_tokens"], 4)
+
+        return {
+            "framework": self.framework,
+            "interval_s": self.interval_s,
+            "n_samples": len(self.gauges),
+            "scrape_errors": self.errors,
+            "gauges": gauges,
+            "deltas": deltas,
+            "derived": derived,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="One-shot engine /metrics scrape")
+    parser.add_argument("--url", required=True, help="Server base URL, e.g. http://10.0.0.5:8000")
+    parser.add_argument("--framework", default="vllm", choices=sorted(GAUGES))
+    args = parser.parse_args()
+
+    poller = EngineMetricsPoller(args.url, framework=args.framework)
+    values = poller.scrape()
+    if values is None:
+        print(f"Could not scrape {poller.url}")
+        raise SystemExit(1)
+    print(json.dumps({
+        "gauges": resolve(values, poller.gauge_map),
+        "counters": resolve(values, poller.counter_map),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
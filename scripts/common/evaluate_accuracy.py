@@ -17,8 +17,44 @@ Evaluates quantized models on instruction-following capability by testing
 whether model outputs satisfy verifiable constraints (e.g., word count,
 format requirements, keyword inclusion).
 
+Responses are generated concurrently (--concurrency, default 32) over one
+pooled connection set, so the server can batch them; 429/503 and transport
+errors are retried with exponential backoff. Every finished response is
+appended to a JSONL checkpoint (default: <output>.checkpoint.jsonl) together
+with its latency and token counts, and a rerun with the same checkpoint only
+generates the prompts that are still missing. The checkpoint's first line
+records model, base URL and sampling params. A checkpoint written for anything
+else is ignored and overwritten. It is deleted once the run finishes.
+
+Successful generations are also stored in the persistent generation cache
+(generation_cache.py), keyed by model, serving image tag (--image-tag or
+IMAGE_TAG), prompt and sampling params. Re-running an eval against the same
+build is answered from the cache; hit statistics are part of the report.
+Without an image tag the cache is off. The model name alone does not tell
+serving builds apart.
+
+--num-samples draws a sample stratified by instruction category (seeded,
+--sampling first restores the old "first N prompts" behaviour), and every
+accuracy is reported with a confidence interval: Wilson for prompt level,
+a prompt-clustered bootstrap for instruction level. With --adaptive and a
+--baseline the run grows in --batch-size steps from --min-samples and stops
+as soon as the prompt-level CI is entirely above or below baseline −
+--threshold; the CI level is Bonferroni-corrected for the number of looks so
+stopping early does not raise the false-alarm rate.
+
+Scoring runs in a process pool (--score-workers, default: all cores) and
+starts as soon as each response arrives, so CPU-bound instruction checkers
+(language detection, regex checks) overlap with generation. Per-prompt
+results are merged into the usual eval_results_strict / eval_results_loose
+report; --score-workers 0 scores in-process after generation.
+
 Usage:
     python scripts/evaluate_accuracy.py --base-url http://localhost:8000 --model <model_name>
+    python scripts/evaluate_accuracy.py --model <model_name> --concurrency 64 --checkpoint ifeval.jsonl
+    python scripts/evaluate_accuracy.py --model <model_name> --image-tag <tag> --no-cache
+    python scripts/evaluate_accuracy.py --model <model_name> --num-samples 200 --adaptive \
+        --baseline baselines/llama-3.1-8b-instruct.json
+    python scripts/common/accuracy_resume_check.py     # adaptive resume from a partial checkpoint
 
 Environment variables:
     VLLM_BASE_URL: Base URL for vLLM server (default: http://localhost:8000)
@@ -26,16 +62,26 @@ Environment variables:
 """
 
 import argparse
+import asyncio
 import json
+import multiprocessing
 import os
+import random
+import statistics
 import sys
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime
-from typing import Any
+from typing import Any, Callable
+
+from accuracy_stats import (cluster_bootstrap_ci, instruction_category, regression_decision,
+                            stratified_order, wilson_interval)
+from generation_cache import GenerationCache
 
 try:
-    import requests
+    import httpx
 except ImportError:
-    print("Error: requests library required. Install with: pip install requests")
+    print("Error: httpx library required. Install with: pip install httpx")
     sys.exit(1)
 
 try:
@@ -45,28 +91,346 @@ except ImportError:
     sys.exit(1)
 
 
-def generate_response(base_url: str, model: str, prompt: str, max_tokens: int = 2048) -> str:
-    """Generate response from vLLM server."""
-    url = f"{base_url}/v1/chat/completions"
-    
+DEFAULT_CONCURRENCY = 32
+DEFAULT_ALPHA = 0.05
+DEFAULT_THRESHOLD = 5.0      # regression threshold in accuracy points, as in compare_baseline.py
+DEFAULT_MIN_SAMPLES = 100
+DEFAULT_BATCH_SIZE = 50
+MAX_RETRIES = 5
+RETRY_STATUS = (429, 503)
+
+
+def sampling_params(max_tokens: int = 2048) -> dict[str, Any]:
+    """Request parameters that affect the output; part of the generation cache key."""
+    return {
+        "max_tokens": max_tokens,
+        "temperature": 0.0,  # Deterministic for reproducibility
+    }
+
+
+async def generate_response(
+    client: httpx.AsyncClient,
+    base_url: str,
+    model: str,
+    prompt: str,
+    max_tokens: int = 2048,
+    max_retries: int = MAX_RETRIES,
+) -> dict[str, Any]:
+    """
+    Generate one response from the vLLM server.
+
+    Returns a record with the response text (empty on failure), latency of the
+    successful attempt, token usage as reported by the server and the number
+    of attempts. 429/503, timeouts and connection errors are retried with
+    jittered exponential backoff, honouring Retry-After when the server sends it.
+    """
+    url = f"{base_url.rstrip('/')}/v1/chat/completions"
     payload = {
         "model": model,
         "messages": [{"role": "user", "content": prompt}],
-        "max_tokens": max_tokens,
-        "temperature": 0.0,  # Deterministic for reproducibility
+        **sampling_params(max_tokens),
     }
-    
+    record: dict[str, Any] = {"prompt": prompt, "response": "", "attempts": 0}
+
+    delay = 1.0
+    for attempt in range(1, max_retries + 1):
+        record["attempts"] = attempt
+        retry_after = None
+        t0 = time.perf_counter()
+        try:
+            resp = await client.post(url, json=payload)
+            if resp.status_code in RETRY_STATUS and attempt < max_retries:
+                retry_after = resp.headers.get("retry-after")
+                raise httpx.HTTPStatusError(f"HTTP {resp.status_code}", request=resp.request, response=resp)
+            resp.raise_for_status()
+            result = resp.json()
+            usage = result.get("usage") or {}
+            record.update(
+                response=result["choices"][0]["message"]["content"] or "",
+                latency_ms=round((time.perf_counter() - t0) * 1000, 1),
+                prompt_tokens=usage.get("prompt_tokens"),
+                completion_tokens=usage.get("completion_tokens"),
+            )
+            record.pop("error", None)
+            return record
+        except (httpx.TimeoutException, httpx.TransportError, httpx.HTTPStatusError) as e:
+            record["error"] = str(e) or type(e).__name__
+            retryable = not isinstance(e, httpx.HTTPStatusError) or e.response.status_code in RETRY_STATUS
+            if not retryable or attempt == max_retries:
+                return record
+        except (KeyError, IndexError, ValueError) as e:
+            record["error"] = f"Error parsing response: {e}"
+            return record
+
+        try:
+            wait = float(retry_after) if retry_after else delay
+        except ValueError:
+            wait = delay
+        await asyncio.sleep(wait * random.uniform(0.8, 1.2))
+        delay = min(delay * 2, 30.0)
+    return record
+
+
+# ── Checkpoint ──────────────────────────────────────────────────────────────
+
+def checkpoint_header(base_url: str, model: str, max_tokens: int = 2048) -> dict[str, Any]:
+    """First line of a checkpoint: what its responses were generated with."""
+    return {"checkpoint": {"model": model, "base_url": base_url.rstrip("/"), "params": sampling_params(max_tokens)}}
+
+
+def load_checkpoint(path: str | None, header: dict[str, Any]) -> dict[str, dict] | None:
+    """
+    Successful records from a previous (possibly interrupted) run, keyed by prompt.
+
+    None when there is no checkpoint, or when its header differs from `header`
+    (another model, server or sampling params), so the caller starts a new one.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    done: dict[str, dict] = {}
+    with open(path) as f:
+        try:
+            found = json.loads(f.readline() or "{}")
+        except json.JSONDecodeError:
+            found = {}
+        if found != header:
+            print(f"Ignoring checkpoint {path}: written for {found.get('checkpoint') or 'an unknown run'}, "
+                  f"not {header['checkpoint']}")
+            return None
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from an interrupted write
+            if rec.get("response") and not rec.get("error"):
+                done[rec["prompt"]] = rec
+    return done
+
+
+async def generate_all(
+    base_url: str,
+    model: str,
+    prompts: list[str],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    checkpoint: str | None = None,
+    max_tokens: int = 2048,
+    cache: GenerationCache | None = None,
+    image_tag: str | None = None,
+    on_record: Callable[[dict], None] | None = None,
+) -> dict[str, dict]:
+    """
+    Generate responses for `prompts` with at most `concurrency` requests in flight.
+
+    Prompts already answered in `checkpoint` are skipped, then prompts found in
+    `cache` (marked "cached": true); each new record is appended to the
+    checkpoint as soon as it finishes and stored in the cache. `on_record` is
+    called once per prompt as soon as its record is known (checkpoint and cache
+    hits first). Returns records for all prompts.
+    """
+    header = checkpoint_header(base_url, model, max_tokens)
+    records = load_checkpoint(checkpoint, header)
+    fresh = records is None
+    records = records or {}
+    pending = [p for p in dict.fromkeys(prompts) if p not in records]
+    if records:
+        print(f"Resuming from {checkpoint}: {len(records)} done, {len(pending)} remaining")
+
+    def cache_key(prompt: str) -> str:
+        return cache.key(model, [{"role": "user", "content": prompt}], sampling_params(max_tokens), image_tag)
+
+    if cache is not None:
+        for prompt in pending:
+            hit = cache.get(cache_key(prompt))
+            if hit is not None:
+                records[prompt] = {**hit, "cached": True}
+        n_cached = sum(1 for p in pending if p in records)
+        pending = [p for p in pending if p not in records]
+        print(f"Generation cache: {n_cached} hits, {len(pending)} to generate")
+    total = len(records) + len(pending)
+    if on_record:
+        for prompt in dict.fromkeys(prompts):
+            if prompt in records:
+                on_record(records[prompt])
+
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    ckpt = open(checkpoint, "w" if fresh else "a") if checkpoint else None
+    if ckpt and fresh:
+        ckpt.write(json.dumps(header) + "\n")
+    tasks: list[asyncio.Task] = []
     try:
-        response = requests.post(url, json=payload, timeout=120)
-        response.raise_for_status()
-        result = response.json()
-        return result["choices"][0]["message"]["content"]
-    except requests.exceptions.RequestException as e:
-        print(f"Error generating response: {e}")
-        return ""
-    except (KeyError, IndexError) as e:
-        print(f"Error parsing response: {e}")
-        return ""
+        async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(600.0, connect=10.0)) as client:
+
+            async def one(prompt: str) -> dict:
+                async with sem:
+                    return await generate_response(client, base_url, model, prompt, max_tokens)
+
+            tasks = [asyncio.create_task(one(p)) for p in pending]
+            for fut in asyncio.as_completed(tasks):
+                rec = await fut
+                records[rec["prompt"]] = rec
+                if on_record:
+                    on_record(rec)
+                if cache is not None and rec["response"] and not rec.get("error"):
+                    cache.put(cache_key(rec["prompt"]), rec, model=model, image_tag=image_tag)
+                if ckpt:
+                    ckpt.write(json.dumps(rec) + "\n")
+                    ckpt.flush()
+                status = "✓" if rec["response"] else "✗"
+                preview = rec["response"][:50].replace("\n", " ") + "..." if rec["response"] else rec.get("error", "FAILED")
+                latency = f"{rec['latency_ms']:>8.0f}ms" if "latency_ms" in rec else f"{'-':>10}"
+                print(f"  [{len(records)}/{total}] {status} {latency} {preview}")
+    finally:
+        # On interruption, drop in-flight requests; the checkpoint holds everything finished
+        for t in tasks:
+            t.cancel()
+        if ckpt:
+            ckpt.close()
+    return records
+
+
+def generation_stats(records: list[dict], wall_s: float | None = None) -> dict[str, Any]:
+    """Latency and token summary of the requests actually sent in this run (cache hits excluded)."""
+    cached = [r for r in records if r.get("cached")]
+    ok = [r for r in records if r.get("response") and "latency_ms" in r and not r.get("cached")]
+    lat = sorted(r["latency_ms"] for r in ok)
+    completion = [r["completion_tokens"] for r in ok if r.get("completion_tokens") is not None]
+    prompt_tok = [r["prompt_tokens"] for r in ok if r.get("prompt_tokens") is not None]
+    stats: dict[str, Any] = {
+        "requests": len(records),
+        "cache_hits": len(cached),
+        "failed": len(records) - len(ok) - len(cached),
+        "retried": sum(1 for r in records if r.get("attempts", 1) > 1),
+        "prompt_tokens": sum(prompt_tok),
+        "completion_tokens": sum(completion),
+    }
+    if lat:
+        stats.update(
+            latency_p50_ms=round(statistics.median(lat), 1),
+            latency_p95_ms=round(lat[min(len(lat) - 1, int(0.95 * len(lat)))], 1),
+            latency_max_ms=lat[-1],
+        )
+    if completion:
+        stats["completion_tokens_mean"] = round(statistics.mean(completion), 1)
+    if wall_s:
+        stats["wall_s"] = round(wall_s, 1)
+        stats["output_tok_s"] = round(sum(completion) / wall_s, 1) if completion else None
+    return stats
+
+
+# ── Scoring ─────────────────────────────────────────────────────────────────
+
+def _field(output, name: str):
+    return output.get(name) if isinstance(output, dict) else getattr(output, name, None)
+
+
+def follow_flags(all_outputs, mode: str) -> list[list[bool]] | None:
+    """Per-prompt instruction follow flags ("strict" or "loose") from Evaluator.evaluate outputs."""
+    outputs = all_outputs.get(f"eval_results_{mode}") if isinstance(all_outputs, dict) else None
+    if not outputs:
+        return None
+    flags = [_field(o, "follow_instruction_list") for o in outputs]
+    return None if any(f is None for f in flags) else [[bool(x) for x in f] for f in flags]
+
+
+_worker_evaluator = None
+
+
+def _score_example(example, response: str) -> dict[str, list[bool]] | None:
+    """Score one response in a pool worker; the Evaluator is built once per process."""
+    global _worker_evaluator
+    if _worker_evaluator is None:
+        _worker_evaluator = Evaluator(instruction_registry)
+    _, outputs = _worker_evaluator.evaluate([example], {example.prompt: response})
+    flags = {mode: follow_flags(outputs, mode) for mode in ("strict", "loose")}
+    return {mode: f[0] for mode, f in flags.items()} if all(flags.values()) else None
+
+
+class StreamingScorer:
+    """
+    Scores responses on a process pool as they are generated.
+
+    submit() is called from the generation loop for every finished record and
+    returns immediately; results() waits for the requested prompts. With
+    workers=0, or when the ifeval build does not expose per-prompt outputs,
+    results() falls back to one in-process Evaluator.evaluate call.
+    """
+
+    def __init__(self, workers: int | None = None):
+        workers = (os.cpu_count() or 1) if workers is None else workers
+        self.workers = workers
+        self._pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) if workers else None
+        self._futures: dict[str, Future] = {}
+        self._examples: dict[str, Any] = {}
+        self._responses: dict[str, str] = {}
+
+    def submit(self, example, response: str) -> None:
+        if example.prompt in self._responses:
+            return
+        self._examples[example.prompt] = example
+        self._responses[example.prompt] = response
+        if self._pool:
+            self._futures[example.prompt] = self._pool.submit(_score_example, example, response)
+
+    def results(self, prompts: list[str]) -> list[dict[str, list[bool]]] | None:
+        """Per-prompt {"strict": flags, "loose": flags}, in `prompts` order; None if unavailable."""
+        if self._pool:
+            scored = [self._futures[p].result() for p in prompts]
+            if all(r is not None for r in scored):
+                return scored
+        examples = [self._examples[p] for p in prompts]
+        _, outputs = Evaluator(instruction_registry).evaluate(examples, {p: self._responses[p] for p in prompts})
+        flags = {mode: follow_flags(outputs, mode) for mode in ("strict", "loose")}
+        if not all(flags.values()):
+            return None
+        return [{mode: flags[mode][i] for mode in flags} for i in range(len(prompts))]
+
+    def close(self) -> None:
+        if self._pool:
+            self._pool.shutdown(cancel_futures=True)
+
+
+def merge_report(per_prompt: list[dict[str, list[bool]]]) -> dict[str, dict[str, float]]:
+    """eval_results_strict / eval_results_loose accuracies (fractions) from per-prompt flags."""
+    report = {}
+    for mode in ("strict", "loose"):
+        flags = [p[mode] for p in per_prompt]
+        n_inst = sum(len(f) for f in flags)
+        report[f"eval_results_{mode}"] = {
+            "prompt_accuracy": sum(all(f) for f in flags) / len(flags) if flags else 0.0,
+            "instruction_accuracy": sum(sum(f) for f in flags) / n_inst if n_inst else 0.0,
+        }
+    return report
+
+
+def score(flags: dict[str, list[list[bool]]], confidence: float) -> dict[str, Any]:
+    """Accuracies (percent), counts and CIs from per-prompt follow flags."""
+    out: dict[str, Any] = {"accuracy": {}, "ci": {}, "counts": {}}
+    for mode, suffix in (("strict", ""), ("loose", "_loose")):
+        per_prompt = flags[mode]
+        k_prompt = sum(all(f) for f in per_prompt)
+        k_inst = sum(sum(f) for f in per_prompt)
+        n_inst = sum(len(f) for f in per_prompt)
+        n = len(per_prompt)
+        out["counts"][f"prompt_{mode}"] = [k_prompt, n]
+        out["counts"][f"instruction_{mode}"] = [k_inst, n_inst]
+        out["accuracy"][f"prompt_level_accuracy{suffix}"] = k_prompt / n * 100 if n else 0.0
+        out["accuracy"][f"instruction_level_accuracy{suffix}"] = k_inst / n_inst * 100 if n_inst else 0.0
+        lo, hi = wilson_interval(k_prompt, n, confidence)
+        out["ci"][f"prompt_level_accuracy{suffix}"] = {"low": round(lo, 2), "high": round(hi, 2), "method": "wilson"}
+        lo, hi = cluster_bootstrap_ci(per_prompt, confidence)
+        out["ci"][f"instruction_level_accuracy{suffix}"] = {
+            "low": round(lo, 2), "high": round(hi, 2), "method": "cluster-bootstrap"}
+    out["confidence"] = round(confidence, 4)
+    return out
+
+
+def load_baseline_accuracy(path: str) -> float | None:
+    """Strict prompt-level accuracy of a baselines/*.json file, or None if not established."""
+    with open(path) as f:
+        baseline = json.load(f)
+    value = baseline.get("accuracy", {}).get("ifeval", {}).get("prompt_level_accuracy_strict")
+    return value or None
 
 
 def evaluate_ifeval(
@@ -74,6 +438,19 @@ def evaluate_ifeval(
     model: str,
     num_samples: int = None,
     output_file: str = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    checkpoint: str | None = None,
+    cache: GenerationCache | None = None,
+    image_tag: str | None = None,
+    sampling: str = "stratified",
+    seed: int = 0,
+    adaptive: bool = False,
+    baseline_accuracy: float | None = None,
+    threshold: float = DEFAULT_THRESHOLD,
+    alpha: float = DEFAULT_ALPHA,
+    min_samples: int = DEFAULT_MIN_SAMPLES,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    score_workers: int | None = None,
 ) -> dict[str, Any]:
     """
     Run IFEval evaluation using the official ifeval library.
@@ -82,34 +459,79 @@ def evaluate_ifeval(
         Dictionary with evaluation results including:
         - prompt_level_accuracy: % of prompts where ALL instructions were followed
         - instruction_level_accuracy: % of individual instructions followed
+        - ci: confidence interval of each accuracy
     """
     # Load default dataset
     print("Loading IFEval dataset...")
-    input_examples = get_default_dataset("en")
-    
-    # Limit samples if specified
-    if num_samples and num_samples < len(input_examples):
-        input_examples = input_examples[:num_samples]
+    dataset = get_default_dataset("en")
+    categories = [instruction_category(e.instruction_id_list[0]) if e.instruction_id_list else "none"
+                  for e in dataset]
+    order = stratified_order(categories, seed) if sampling == "stratified" else list(range(len(dataset)))
+    max_n = min(num_samples or len(dataset), len(dataset))
+
+    # Sample sizes at which results are looked at; one look unless adaptive
+    if adaptive:
+        if baseline_accuracy is None:
+            raise ValueError("--adaptive needs an established baseline (prompt_level_accuracy_strict)")
+        sizes = list(range(min(min_samples, max_n), max_n, batch_size)) + [max_n]
+    else:
+        sizes = [max_n]
+    confidence = 1 - alpha / len(sizes)
     
-    print(f"Loaded {len(input_examples)} samples")
-    print(f"\nGenerating responses from {model}...")
+    print(f"Loaded {len(dataset)} samples, evaluating up to {max_n} ({sampling} sampling"
+          + (f", adaptive from {sizes[0]} in steps of {batch_size}" if adaptive else "") + ")")
+    print(f"\nGenerating responses from {model} (concurrency {concurrency})...")
     print("-" * 60)
     
-    # Generate responses for each prompt
-    responses = {}
-    for i, example in enumerate(input_examples):
-        prompt = example.prompt
-        response = generate_response(base_url, model, prompt)
-        responses[prompt] = response
-        
-        status = "✓" if response else "✗"
-        preview = response[:50].replace("\n", " ") + "..." if response else "FAILED"
-        print(f"  [{i+1}/{len(input_examples)}] {status} {preview}")
+    by_prompt = {example.prompt: example for example in dataset}
+    scorer = StreamingScorer(score_workers)
+    records: dict[str, dict] = {}
+    looks = []
+    wall_s = 0.0
+    score_wait_s = 0.0
+    for n in sizes:
+        input_examples = [dataset[i] for i in order[:n]]
+        prompts = [example.prompt for example in input_examples]
+        new = [p for p in dict.fromkeys(prompts) if p not in records]
+        t0 = time.perf_counter()
+        records.update(asyncio.run(generate_all(
+            base_url, model, new, concurrency, checkpoint, cache=cache, image_tag=image_tag,
+            on_record=lambda rec: scorer.submit(by_prompt[rec["prompt"]], rec["response"]))))
+        wall_s += time.perf_counter() - t0
     
-    # Create evaluator and run evaluation
-    print("\nRunning IFEval evaluation...")
-    evaluator = Evaluator(instruction_registry)
-    report, all_outputs = evaluator.evaluate(input_examples, responses)
+        print(f"\nRunning IFEval evaluation on {n} prompts ({scorer.workers or 'no'} scoring workers)...")
+        t0 = time.perf_counter()
+        # A resumed checkpoint can hold prompts of later looks: generate_all returned them with
+        # the first look, so they never reached on_record. submit() ignores prompts it has seen.
+        for p in prompts:
+            scorer.submit(by_prompt[p], records[p]["response"])
+        per_prompt = scorer.results(prompts)
+        if per_prompt is None:
+            # ifeval build without per-prompt outputs: only the aggregate report is available
+            report, _ = Evaluator(instruction_registry).evaluate(
+                input_examples, {p: records[p]["response"] for p in prompts})
+            scored = None
+        else:
+            report = merge_report(per_prompt)
+            scored = score({mode: [p[mode] for p in per_prompt] for mode in ("strict", "loose")}, confidence)
+        score_wait_s += time.perf_counter() - t0
+        if not adaptive:
+            break
+        if scored is None:
+            print("  Per-prompt outputs unavailable from ifeval; adaptive stopping disabled")
+            break
+        ci = scored["ci"]["prompt_level_accuracy"]
+        decision = regression_decision(ci["low"] - baseline_accuracy, ci["high"] - baseline_accuracy, threshold)
+        looks.append({"n": n, "prompt_level_accuracy": round(scored["accuracy"]["prompt_level_accuracy"], 2),
+                      "ci": [ci["low"], ci["high"]], "decision": decision})
+        print(f"  look {len(looks)}: n={n} prompt-level {looks[-1]['prompt_level_accuracy']:.1f}% "
+              f"CI [{ci['low']:.1f}, {ci['high']:.1f}] vs boundary {baseline_accuracy - threshold:.1f}% → {decision}")
+        if decision != "INCONCLUSIVE":
+            break
+
+    scorer.close()
+    generation = generation_stats([records[p] for p in dict.fromkeys(prompts)], wall_s)
+    generation["scoring_wait_s"] = round(score_wait_s, 2)
     
     # Extract metrics from report
     # The report contains eval_results_strict and eval_results_loose dicts
@@ -121,6 +543,10 @@ def evaluate_ifeval(
     inst_strict = strict_results.get("instruction_accuracy", 0) * 100
     inst_loose = loose_results.get("instruction_accuracy", 0) * 100
     
+    strata: dict[str, int] = {}
+    for i in order[:len(input_examples)]:
+        strata[categories[i]] = strata.get(categories[i], 0) + 1
+
     results = {
         "model": model,
         "timestamp": datetime.utcnow().isoformat() + "Z",
@@ -129,19 +555,54 @@ def evaluate_ifeval(
         "prompt_level_accuracy_loose": prompt_loose,
         "instruction_level_accuracy": inst_strict,
         "instruction_level_accuracy_loose": inst_loose,
+        "ci": scored["ci"] if scored else None,
+        "confidence": scored["confidence"] if scored else None,
+        "counts": scored["counts"] if scored else None,
+        "sampling": {
+            "mode": sampling,
+            "seed": seed,
+            "dataset_size": len(dataset),
+            "strata": dict(sorted(strata.items())),
+            "adaptive": {
+                "baseline_prompt_level_accuracy": baseline_accuracy,
+                "threshold": threshold,
+                "alpha": alpha,
+                "max_looks": len(sizes),
+                "looks": looks,
+                "stopped_early": len(input_examples) < max_n,
+            } if adaptive else None,
+        },
+        "generation": generation,
+        "generation_cache": cache.stats() if cache is not None else None,
         "raw_report": report,
     }
     
+    def with_ci(key: str) -> str:
+        ci = (results["ci"] or {}).get(key)
+        return f"{results[key]:.2f}%" + (f"  [{ci['low']:.2f}, {ci['high']:.2f}]" if ci else "")
+
     # Print summary
     print("\n" + "=" * 60)
     print("IFEval Results Summary")
     print("=" * 60)
     print(f"Model: {model}")
-    print(f"Samples evaluated: {len(input_examples)}")
-    print(f"\nPrompt-level accuracy (strict):      {prompt_strict:.2f}%")
-    print(f"Prompt-level accuracy (loose):       {prompt_loose:.2f}%")
-    print(f"\nInstruction-level accuracy (strict): {inst_strict:.2f}%")
-    print(f"Instruction-level accuracy (loose):  {inst_loose:.2f}%")
+    print(f"Samples evaluated: {len(input_examples)} ({sampling})")
+    if results["confidence"]:
+        print(f"Intervals: {results['confidence']:.1%} confidence")
+    print(f"\nPrompt-level accuracy (strict):      {with_ci('prompt_level_accuracy')}")
+    print(f"Prompt-level accuracy (loose):       {with_ci('prompt_level_accuracy_loose')}")
+    print(f"\nInstruction-level accuracy (strict): {with_ci('instruction_level_accuracy')}")
+    print(f"Instruction-level accuracy (loose):  {with_ci('instruction_level_accuracy_loose')}")
+    print(f"\nGeneration: {generation['requests']} requests, {generation['cache_hits']} cached, "
+          f"{generation['failed']} failed, {generation['retried']} retried, {generation.get('wall_s', 0):.0f}s wall")
+    if "latency_p50_ms" in generation:
+        print(f"Latency p50/p95/max: {generation['latency_p50_ms']:.0f} / "
+              f"{generation['latency_p95_ms']:.0f} / {generation['latency_max_ms']:.0f} ms, "
+              f"{generation['completion_tokens']} completion tokens")
+    if cache is not None:
+        cs = results["generation_cache"]
+        print(f"Generation cache: {cs['hits']} hits / {cs['misses']} misses, "
+              f"{cs['entries']} entries, {cs['size_mb']} MB ({cs['path']})")
     
     # Save results
     if output_file:
@@ -158,6 +619,8 @@ def evaluate_ifeval(
         with open(output_file, "w") as f:
             json.dump(serializable_results, f, indent=2)
         print(f"\nResults saved to: {output_file}")
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
     
     return results
 
@@ -180,37 +643,149 @@ def main():
         "--num-samples",
         type=int,
         default=None,
-        help="Number of samples to evaluate (default: all ~500)",
+        help="Number of samples to evaluate (default: all ~500); the upper bound with --adaptive",
+    )
+    parser.add_argument(
+        "--sampling",
+        choices=["stratified", "first"],
+        default="stratified",
+        help="How --num-samples picks prompts: stratified by instruction category (default) or the first N",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the stratified sample (default: 0)",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Stop as soon as the prompt-level CI clears or falls below baseline - threshold (needs --baseline)",
+    )
+    parser.add_argument(
+        "--baseline",
+        help="Baseline JSON for --adaptive (e.g. baselines/llama-3.1-8b-instruct.json)",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f"Regression threshold in accuracy points (default: {DEFAULT_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=DEFAULT_ALPHA,
+        help=f"Overall CI error rate, split across adaptive looks (default: {DEFAULT_ALPHA})",
+    )
+    parser.add_argument(
+        "--min-samples",
+        type=int,
+        default=DEFAULT_MIN_SAMPLES,
+        help=f"First look of --adaptive (default: {DEFAULT_MIN_SAMPLES})",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"Prompts added between adaptive looks (default: {DEFAULT_BATCH_SIZE})",
     )
     parser.add_argument(
         "--output",
         default="ifeval_results.json",
         help="Output file for results (default: ifeval_results.json)",
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Maximum generation requests in flight (default: {DEFAULT_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=None,
+        help="JSONL file of finished generations; resumed on rerun with the same model, server and params, "
+             "deleted when the run finishes (default: <output>.checkpoint.jsonl)",
+    )
+    parser.add_argument(
+        "--no-checkpoint",
+        action="store_true",
+        help="Do not read or write a checkpoint file",
+    )
+    parser.add_argument(
+        "--score-workers",
+        type=int,
+        default=None,
+        help="Scoring processes, fed while generation runs (default: CPU count; 0 = score in-process afterwards)",
+    )
+    parser.add_argument(
+        "--image-tag",
+        default=os.getenv("IMAGE_TAG", ""),
+        help="Serving image tag; part of the generation cache key, which is off without one (default: IMAGE_TAG env)",
+    )
+    parser.add_argument(
+        "--cache",
+        default=None,
+        help="Generation cache database (default: GENERATION_CACHE env or .generation_cache/cache.db)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always generate; do not read or write the generation cache",
+    )
     
     args = parser.parse_args()
     
     if not args.model:
         print("Error: Model name required. Use --model or set MODEL env var.")
         sys.exit(1)
+    baseline_accuracy = None
+    if args.adaptive:
+        if not args.baseline:
+            parser.error("--adaptive requires --baseline")
+        baseline_accuracy = load_baseline_accuracy(args.baseline)
+        if baseline_accuracy is None:
+            print(f"Error: {args.baseline} has no established prompt-level accuracy; cannot stop adaptively")
+            sys.exit(1)
     
     # Verify server is accessible
     try:
-        resp = requests.get(f"{args.base_url}/health", timeout=10)
+        resp = httpx.get(f"{args.base_url}/health", timeout=10)
         resp.raise_for_status()
         print(f"Connected to vLLM server at {args.base_url}")
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Error: Cannot connect to vLLM server at {args.base_url}")
         print(f"Details: {e}")
         sys.exit(1)
     
+    cache = None
+    if not args.no_cache and not args.image_tag:
+        print("Generation cache off: no --image-tag or IMAGE_TAG to tell serving builds apart")
+    elif not args.no_cache:
+        cache = GenerationCache(args.cache) if args.cache else GenerationCache()
+
     # Run evaluation
     results = evaluate_ifeval(
         base_url=args.base_url,
         model=args.model,
         num_samples=args.num_samples,
         output_file=args.output,
+        concurrency=args.concurrency,
+        checkpoint=None if args.no_checkpoint else (args.checkpoint or f"{args.output}.checkpoint.jsonl"),
+        cache=cache,
+        image_tag=args.image_tag or None,
+        sampling=args.sampling,
+        seed=args.seed,
+        adaptive=args.adaptive,
+        baseline_accuracy=baseline_accuracy,
+        threshold=args.threshold,
+        alpha=args.alpha,
+        min_samples=args.min_samples,
+        batch_size=args.batch_size,
+        score_workers=args.score_workers,
     )
+    if cache is not None:
+        cache.close()
     
     # Exit with error if accuracy is critically low
     if results["prompt_level_accuracy"] < 10:
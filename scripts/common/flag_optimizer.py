@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Bayesian optimization over discrete inference-server flag spaces.
+
+TECHNIQUE_FLAGS in bench.py is a hand-picked list of single and paired
+techniques. This treats server flags as a search space instead: each
+dimension (KV cache dtype, speculative decoding, KV offload size,
+max-num-seqs, ...) has a few choices, a config picks one choice per
+dimension, and a Gaussian process over the measured configs proposes the
+next one to deploy by expected improvement of the objective.
+
+  * objectives   goodput         SLO-compliant output tok/s (best compliant level per combo, mean over combos)
+                 tokens_per_joule  tok/J at the most efficient SLO-compliant level, mean over combos
+  * encoding     ordinal dimensions → position scaled to [0, 1], categorical → one-hot
+  * surrogate    Matérn-5/2 GP on standardized objectives, length scale and noise
+                 chosen by marginal likelihood over a small grid
+  * stopping     max trials, space exhausted, or no relative improvement above
+                 min_improvement in the last `patience` trials (plateau)
+
+Failed deployments (pod never ready, bench error) are kept as trials and
+scored as the worst observed objective so the optimizer moves away from them.
+
+SimulatedBackend gives every choice and every pair of choices a seeded random
+effect on throughput, latency and power, so the whole loop (propose → deploy
+→ measure → store → stop) can be run end to end without a GPU.
+
+Usage (library):
+    from flag_optimizer import FlagOptimizer, objective_value
+    opt = FlagOptimizer(space, seed=0)
+    while (config := opt.propose()) is not None and not opt.stop_reason():
+        opt.observe(config, objective_value(run(config), "goodput", slo))
+"""
+import itertools
+import math
+import random
+
+import numpy as np
+
+OBJECTIVES = ("goodput", "tokens_per_joule")
+DEFAULT_N_INIT = 4
+DEFAULT_PATIENCE = 8           # 5 stopped before the GP got past the initial design on half the simulated seeds
+DEFAULT_MIN_IMPROVEMENT = 0.01    # plateau: < 1% better than the best in the last `patience` trials
+
+# GP hyperparameter grid (inputs live in [0, 1], outputs are standardized)
+LENGTH_SCALES = (0.25, 0.5, 1.0, 2.0)
+NOISE_LEVELS = (1e-4, 1e-2, 1e-1)
+
+
+# ── Search space ──
+#
+# space = {dimension: {"choices": {label: [flags]}, "default": label, "ordinal": bool}}
+# Choice order matters for ordinal dimensions (e.g. offload sizes, max-num-seqs).
+
+def enumerate_configs(space: dict, constraint=None) -> list[dict]:
+    """Every config {dimension: choice label} of the space, optionally filtered by `constraint(config)`."""
+    dims = list(space)
+    configs = [dict(zip(dims, combo)) for combo in itertools.product(*(space[d]["choices"] for d in dims))]
+    return [c for c in configs if constraint is None or constraint(c)]
+
+
+def default_config(space: dict) -> dict:
+    return {d: spec["default"] for d, spec in space.items()}
+
+
+def config_flags(space: dict, config: dict) -> list[str]:
+    return [flag for d, spec in space.items() for flag in spec["choices"][config[d]]]
+
+
+def config_label(space: dict, config: dict) -> str:
+    """Technique-style label of the non-default choices, e.g. 'kv-fp8+spec-ngram' ('baseline' if none)."""
+    parts = [config[d] for d, spec in space.items() if config[d] != spec["default"]]
+    return "+".join(parts) or "baseline"
+
+
+def encode(space: dict, config: dict) -> np.ndarray:
+    x = []
+    for d, spec in space.items():
+        labels = list(spec["choices"])
+        i = labels.index(config[d])
+        if spec.get("ordinal"):
+            x.append(i / max(len(labels) - 1, 1))
+        else:
+            x.extend(1.0 if j == i else 0.0 for j in range(len(labels)))
+    return np.array(x, dtype=np.float64)
+
+
+# ── Objective ──
+
+def _compliant(level: dict, slo: dict | None) -> bool:
+    for metric, limit in (slo or {}).items():
+        if limit is not None and (level.get(metric) is None or level[metric] > limit):
+            return False
+    return True
+
+
+def objective_value(result: dict | None, objective: str = "goodput", slo: dict | None = None) -> float | None:
+    """
+    Objective of one bench.py result payload (None if the run produced nothing).
+
+    A combo without any SLO-compliant level contributes 0, so configs that
+    only win by breaking the SLO do not win.
+    """
+    combos = (result or {}).get("combos") or {}
+    per_combo = []
+    for combo in combos.values():
+        ok = [lv for lv in combo.get("levels", []) if lv.get("throughput_tok_s") and _compliant(lv, slo)]
+        if objective == "goodput":
+            per_combo.append(max((lv["throughput_tok_s"] for lv in ok), default=0.0))
+        elif objective == "tokens_per_joule":
+            tpj = [lv["throughput_tok_s"] / lv["dcgm"]["power_avg_w"]
+                   for lv in ok if (lv.get("dcgm") or {}).get("power_avg_w")]
+            per_combo.append(max(tpj, default=0.0))
+        else:
+            raise ValueError(f"unknown objective {objective!r} (expected one of {OBJECTIVES})")
+    if not per_combo:
+        return None
+    return round(float(np.mean(per_combo)), 4)
+
+
+# ── Gaussian process ──
+
+def _matern52(A: np.ndarray, B: np.ndarray, length_scale: float) -> np.ndarray:
+    d = np.sqrt(np.maximum(((A[:, None, :] - B[None, :, :]) ** 2).sum(-1), 0.0)) / length_scale
+    return (1.0 + math.sqrt(5) * d + 5.0 / 3.0 * d ** 2) * np.exp(-math.sqrt(5) * d)
+
+
+class GaussianProcess:
+    """Zero-mean GP on standardized targets with grid-searched length scale and noise."""
+
+    def fit(self, X: np.ndarray, y: np.ndarray) -> "GaussianProcess":
+        self.X = X
+        self.y_mean = float(y.mean())
+        self.y_std = float(y.std()) or 1.0
+        z = (y - self.y_mean) / self.y_std
+        best = None
+        for ls, noise in itertools.product(LENGTH_SCALES, NOISE_LEVELS):
+            K = _matern52(X, X, ls) + noise * np.eye(len(X))
+            try:
+                L = np.linalg.cholesky(K)
+            except np.linalg.LinAlgError:
+                continue
+            alpha = np.linalg.solve(L.T, np.linalg.solve(L, z))
+            lml = -0.5 * z @ alpha - np.log(np.diag(L)).sum()
+            if best is None or lml > best[0]:
+                best = (lml, ls, noise, L, alpha)
+        _, self.length_scale, self.noise, self.L, self.alpha = best
+        return self
+
+    def predict(self, Xs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Posterior mean and standard deviation in objective units."""
+        Ks = _matern52(Xs, self.X, self.length_scale)
+        mu = Ks @ self.alpha
+        v = np.linalg.solve(self.L, Ks.T)
+        var = np.maximum(1.0 - (v ** 2).sum(0), 1e-12)
+        return mu * self.y_std + self.y_mean, np.sqrt(var) * self.y_std
+
+
+_erf = np.vectorize(math.erf)
+
+
+def expected_improvement(mu: np.ndarray, sigma: np.ndarray, best: float, xi: float = 0.0) -> np.ndarray:
+    """EI for maximization."""
+    imp = mu - best - xi
+    z = imp / sigma
+    cdf = 0.5 * (1.0 + _erf(z / math.sqrt(2)))
+    pdf = np.exp(-0.5 * z ** 2) / math.sqrt(2 * math.pi)
+    return imp * cdf + sigma * pdf
+
+
+# ── Optimizer ──
+
+class FlagOptimizer:
+    """
+    Proposes configs of `space` one at a time; `observe` feeds back the objective
+    (None for a failed deployment). `trials` may resume a previous run.
+    """
+
+    def __init__(self, space: dict, constraint=None, n_init: int = DEFAULT_N_INIT,
+                 patience: int = DEFAULT_PATIENCE, min_improvement: float = DEFAULT_MIN_IMPROVEMENT,
+                 max_trials: int | None = None, seed: int = 0, trials: list[dict] | None = None):
+        self.space = space
+        self.candidates = enumerate_configs(space, constraint)
+        self.n_init = n_init
+        self.patience = patience
+        self.min_improvement = min_improvement
+        self.max_trials = max_trials
+        self.rng = random.Random(seed)
+        self.trials: list[dict] = list(trials or [])
+        self.last_ei: float | None = None
+
+    def _tried(self) -> set[str]:
+        return {config_label(self.space, t["config"]) for t in self.trials}
+
+    def observe(self, config: dict, objective: float | None, **extra) -> dict:
+        trial = {"trial": len(self.trials) + 1, "config": config, "label": config_label(self.space, config),
+                 "objective": objective, "status": "ok" if objective is not None else "failed", **extra}
+        self.trials.append(trial)
+        return trial
+
+    def best(self) -> dict | None:
+        ok = [t for t in self.trials if t["objective"] is not None]
+        return max(ok, key=lambda t: t["objective"]) if ok else None
+
+    def stop_reason(self) -> str | None:
+        if self.max_trials is not None and len(self.trials) >= self.max_trials:
+            return "max_trials"
+        if len(self._tried()) >= len(self.candidates):
+            return "exhausted"
+        ok = [t["objective"] for t in self.trials if t["objective"] is not None]
+        if len(self.trials) < self.n_init + self.patience or not ok:
+            return None
+        before = [t["objective"] for t in self.trials[:-self.patience] if t["objective"] is not None]
+        if not before:
+            return None
+        best_before, best_now = max(before), max(ok)
+        if best_now - best_before <= self.min_improvement * abs(best_before):
+            return "plateau"
+        return None
+
+    def propose(self) -> dict | None:
+        tried = self._tried()
+        pending = [c for c in self.candidates if config_label(self.space, c) not in tried]
+        if not pending:
+            return None
+
+        # Initial design: the all-defaults baseline, then random configs.
+        if len(self.trials) < self.n_init:
+            base = default_config(self.space)
+            if config_label(self.space, base) not in tried and base in pending:
+                return base
+            return self.rng.choice(pending)
+
+        ok = [t["objective"] for t in self.trials if t["objective"] is not None]
+        floor = min(ok) if ok else 0.0
+        X = np.array([encode(self.space, t["config"]) for t in self.trials])
+        y = np.array([t["objective"] if t["objective"] is not None else floor for t in self.trials])
+        gp = GaussianProcess().fit(X, y)
+        mu, sigma = gp.predict(np.array([encode(self.space, c) for c in pending]))
+        ei = expected_improvement(mu, sigma, float(y.max()), xi=0.01 * gp.y_std)
+        i = int(np.argmax(ei))
+        self.last_ei = round(float(ei[i]), 4)
+        return pending[i]
+
+
+# ── Simulated backend ──
+
+class SimulatedBackend:
+    """
+    Synthetic serving system: every choice and every pair of choices of the
+    space gets a seeded random effect on throughput, ITL, TTFT and power.
+    `fail_rate` of the choice pairs make a deployment fail outright.
+
+    run(config) returns a bench.py-shaped payload ({"combos": {...}}) with
+    a little measurement noise; true_objective() is the noise-free objective.
+    """
+
+    def __init__(self, space: dict, combos=((1024, 1024), (4096, 1024), (1024, 4096)),
+                 concurrency_levels=(1, 8, 32), seed: int = 0, noise: float = 0.02, fail_rate: float = 0.05):
+        self.space = space
+        self.combos = combos
+        self.levels = concurrency_levels
+        self.noise = noise
+        rng = np.random.default_rng(seed)
+        self.main = {(d, label): rng.normal(0, [0.10, 0.08, 0.10, 0.05])
+                     for d, spec in space.items() for label in spec["choices"] if label != spec["default"]}
+        items = list(self.main)
+        self.pairs = {(a, b): rng.normal(0, [0.05, 0.04, 0.05, 0.02]) for a, b in itertools.combinations(items, 2)}
+        self.broken = {pair for pair in self.pairs if rng.random() < fail_rate}
+        self.rng = rng
+
+    def _effects(self, config: dict) -> np.ndarray | None:
+        chosen = [(d, config[d]) for d in self.space if (d, config[d]) in self.main]
+        if any(pair in self.broken for pair in itertools.combinations(chosen, 2)):
+            return None
+        total = sum((self.main[c] for c in chosen), np.zeros(4))
+        total = total + sum((self.pairs[p] for p in itertools.combinations(chosen, 2)), np.zeros(4))
+        return total     # log multipliers: capacity, ITL, TTFT, power
+
+    def _level(self, isl, osl, c, eff, noisy):
+        jitter = (lambda: math.exp(self.rng.normal(0, self.noise))) if noisy else (lambda: 1.0)
+        capacity, itl_m, ttft_m, power_m = np.exp(eff)
+        itl = 110.0 * (1.0 + (c - 1) / (24.0 * capacity)) * itl_m * jitter()
+        ttft = 0.9 * isl * (1.0 + (c - 1) * 0.6 / capacity) * ttft_m * jitter()
+        tput = c * osl / ((ttft + (osl - 1) * itl) / 1000.0) * jitter()
+        return {
+            "concurrency": c,
+            "throughput_tok_s": round(tput, 2),
+            "ttft_p50_ms": round(ttft, 2),
+            "ttft_p99_ms": round(ttft * 1.3, 2),
+            "itl_p50_ms": round(itl, 2),
+            "itl_p99_ms": round(itl * 1.15, 2),
+            "dcgm": {"power_avg_w": round(60.0 * power_m * (1.0 + 0.5 * min(c, 32) / 32.0) * jitter(), 1)},
+        }
+
+    def run(self, config: dict, noisy: bool = True) -> dict | None:
+        eff = self._effects(config)
+        if eff is None:
+            return None
+        return {
+            "simulated": True,
+            "combos": {
+                f"ISL{isl}/OSL{osl}": {"isl": isl, "osl": osl, "dataset": "random",
+                                       "levels": [self._level(isl, osl, c, eff, noisy) for c in self.levels]}
+                for isl, osl in self.combos
+            },
+        }
+
+    def true_objective(self, config: dict, objective: str = "goodput", slo: dict | None = None) -> float | None:
+        return objective_value(self.run(config, noisy=False), objective, slo)
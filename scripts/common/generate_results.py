@@ -3,6 +3,34 @@ import json
 import os
 from datetime import datetime
 
+
+def load_samples(path):
+    """
+    Per-request samples from a `vllm bench serve --save-result --save-detailed` file.
+
+    Returns {"ttft_ms": [...], "tpot_ms": [...], "tok_s": [...]} for successful
+    requests, or None when the file is missing; compare_baseline.py --perf runs
+    its rank tests on these instead of the run means.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        detail = json.load(f)
+    ttfts = detail.get('ttfts') or []
+    itls = detail.get('itls') or [[] for _ in ttfts]
+    output_lens = detail.get('output_lens') or [0] * len(ttfts)
+    samples = {'ttft_ms': [], 'tpot_ms': [], 'tok_s': []}
+    for ttft, itl, n_out in zip(ttfts, itls, output_lens):
+        if not ttft or not n_out:
+            continue   # failed request
+        decode_s = sum(itl)
+        samples['ttft_ms'].append(round(ttft * 1000, 2))
+        if n_out > 1 and decode_s > 0:
+            samples['tpot_ms'].append(round(decode_s * 1000 / (n_out - 1), 2))
+        samples['tok_s'].append(round(n_out / (ttft + decode_s), 2))
+    return samples if samples['ttft_ms'] else None
+
+
 data = {
     'model': os.getenv('MODEL', ''),
     'dgx_cost_per_hour': float(os.getenv('DGX_COST', '0')),
@@ -20,7 +48,8 @@ data = {
             'mean_itl_ms': float(os.getenv('PREFILL_MEAN_ITL', '0')),
             'median_itl_ms': float(os.getenv('PREFILL_MEDIAN_ITL', '0')),
             'p99_itl_ms': float(os.getenv('PREFILL_P99_ITL', '0'))
-        }
+        },
+        'samples': load_samples(os.getenv('PREFILL_DETAIL'))
     },
     'cached': {
         'tokens_per_second': float(os.getenv('CACHED_TPS', '0')),
@@ -35,7 +64,8 @@ data = {
             'mean_itl_ms': float(os.getenv('CACHE_MEAN_ITL', '0')),
             'median_itl_ms': float(os.getenv('CACHE_MEDIAN_ITL', '0')),
             'p99_itl_ms': float(os.getenv('CACHE_P99_ITL', '0'))
-        }
+        },
+        'samples': load_samples(os.getenv('CACHE_DETAIL'))
     },
     'decode': {
         'tokens_per_second': float(os.getenv('OUTPUT_TPS', '0')),
@@ -50,7 +80,8 @@ data = {
             'mean_itl_ms': float(os.getenv('DECODE_MEAN_ITL', '0')),
             'median_itl_ms': float(os.getenv('DECODE_MEDIAN_ITL', '0')),
             'p99_itl_ms': float(os.getenv('DECODE_P99_ITL', '0'))
-        }
+        },
+        'samples': load_samples(os.getenv('DECODE_DETAIL'))
     },
     'timestamp': datetime.utcnow().isoformat() + 'Z',
     'vllm_server_args': {
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Persistent, content-addressed cache of model generations.
+
+lighteval already caches litellm calls in .litellm_cache/cache.db, but the
+legacy evaluator regenerates every response on each run. GenerationCache keeps
+finished generations in a SQLite database keyed by
+
+    sha256(model, image tag, messages, sampling params)
+
+so re-scoring, re-running a comparison or resuming a crashed eval against the
+same model build costs no GPU time. The image tag is part of the key because a
+new serving image (kernels, quantization, engine version) can change outputs
+for the same model name. key() refuses an empty tag: without one, a cached
+generation cannot be told apart from another build's.
+
+Entries are evicted least-recently-used once the stored payload exceeds
+max_bytes (default 1 GiB, GENERATION_CACHE_MAX_MB). Hit/miss counters are kept
+per instance and reported by stats().
+
+Usage (library):
+    from generation_cache import GenerationCache
+    cache = GenerationCache()
+    key = cache.key(model, messages, {"max_tokens": 2048, "temperature": 0.0}, image_tag)
+    record = cache.get(key)
+    if record is None:
+        record = generate(...)
+        cache.put(key, record, model=model, image_tag=image_tag)
+    print(cache.stats())
+
+Usage (CLI):
+    python3 generation_cache.py stats
+    python3 generation_cache.py evict --max-mb 256
+    python3 generation_cache.py clear [--model <model>]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+DEFAULT_PATH = Path(os.getenv("GENERATION_CACHE", ".generation_cache/cache.db"))
+DEFAULT_MAX_BYTES = int(float(os.getenv("GENERATION_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+EVICT_TO = 0.9          # after eviction the cache is at most this fraction of max_bytes
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    key        TEXT PRIMARY KEY,
+    model      TEXT,
+    image_tag  TEXT,
+    record     TEXT NOT NULL,
+    size       INTEGER NOT NULL,
+    created    REAL NOT NULL,
+    last_used  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS generations_last_used ON generations (last_used);
+"""
+
+
+class GenerationCache:
+    def __init__(self, path: str | Path = DEFAULT_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._size = self.size_bytes()    # running total so put() need not re-sum the table
+
+    @staticmethod
+    def key(model: str, messages: list[dict], params: dict | None = None, image_tag: str | None = None) -> str:
+        """Content address of one generation request; raises ValueError without an image tag."""
+        if not image_tag:
+            raise ValueError("generation cache keys need the serving image tag")
+        blob = json.dumps(
+            {"model": model, "image_tag": image_tag, "messages": messages, "params": params or {}},
+            sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+        )
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        row = self._db.execute("SELECT record FROM generations WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self._db:
+            self._db.execute("UPDATE generations SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, record: dict, model: str | None = None, image_tag: str | None = None) -> None:
+        blob = json.dumps(record, ensure_ascii=False)
+        size = len(blob.encode())
+        now = time.time()
+        with self._db:
+            old = self._db.execute("SELECT size FROM generations WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO generations (key, model, image_tag, record, size, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, image_tag, blob, size, now, now),
+            )
+        self._size += size - (old[0] if old else 0)
+        self.writes += 1
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def size_bytes(self) -> int:
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM generations").fetchone()[0]
+
+    def evict(self, max_bytes: int | None = None) -> int:
+        """Drop least-recently-used entries until the cache is within EVICT_TO × max_bytes."""
+        target = int((max_bytes if max_bytes is not None else self.max_bytes) * EVICT_TO)
+        total = self.size_bytes()
+        if total <= target:
+            return 0
+        doomed = []
+        for key, size in self._db.execute("SELECT key, size FROM generations ORDER BY last_used"):
+            if total <= target:
+                break
+            doomed.append((key,))
+            total -= size
+        with self._db:
+            self._db.executemany("DELETE FROM generations WHERE key = ?", doomed)
+        self._size = total
+        self.evictions += len(doomed)
+        return len(doomed)
+
+    def clear(self, model: str | None = None) -> int:
+        with self._db:
+            if model:
+                cur = self._db.execute("DELETE FROM generations WHERE model = ?", (model,))
+            else:
+                cur = self._db.execute("DELETE FROM generations")
+        self._db.execute("VACUUM")
+        self._size = self.size_bytes()
+        return cur.rowcount
+
+    def stats(self) -> dict:
+        entries = self._db.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "path": str(self.path),
+            "entries": entries,
+            "size_mb": round(self.size_bytes() / (1024 * 1024), 2),
+            "max_mb": round(self.max_bytes / (1024 * 1024), 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or prune the generation cache")
+    parser.add_argument("command", choices=["stats", "evict", "clear"])
+    parser.add_argument("--path", default=str(DEFAULT_PATH), help=f"Cache database (default: {DEFAULT_PATH})")
+    parser.add_argument("--max-mb", type=float, help="Size limit for evict (default: GENERATION_CACHE_MAX_MB or 1024)")
+    parser.add_argument("--model", help="clear: only drop entries of this model")
+    args = parser.parse_args()
+
+    cache = GenerationCache(args.path)
+    if args.command == "evict":
+        limit = int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None
+        print(f"Evicted {cache.evict(limit)} entries")
+    elif args.command == "clear":
+        print(f"Removed {cache.clear(args.model)} entries")
+
+    by_model = cache._db.execute(
+        "SELECT model, image_tag, COUNT(*), SUM(size) FROM generations GROUP BY model, image_tag ORDER BY model"
+    ).fetchall()
+    print(json.dumps(cache.stats(), indent=2))
+    for model, tag, n, size in by_model:
+        print(f"  {model or '?'} @ {tag or '-'}: {n} entries, {size / 1024:.0f} KiB")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
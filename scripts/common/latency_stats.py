@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Vectorized latency analytics over per-request samples.
+
+Per-request measurements (TTFT, ITL lists, output lengths) are held as NumPy
+arrays instead of Python lists, so percentiles, bootstrap confidence
+intervals, per-output-position TPOT curves and goodput are a handful of array
+operations rather than sort-and-index loops. Used by the benchmark scripts
+(nemotron-120b/bench.py, run_agent_benchmark.py), compare_baseline.py and
+aggregate.py.
+
+Percentiles use linear interpolation (NumPy's default), so p99 of 100
+samples is interpolated between the two largest values instead of picking
+one of them.
+
+Usage (library):
+    from latency_stats import pct, summarize, bootstrap_ci, tpot_by_position, goodput
+    level["ttft_p99_ms"] = pct(ttfts, 99)
+    level["ttft_p50_ci_ms"] = bootstrap_ci(ttfts, 50)
+    level["tpot_by_position"] = tpot_by_position(itl_lists)
+    level["goodput"] = goodput(ttfts, tpots, out_lens, wall_s, slo_ttft_ms=2000, slo_tpot_ms=100)
+
+Usage (CLI, summarize a JSON list or a vllm bench --save-detailed file):
+    python3 latency_stats.py prefill_detail.json
+"""
+import argparse
+import json
+import warnings
+from math import erfc, sqrt
+
+import numpy as np
+
+DEFAULT_QUANTILES = (50, 90, 95, 99)
+DEFAULT_N_BOOT = 2000
+MAX_BOOT_CELLS = 4_000_000   # resample matrix size above which bootstrap runs in chunks
+
+
+def as_array(samples) -> np.ndarray:
+    """Float64 array of the finite values in `samples` (None / NaN / inf dropped)."""
+    if samples is None:
+        return np.empty(0)
+    arr = np.asarray([np.nan if v is None else v for v in samples] if isinstance(samples, list) else samples,
+                     dtype=np.float64).ravel()
+    return arr[np.isfinite(arr)]
+
+
+def pct(samples, q: float, digits: int | None = 2) -> float | None:
+    """Single percentile (q in 0..100), or None when there are no samples."""
+    arr = as_array(samples)
+    if arr.size == 0:
+        return None
+    value = float(np.percentile(arr, q))
+    return round(value, digits) if digits is not None else value
+
+
+def percentiles(samples, qs=DEFAULT_QUANTILES, digits: int | None = 2) -> dict:
+    """{"p50": ..., "p99": ...} in one pass; values are None when there are no samples."""
+    arr = as_array(samples)
+    if arr.size == 0:
+        return {f"p{q:g}": None for q in qs}
+    values = np.percentile(arr, qs)
+    return {f"p{q:g}": (round(float(v), digits) if digits is not None else float(v)) for q, v in zip(qs, values)}
+
+
+def summarize(samples, qs=DEFAULT_QUANTILES, digits: int = 2) -> dict:
+    """count / mean / percentiles / max of a sample set."""
+    arr = as_array(samples)
+    if arr.size == 0:
+        return {"count": 0}
+    return {
+        "count": int(arr.size),
+        "mean": round(float(arr.mean()), digits),
+        **percentiles(arr, qs, digits),
+        "max": round(float(arr.max()), digits),
+    }
+
+
+def _resample_stat(arr: np.ndarray, q: float, n_boot: int, rng: np.random.Generator) -> np.ndarray:
+    """Percentile `q` of `n_boot` bootstrap resamples of `arr`, chunked to bound memory."""
+    out = np.empty(n_boot)
+    chunk = max(1, MAX_BOOT_CELLS // arr.size)
+    for start in range(0, n_boot, chunk):
+        k = min(chunk, n_boot - start)
+        idx = rng.integers(0, arr.size, size=(k, arr.size))
+        out[start:start + k] = np.percentile(arr[idx], q, axis=1)
+    return out
+
+
+def bootstrap_ci(samples, q: float = 50, n_boot: int = DEFAULT_N_BOOT, confidence: float = 0.95,
+                 seed: int = 0, digits: int | None = 2) -> list | None:
+    """Percentile-bootstrap CI [low, high] for the q-th percentile of `samples`."""
+    arr = as_array(samples)
+    if arr.size < 2:
+        return None
+    boot = _resample_stat(arr, q, n_boot, np.random.default_rng(seed))
+    tail = (1.0 - confidence) / 2.0 * 100
+    lo, hi = np.percentile(boot, [tail, 100 - tail])
+    if digits is None:
+        return [float(lo), float(hi)]
+    return [round(float(lo), digits), round(float(hi), digits)]
+
+
+def bootstrap_diff_ci(x, y, q: float = 99, n_boot: int = DEFAULT_N_BOOT, confidence: float = 0.95,
+                      seed: int = 0) -> tuple[float, float, float]:
+    """
+    Bootstrap CI for percentile(x, q) - percentile(y, q).
+
+    Returns (point_estimate, ci_low, ci_high).
+    """
+    a, b = as_array(x), as_array(y)
+    rng = np.random.default_rng(seed)
+    diffs = _resample_stat(a, q, n_boot, rng) - _resample_stat(b, q, n_boot, rng)
+    tail = (1.0 - confidence) / 2.0 * 100
+    lo, hi = np.percentile(diffs, [tail, 100 - tail])
+    return float(np.percentile(a, q) - np.percentile(b, q)), float(lo), float(hi)
+
+
+def hierarchical_diff_ci(x, runs, q: float = 50, n_boot: int = DEFAULT_N_BOOT, confidence: float = 0.95,
+                         seed: int = 0) -> tuple[float, float, float]:
+    """
+    Bootstrap CI for percentile(x, q) - percentile(reference, q), with runs as the unit.
+
+    `x` holds one run's per-request samples and `runs` the per-request samples
+    of each earlier run. Pooling the runs and resampling requests would ignore
+    run-to-run variance. Instead, each replicate resamples the runs with
+    replacement and then requests within each drawn run. `x` is itself a
+    single run, so each replicate also subtracts one drawn run's deviation from
+    the pooled reference. With a single reference run this reduces to
+    bootstrap_diff_ci.
+
+    Returns (point_estimate, ci_low, ci_high).
+    """
+    a = as_array(x)
+    runs = [r for r in map(as_array, runs) if r.size]
+    pooled = np.concatenate(runs)
+    rng = np.random.default_rng(seed)
+    deviation = np.array([np.percentile(r, q) for r in runs]) - np.percentile(pooled, q)
+    ref_boot = np.empty(n_boot)
+    for i in range(n_boot):
+        drawn = [runs[j] for j in rng.integers(0, len(runs), size=len(runs))]
+        ref_boot[i] = np.percentile(np.concatenate([r[rng.integers(0, r.size, size=r.size)] for r in drawn]), q)
+    diffs = _resample_stat(a, q, n_boot, rng) - ref_boot - deviation[rng.integers(0, len(runs), size=n_boot)]
+    tail = (1.0 - confidence) / 2.0 * 100
+    lo, hi = np.percentile(diffs, [tail, 100 - tail])
+    return float(np.percentile(a, q) - np.percentile(pooled, q)), float(lo), float(hi)
+
+
+def rankdata(values: np.ndarray) -> tuple[np.ndarray, float]:
+    """Average ranks (1-based) and the tie-correction term sum(t^3 - t)."""
+    order = np.argsort(values, kind="mergesort")
+    sorted_vals = values[order]
+    # Boundaries of runs of equal values.
+    starts = np.flatnonzero(np.r_[True, sorted_vals[1:] != sorted_vals[:-1]])
+    counts = np.diff(np.r_[starts, sorted_vals.size])
+    avg = starts + (counts + 1) / 2.0
+    ranks = np.empty(values.size)
+    ranks[order] = np.repeat(avg, counts)
+    return ranks, float(np.sum(counts.astype(np.float64) ** 3 - counts))
+
+
+def mann_whitney_greater(x, y) -> tuple[float, float]:
+    """
+    One-sided Mann-Whitney U test that `x` is stochastically greater than `y`.
+
+    Normal approximation with tie and continuity correction.
+    Returns (p_value, cliffs_delta) where cliffs_delta = P(x > y) - P(x < y).
+    """
+    a, b = as_array(x), as_array(y)
+    n1, n2 = a.size, b.size
+    ranks, tie_term = rankdata(np.concatenate([a, b]))
+    u1 = float(ranks[:n1].sum()) - n1 * (n1 + 1) / 2.0
+    cliffs_delta = 2.0 * u1 / (n1 * n2) - 1.0
+    n = n1 + n2
+    variance = n1 * n2 / 12.0 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0, cliffs_delta
+    z = (u1 - n1 * n2 / 2.0 - 0.5) / sqrt(variance)
+    return 0.5 * erfc(z / sqrt(2)), cliffs_delta
+
+
+def ragged_to_matrix(lists) -> np.ndarray:
+    """Stack variable-length per-request lists into a NaN-padded (n_requests, max_len) matrix."""
+    lengths = np.fromiter((len(v) for v in lists), dtype=np.int64, count=len(lists))
+    out = np.full((lengths.size, int(lengths.max()) if lengths.size else 0), np.nan)
+    if lengths.sum():
+        flat = np.concatenate([np.asarray(v, dtype=np.float64) for v in lists if len(v)])
+        rows = np.repeat(np.arange(lengths.size), lengths)
+        cols = np.arange(flat.size) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        out[rows, cols] = flat
+    return out
+
+
+def tpot_by_position(itl_lists, qs=(50, 99), bucket: int | None = None, max_points: int = 64,
+                     min_requests: int = 3) -> dict:
+    """
+    Inter-token latency as a function of output position.
+
+    `itl_lists` holds one list of ITLs (ms) per request; position i is the gap
+    before output token i+1. Positions are grouped into buckets (default: so
+    that at most `max_points` buckets remain) and each bucket reports the
+    requested percentiles across all gaps that fall in it. Buckets with fewer
+    than `min_requests` requests reaching them are dropped as noise.
+    """
+    mat = ragged_to_matrix(list(itl_lists))
+    if mat.size == 0:
+        return {"position": [], "n": [], **{f"p{q:g}": [] for q in qs}}
+    n_pos = mat.shape[1]
+    bucket = bucket or max(1, -(-n_pos // max_points))
+    n_buckets = -(-n_pos // bucket)
+    padded = np.full((mat.shape[0], n_buckets * bucket), np.nan)
+    padded[:, :n_pos] = mat
+    # (requests, buckets, bucket) → (buckets, requests * bucket)
+    grouped = padded.reshape(mat.shape[0], n_buckets, bucket).transpose(1, 0, 2).reshape(n_buckets, -1)
+    reached = np.isfinite(padded.reshape(mat.shape[0], n_buckets, bucket)).any(axis=2).sum(axis=0)
+    keep = reached >= min_requests
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        values = np.nanpercentile(grouped[keep], qs, axis=1) if keep.any() else np.empty((len(qs), 0))
+    return {
+        "bucket": bucket,
+        "position": (np.flatnonzero(keep) * bucket).tolist(),
+        "n": reached[keep].astype(int).tolist(),
+        **{f"p{q:g}": np.round(values[i], 2).tolist() for i, q in enumerate(qs)},
+    }
+
+
+def tpot_from_itls(itl_lists) -> np.ndarray:
+    """Mean ITL per request (ms); NaN for requests with fewer than two output tokens."""
+    mat = ragged_to_matrix(list(itl_lists))
+    if mat.size == 0:
+        return np.empty(0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)   # all-NaN rows → NaN
+        return np.nanmean(mat, axis=1)
+
+
+def goodput(ttft_ms, tpot_ms, output_tokens, wall_s: float,
+            slo_ttft_ms: float | None = None, slo_tpot_ms: float | None = None) -> dict:
+    """
+    Throughput counting only requests that met every given SLO.
+
+    The three per-request arrays must be aligned (one entry per request). A
+    request with an unknown value for an SLO'd metric counts as a miss.
+    """
+    ttft = np.asarray(ttft_ms, dtype=np.float64)
+    tpot = np.asarray(tpot_ms, dtype=np.float64)
+    out = np.asarray(output_tokens, dtype=np.float64)
+    ok = np.ones(out.size, dtype=bool)
+    if slo_ttft_ms is not None:
+        ok &= np.nan_to_num(ttft, nan=np.inf) <= slo_ttft_ms
+    if slo_tpot_ms is not None:
+        ok &= np.nan_to_num(tpot, nan=np.inf) <= slo_tpot_ms
+    n_ok = int(ok.sum())
+    return {
+        "slo": {k: v for k, v in (("ttft_ms", slo_ttft_ms), ("tpot_ms", slo_tpot_ms)) if v is not None},
+        "requests": int(out.size),
+        "requests_ok": n_ok,
+        "attainment": round(n_ok / out.size, 4) if out.size else None,
+        "goodput_req_s": round(n_ok / wall_s, 3) if wall_s > 0 else None,
+        "goodput_tok_s": round(float(out[ok].sum()) / wall_s, 2) if wall_s > 0 else None,
+    }
+
+
+def columns(rows: list[dict], fields) -> dict[str, np.ndarray]:
+    """Row dicts → {field: float array} (None → NaN), for vectorized ranking and filtering."""
+    return {
+        f: np.fromiter((np.nan if r.get(f) is None else r[f] for r in rows), dtype=np.float64, count=len(rows))
+        for f in fields
+    }
+
+
+def rank(values: np.ndarray, descending: bool = False, mask: np.ndarray | None = None) -> np.ndarray:
+    """Indices of the finite (and masked-in) values, sorted stably."""
+    valid = np.isfinite(values)
+    if mask is not None:
+        valid &= mask
+    idx = np.flatnonzero(valid)
+    keys = -values[idx] if descending else values[idx]
+    return idx[np.argsort(keys, kind="stable")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize per-request latency samples")
+    parser.add_argument("path", help="JSON list of numbers, or a vllm bench --save-detailed result")
+    parser.add_argument("--slo-ttft-ms", type=float)
+    parser.add_argument("--slo-tpot-ms", type=float)
+    args = parser.parse_args()
+
+    with open(args.path) as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        print(json.dumps({"summary": summarize(data), "p50_ci": bootstrap_ci(data, 50)}, indent=2))
+        return
+
+    ttft_ms = np.asarray(data.get("ttfts", []), dtype=np.float64) * 1000
+    itl_ms = [np.asarray(v, dtype=np.float64) * 1000 for v in data.get("itls", [])]
+    tpot_ms = tpot_from_itls(itl_ms)
+    report = {
+        "ttft_ms": {**summarize(ttft_ms), "p50_ci": bootstrap_ci(ttft_ms, 50), "p99_ci": bootstrap_ci(ttft_ms, 99)},
+        "tpot_ms": summarize(tpot_ms),
+        "tpot_by_position": tpot_by_position(itl_ms),
+    }
+    if data.get("duration"):
+        report["goodput"] = goodput(ttft_ms, tpot_ms, data.get("output_lens", []), data["duration"],
+                                    args.slo_ttft_ms, args.slo_tpot_ms)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
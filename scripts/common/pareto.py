@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Pareto frontier analysis across throughput, latency, energy and cost.
+
+Each (config × concurrency) cell of an ISL/OSL combo is a candidate operating
+point scored on five objectives:
+
+    throughput_tok_s   maximize
+    ttft_p99_ms        minimize
+    itl_p99_ms         minimize
+    tokens_per_joule   maximize   throughput / DCGM average power
+    cost_per_m_tokens  minimize   ($/h hardware + power × $/kWh) per million output tokens
+
+A point is dominated if another point in the same combo is at least as good on
+every objective and strictly better on one. A missing objective (no DCGM data,
+failed cell) counts as the worst value, so incomplete points can only reach
+the frontier on the objectives they did report.
+
+Configs whose IFEval accuracy (bench.py --accuracy-samples) falls more than
+max_accuracy_drop points below the model's reference config are excluded
+before ranking. The reference is the baseline technique at the
+highest-precision quantization measured. A Newcombe CI on the accuracy
+difference decides: a config is excluded when the whole CI lies below
+−max_accuracy_drop ("confirmed"). At the default 100 samples that CI is about
+±13 points wide, so a config is also excluded when the CI straddles the bound
+but the point estimate is beyond it ("confirmed": false). Those are the
+configs to rerun with more samples. Configs without accuracy data are kept.
+
+Usage:
+    python3 pareto.py --family qwen35-27b --output docs/qwen35-27b-pareto.json
+
+Usage (library):
+    from pareto import annotate, pareto_report
+    annotate(rows)                       # adds tokens_per_joule / cost_per_m_tokens
+    kept, excluded = accuracy_filter(rows)   # drop configs that trade quality for speed
+    report = pareto_report(kept, excluded_configs=excluded)   # per-combo frontier + dominated points
+"""
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+
+from accuracy_stats import newcombe_interval, regression_decision
+
+# Same hardware rate the deploy-and-benchmark workflow uses for $/M tokens.
+HW_COST_PER_HOUR = float(os.getenv("DGX_HARDWARE_COST_PER_HOUR", "0.152"))
+ELECTRICITY_PER_KWH = float(os.getenv("ELECTRICITY_COST_PER_KWH", "0.15"))
+
+OBJECTIVES = {
+    "throughput_tok_s":  "max",
+    "ttft_p99_ms":       "min",
+    "itl_p99_ms":        "min",
+    "tokens_per_joule":  "max",
+    "cost_per_m_tokens": "min",
+}
+
+CONFIG_FIELDS = ("framework", "quantization", "technique", "hardware")
+
+MAX_ACCURACY_DROP = 5.0      # accuracy points; same threshold as compare_baseline.py
+QUANT_PRECISION = ("bf16", "fp16", "fp8", "gptq-int4")   # highest precision first
+
+
+def tokens_per_joule(row: dict) -> float | None:
+    tput, power = row.get("throughput_tok_s"), row.get("dcgm_power_w")
+    if not tput or not power:
+        return None
+    return tput / power
+
+
+def cost_per_m_tokens(row: dict, hw_cost_per_hour: float = HW_COST_PER_HOUR,
+                      electricity_per_kwh: float = ELECTRICITY_PER_KWH) -> float | None:
+    """Dollars per million generated tokens at this operating point."""
+    tput = row.get("throughput_tok_s")
+    if not tput:
+        return None
+    power_kw = (row.get("dcgm_power_w") or 0.0) / 1000.0
+    dollars_per_hour = hw_cost_per_hour + power_kw * electricity_per_kwh
+    return dollars_per_hour / (tput * 3600.0) * 1e6
+
+
+def annotate(rows: list[dict], hw_cost_per_hour: float = HW_COST_PER_HOUR,
+             electricity_per_kwh: float = ELECTRICITY_PER_KWH) -> list[dict]:
+    """Add the derived objectives to each row in place."""
+    for row in rows:
+        tpj = tokens_per_joule(row)
+        cost = cost_per_m_tokens(row, hw_cost_per_hour, electricity_per_kwh)
+        row["tokens_per_joule"] = round(tpj, 4) if tpj is not None else None
+        row["cost_per_m_tokens"] = round(cost, 4) if cost is not None else None
+    return rows
+
+
+def _score(row: dict, objectives: dict) -> tuple[float, ...]:
+    """Objective vector oriented so that larger is always better; None → -inf."""
+    out = []
+    for name, sense in objectives.items():
+        v = row.get(name)
+        if v is None:
+            out.append(float("-inf"))
+        else:
+            out.append(v if sense == "max" else -v)
+    return tuple(out)
+
+
+def dominates(a: tuple, b: tuple) -> bool:
+    return all(x >= y for x, y in zip(a, b)) and any(x > y for x, y in zip(a, b))
+
+
+def pareto_split(rows: list[dict], objectives: dict = OBJECTIVES) -> tuple[list[dict], list[tuple[dict, dict]]]:
+    """
+    Split rows into (frontier, dominated).
+
+    `dominated` pairs each dominated row with one frontier row that dominates
+    it (the one with the highest throughput), which is what the report shows.
+    """
+    scored = [(r, _score(r, objectives)) for r in rows if r.get("throughput_tok_s") is not None]
+    frontier, dominated_rows = [], []
+    for r, s in scored:
+        if any(dominates(s2, s) for _, s2 in scored):
+            dominated_rows.append((r, s))
+        else:
+            frontier.append((r, s))
+
+    dominated = []
+    for r, s in dominated_rows:
+        by = [fr for fr, fs in frontier if dominates(fs, s)]
+        best = max(by, key=lambda x: x["throughput_tok_s"]) if by else None
+        dominated.append((r, best))
+    return [r for r, _ in frontier], dominated
+
+
+def config_label(row: dict) -> str:
+    return "/".join(str(row.get(f) or "?") for f in CONFIG_FIELDS[:3])
+
+
+def _config_accuracy(rows: list[dict]) -> dict[tuple, dict]:
+    """(model, config label, hardware) → accuracy of the largest accuracy run seen for it."""
+    out: dict[tuple, dict] = {}
+    for row in rows:
+        if row.get("accuracy_prompt_strict") is None or not row.get("accuracy_num_samples"):
+            continue
+        key = (row.get("model"), config_label(row), row.get("hardware"))
+        if key not in out or row["accuracy_num_samples"] > out[key]["num_samples"]:
+            out[key] = {"accuracy": row["accuracy_prompt_strict"], "num_samples": row["accuracy_num_samples"],
+                        "quantization": row.get("quantization"), "technique": row.get("technique")}
+    return out
+
+
+def _reference(configs: dict[tuple, dict]) -> tuple | None:
+    def rank(item):
+        _, acc = item
+        quant = acc["quantization"]
+        return (acc["technique"] != "baseline",
+                QUANT_PRECISION.index(quant) if quant in QUANT_PRECISION else len(QUANT_PRECISION),
+                -acc["accuracy"])
+    return min(configs.items(), key=rank)[0] if configs else None
+
+
+def accuracy_filter(rows: list[dict], max_drop: float = MAX_ACCURACY_DROP,
+                    confidence: float = 0.95) -> tuple[list[dict], list[dict]]:
+    """
+    Split rows into (kept, excluded_configs) by IFEval accuracy.
+
+    Each model's configs are compared against its reference config with a
+    Newcombe interval on the prompt-level accuracy difference. A config is
+    excluded when the whole interval is below −max_drop, or when the interval
+    is inconclusive and the point difference is below −max_drop.
+    """
+    by_model: dict[str, dict[tuple, dict]] = {}
+    for key, acc in _config_accuracy(rows).items():
+        by_model.setdefault(key[0], {})[key] = acc
+
+    dropped: dict[tuple, dict] = {}
+    for model, configs in by_model.items():
+        ref_key = _reference(configs)
+        ref = configs[ref_key]
+        k_ref = round(ref["accuracy"] / 100 * ref["num_samples"])
+        for key, acc in configs.items():
+            if key == ref_key:
+                continue
+            lo, hi = newcombe_interval(round(acc["accuracy"] / 100 * acc["num_samples"]), acc["num_samples"],
+                                       k_ref, ref["num_samples"], confidence)
+            decision = regression_decision(lo, hi, max_drop)
+            delta = acc["accuracy"] - ref["accuracy"]
+            if decision == "FAIL" or (decision == "INCONCLUSIVE" and delta < -max_drop):
+                dropped[key] = {
+                    "model": model, "config": key[1], "hardware": key[2],
+                    "accuracy": acc["accuracy"], "num_samples": acc["num_samples"],
+                    "reference_config": ref_key[1], "reference_accuracy": ref["accuracy"],
+                    "delta_ci": [round(lo, 2), round(hi, 2)], "confirmed": decision == "FAIL",
+                }
+
+    kept = [r for r in rows if (r.get("model"), config_label(r), r.get("hardware")) not in dropped]
+    return kept, list(dropped.values())
+
+
+def _point(row: dict, objectives: dict) -> dict:
+    return {
+        **{f: row.get(f) for f in CONFIG_FIELDS},
+        "concurrency": row.get("concurrency"),
+        **{k: row.get(k) for k in objectives},
+        "accuracy_prompt_strict": row.get("accuracy_prompt_strict"),
+        "source_file": row.get("source_file"),
+    }
+
+
+def pareto_report(rows: list[dict], objectives: dict = OBJECTIVES,
+                  hw_cost_per_hour: float = HW_COST_PER_HOUR,
+                  electricity_per_kwh: float = ELECTRICITY_PER_KWH,
+                  excluded_configs: list[dict] | None = None) -> dict:
+    """Per-combo frontier and dominated points, ready to dump as JSON (rows must be annotated)."""
+    by_combo: dict[str, list[dict]] = {}
+    for row in rows:
+        by_combo.setdefault(row.get("combo") or "?", []).append(row)
+
+    combos = {}
+    for combo, combo_rows in sorted(by_combo.items()):
+        frontier, dominated = pareto_split(combo_rows, objectives)
+        frontier.sort(key=lambda r: r["throughput_tok_s"], reverse=True)
+        combos[combo] = {
+            "n_points": len(frontier) + len(dominated),
+            "frontier": [_point(r, objectives) for r in frontier],
+            "dominated": [
+                {**_point(r, objectives),
+                 "dominated_by": f"{config_label(by)} c={by.get('concurrency')}" if by else None}
+                for r, by in dominated
+            ],
+        }
+    return {
+        "generated": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "objectives": objectives,
+        "cost_model": {"hw_cost_per_hour": hw_cost_per_hour, "electricity_per_kwh": electricity_per_kwh},
+        "excluded_configs": excluded_configs or [],
+        "combos": combos,
+    }
+
+
+def print_frontier(report: dict) -> None:
+    for ex in report.get("excluded_configs", []):
+        print(f"EXCLUDED {ex['config']} ({ex['model']}): IFEval {ex['accuracy']:.1f}% vs "
+              f"{ex['reference_accuracy']:.1f}% for {ex['reference_config']} "
+              f"(Δ CI [{ex['delta_ci'][0]:+.1f}, {ex['delta_ci'][1]:+.1f}])"
+              + ("" if ex.get("confirmed", True) else ", unconfirmed: rerun with more samples"))
+    for combo, data in report["combos"].items():
+        print(f"\n{'='*80}")
+        print(f"  PARETO FRONTIER {combo} ({len(data['frontier'])} of {data['n_points']} points)")
+        print(f"{'='*80}")
+        header = (f"{'Framework':<8}  {'Quant':<10}  {'Technique':<16}  {'C':>3}  {'tok/s':>8}  "
+                  f"{'TTFT p99':>9}  {'ITL p99':>8}  {'tok/J':>7}  {'$/M':>7}")
+        print(header)
+        print("-" * len(header))
+
+        def fmt(v, width, prec=1):
+            return f"{v:>{width}.{prec}f}" if v is not None else f"{'N/A':>{width}}"
+
+        for p in data["frontier"]:
+            print(f"{p['framework'] or '?':<8}  {p['quantization'] or '?':<10}  {p['technique'] or '?':<16}  "
+                  f"{p['concurrency'] or 0:>3}  {fmt(p['throughput_tok_s'], 8)}  {fmt(p['ttft_p99_ms'], 9)}  "
+                  f"{fmt(p['itl_p99_ms'], 8)}  {fmt(p['tokens_per_joule'], 7, 3)}  {fmt(p['cost_per_m_tokens'], 7, 3)}")
+
+
+def save_report(report: dict, path: str) -> None:
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nPareto frontier saved to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pareto frontier over benchmark results in the warehouse")
+    parser.add_argument("--family", default="qwen35-27b", help="Warehouse result family (default: qwen35-27b)")
+    parser.add_argument("--model", help="Restrict to one model")
+    parser.add_argument("--hw-cost-per-hour", type=float, default=HW_COST_PER_HOUR)
+    parser.add_argument("--kwh-price", type=float, default=ELECTRICITY_PER_KWH)
+    parser.add_argument("--max-accuracy-drop", type=float, default=MAX_ACCURACY_DROP,
+                        help=f"Exclude configs whose IFEval accuracy is more than this many points below the "
+                             f"model's reference config (default: {MAX_ACCURACY_DROP})")
+    parser.add_argument("--output", help="Write the frontier JSON here (e.g. docs/qwen35-27b-pareto.json)")
+    args = parser.parse_args()
+
+    from results_store import ingest, query_rows
+    ingest()
+    filters = {"family": args.family}
+    if args.model:
+        filters["model"] = args.model
+    rows = query_rows(filters)
+    if not rows:
+        print("No rows in the warehouse for", filters)
+        raise SystemExit(1)
+
+    annotate(rows, args.hw_cost_per_hour, args.kwh_price)
+    rows, excluded = accuracy_filter(rows, args.max_accuracy_drop)
+    report = pareto_report(rows, hw_cost_per_hour=args.hw_cost_per_hour, electricity_per_kwh=args.kwh_price,
+                           excluded_configs=excluded)
+    print_frontier(report)
+    if args.output:
+        save_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
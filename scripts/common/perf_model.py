@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Parametric performance surface for one framework/quant/technique.
+
+Fits simple serving curves to measured (ISL, OSL, concurrency) cells and
+predicts unmeasured cells with bootstrap uncertainty:
+
+    log TTFT = t0 + a·log isl + b·log osl + (g + h·log osl)·log c
+                                             prefill, plus closed-loop queueing whose
+                                             growth with c depends on how often slots free up
+    ITL      = i0 + d·(c-1) + e·(c-1)·ctx/1000
+                                             decode step grows with batch and KV read
+    tok/s    = c·osl / (TTFT + (osl-1)·ITL)  Little's law on the p50 curves
+
+where ctx = isl + osl/2 is the mean context during decode. p50 and p99 are
+fitted separately with the same features: TTFT by least squares in log space
+(a power law — queueing delay spans two orders of magnitude across the grid),
+ITL by relative least squares with negative terms dropped. Saturation
+throughput is the peak of the tok/s curve over concurrency.
+
+prune_sweep() is the active-measurement loop behind bench.py --prune: measure
+the lowest and highest concurrency of every combo, then keep measuring the
+unmeasured cell with the widest relative prediction interval until every
+interval is within the tolerance or the cell budget runs out. Unmeasured cells
+are returned as predictions.
+
+Usage:
+    python3 perf_model.py --framework vllm --quantization gptq-int4 --technique baseline \\
+        --predict 2048x512 --concurrency 1,8,16,32
+
+Usage (library):
+    from perf_model import PerfModel, prune_sweep
+    model = PerfModel(cells)                  # dicts with isl, osl, concurrency and metrics
+    model.predict(2048, 512, 16)              # {metric: {"value", "lo", "hi"}}
+"""
+import argparse
+import importlib.util
+import json
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_TOLERANCE = 0.10     # stop once every prediction interval is within ±10%
+DEFAULT_N_BOOT = 200
+INTERVAL = (5.0, 95.0)       # percentile bounds reported as lo / hi
+
+
+def _ttft_features(isl, osl, c):
+    lc, lo = np.log(c), np.log(osl)
+    return [1.0, np.log(isl), lo, lc, lc * lo]
+
+
+def _itl_features(isl, osl, c):
+    ctx = isl + osl / 2.0
+    return [1.0, c - 1, (c - 1) * ctx / 1000.0]
+
+
+# metric → (features, fitted in log space)
+CURVES = {
+    "ttft_p50_ms": (_ttft_features, True),
+    "ttft_p99_ms": (_ttft_features, True),
+    "itl_p50_ms":  (_itl_features, False),
+    "itl_p99_ms":  (_itl_features, False),
+}
+N_PARAMS = max(len(f(1, 1, 1)) for f, _ in CURVES.values())
+MIN_CELLS = N_PARAMS + 1     # at least one residual degree of freedom for the bootstrap
+UNCERTAINTY_METRICS = ("throughput_tok_s", "ttft_p99_ms", "itl_p99_ms")
+SATURATION_REACH = 2         # search the tok/s peak up to 2× the highest measured concurrency
+
+
+def _fit_log(X: np.ndarray, y: np.ndarray) -> np.ndarray:
+    coef, *_ = np.linalg.lstsq(X, np.log(y), rcond=None)
+    return coef
+
+
+def _fit_relative(X: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Relative least squares with non-negative terms (most negative term dropped until none is)."""
+    w = 1.0 / y
+    active = list(range(X.shape[1]))
+    coef_a = np.zeros(0)
+    while active:
+        coef_a, *_ = np.linalg.lstsq(X[:, active] * w[:, None], y * w, rcond=None)
+        if (coef_a >= 0).all():
+            break
+        active.pop(int(np.argmin(coef_a)))
+    coef = np.zeros(X.shape[1])
+    coef[active] = coef_a
+    return coef
+
+
+def effective_concurrency(concurrency: int, num_prompts: int | None = None) -> int:
+    """A run of num_prompts < concurrency requests never has more than num_prompts in flight."""
+    return min(concurrency, num_prompts) if num_prompts else concurrency
+
+
+def littles_law_tput(isl, osl, c, ttft_ms, itl_ms):
+    """Output tok/s of c concurrent requests each lasting TTFT + (osl-1)·ITL."""
+    return c * osl / ((ttft_ms + (osl - 1) * itl_ms) / 1000.0)
+
+
+class PerfModel:
+    """Bootstrap-fitted TTFT / ITL / throughput surface over measured cells."""
+
+    def __init__(self, cells: list[dict], n_boot: int = DEFAULT_N_BOOT, seed: int = 0):
+        self.cells = [c for c in cells if c.get("isl") and c.get("osl") and c.get("concurrency")]
+        self.coef: dict[str, np.ndarray] = {}
+        self.boot: dict[str, np.ndarray] = {}
+        rng = np.random.default_rng(seed)
+
+        for metric, (features, log_space) in CURVES.items():
+            usable = [c for c in self.cells if c.get(metric)]
+            n, p = len(usable), len(features(1, 1, 1))
+            if n < p:
+                continue
+            fit = _fit_log if log_space else _fit_relative
+            X = np.array([features(c["isl"], c["osl"], effective_concurrency(c["concurrency"], c.get("num_prompts")))
+                          for c in usable], dtype=np.float64)
+            y = np.array([c[metric] for c in usable], dtype=np.float64)
+            coef = fit(X, y)
+            self.coef[metric] = coef
+
+            # Residual bootstrap: the design (which cells were measured) is fixed, only the
+            # noise is resampled, inflated by sqrt(n / (n - p)) for the fitted degrees of freedom.
+            fitted = X @ coef
+            res = (np.log(y) - fitted) if log_space else (y - fitted) / fitted
+            res *= np.sqrt(n / max(n - p, 1))
+            boots = []
+            for idx in rng.integers(0, n, size=(n_boot, n)):
+                y_star = np.exp(fitted + res[idx]) if log_space else np.maximum(fitted * (1.0 + res[idx]), 1e-6)
+                boots.append(fit(X, y_star))
+            self.boot[metric] = np.array(boots)
+
+    @property
+    def ready(self) -> bool:
+        """All curves fitted from enough cells for the bootstrap to mean something."""
+        return len(self.cells) >= MIN_CELLS and set(CURVES) <= set(self.coef)
+
+    def _draws(self, metric: str, isl, osl, c) -> tuple[float, np.ndarray]:
+        features, log_space = CURVES[metric]
+        x = np.array(features(isl, osl, c), dtype=np.float64)
+        value, draws = float(x @ self.coef[metric]), self.boot[metric] @ x
+        if log_space:
+            return float(np.exp(value)), np.exp(draws)
+        return value, draws
+
+    def predict(self, isl: int, osl: int, concurrency: int, num_prompts: int | None = None) -> dict | None:
+        """
+        {metric: {"value", "lo", "hi"}} for one cell, or None if the curves are not fitted.
+
+        `num_prompts` is the run length the cell would be measured with; short
+        runs cap the concurrency the server actually sees.
+        """
+        if not set(CURVES) <= set(self.coef):
+            return None
+        concurrency = effective_concurrency(concurrency, num_prompts)
+        out, draws = {}, {}
+        for metric in CURVES:
+            value, draws[metric] = self._draws(metric, isl, osl, concurrency)
+            out[metric] = value
+        out["throughput_tok_s"] = littles_law_tput(isl, osl, concurrency, out["ttft_p50_ms"], out["itl_p50_ms"])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            draws["throughput_tok_s"] = littles_law_tput(
+                isl, osl, concurrency, draws["ttft_p50_ms"], draws["itl_p50_ms"])
+        result = {}
+        for metric, value in out.items():
+            d = draws[metric][np.isfinite(draws[metric])]
+            lo, hi = np.percentile(d, INTERVAL) if len(d) else (value, value)
+            result[metric] = {"value": round(value, 2), "lo": round(float(lo), 2), "hi": round(float(hi), 2)}
+        return result
+
+    def saturation_tok_s(self, isl: int, osl: int) -> dict | None:
+        """
+        Peak of the predicted tok/s curve ({"tok_s", "concurrency", "saturated"}).
+
+        The search stops at SATURATION_REACH × the highest measured concurrency;
+        `saturated` is False when the curve is still rising there.
+        """
+        if "ttft_p50_ms" not in self.coef or "itl_p50_ms" not in self.coef:
+            return None
+        top = SATURATION_REACH * max(c["concurrency"] for c in self.cells)
+        levels = np.unique(np.geomspace(1, top, 32).round())
+        tput = [littles_law_tput(isl, osl, c, self._draws("ttft_p50_ms", isl, osl, c)[0],
+                                 self._draws("itl_p50_ms", isl, osl, c)[0]) for c in levels]
+        i = int(np.argmax(tput))
+        return {"tok_s": round(float(tput[i]), 2), "concurrency": int(levels[i]), "saturated": i < len(levels) - 1}
+
+    def rel_uncertainty(self, isl: int, osl: int, concurrency: int, num_prompts: int | None = None) -> float | None:
+        """Widest relative half-width of the prediction intervals of UNCERTAINTY_METRICS."""
+        pred = self.predict(isl, osl, concurrency, num_prompts)
+        if pred is None:
+            return None
+        widths = [(pred[m]["hi"] - pred[m]["lo"]) / (2.0 * abs(pred[m]["value"]))
+                  for m in UNCERTAINTY_METRICS if pred[m]["value"]]
+        return max(widths) if widths else None
+
+    def loo_error(self) -> dict:
+        """Leave-one-out median relative error per metric (fit quality on measured cells)."""
+        errors: dict[str, list[float]] = {}
+        for i, cell in enumerate(self.cells):
+            rest = PerfModel(self.cells[:i] + self.cells[i + 1:], n_boot=1)
+            pred = rest.predict(cell["isl"], cell["osl"], cell["concurrency"], cell.get("num_prompts"))
+            if pred is None:
+                continue
+            for metric in (*CURVES, "throughput_tok_s"):
+                if cell.get(metric):
+                    errors.setdefault(metric, []).append(abs(pred[metric]["value"] - cell[metric]) / cell[metric])
+        return {m: round(float(np.median(e)), 4) for m, e in errors.items()}
+
+    def summary(self) -> dict:
+        return {
+            "n_cells": len(self.cells),
+            "coefficients": {m: [round(float(v), 6) for v in c] for m, c in self.coef.items()},
+        }
+
+
+# ── Active measurement ──
+
+def seed_cells(grid: list[tuple[int, int, int]]) -> list[tuple[int, int, int]]:
+    """Lowest and highest concurrency of every combo: the corners the curves cannot extrapolate to."""
+    combos = list(dict.fromkeys((isl, osl) for isl, osl, _ in grid))
+    seeds = []
+    for combo in combos:
+        levels = sorted(c for isl, osl, c in grid if (isl, osl) == combo)
+        seeds += [(*combo, levels[0]), (*combo, levels[-1])]
+    return list(dict.fromkeys(seeds))
+
+
+def prune_sweep(measure, grid: list[tuple[int, int, int]], known: dict | None = None,
+                tolerance: float = DEFAULT_TOLERANCE, budget: int | None = None, num_prompts=None,
+                log=print) -> dict:
+    """
+    Measure only the most informative cells of `grid` ((isl, osl, concurrency) tuples).
+
+    `measure(isl, osl, c)` runs one cell and returns its level dict or None.
+    `known` maps cells already on disk to their level dicts; they count
+    against the budget but are never re-measured. `num_prompts(isl, osl, c)`
+    gives the run length a cell is measured with (see effective_concurrency).
+
+    Returns {"model", "stop_reason", "measured", "predicted", "max_rel_uncertainty"}.
+    """
+    budget = len(grid) if budget is None else budget
+    cells = {cell: lv for cell, lv in (known or {}).items() if lv}
+    attempted = set(known or {})
+
+    def run(cell):
+        attempted.add(cell)
+        level = measure(*cell)
+        if level:
+            cells[cell] = level
+
+    def n_prompts(cell):
+        return num_prompts(*cell) if num_prompts else None
+
+    def model_of() -> PerfModel:
+        return PerfModel([{"num_prompts": n_prompts((isl, osl, c)), **lv, "isl": isl, "osl": osl, "concurrency": c}
+                          for (isl, osl, c), lv in cells.items()])
+
+    for cell in seed_cells(grid):
+        if cell not in attempted and len(attempted) < budget:
+            run(cell)
+
+    worst = None
+    while True:
+        model = model_of()
+        pending = [cell for cell in grid if cell not in attempted]
+        if not pending:
+            stop = "complete"
+            break
+        if model.ready:
+            scored = [(model.rel_uncertainty(*cell, n_prompts(cell)) or 0.0, cell) for cell in pending]
+            worst, pick = max(scored)
+            if worst <= tolerance:
+                stop = "converged"
+                break
+        else:
+            pick = pending[0]
+        if len(attempted) >= budget:
+            stop = "budget"
+            break
+        log(f"    prune: measuring ISL{pick[0]}/OSL{pick[1]} c={pick[2]}"
+            + (f" (±{worst:.0%} predicted)" if worst is not None and model.ready else ""))
+        run(pick)
+
+    predicted = []
+    for isl, osl, c in grid:
+        if (isl, osl, c) in cells:
+            continue
+        n = n_prompts((isl, osl, c))
+        pred = model.predict(isl, osl, c, n)
+        if pred is not None:
+            predicted.append({"isl": isl, "osl": osl, "concurrency": c, "num_prompts": n, **pred})
+    return {
+        "model": model,
+        "stop_reason": stop,
+        "measured": sorted(cells),
+        "predicted": predicted,
+        "max_rel_uncertainty": round(worst, 4) if worst is not None else None,
+    }
+
+
+def bench_num_prompts(family: str):
+    """
+    run_params() of scripts/<family>/bench.py as a num_prompts(isl, osl, c) callable, if that bench exists.
+
+    Older result files do not record their run length, but bench.py derives
+    it deterministically from the cell, so it can be recomputed.
+    """
+    bench = Path(__file__).resolve().parent.parent / family / "bench.py"
+    if not bench.exists():
+        return None
+    spec = importlib.util.spec_from_file_location(f"{family.replace('-', '_')}_bench", bench)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return lambda isl, osl, c: module.run_params(isl, osl, c)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit performance curves and predict unmeasured cells")
+    parser.add_argument("--family", default="qwen35-27b", help="Warehouse result family (default: qwen35-27b)")
+    parser.add_argument("--model", help="Restrict to one model")
+    parser.add_argument("--framework", required=True)
+    parser.add_argument("--quantization", required=True)
+    parser.add_argument("--technique", default="baseline")
+    parser.add_argument("--hardware", help="Restrict to one node (hardware string in the results)")
+    parser.add_argument("--predict", action="append", default=[], metavar="ISLxOSL",
+                        help="ISL/OSL combo to predict, e.g. 2048x512 (repeatable)")
+    parser.add_argument("--concurrency", default="1,8,32", help="Concurrency levels to predict (default: 1,8,32)")
+    parser.add_argument("--output", help="Write fit and predictions as JSON here")
+    args = parser.parse_args()
+
+    from results_store import ingest, query_rows
+    ingest()
+    filters = {"family": args.family, "framework": args.framework,
+               "quantization": args.quantization, "technique": args.technique}
+    for key in ("model", "hardware"):
+        if getattr(args, key):
+            filters[key] = getattr(args, key)
+    rows = [r for r in query_rows(filters) if r.get("isl") and r.get("osl")]
+    num_prompts = bench_num_prompts(args.family)
+    if num_prompts:
+        for r in rows:
+            r["num_prompts"] = num_prompts(r["isl"], r["osl"], r["concurrency"])
+    model = PerfModel(rows)
+    if not model.ready:
+        print(f"Not enough cells to fit ({len(model.cells)} < {MIN_CELLS}) for", filters)
+        raise SystemExit(1)
+
+    loo = model.loo_error()
+    print(f"Fitted on {len(model.cells)} cells; leave-one-out median relative error:")
+    for metric, err in loo.items():
+        print(f"  {metric:<18} {err:.1%}")
+
+    combos = [tuple(int(x) for x in p.lower().split("x")) for p in args.predict]
+    combos = combos or sorted({(r["isl"], r["osl"]) for r in rows})
+    levels = [int(c) for c in args.concurrency.split(",")]
+    predictions = []
+    for isl, osl in combos:
+        sat = model.saturation_tok_s(isl, osl)
+        peak = f"{sat['tok_s']} tok/s @ c={sat['concurrency']}" + ("" if sat["saturated"] else " (still rising)")
+        print(f"\n=== ISL{isl}/OSL{osl}  peak ≈ {peak} ===")
+        print(f"  {'C':>3}  {'tok/s':>20}  {'TTFT p99 ms':>22}  {'ITL p99 ms':>18}")
+        for c in levels:
+            p = model.predict(isl, osl, c)
+            predictions.append({"isl": isl, "osl": osl, "concurrency": c, **p})
+
+            def fmt(m):
+                return f"{p[m]['value']:.1f} [{p[m]['lo']:.1f}, {p[m]['hi']:.1f}]"
+            print(f"  {c:>3}  {fmt('throughput_tok_s'):>20}  {fmt('ttft_p99_ms'):>22}  {fmt('itl_p99_ms'):>18}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"filters": filters, **model.summary(), "loo_error": loo, "predictions": predictions}, f, indent=2)
+        print(f"\nPredictions saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
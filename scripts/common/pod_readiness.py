@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Event-driven pod readiness and cold-start timing.
+
+Replaces the `kubectl exec … curl /health` polling loops (one subprocess every
+15–20 s) with:
+  * a Kubernetes watch on the pod, which reports scheduling, image pull and
+    container start as they happen, and
+  * a direct HTTP probe of http://<podIP>:<port>/health with short backoff once
+    the container is running, followed by a 1-token completion.
+
+Each phase is timed relative to the pod's creationTimestamp and returned as a
+cold-start record:
+
+    scheduled → image_pulled → container_started → weights_loaded → first_completion
+
+Usage:
+    python3 pod_readiness.py --pod qwen35-27b-vllm-fp8-spark01-leader --container vllm \
+        --timeout 1800 --output results/qwen35-27b-vllm-fp8-baseline-2026-04-16.json
+
+With --output a ready pod's record is written next to the result file as
+<result>.cold-start.json, never into the result itself; bench.py folds it in
+under "cold_start" on its first save and removes it. A pod that never becomes
+ready writes nothing (and clears a stale sidecar); the record goes to stdout.
+Exit status is 0 when the server answered a completion, 1 otherwise.
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+from kubernetes import client as k8s_client, config as k8s_config, watch as k8s_watch
+
+NAMESPACE = "token-labs"
+PORT = 8000
+
+PROBE_INITIAL_S = 0.5
+PROBE_MAX_S = 5.0
+PROBE_BACKOFF = 1.5
+
+# Waiting reasons that will not resolve on their own.
+FATAL_WAITING_REASONS = {"ErrImagePull", "ImagePullBackOff", "InvalidImageName", "CreateContainerConfigError"}
+MAX_RESTARTS = 2
+
+# Suffix replacing ".json" on the result path; result discovery skips these files.
+COLD_START_SUFFIX = ".cold-start.json"
+
+
+def _load_kube_config():
+    try:
+        k8s_config.load_incluster_config()
+    except k8s_config.ConfigException:
+        k8s_config.load_kube_config()
+
+
+def _ts(dt) -> float | None:
+    return dt.timestamp() if dt else None
+
+
+class PodWatcher(threading.Thread):
+    """Follows one pod via the watch API and records lifecycle timestamps."""
+
+    def __init__(self, v1, namespace: str, pod: str, container: str, deadline: float):
+        super().__init__(name=f"watch-{pod}", daemon=True)
+        self.v1 = v1
+        self.namespace = namespace
+        self.pod = pod
+        self.container = container
+        self.deadline = deadline
+        self.created: float | None = None
+        self.scheduled: float | None = None
+        self.container_started: float | None = None
+        self.node: str | None = None
+        self.pod_ip: str | None = None
+        self.restarts = 0
+        self.failure: str | None = None
+        self.running = threading.Event()   # container is running and has an IP
+        self.finished = threading.Event()  # failure or caller asked us to stop
+        self._watch = k8s_watch.Watch()
+
+    def _observe(self, pod) -> None:
+        self.created = _ts(pod.metadata.creation_timestamp)
+        self.node = pod.spec.node_name or self.node
+        self.pod_ip = pod.status.pod_ip or self.pod_ip
+
+        for cond in pod.status.conditions or []:
+            if cond.type == "PodScheduled" and cond.status == "True":
+                self.scheduled = _ts(cond.last_transition_time)
+
+        if pod.status.phase == "Failed":
+            self.failure = f"pod phase Failed ({pod.status.reason or 'unknown reason'})"
+
+        for cs in pod.status.container_statuses or []:
+            if cs.name != self.container:
+                continue
+            self.restarts = cs.restart_count or 0
+            state = cs.state
+            if state.running:
+                self.container_started = _ts(state.running.started_at)
+            elif state.waiting and state.waiting.reason in FATAL_WAITING_REASONS:
+                self.failure = f"container waiting: {state.waiting.reason}"
+            if self.restarts > MAX_RESTARTS:
+                self.failure = f"container restarted {self.restarts} times"
+
+        if self.container_started and self.pod_ip:
+            self.running.set()
+        else:
+            self.running.clear()
+
+    def run(self) -> None:
+        resource_version = None
+        while not self.finished.is_set() and self.failure is None:
+            remaining = int(self.deadline - time.time())
+            if remaining <= 0:
+                break
+            try:
+                for event in self._watch.stream(
+                    self.v1.list_namespaced_pod,
+                    namespace=self.namespace,
+                    field_selector=f"metadata.name={self.pod}",
+                    resource_version=resource_version,
+                    timeout_seconds=min(remaining, 300),
+                ):
+                    obj = event["object"]
+                    resource_version = obj.metadata.resource_version
+                    if event["type"] == "DELETED":
+                        self.running.clear()
+                        continue
+                    self._observe(obj)
+                    if self.failure or self.finished.is_set():
+                        break
+            except k8s_client.ApiException as e:
+                if e.status == 410:          # resourceVersion too old — relist
+                    resource_version = None
+                    continue
+                time.sleep(1)
+            except Exception:
+                time.sleep(1)
+        self.finished.set()
+
+    def stop(self) -> None:
+        self.finished.set()
+        self._watch.stop()
+
+
+def image_pulled_at(v1, namespace: str, pod: str) -> tuple[float | None, str | None]:
+    """Timestamp and message of the pod's latest 'Pulled' event (one list call)."""
+    try:
+        events = v1.list_namespaced_event(
+            namespace, field_selector=f"involvedObject.name={pod},reason=Pulled"
+        ).items
+    except Exception:
+        return None, None
+    if not events:
+        return None, None
+    ev = max(events, key=lambda e: _ts(e.last_timestamp or e.event_time) or 0)
+    return _ts(ev.last_timestamp or ev.event_time), ev.message
+
+
+def probe_health(session: requests.Session, base_url: str) -> bool:
+    try:
+        return session.get(f"{base_url}/health", timeout=2).status_code == 200
+    except requests.RequestException:
+        return False
+
+
+def probe_completion(session: requests.Session, base_url: str) -> bool:
+    """Send a 1-token completion to the first served model."""
+    try:
+        models = session.get(f"{base_url}/v1/models", timeout=5).json().get("data", [])
+        if not models:
+            return False
+        r = session.post(
+            f"{base_url}/v1/completions",
+            json={"model": models[0]["id"], "prompt": "Hello", "max_tokens": 1, "temperature": 0.0},
+            timeout=60,
+        )
+        return r.status_code == 200
+    except (requests.RequestException, ValueError):
+        return False
+
+
+def wait_for_ready(pod: str, container: str, namespace: str = NAMESPACE,
+                   timeout_s: int = 1800, port: int = PORT) -> dict:
+    """
+    Block until `pod` serves a completion or `timeout_s` elapses.
+
+    Returns the cold-start record; `record["ready"]` tells whether it succeeded.
+    """
+    print(f"Waiting for {pod}/{container} (up to {timeout_s}s)...", flush=True)
+    _load_kube_config()
+    v1 = k8s_client.CoreV1Api()
+    t_begin = time.time()
+    deadline = t_begin + timeout_s
+
+    watcher = PodWatcher(v1, namespace, pod, container, deadline)
+    watcher.start()
+
+    session = requests.Session()
+    weights_loaded = first_completion = None
+    already_ready = False
+    delay = PROBE_INITIAL_S
+    first_probe = True
+    while time.time() < deadline and watcher.failure is None:
+        if not watcher.running.wait(timeout=min(5.0, max(0.0, deadline - time.time()))):
+            continue
+        base_url = f"http://{watcher.pod_ip}:{port}"
+        if probe_health(session, base_url):
+            weights_loaded = weights_loaded or time.time()
+            already_ready = already_ready or first_probe
+            if probe_completion(session, base_url):
+                first_completion = time.time()
+                break
+        first_probe = False
+        time.sleep(delay)
+        delay = min(PROBE_MAX_S, delay * PROBE_BACKOFF)
+
+    watcher.stop()
+    session.close()
+
+    pulled, pull_message = image_pulled_at(v1, namespace, pod)
+    origin = watcher.created or t_begin
+
+    def rel(t):
+        return round(t - origin, 2) if t else None
+
+    phases = {
+        "scheduled":         rel(watcher.scheduled),
+        "image_pulled":      rel(pulled),
+        "container_started": rel(watcher.container_started),
+        "weights_loaded":    rel(weights_loaded),
+        "first_completion":  rel(first_completion),
+    }
+    order = list(phases)
+    durations = {}
+    prev = 0.0
+    for name in order:
+        if phases[name] is not None:
+            durations[name] = round(phases[name] - prev, 2)
+            prev = phases[name]
+
+    record = {
+        "pod": pod,
+        "node": watcher.node,
+        "created": datetime.fromtimestamp(origin, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "ready": first_completion is not None,
+        "failure": watcher.failure,
+        "restarts": watcher.restarts,
+        "already_ready": already_ready,   # pod was up before we started waiting
+        "waited_s": round(time.time() - t_begin, 2),
+        "phases_s": phases,               # seconds since pod creation
+        "durations_s": durations,         # time spent in each phase
+        "image_pull_message": pull_message,
+    }
+
+    if record["ready"]:
+        print(f"  {pod} is ready ({phases['first_completion']}s since creation: "
+              f"pull={durations.get('image_pulled')}s  load={durations.get('weights_loaded')}s)", flush=True)
+    elif watcher.failure:
+        print(f"  {pod} failed: {watcher.failure}", flush=True)
+    else:
+        print(f"  Timed out waiting for {pod}", flush=True)
+    return record
+
+
+def cold_start_path(output_path: str) -> Path:
+    """Sidecar of a benchmark result file that holds its cold-start record until bench.py takes it."""
+    return Path(output_path).with_suffix(COLD_START_SUFFIX)
+
+
+def write_cold_start(output_path: str, record: dict) -> None:
+    """Write a ready pod's cold-start record next to the result file; drop any stale one otherwise."""
+    path = cold_start_path(output_path)
+    if not record["ready"]:
+        path.unlink(missing_ok=True)
+        return
+    with open(path, "w") as f:
+        json.dump(record, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wait for an inference pod and record cold-start timing")
+    parser.add_argument("--pod", required=True)
+    parser.add_argument("--container", required=True)
+    parser.add_argument("--namespace", default=NAMESPACE)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--timeout", type=int, default=1800, help="Seconds to wait (default: 1800)")
+    parser.add_argument("--output", help="Benchmark result JSON the record belongs to (written to <result>.cold-start.json)")
+    args = parser.parse_args()
+
+    record = wait_for_ready(args.pod, args.container, args.namespace, args.timeout, args.port)
+    if args.output:
+        write_cold_start(args.output, record)
+    if not args.output or not record["ready"]:
+        print(json.dumps(record, indent=2))
+    raise SystemExit(0 if record["ready"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+"""
+Columnar results warehouse.
+
+Normalizes every benchmark result file in results/ and docs/ into one typed
+table (one row per result × ISL/OSL combo × concurrency) stored as Parquet,
+partitioned by model and date:
+
+    results/warehouse/
+      manifest.json                          source file → sha256, normalizer version, part files
+      model_key=Qwen--Qwen3.5-27B-FP8/date=2026-04-16/<source>-<sha256[:16]>.parquet
+      ...
+
+Ingest is incremental: a source file is only re-normalized when its content
+hash or NORMALIZER_VERSION changes, and each source maps to its own part
+file, so an overnight run adds a handful of small files instead of rewriting
+the table. Parts of sources that were deleted or changed are removed.
+
+Families understood:
+  qwen35-27b   results/qwen35-27b-*.json           (bench.py: combos, dcgm, engine, accuracy)
+  sweep        results/*-isl-osl-sweep-*.json      (run_isl_osl_sweep / run_framework_sweep)
+  single       results/qwen25-7b-*-<exp>-*.json    (top-level "levels", no ISL/OSL)
+  history      docs/benchmark-history.json         (prefill / cached / decode blocks)
+  live         docs/benchmark-results.json         (live_benchmarks.experiments)
+
+Usage:
+    python3 results_store.py ingest
+    python3 results_store.py query --model Qwen/Qwen3.5-27B-FP8 --columns combo,concurrency,throughput_tok_s
+    python3 results_store.py query --family qwen35-27b --sort-by throughput_tok_s --descending --limit 5
+
+Usage (library):
+    from results_store import ingest, query_rows
+    ingest()
+    rows = query_rows({"family": "qwen35-27b", "isl": 1024})
+"""
+import argparse
+import hashlib
+import json
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+REPO = Path(__file__).resolve().parent.parent.parent
+RESULTS_DIR = REPO / "results"
+DOCS_DIR = REPO / "docs"
+WAREHOUSE_DIR = RESULTS_DIR / "warehouse"
+MANIFEST = "manifest.json"
+# Bump whenever SCHEMA or a _normalize_* function changes, so unchanged
+# sources are re-normalized on the next ingest.
+NORMALIZER_VERSION = 2
+
+# Result-shaped JSON that is not a benchmark run (summaries, accuracy reports, aggregate.py's row
+# cache). Dotfiles and pod_readiness.py's cold-start sidecars are skipped as well.
+SKIP_NAMES = {"qwen35-27b-summary.json", ".aggregate-cache.json"}
+SKIP_SUFFIXES = (".cold-start.json",)
+DOCS_SOURCES = ("benchmark-history.json", "benchmark-results.json")
+
+SCHEMA = pa.schema([
+    ("family",                  pa.string()),
+    ("model",                   pa.string()),
+    ("framework",               pa.string()),
+    ("quantization",            pa.string()),
+    ("technique",               pa.string()),
+    ("hardware",                pa.string()),
+    ("dataset",                 pa.string()),
+    ("experiment",              pa.string()),
+    ("phase",                   pa.string()),   # history only: prefill / cached / decode
+    ("timestamp",               pa.timestamp("s", tz="UTC")),
+    ("combo",                   pa.string()),
+    ("isl",                     pa.int32()),
+    ("osl",                     pa.int32()),
+    ("concurrency",             pa.int32()),
+    ("throughput_tok_s",        pa.float64()),
+    ("ttft_p50_ms",             pa.float64()),
+    ("ttft_p99_ms",             pa.float64()),
+    ("itl_p50_ms",              pa.float64()),
+    ("itl_p99_ms",              pa.float64()),
+    ("e2e_p50_ms",              pa.float64()),
+    ("requests_ok",             pa.int32()),
+    ("requests_err",            pa.int32()),
+    ("cost_per_m_tokens",       pa.float64()),
+    ("dcgm_gpu_util",           pa.float64()),
+    ("dcgm_power_w",            pa.float64()),
+    ("dcgm_energy_j",           pa.float64()),
+    ("engine_waiting_max",      pa.float64()),
+    ("engine_kv_usage_max",     pa.float64()),
+    ("engine_preemptions",      pa.float64()),
+    ("engine_prefix_hit_rate",  pa.float64()),
+    ("engine_spec_accept_rate", pa.float64()),
+    ("accuracy_prompt_strict",  pa.float64()),   # IFEval of the same config (run-level, repeated per cell)
+    ("accuracy_inst_strict",    pa.float64()),
+    ("accuracy_num_samples",    pa.int32()),
+    ("source_file",             pa.string()),
+    ("source_sha256",           pa.string()),
+])
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("model_key", pa.string()), ("date", pa.string())]), flavor="hive"
+)
+
+_DATE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})")
+
+
+# ── Normalizers ─────────────────────────────────────────────────────────────
+
+def model_key(model: str | None) -> str:
+    return (model or "unknown").replace("/", "--")
+
+
+def _parse_ts(value) -> datetime | None:
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def _date_of(d: dict, name: str) -> str:
+    for candidate in (d.get("date"), d.get("timestamp"), d.get("run_date"), name):
+        m = _DATE_RE.search(str(candidate or ""))
+        if m:
+            return m.group(1)
+    return "unknown"
+
+
+def _level_metrics(level: dict) -> dict:
+    dcgm = level.get("dcgm") or {}
+    engine = level.get("engine") or {}
+    gauges = engine.get("gauges", {})
+    return {
+        "concurrency": level.get("concurrency"),
+        "throughput_tok_s": level.get("throughput_tok_s"),
+        "ttft_p50_ms": level.get("ttft_p50_ms"),
+        "ttft_p99_ms": level.get("ttft_p99_ms"),
+        "itl_p50_ms": level.get("itl_p50_ms"),
+        "itl_p99_ms": level.get("itl_p99_ms"),
+        "e2e_p50_ms": level.get("e2e_p50_ms"),
+        "requests_ok": level.get("requests_ok", level.get("n_requests")),
+        "requests_err": level.get("requests_err", level.get("n_errors")),
+        "dcgm_gpu_util": dcgm.get("gpu_util_avg_pct"),
+        "dcgm_power_w": dcgm.get("power_avg_w"),
+        "dcgm_energy_j": dcgm.get("energy_j"),
+        "engine_waiting_max": gauges.get("waiting", {}).get("max"),
+        "engine_kv_usage_max": gauges.get("kv_cache_usage", {}).get("max"),
+        "engine_preemptions": engine.get("deltas", {}).get("preemptions"),
+        "engine_prefix_hit_rate": engine.get("derived", {}).get("prefix_cache_hit_rate"),
+        "engine_spec_accept_rate": engine.get("derived", {}).get("spec_acceptance_rate"),
+    }
+
+
+def _infer_framework(d: dict, name: str) -> str:
+    if d.get("framework"):
+        return d["framework"]
+    if d.get("runtime"):
+        return d["runtime"].split("-")[0]
+    if "-llmd-" in name:
+        return "llm-d"
+    return "vllm"
+
+
+def _infer_technique(d: dict, name: str) -> str:
+    """qwen25-7b-llmd-fp8-kv-2026-04-08.json → 'fp8-kv'."""
+    if d.get("technique"):
+        return d["technique"]
+    m = re.match(r"qwen25-7b-(?:llmd|standalone)-(.+)-\d{4}-\d{2}-\d{2}\.json$", name)
+    if m and "isl-osl-sweep" not in m.group(1):
+        return m.group(1)
+    return d.get("config") or "baseline"
+
+
+def _accuracy(d: dict) -> dict:
+    acc = d.get("accuracy") or {}
+    return {
+        "accuracy_prompt_strict": acc.get("prompt_level_accuracy"),
+        "accuracy_inst_strict": acc.get("instruction_level_accuracy"),
+        "accuracy_num_samples": acc.get("num_samples"),
+    }
+
+
+def _normalize_combos(d: dict, name: str, family: str) -> list[dict]:
+    base = {
+        "family": family,
+        "model": d.get("model"),
+        "framework": _infer_framework(d, name),
+        "quantization": d.get("quantization"),
+        "technique": _infer_technique(d, name),
+        "hardware": d.get("hardware"),
+        "dataset": d.get("dataset"),
+        "experiment": d.get("experiment"),
+        "timestamp": _parse_ts(d.get("timestamp")),
+        **_accuracy(d),
+    }
+    rows = []
+    for combo_key, combo in d.get("combos", {}).items():
+        for level in combo.get("levels", []):
+            rows.append({
+                **base,
+                "combo": combo_key,
+                "isl": combo.get("isl"),
+                "osl": combo.get("osl"),
+                **_level_metrics(level),
+            })
+    return rows
+
+
+def _normalize_single(d: dict, name: str) -> list[dict]:
+    base = {
+        "family": "single",
+        "model": d.get("model"),
+        "framework": _infer_framework(d, name),
+        "technique": _infer_technique(d, name),
+        "experiment": d.get("experiment"),
+        "timestamp": _parse_ts(d.get("timestamp")),
+    }
+    return [{**base, **_level_metrics(level)} for level in d.get("levels", [])]
+
+
+def _normalize_history(entries: list) -> list[dict]:
+    rows = []
+    for entry in entries:
+        base = {
+            "family": "history",
+            "model": entry.get("model"),
+            "framework": "vllm",
+            "technique": entry.get("image_tag"),
+            "timestamp": _parse_ts(entry.get("timestamp")),
+        }
+        for phase in ("prefill", "cached", "decode"):
+            block = entry.get(phase) or {}
+            lat = block.get("latency") or {}
+            if not block.get("tokens_per_second"):
+                continue   # phase was not run (all-zero block)
+            rows.append({
+                **base,
+                "phase": phase,
+                "throughput_tok_s": block.get("tokens_per_second"),
+                "cost_per_m_tokens": block.get("cost_per_million_tokens"),
+                "ttft_p50_ms": lat.get("median_ttft_ms"),
+                "ttft_p99_ms": lat.get("p99_ttft_ms"),
+                "itl_p50_ms": lat.get("median_itl_ms"),
+                "itl_p99_ms": lat.get("p99_itl_ms"),
+            })
+    return rows
+
+
+def _normalize_live(d: dict) -> list[dict]:
+    live = d.get("live_benchmarks") or {}
+    ts = _parse_ts(live.get("run_date"))
+    rows = []
+    for exp in live.get("experiments", []):
+        if exp.get("status") != "completed":
+            continue
+        rows.append({
+            "family": "live",
+            "model": exp.get("model"),
+            "framework": exp.get("framework"),
+            "experiment": exp.get("id"),
+            "hardware": exp.get("node"),
+            "timestamp": ts,
+            "osl": exp.get("max_tokens", live.get("osl_tokens")),
+            "concurrency": live.get("concurrency", 1),
+            "throughput_tok_s": exp.get("throughput_tok_s"),
+            "ttft_p50_ms": exp.get("ttft_p50_ms"),
+            "ttft_p99_ms": exp.get("ttft_p99_ms"),
+            "itl_p50_ms": exp.get("itl_p50_ms"),
+            "itl_p99_ms": exp.get("itl_p99_ms"),
+            "requests_ok": exp.get("n_requests"),
+            "requests_err": exp.get("errors"),
+        })
+    return rows
+
+
+def normalize(path: Path, data) -> list[dict]:
+    """Turn one parsed result file into warehouse rows (empty if not a benchmark)."""
+    name = path.name
+    if isinstance(data, list):
+        return _normalize_history(data) if name == "benchmark-history.json" else []
+    if not isinstance(data, dict):
+        return []
+    if "live_benchmarks" in data:
+        return _normalize_live(data)
+    if "combos" in data:
+        family = "qwen35-27b" if name.startswith("qwen35-27b-") else "sweep"
+        return _normalize_combos(data, name, family)
+    if isinstance(data.get("levels"), list):
+        return _normalize_single(data, name)
+    return []
+
+
+# ── Ingest ──────────────────────────────────────────────────────────────────
+
+def discover_sources(results_dir: Path = RESULTS_DIR, docs_dir: Path = DOCS_DIR) -> list[Path]:
+    sources = [p for p in sorted(results_dir.glob("*.json"))
+               if p.name not in SKIP_NAMES and not p.name.startswith(".") and not p.name.endswith(SKIP_SUFFIXES)]
+    sources += [docs_dir / n for n in DOCS_SOURCES if (docs_dir / n).exists()]
+    return sources
+
+
+_SAFE_NAME = re.compile(r"[^A-Za-z0-9._-]")
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _load_manifest(warehouse: Path) -> dict:
+    try:
+        with open(warehouse / MANIFEST) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _save_manifest(warehouse: Path, manifest: dict) -> None:
+    tmp = warehouse / (MANIFEST + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    tmp.replace(warehouse / MANIFEST)
+
+
+def _drop_parts(warehouse: Path, parts: list[str]) -> None:
+    for rel in parts:
+        p = warehouse / rel
+        p.unlink(missing_ok=True)
+        for parent in (p.parent, p.parent.parent):   # date=…, model_key=…
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+
+
+def _write_parts(warehouse: Path, rows: list[dict], source: str, sha: str) -> list[str]:
+    """Write one Parquet file per (model_key, date) partition for this source."""
+    by_partition: dict[tuple[str, str], list[dict]] = {}
+    for row in rows:
+        row["source_file"] = source
+        row["source_sha256"] = sha
+        key = (model_key(row.get("model")), row.pop("_date"))
+        by_partition.setdefault(key, []).append(row)
+
+    parts = []
+    for (mkey, date), part_rows in sorted(by_partition.items()):
+        rel = f"model_key={mkey}/date={date}/{_SAFE_NAME.sub('-', source)}-{sha[:16]}.parquet"
+        out = warehouse / rel
+        out.parent.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pylist(part_rows, schema=SCHEMA)
+        pq.write_table(table, out, compression="zstd")
+        parts.append(rel)
+    return parts
+
+
+def ingest(results_dir: Path = RESULTS_DIR, docs_dir: Path = DOCS_DIR,
+           warehouse: Path = WAREHOUSE_DIR, verbose: bool = False) -> dict:
+    """
+    Bring the warehouse up to date with the result files on disk.
+
+    Returns counts: {"added", "updated", "removed", "unchanged", "rows_written"}.
+    """
+    warehouse.mkdir(parents=True, exist_ok=True)
+    manifest = _load_manifest(warehouse)
+    stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "rows_written": 0}
+    seen = set()
+
+    for path in discover_sources(results_dir, docs_dir):
+        source = f"{path.parent.name}/{path.name}"
+        seen.add(source)
+        raw = path.read_bytes()
+        sha = _sha256(raw)
+        entry = manifest.get(source)
+        if entry and entry["sha256"] == sha and entry.get("version") == NORMALIZER_VERSION:
+            stats["unchanged"] += 1
+            continue
+
+        try:
+            data = json.loads(raw)
+        except ValueError as e:
+            print(f"WARN: could not parse {source}: {e}")
+            continue
+        rows = normalize(path, data)
+        date = _date_of(data if isinstance(data, dict) else {}, path.name)
+        for row in rows:
+            ts = row.get("timestamp")
+            row["_date"] = ts.strftime("%Y-%m-%d") if ts else date
+
+        if entry:
+            _drop_parts(warehouse, entry["parts"])
+        parts = _write_parts(warehouse, rows, source, sha) if rows else []
+        manifest[source] = {
+            "sha256": sha,
+            "version": NORMALIZER_VERSION,
+            "parts": parts,
+            "rows": len(rows),
+            "ingested_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+        stats["updated" if entry else "added"] += 1
+        stats["rows_written"] += len(rows)
+        if verbose:
+            print(f"  {'updated' if entry else 'added':<8} {source}: {len(rows)} rows")
+
+    for source in sorted(set(manifest) - seen):
+        _drop_parts(warehouse, manifest.pop(source)["parts"])
+        stats["removed"] += 1
+        if verbose:
+            print(f"  removed  {source}")
+
+    _save_manifest(warehouse, manifest)
+    return stats
+
+
+# ── Query ───────────────────────────────────────────────────────────────────
+
+def dataset(warehouse: Path = WAREHOUSE_DIR) -> ds.Dataset:
+    return ds.dataset(
+        str(warehouse), format="parquet", partitioning=PARTITIONING,
+        schema=pa.unify_schemas([SCHEMA, PARTITIONING.schema]),
+        exclude_invalid_files=True, ignore_prefixes=[".", "_", MANIFEST],
+    )
+
+
+def _filter_expression(filters: dict | None):
+    """{"framework": "vllm", "isl": [1024, 2048]} → pyarrow filter expression."""
+    expr = None
+    for col, value in (filters or {}).items():
+        if col == "model":
+            col, value = "model_key", (
+                [model_key(v) for v in value] if isinstance(value, (list, tuple, set)) else model_key(value))
+        field = ds.field(col)
+        if isinstance(value, (list, tuple, set)):
+            term = field.isin(list(value))
+        elif value is None:
+            term = field.is_null()
+        else:
+            term = field == value
+        expr = term if expr is None else expr & term
+    return expr
+
+
+def load_table(filters: dict | None = None, columns: list[str] | None = None,
+               warehouse: Path = WAREHOUSE_DIR) -> pa.Table:
+    """
+    Read the warehouse as an Arrow table.
+
+    `filters` maps column → value or list of values (AND across columns);
+    filtering on `model` or `date` prunes whole partitions without opening
+    their files. `columns` projects to a subset of columns.
+    """
+    if not (warehouse / MANIFEST).exists():
+        return SCHEMA.empty_table() if columns is None else pa.schema(
+            [SCHEMA.field(c) for c in columns if c in SCHEMA.names]).empty_table()
+    return dataset(warehouse).to_table(columns=columns, filter=_filter_expression(filters))
+
+
+def query_rows(filters: dict | None = None, columns: list[str] | None = None,
+               warehouse: Path = WAREHOUSE_DIR, sort_by: str | None = None,
+               descending: bool = False) -> list[dict]:
+    """Like load_table, but returns plain row dicts (None for missing values)."""
+    table = load_table(filters, columns, warehouse)
+    if sort_by:
+        order = "descending" if descending else "ascending"
+        table = table.take(pc.sort_indices(table, sort_keys=[(sort_by, order)]))
+    return table.to_pylist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar warehouse for benchmark results")
+    parser.add_argument("--warehouse", default=str(WAREHOUSE_DIR))
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_ingest = sub.add_parser("ingest", help="Normalize new/changed result files into Parquet")
+    p_ingest.add_argument("--results-dir", default=str(RESULTS_DIR))
+    p_ingest.add_argument("--docs-dir", default=str(DOCS_DIR))
+
+    p_query = sub.add_parser("query", help="Print matching rows as JSON lines")
+    p_query.add_argument("--family")
+    p_query.add_argument("--model")
+    p_query.add_argument("--framework")
+    p_query.add_argument("--date")
+    p_query.add_argument("--columns", help="Comma-separated column list")
+    p_query.add_argument("--sort-by")
+    order = p_query.add_mutually_exclusive_group()
+    order.add_argument("--ascending", dest="descending", action="store_false", help="Sort ascending (default)")
+    order.add_argument("--descending", dest="descending", action="store_true")
+    p_query.set_defaults(descending=False)
+    p_query.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    warehouse = Path(args.warehouse)
+    if args.cmd == "ingest":
+        stats = ingest(Path(args.results_dir), Path(args.docs_dir), warehouse, verbose=True)
+        print(f"Ingest: {stats['added']} added, {stats['updated']} updated, {stats['removed']} removed, "
+              f"{stats['unchanged']} unchanged ({stats['rows_written']} rows written) → {warehouse}")
+        return
+
+    filters = {k: v for k in ("family", "model", "framework", "date") if (v := getattr(args, k))}
+    columns = args.columns.split(",") if args.columns else None
+    rows = query_rows(filters, columns, warehouse, sort_by=args.sort_by, descending=args.descending)
+    for row in rows[:args.limit]:
+        print(json.dumps(row, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Persistent per-file row cache with incrementally maintained rankings.
+
+Aggregation scripts flatten every result JSON into rows on each run. During
+overnight runs the summary is regenerated after every cell, so the cost grows
+with the number of result files. RowCache keeps the flattened rows of each
+file in a JSON cache keyed by path, mtime, size and sha256:
+
+  * mtime + size unchanged      → rows reused without reading the file
+  * mtime changed, same sha256  → rows reused (file was touched / copied)
+  * content changed             → file re-parsed, its rows replaced
+
+Rankings are sorted indexes over the cached rows. Only rows of new, changed
+or deleted files are inserted/removed (bisect), the rest keep their order.
+
+Usage (library):
+    from row_cache import RowCache
+    cache = RowCache(results_dir / ".aggregate-cache.json", extract=file_rows, version=3,
+                     rankings={"throughput": ("throughput_tok_s", True, None)})
+    cache.refresh(sorted(results_dir.glob("qwen35-27b-*.json")))
+    rows = cache.rows()
+    best = cache.ranked("throughput")
+    cache.save()
+"""
+import bisect
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class RankedIndex:
+    """Rows sorted by one field; ties keep file (path) order, then row order within the file."""
+
+    def __init__(self, field: str, descending: bool, predicate=None):
+        self.field = field
+        self.descending = descending
+        self.predicate = predicate
+        self._keys: list[tuple] = []
+        self._rows: list[dict] = []
+
+    def _key(self, row: dict, path: str, row_pos: int) -> tuple:
+        value = row[self.field]
+        return (-value if self.descending else value, path, row_pos)
+
+    def accepts(self, row: dict) -> bool:
+        return row.get(self.field) is not None and (self.predicate is None or self.predicate(row))
+
+    def add(self, row: dict, path: str, row_pos: int) -> None:
+        if not self.accepts(row):
+            return
+        key = self._key(row, path, row_pos)
+        i = bisect.bisect_left(self._keys, key)
+        self._keys.insert(i, key)
+        self._rows.insert(i, row)
+
+    def remove_file(self, path: str) -> None:
+        keep = [i for i, k in enumerate(self._keys) if k[1] != path]
+        if len(keep) != len(self._keys):
+            self._keys = [self._keys[i] for i in keep]
+            self._rows = [self._rows[i] for i in keep]
+
+    def refs(self) -> list[list]:
+        return [[k[1], k[2]] for k in self._keys]
+
+    def restore(self, refs: list[list], files: dict) -> bool:
+        """Rebuild from a persisted order without sorting; False if it no longer matches `files`."""
+        keys, rows = [], []
+        for path, row_pos in refs:
+            entry = files.get(path)
+            if entry is None or row_pos >= len(entry["rows"]):
+                return False
+            row = entry["rows"][row_pos]
+            if not self.accepts(row):
+                return False
+            keys.append(self._key(row, path, row_pos))
+            rows.append(row)
+        self._keys, self._rows = keys, rows
+        return True
+
+    def rows(self) -> list[dict]:
+        return list(self._rows)
+
+
+class RowCache:
+    """
+    `extract(path, data) -> (rows, extras)` flattens one parsed result file.
+    `extras` is any JSON-serializable side data (e.g. adaptive-ladder knees).
+    `version` must be bumped whenever `extract` changes its output.
+    `rankings` maps name → (field, descending, predicate).
+    """
+
+    def __init__(self, cache_path: Path, extract, version: int, rankings: dict | None = None):
+        self.cache_path = Path(cache_path)
+        self.extract = extract
+        self.version = version
+        self.files: dict[str, dict] = {}
+        self.stats = {"reused": 0, "rehashed": 0, "parsed": 0, "removed": 0, "errors": 0}
+        self.indexes = {name: RankedIndex(*spec) for name, spec in (rankings or {}).items()}
+        self._dirty = False
+        self._load()
+
+    # ── persistence ──
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if cached.get("version") != self.version:
+            return
+        self.files = cached.get("files", {})
+        persisted = cached.get("rankings", {})
+        for name, index in self.indexes.items():
+            if name not in persisted or not index.restore(persisted[name], self.files):
+                self._rebuild(index)
+
+    def _rebuild(self, index: RankedIndex) -> None:
+        index._keys, index._rows = [], []
+        for path in sorted(self.files):
+            for i, row in enumerate(self.files[path]["rows"]):
+                index.add(row, path, i)
+        self._dirty = True
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        tmp = self.cache_path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump({
+                "version": self.version,
+                "files": self.files,
+                "rankings": {name: index.refs() for name, index in self.indexes.items()},
+            }, f)
+        tmp.replace(self.cache_path)
+        self._dirty = False
+
+    # ── refresh ──
+
+    def _drop(self, path: str) -> None:
+        self.files.pop(path, None)
+        for index in self.indexes.values():
+            index.remove_file(path)
+        self._dirty = True
+
+    def refresh(self, paths: list[Path]) -> None:
+        """Bring the cache up to date with `paths` (the current set of result files)."""
+        current = {str(p) for p in paths}
+        for path in sorted(set(self.files) - current):
+            self._drop(path)
+            self.stats["removed"] += 1
+
+        for path in paths:
+            key = str(path)
+            st = os.stat(path)
+            entry = self.files.get(key)
+            if entry and entry["mtime"] == st.st_mtime and entry["size"] == st.st_size:
+                self.stats["reused"] += 1
+                continue
+            sha = _sha256(path)
+            if entry and entry["sha256"] == sha:
+                entry.update(mtime=st.st_mtime, size=st.st_size)
+                self.stats["rehashed"] += 1
+                self._dirty = True
+                continue
+            if entry:
+                self._drop(key)
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"WARN: could not load {path}: {e}")
+                self.stats["errors"] += 1
+                continue
+            rows, extras = self.extract(key, data)
+            self.files[key] = {"mtime": st.st_mtime, "size": st.st_size, "sha256": sha,
+                               "rows": rows, "extras": extras}
+            for i, row in enumerate(rows):
+                for index in self.indexes.values():
+                    index.add(row, key, i)
+            self.stats["parsed"] += 1
+            self._dirty = True
+
+    # ── access ──
+
+    def rows(self) -> list[dict]:
+        return [row for path in sorted(self.files) for row in self.files[path]["rows"]]
+
+    def extras(self) -> list:
+        return [self.files[path]["extras"] for path in sorted(self.files)]
+
+    def ranked(self, name: str) -> list[dict]:
+        return self.indexes[name].rows()
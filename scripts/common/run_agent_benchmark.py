@@ -4,14 +4,20 @@ Agent Workload Benchmark
 Benchmarks LLM inference under agentic patterns: multi-turn KV cache reuse,
 tool call overhead, and concurrent session throughput.
 
+The prefix_affinity scenario runs many concurrent sessions, each with its own
+long context, against a multi-replica endpoint (e.g. the model aggregator in
+proxy mode). It reports follow-up-turn TTFT and how often a session stayed on
+one replica. Run it once per routing policy to compare.
+
 Usage:
     python3 run_agent_benchmark.py --url http://192.168.1.204:8000 --model Qwen/Qwen2.5-7B-Instruct
     python3 run_agent_benchmark.py --url http://192.168.1.204:8000 --concurrency 1 4 8 --turns 5
+    python3 run_agent_benchmark.py --url http://model-aggregator:8000 --scenarios prefix_affinity \
+        --affinity-sessions 32 --context-tokens 2000
 """
 import argparse
 import asyncio
 import json
-import statistics
 import time
 from datetime import datetime, timezone
 from typing import Any
@@ -19,6 +25,8 @@ from typing import Any
 import httpx
 from tqdm import tqdm
 
+from latency_stats import bootstrap_ci, pct, percentiles, ragged_to_matrix
+
 # ---------------------------------------------------------------------------
 # Prompts / fixtures
 # ---------------------------------------------------------------------------
@@ -117,6 +125,8 @@ TOOL_RESULTS = {
     "calculator": "541471",
 }
 
+SCENARIOS = ["multiturn", "tools", "concurrent", "prefix_affinity"]
+
 # ---------------------------------------------------------------------------
 # HTTP helpers
 # ---------------------------------------------------------------------------
@@ -153,10 +163,12 @@ async def chat_completion_stream(
     max_tokens: int = 80,
     tools: list[dict] | None = None,
     tool_choice: str | None = None,
+    response_headers: dict | None = None,
 ) -> tuple[float, float, int]:
     """
     Send a streaming chat completion request.
     Returns (ttft_ms, total_ms, token_count_approx).
+    If `response_headers` is given it is filled with the response headers.
     """
     payload: dict[str, Any] = {
         "model": model,
@@ -183,6 +195,8 @@ async def chat_completion_stream(
                 f"HTTP {resp.status_code}", request=resp.request, response=resp
             )
         resp.raise_for_status()
+        if response_headers is not None:
+            response_headers.update(resp.headers)
 
         async for raw_line in resp.aiter_lines():
             if not raw_line.startswith("data:"):
@@ -322,14 +336,9 @@ async def scenario_multiturn_kv_reuse(
         all_ttfts_by_turn.append(session_ttfts)
         pbar.update(turns)
 
-    # Aggregate: per-turn p50 across sessions
-    ttft_p50_by_turn = []
-    for turn_idx in range(turns):
-        vals = [
-            s[turn_idx] for s in all_ttfts_by_turn
-            if turn_idx < len(s) and not (s[turn_idx] != s[turn_idx])  # filter NaN
-        ]
-        ttft_p50_by_turn.append(round(statistics.median(vals), 1) if vals else None)
+    # Aggregate: per-turn p50 across sessions ([session, turn] matrix, NaN = failed turn)
+    by_turn = ragged_to_matrix(all_ttfts_by_turn)
+    ttft_p50_by_turn = [pct(by_turn[:, t], 50, 1) if t < by_turn.shape[1] else None for t in range(turns)]
 
     # KV reuse speedup: turn 1 vs last turn p50
     t1 = ttft_p50_by_turn[0] if ttft_p50_by_turn else None
@@ -436,8 +445,8 @@ async def scenario_tool_call_overhead(
     tool_latencies = [r["tool_call_latency_ms"] for r in results if r.get("tool_call_latency_ms")]
     post_ttfts = [r["post_tool_ttft_ms"] for r in results if r.get("post_tool_ttft_ms") is not None]
 
-    tool_p50 = round(statistics.median(tool_latencies), 1) if tool_latencies else None
-    post_p50 = round(statistics.median(post_ttfts), 1) if post_ttfts else None
+    tool_p50 = pct(tool_latencies, 50, 1)
+    post_p50 = pct(post_ttfts, 50, 1)
     overhead = round(tool_p50 - post_p50, 1) if (tool_p50 and post_p50) else None
 
     return {
@@ -504,35 +513,120 @@ async def run_concurrent_sessions(
         total_tokens += sess_tokens
 
     tput = round(total_tokens / t_wall, 1) if t_wall > 0 else 0
-    ttft_p50 = round(statistics.median(ttfts_all), 1) if ttfts_all else None
-    ttfts_sorted = sorted(ttfts_all)
-    p95_idx = int(len(ttfts_sorted) * 0.95)
-    ttft_p95 = round(ttfts_sorted[min(p95_idx, len(ttfts_sorted) - 1)], 1) if ttfts_sorted else None
+    ttft = percentiles(ttfts_all, (50, 95), digits=1)
 
     return {
         "concurrency": concurrency,
         "tput_tok_s": tput,
-        "ttft_p50_ms": ttft_p50,
-        "ttft_p95_ms": ttft_p95,
+        "ttft_p50_ms": ttft["p50"],
+        "ttft_p95_ms": ttft["p95"],
+        "ttft_p50_ci_ms": bootstrap_ci(ttfts_all, 50, digits=1),
         "n_sessions": n_sessions,
         "total_tokens": total_tokens,
         "wall_time_s": round(t_wall, 2),
     }
 
 
+# ---------------------------------------------------------------------------
+# Scenario D: Prefix affinity across replicas
+# ---------------------------------------------------------------------------
+
+def session_context(session_id: int, n_tokens: int) -> str:
+    """Deterministic per-session document of ~n_tokens tokens (~4 chars/token)."""
+    lines = []
+    i = 0
+    while sum(len(l) + 1 for l in lines) < n_tokens * 4:
+        lines.append(f"[session {session_id} note {i}] Ticket {session_id * 7919 + i} reports step {i % 13} "
+                     f"of pipeline {session_id % 17} took {(i * 37) % 900 + 100} ms on node {i % 5}.")
+        i += 1
+    return "\n".join(lines)
+
+
+async def scenario_prefix_affinity(
+    base_url: str,
+    model: str,
+    turns: int,
+    n_sessions: int,
+    context_tokens: int,
+    client: httpx.AsyncClient,
+    pbar: tqdm,
+) -> dict:
+    """
+    Concurrent sessions with distinct long prefixes. Follow-up turns are fast
+    only if they land on the replica that cached the session's prefix.
+    """
+    turn_prompts = (TURNS_SCRIPT * ((turns // len(TURNS_SCRIPT)) + 1))[:turns]
+
+    async def session(sid: int) -> tuple[list[float], list[str | None], list[str]]:
+        context = session_context(sid, context_tokens)
+        messages = [{"role": "system", "content": SYSTEM_PROMPT_MULTITURN}]
+        ttfts, replicas, decisions = [], [], []
+        for i, user_msg in enumerate(turn_prompts):
+            content = f"Session notes:\n{context}\n\n{user_msg}" if i == 0 else user_msg
+            messages.append({"role": "user", "content": content})
+            headers: dict = {}
+            try:
+                ttft_ms, _, _ = await chat_completion_stream(
+                    client, base_url, model, messages, max_tokens=80, response_headers=headers
+                )
+                ttfts.append(ttft_ms)
+                replicas.append(headers.get("x-token-labs-replica", "?"))
+                decisions.append(headers.get("x-token-labs-routing", "?"))
+            except Exception:
+                ttfts.append(float("nan"))
+                replicas.append(None)
+            messages.append({"role": "assistant", "content": f"[turn {i+1}]"})
+            pbar.update(1)
+        return ttfts, replicas, decisions
+
+    results = await asyncio.gather(*(session(sid) for sid in range(n_sessions)))
+
+    by_turn = ragged_to_matrix([r[0] for r in results])
+    followups = [t for r in results for t in r[0][1:] if t == t]
+    sticky = [rep == r[1][0] for r in results for rep in r[1][1:] if rep is not None and r[1][0] is not None]
+    decisions: dict[str, int] = {}
+    for r in results:
+        for d in r[2]:
+            decisions[d] = decisions.get(d, 0) + 1
+    followup = percentiles(followups, (50, 95), digits=1)
+
+    return {
+        "sessions": n_sessions,
+        "turns": turns,
+        "context_tokens": context_tokens,
+        "ttft_by_turn_p50_ms": [pct(by_turn[:, t], 50, 1) for t in range(by_turn.shape[1])],
+        "followup_ttft_p50_ms": followup["p50"],
+        "followup_ttft_p95_ms": followup["p95"],
+        "followup_ttft_p50_ci_ms": bootstrap_ci(followups, 50, digits=1),
+        "same_replica_rate": round(sum(sticky) / len(sticky), 3) if sticky else None,
+        "replicas_seen": len({rep for r in results for rep in r[1] if rep is not None}),
+        "routing_decisions": decisions,
+    }
+
+
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
 
 def print_summary(results: dict) -> None:
     s = results["scenarios"]
-    mt = s.get("multiturn_kv_reuse", {})
-    tc = s.get("tool_call_overhead", {})
-    cs = s.get("concurrent_sessions", [])
+    mt = s.get("multiturn_kv_reuse")
+    tc = s.get("tool_call_overhead")
+    cs = s.get("concurrent_sessions")
+    pa = s.get("prefix_affinity")
 
     print("\n=== Agent Workload Benchmark Results ===\n")
+    if mt is not None:
+        _print_multiturn(mt)
+    if tc is not None:
+        _print_tool_calls(tc)
+    if cs is not None:
+        _print_concurrent(cs)
+    if pa is not None:
+        _print_prefix_affinity(pa)
 
-    # Multi-turn
+
+def _print_multiturn(mt: dict) -> None:
     turns = mt.get("turns", "?")
     sessions = mt.get("sessions", "?")
     ttfts = mt.get("ttft_by_turn_p50_ms", [])
@@ -544,7 +638,8 @@ def print_summary(results: dict) -> None:
     print(f"  KV reuse speedup: {speedup}x")
     print()
 
-    # Tool call
+
+def _print_tool_calls(tc: dict) -> None:
     n = tc.get("n", "?")
     gen_ms = tc.get("tool_call_generation_ms", "?")
     post_ms = tc.get("post_tool_ttft_p50_ms", "?")
@@ -556,7 +651,8 @@ def print_summary(results: dict) -> None:
     print(f"  Tool call overhead vs direct: {overhead_str}")
     print()
 
-    # Concurrent sessions
+
+def _print_concurrent(cs: list) -> None:
     print("Concurrent Agent Sessions:")
     for entry in cs:
         c = entry.get("concurrency", "?")
@@ -567,6 +663,16 @@ def print_summary(results: dict) -> None:
     print()
 
 
+def _print_prefix_affinity(pa: dict) -> None:
+    print(f"Prefix Affinity ({pa['sessions']} sessions x {pa['turns']} turns, "
+          f"~{pa['context_tokens']} context tokens):")
+    print(f"  Turn 1 TTFT p50: {pa['ttft_by_turn_p50_ms'][0]}ms")
+    print(f"  Follow-up TTFT p50={pa['followup_ttft_p50_ms']}ms, p95={pa['followup_ttft_p95_ms']}ms")
+    print(f"  Same replica as turn 1: {pa['same_replica_rate']}  ({pa['replicas_seen']} replicas seen)")
+    print(f"  Routing decisions: {pa['routing_decisions']}")
+    print()
+
+
 async def main_async(args: argparse.Namespace) -> None:
     concurrency_levels = args.concurrency
     turns = args.turns
@@ -575,11 +681,14 @@ async def main_async(args: argparse.Namespace) -> None:
     n_multiturn_sessions = 10
     n_tool_samples = 20
 
+    scenarios = set(args.scenarios)
+
     # Total progress steps (rough)
     total_steps = (
-        n_multiturn_sessions * turns  # scenario A
-        + n_tool_samples               # scenario B
-        + sum(c * 2 * turns for c in concurrency_levels)  # scenario C
+        ("multiturn" in scenarios) * n_multiturn_sessions * turns  # scenario A
+        + ("tools" in scenarios) * n_tool_samples                  # scenario B
+        + ("concurrent" in scenarios) * sum(max(c * 2, 4) * turns for c in concurrency_levels)  # scenario C
+        + ("prefix_affinity" in scenarios) * args.affinity_sessions * turns  # scenario D
     )
 
     results: dict[str, Any] = {
@@ -595,28 +704,38 @@ async def main_async(args: argparse.Namespace) -> None:
         with tqdm(total=total_steps, desc="Benchmarking", unit="req") as pbar:
 
             # --- Scenario A ---
-            pbar.set_description("Scenario A: Multi-turn KV reuse")
-            mt_result = await scenario_multiturn_kv_reuse(
-                args.url, args.model, turns, n_multiturn_sessions, client, pbar
-            )
-            results["scenarios"]["multiturn_kv_reuse"] = mt_result
+            if "multiturn" in scenarios:
+                pbar.set_description("Scenario A: Multi-turn KV reuse")
+                mt_result = await scenario_multiturn_kv_reuse(
+                    args.url, args.model, turns, n_multiturn_sessions, client, pbar
+                )
+                results["scenarios"]["multiturn_kv_reuse"] = mt_result
 
             # --- Scenario B ---
-            pbar.set_description("Scenario B: Tool call overhead")
-            tc_result = await scenario_tool_call_overhead(
-                args.url, args.model, n_tool_samples, client, pbar
-            )
-            results["scenarios"]["tool_call_overhead"] = tc_result
+            if "tools" in scenarios:
+                pbar.set_description("Scenario B: Tool call overhead")
+                tc_result = await scenario_tool_call_overhead(
+                    args.url, args.model, n_tool_samples, client, pbar
+                )
+                results["scenarios"]["tool_call_overhead"] = tc_result
 
             # --- Scenario C ---
-            concurrent_results = []
-            for c in concurrency_levels:
-                pbar.set_description(f"Scenario C: c={c} concurrent sessions")
-                cs_result = await run_concurrent_sessions(
-                    args.url, args.model, c, turns, client, pbar
+            if "concurrent" in scenarios:
+                concurrent_results = []
+                for c in concurrency_levels:
+                    pbar.set_description(f"Scenario C: c={c} concurrent sessions")
+                    cs_result = await run_concurrent_sessions(
+                        args.url, args.model, c, turns, client, pbar
+                    )
+                    concurrent_results.append(cs_result)
+                results["scenarios"]["concurrent_sessions"] = concurrent_results
+
+            # --- Scenario D ---
+            if "prefix_affinity" in scenarios:
+                pbar.set_description("Scenario D: Prefix affinity")
+                results["scenarios"]["prefix_affinity"] = await scenario_prefix_affinity(
+                    args.url, args.model, turns, args.affinity_sessions, args.context_tokens, client, pbar
                 )
-                concurrent_results.append(cs_result)
-            results["scenarios"]["concurrent_sessions"] = concurrent_results
 
     # Save JSON
     if args.output:
@@ -655,6 +774,25 @@ def main() -> None:
         default=5,
         help="Number of turns per conversation (default: 5)",
     )
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=SCENARIOS,
+        default=["multiturn", "tools", "concurrent"],
+        help="Scenarios to run (default: multiturn tools concurrent)",
+    )
+    parser.add_argument(
+        "--affinity-sessions",
+        type=int,
+        default=32,
+        help="Concurrent sessions for the prefix_affinity scenario (default: 32)",
+    )
+    parser.add_argument(
+        "--context-tokens",
+        type=int,
+        default=2000,
+        help="Per-session context length for the prefix_affinity scenario (default: 2000)",
+    )
     parser.add_argument(
         "--output",
         default=None,
@@ -15,6 +15,8 @@ import subprocess
 import sys
 from datetime import datetime, timezone
 
+from pod_readiness import wait_for_ready
+
 MODEL     = "Qwen/Qwen2.5-7B-Instruct"
 BASE_URL  = "http://localhost:8000"
 NAMESPACE = "token-labs"
@@ -43,25 +45,6 @@ def run_params(isl, osl, concurrency):
     return n, timeout
 
 
-def wait_for_ready(pod, container, timeout_s=600):
-    print(f"Waiting for {pod} to be ready...", flush=True)
-    deadline = datetime.now().timestamp() + timeout_s
-    while datetime.now().timestamp() < deadline:
-        result = subprocess.run(
-            ["kubectl", "exec", "-n", NAMESPACE, pod, "-c", container, "--",
-             "curl", "-sf", "http://localhost:8000/health"],
-            capture_output=True, text=True, timeout=15
-        )
-        if result.returncode == 0:
-            print(f"  {pod} is ready.", flush=True)
-            return True
-        remaining = int(deadline - datetime.now().timestamp())
-        print(f"  Not ready yet ({remaining}s remaining)...", flush=True)
-        import time; time.sleep(15)
-    print(f"  Timed out waiting for {pod}", flush=True)
-    return False
-
-
 def get_pod_ip(pod):
     r = subprocess.run(
         ["kubectl", "get", "pod", "-n", NAMESPACE, pod, "-o", "jsonpath={.status.podIP}"],
@@ -134,16 +117,20 @@ def main():
         results = existing.get("combos", {})
         print(f"Resuming from {output_path}", flush=True)
     except FileNotFoundError:
+        existing = {}
         results = {}
 
     total = len(COMBOS) * len(CONCURRENCY_LEVELS)
     done  = sum(len(v["levels"]) for v in results.values())
     print(f"Starting at {done}/{total}", flush=True)
 
-    # Wait for pod ready
-    if not wait_for_ready(args.pod, args.container):
+    # Wait for pod ready (watch API + direct health probe), keeping the cold-start timing
+    cold_start = wait_for_ready(args.pod, args.container, namespace=NAMESPACE, timeout_s=600)
+    if not cold_start["ready"]:
         print("Pod not ready — aborting.", flush=True)
         sys.exit(1)
+    if cold_start["already_ready"] and existing.get("cold_start"):
+        cold_start = existing["cold_start"]   # resuming on a warm pod — keep the real cold start
 
     for isl, osl in COMBOS:
         key = f"ISL{isl}/OSL{osl}"
@@ -173,6 +160,7 @@ def main():
                 "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
                 "progress": f"{done}/{total}",
                 "combos": results,
+                "cold_start": cold_start,
             }
             with open(output_path, "w") as f:
                 json.dump(payload, f, indent=2)
@@ -7,6 +7,11 @@ with the calculated cost_per_million_tokens for input (prefill) and output (deco
 
 Usage:
     python scripts/update_pricing.py [--results bench_results.json] [--html docs/index.html]
+    python scripts/update_pricing.py --pricing-table docs/pricing-table.json [--config LABEL]
+
+With --pricing-table, prices come from the sweep-based cost model
+(cost_model.py) instead of a single benchmark run: every model in the table is
+updated with the prices of its recommended config (or --config).
 
 Environment variables (optional):
     BENCH_RESULTS_PATH: Path to benchmark results JSON (default: bench_results.json)
@@ -34,7 +39,11 @@ def extract_model_key_from_backend_name(backend_name: str, html_content: str) ->
     but index.html uses a shorter key (e.g., 'llama-8b-nvfp4').
     
     This function searches the HTML for a model entry where fullModelName matches.
+    Entries keyed by the full model id itself (MODEL_ENRICHMENT) match directly.
     """
+    if re.search(r'"' + re.escape(backend_name) + r'":\s*\{', html_content):
+        return backend_name
+
     # First, try to find an exact match for fullModelName in the HTML
     # Pattern: "some-key": { ... fullModelName: "backend_name" ...
     pattern = r'"([^"]+)":\s*\{[^}]*fullModelName:\s*"' + re.escape(backend_name) + r'"'
@@ -138,6 +147,34 @@ def update_model_pricing(html_content: str, model_key: str, input_price: float,
     return html_content
 
 
+def apply_pricing_table(html_content: str, table: dict, config: str = None) -> tuple[str, list[str]]:
+    """
+    Update every model of a cost_model.py pricing table that exists in the HTML.
+
+    Returns the updated HTML and the list of matched model keys.
+    """
+    from cost_model import selected_prices
+
+    updated = []
+    for model in table.get("models", {}):
+        prices = selected_prices(table, model, config)
+        if prices is None:
+            print(f"  {model}: no prices for config {config or 'recommended'}, skipping")
+            continue
+        model_key = extract_model_key_from_backend_name(model, html_content)
+        if not model_key:
+            print(f"  {model}: not in index.html, skipping")
+            continue
+        print(f"  {model_key} ({prices['config']}): in ${prices['input_per_m']:.2f}  "
+              f"cached ${prices['cached_input_per_m']:.4f}  out ${prices['output_per_m']:.2f}"
+              + ("" if prices.get("validated") else "  [unvalidated fit: no more combos than parameters]"))
+        html_content = update_model_pricing(
+            html_content, model_key, prices["input_per_m"], prices["output_per_m"], prices["cached_input_per_m"]
+        )
+        updated.append(model_key)
+    return html_content, updated
+
+
 def update_curl_example(html_content: str, model_name: str) -> str:
     """
     Update the model name in the curl example.
@@ -150,6 +187,44 @@ def update_curl_example(html_content: str, model_name: str) -> str:
     
     return re.sub(pattern, replacer, html_content)
 
+def update_from_pricing_table(args) -> None:
+    if not os.path.exists(args.pricing_table):
+        print(f"Error: Pricing table not found: {args.pricing_table}")
+        sys.exit(1)
+    if not os.path.exists(args.html):
+        print(f"Error: HTML file not found: {args.html}")
+        sys.exit(1)
+
+    table = load_benchmark_results(args.pricing_table)
+    print(f"Loaded pricing table from: {args.pricing_table} (${table.get('dgx_cost_per_hour')}/h, SLO {table.get('slo')})")
+
+    with open(args.html, "r") as f:
+        html_content = f.read()
+
+    updated_html, model_keys = apply_pricing_table(html_content, table, args.config)
+    if not model_keys:
+        print("Error: No model in the pricing table matched index.html")
+        sys.exit(1)
+
+    if html_content == updated_html:
+        print("No changes made (already up to date)")
+        return
+
+    if args.dry_run:
+        print("\n=== Dry run - changes that would be made ===")
+        for model_key in model_keys:
+            model_pattern = rf'"{re.escape(model_key)}":\s*\{{[^}}]+\}}'
+            match = re.search(model_pattern, updated_html, re.DOTALL)
+            if match:
+                print(match.group(0))
+        return
+
+    with open(args.html, "w") as f:
+        f.write(updated_html)
+
+    print(f"\nUpdated {args.html} with sweep-based pricing for {', '.join(model_keys)}")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Update index.html with benchmark pricing results"
@@ -164,6 +239,14 @@ def main():
         default=os.environ.get("HTML_PATH", "docs/index.html"),
         help="Path to index.html file",
     )
+    parser.add_argument(
+        "--pricing-table",
+        help="Pricing table from cost_model.py (replaces --results)",
+    )
+    parser.add_argument(
+        "--config",
+        help="Config label to price from the pricing table (default: each model's recommended config)",
+    )
     parser.add_argument(
         "--dry-run",
         action="store_true",
@@ -171,6 +254,10 @@ def main():
     )
     args = parser.parse_args()
 
+    if args.pricing_table:
+        update_from_pricing_table(args)
+        return
+
     # Load benchmark results
     if not os.path.exists(args.results):
         print(f"Error: Benchmark results file not found: {args.results}")
@@ -8,12 +8,15 @@ import asyncio
 import json
 import time
 import random
-import statistics
 import sys
 from datetime import datetime
+from pathlib import Path
 
 import aiohttp
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "common"))
+from latency_stats import goodput, pct, ragged_to_matrix, tpot_by_position, tpot_from_itls  # noqa: E402
+
 # ── Config ────────────────────────────────────────────────────────────────────
 
 ENDPOINT = "http://192.168.1.200/v1/chat/completions"
@@ -35,6 +38,10 @@ CONCURRENCY_LEVELS = [1, 2, 4, 8]
 MIN_REQUESTS = 20
 MAX_WALL_SECS = 90
 
+# Per-request SLOs for goodput (requests that meet both, per second)
+SLO_TTFT_MS = 2000
+SLO_TPOT_MS = 100
+
 # approximate tokens-per-word for prompt generation (~1.3 tok/word)
 TOKENS_PER_WORD = 1.3
 
@@ -150,7 +157,9 @@ async def run_level(prompt: str, max_tokens: int, concurrency: int) -> dict:
     async with aiohttp.ClientSession(connector=connector) as session:
 
         ttft_samples = []
-        itl_samples = []
+        itl_lists = []          # one ITL list per successful request
+        output_tokens = []      # aligned with itl_lists
+        request_ttfts = []      # aligned with itl_lists (NaN if no token arrived)
         total_output_tokens = 0
         n_errors = 0
         n_requests_done = 0
@@ -170,7 +179,9 @@ async def run_level(prompt: str, max_tokens: int, concurrency: int) -> dict:
                 else:
                     if result["ttft_ms"] is not None:
                         ttft_samples.append(result["ttft_ms"])
-                    itl_samples.extend(result["itl_list"])
+                    itl_lists.append(result["itl_list"])
+                    output_tokens.append(result["n_output_tokens"])
+                    request_ttfts.append(result["ttft_ms"] if result["ttft_ms"] is not None else float("nan"))
                     total_output_tokens += result["n_output_tokens"]
 
         # We keep launching workers until MIN_REQUESTS done OR wall time exceeded
@@ -198,15 +209,8 @@ async def run_level(prompt: str, max_tokens: int, concurrency: int) -> dict:
         t_wall_end = time.perf_counter()
         wall_time = t_wall_end - t_wall_start
 
-    def pct(samples, p):
-        if not samples:
-            return None
-        s = sorted(samples)
-        idx = int(len(s) * p / 100)
-        idx = min(idx, len(s) - 1)
-        return round(s[idx], 2)
-
     throughput = round(total_output_tokens / wall_time, 2) if wall_time > 0 else 0.0
+    itl_samples = ragged_to_matrix(itl_lists)   # NaN padding is dropped by pct()
 
     return {
         "throughput_tok_s": throughput,
@@ -218,6 +222,9 @@ async def run_level(prompt: str, max_tokens: int, concurrency: int) -> dict:
         "concurrency": concurrency,
         "n_requests": n_requests_done,
         "n_errors": n_errors,
+        "tpot_by_position": tpot_by_position(itl_lists),
+        "goodput": goodput(request_ttfts, tpot_from_itls(itl_lists), output_tokens, wall_time,
+                           SLO_TTFT_MS, SLO_TPOT_MS),
     }
 
 
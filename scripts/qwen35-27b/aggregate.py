@@ -1,20 +1,51 @@
 #!/usr/bin/env python3
 """
 Aggregate Qwen3.5-27B benchmark results.
-Usage: python3 aggregate_qwen35_27b.py [--results-dir PATH]
+Usage: python3 aggregate_qwen35_27b.py [--results-dir PATH] [--from-store | --no-cache] [--pareto-json PATH]
+
+By default flattened rows are cached per result file in <results-dir>/.aggregate-cache.json
+(keyed by path, mtime, size and sha256), so only new or changed files are parsed and
+the rankings are updated incrementally. --no-cache re-parses everything.
+
+--from-store reads rows from the Parquet warehouse (scripts/common/results_store.py)
+after an incremental ingest instead of re-parsing every JSON file.
+--pareto-json writes the per-combo Pareto frontier (e.g. docs/qwen35-27b-pareto.json).
+Configs whose IFEval accuracy (bench.py --accuracy-samples) falls too far below the
+model's reference config are left out of the frontier, as in pareto.py.
 """
 import argparse
 import glob
 import json
 import os
+import sys
 from pathlib import Path
 
 RESULTS_DIR = Path(__file__).parent.parent / "results"
+COMMON_DIR = Path(__file__).resolve().parent.parent / "common"
+
+sys.path.insert(0, str(COMMON_DIR))
+from latency_stats import columns, rank  # noqa: E402
+from pareto import accuracy_filter, annotate, pareto_report, print_frontier, save_report  # noqa: E402
+from row_cache import RowCache  # noqa: E402
+
+CACHE_FILE = ".aggregate-cache.json"
+# Bump whenever file_rows()/file_knees() change their output, to invalidate the cache.
+ROW_CACHE_VERSION = 2
+RANKINGS = {
+    "throughput": ("throughput_tok_s", True, None),
+    # Best latency = lowest TTFT p50 at concurrency=1
+    "latency": ("ttft_p50_ms", False, lambda r: r["concurrency"] == 1),
+}
+
+
+def result_paths(results_dir: Path):
+    return [Path(p) for p in sorted(glob.glob(str(results_dir / "qwen35-27b-*.json")))
+            if not p.endswith(("-summary.json", ".cold-start.json"))]
 
 
 def load_results(results_dir: Path):
     records = []
-    for path in sorted(glob.glob(str(results_dir / "qwen35-27b-*.json"))):
+    for path in map(str, result_paths(results_dir)):
         try:
             with open(path) as f:
                 d = json.load(f)
@@ -24,52 +55,151 @@ def load_results(results_dir: Path):
     return records
 
 
+def file_rows(path, d):
+    """Flatten one benchmark record into rows for ranking."""
+    rows = []
+    framework = d.get("framework", "?")
+    model = d.get("model", "?")
+    quant = d.get("quantization", "?")
+    technique = d.get("technique", "baseline")
+    hardware = d.get("hardware", "")
+    accuracy = d.get("accuracy") or {}
+    for combo_key, combo in d.get("combos", {}).items():
+        isl = combo.get("isl", 0)
+        osl = combo.get("osl", 0)
+        for level in combo.get("levels", []):
+            engine = level.get("engine") or {}
+            gauges = engine.get("gauges", {})
+            row = {
+                "framework": framework,
+                "model": model,
+                "quantization": quant,
+                "technique": technique,
+                "hardware": hardware,
+                "combo": combo_key,
+                "isl": isl,
+                "osl": osl,
+                "concurrency": level.get("concurrency"),
+                "throughput_tok_s": level.get("throughput_tok_s"),
+                "ttft_p50_ms": level.get("ttft_p50_ms"),
+                "ttft_p99_ms": level.get("ttft_p99_ms"),
+                "itl_p50_ms": level.get("itl_p50_ms"),
+                "itl_p99_ms": level.get("itl_p99_ms"),
+                "dcgm_gpu_util": level.get("dcgm", {}).get("gpu_util_avg_pct"),
+                "dcgm_power_w": level.get("dcgm", {}).get("power_avg_w"),
+                "dcgm_energy_j": level.get("dcgm", {}).get("energy_j"),
+                "engine_waiting_max": gauges.get("waiting", {}).get("max"),
+                "engine_kv_usage_max": gauges.get("kv_cache_usage", {}).get("max"),
+                "engine_preemptions": engine.get("deltas", {}).get("preemptions"),
+                "engine_prefix_hit_rate": engine.get("derived", {}).get("prefix_cache_hit_rate"),
+                "engine_spec_accept_rate": engine.get("derived", {}).get("spec_acceptance_rate"),
+                # Run-level IFEval of this config, repeated per cell as in the warehouse
+                "accuracy_prompt_strict": accuracy.get("prompt_level_accuracy"),
+                "accuracy_inst_strict": accuracy.get("instruction_level_accuracy"),
+                "accuracy_num_samples": accuracy.get("num_samples"),
+                "source_file": os.path.basename(path),
+            }
+            rows.append(row)
+    return rows
+
+
 def extract_rows(records):
     """Flatten all benchmark records into rows for ranking."""
-    rows = []
-    for path, d in records:
-        framework = d.get("framework", "?")
-        model = d.get("model", "?")
-        quant = d.get("quantization", "?")
-        technique = d.get("technique", "baseline")
-        hardware = d.get("hardware", "")
-        for combo_key, combo in d.get("combos", {}).items():
-            isl = combo.get("isl", 0)
-            osl = combo.get("osl", 0)
-            for level in combo.get("levels", []):
-                row = {
-                    "framework": framework,
-                    "model": model,
-                    "quantization": quant,
-                    "technique": technique,
-                    "hardware": hardware,
-                    "combo": combo_key,
-                    "isl": isl,
-                    "osl": osl,
-                    "concurrency": level.get("concurrency"),
-                    "throughput_tok_s": level.get("throughput_tok_s"),
-                    "ttft_p50_ms": level.get("ttft_p50_ms"),
-                    "ttft_p99_ms": level.get("ttft_p99_ms"),
-                    "itl_p50_ms": level.get("itl_p50_ms"),
-                    "itl_p99_ms": level.get("itl_p99_ms"),
-                    "dcgm_gpu_util": level.get("dcgm", {}).get("gpu_util_avg_pct"),
-                    "dcgm_power_w": level.get("dcgm", {}).get("power_avg_w"),
-                    "dcgm_energy_j": level.get("dcgm", {}).get("energy_j"),
-                    "source_file": os.path.basename(path),
-                }
-                rows.append(row)
+    return [row for path, d in records for row in file_rows(path, d)]
+
+
+ROW_DEFAULTS = {"framework": "?", "model": "?", "quantization": "?", "technique": "baseline", "hardware": ""}
+
+
+def load_rows_from_store(results_dir: Path):
+    """Ingest new/changed result files, then read the qwen35-27b rows from the warehouse."""
+    import results_store
+
+    warehouse = results_dir / "warehouse"
+    stats = results_store.ingest(results_dir=results_dir, warehouse=warehouse)
+    print(f"Warehouse: {stats['added']} added, {stats['updated']} updated, "
+          f"{stats['unchanged']} unchanged result files")
+    columns = list(ROW_DEFAULTS) + [
+        "combo", "isl", "osl", "concurrency", "throughput_tok_s", "ttft_p50_ms", "ttft_p99_ms",
+        "itl_p50_ms", "itl_p99_ms", "dcgm_gpu_util", "dcgm_power_w", "dcgm_energy_j",
+        "engine_waiting_max", "engine_kv_usage_max", "engine_preemptions",
+        "engine_prefix_hit_rate", "engine_spec_accept_rate",
+        "accuracy_prompt_strict", "accuracy_inst_strict", "accuracy_num_samples", "source_file",
+    ]
+    rows = results_store.query_rows({"family": "qwen35-27b"}, columns, warehouse, sort_by="source_file")
+    for row in rows:
+        for k, default in ROW_DEFAULTS.items():
+            if row[k] is None:
+                row[k] = default
+        row["source_file"] = os.path.basename(row["source_file"])
     return rows
 
 
+def file_knees(path, d):
+    """Adaptive-ladder knees (bench.py --adaptive) of one record, one per combo."""
+    knees = []
+    for combo_key, combo in d.get("combos", {}).items():
+        knee = combo.get("knee")
+        if not knee:
+            continue
+        knees.append({
+            "framework": d.get("framework", "?"),
+            "quantization": d.get("quantization", "?"),
+            "technique": d.get("technique", "baseline"),
+            "hardware": d.get("hardware", ""),
+            "combo": combo_key,
+            "knee_concurrency": knee.get("knee_concurrency"),
+            "knee_throughput_tok_s": knee.get("knee_throughput_tok_s"),
+            "peak_concurrency": knee.get("peak_concurrency"),
+            "peak_throughput_tok_s": knee.get("peak_throughput_tok_s"),
+            "stop_reason": knee.get("stop_reason"),
+            "source_file": os.path.basename(path),
+        })
+    return knees
+
+
+def extract_knees(records):
+    """Collect the adaptive-ladder knee (bench.py --adaptive) for every config × combo."""
+    return [k for path, d in records for k in file_knees(path, d)]
+
+
+def load_rows_cached(results_dir: Path):
+    """Rows, knees and rankings via the per-file row cache (only new/changed files are parsed)."""
+    cache = RowCache(results_dir / CACHE_FILE, lambda path, d: (file_rows(path, d), file_knees(path, d)),
+                     version=ROW_CACHE_VERSION, rankings=RANKINGS)
+    cache.refresh(result_paths(results_dir))
+    cache.save()
+    st = cache.stats
+    print(f"Row cache: {st['parsed']} parsed, {st['reused'] + st['rehashed']} reused, {st['removed']} removed")
+    knees = [k for extras in cache.extras() for k in extras]
+    return cache.rows(), knees, cache.ranked("throughput"), cache.ranked("latency")
+
+
+def print_knees(knees):
+    if not knees:
+        return
+    print(f"\n{'='*80}")
+    print("  CONCURRENCY KNEE (adaptive ladder)")
+    print(f"{'='*80}")
+    header = f"{'Framework':<8}  {'Quant':<10}  {'Technique':<16}  {'Combo':<16}  {'Knee C':>6}  {'Peak tok/s':>10}  {'@C':>4}  {'Stop':<15}"
+    print(header)
+    print("-" * len(header))
+    for k in sorted(knees, key=lambda k: (k["combo"], k["framework"], k["quantization"], k["technique"])):
+        peak = k["peak_throughput_tok_s"]
+        peak_str = f"{peak:>10.1f}" if peak is not None else f"{'N/A':>10}"
+        print(f"{k['framework']:<8}  {k['quantization']:<10}  {k['technique']:<16}  {k['combo']:<16}  "
+              f"{str(k['knee_concurrency']):>6}  {peak_str}  {str(k['peak_concurrency']):>4}  {k['stop_reason'] or '':<15}")
+
+
 def rank_throughput(rows):
-    valid = [r for r in rows if r["throughput_tok_s"] is not None]
-    return sorted(valid, key=lambda r: r["throughput_tok_s"], reverse=True)
+    cols = columns(rows, ["throughput_tok_s"])
+    return [rows[i] for i in rank(cols["throughput_tok_s"], descending=True)]
 
 
 def rank_latency(rows):
     # Best latency = lowest TTFT p50 at concurrency=1
-    valid = [r for r in rows if r["ttft_p50_ms"] is not None and r["concurrency"] == 1]
-    return sorted(valid, key=lambda r: r["ttft_p50_ms"])
+    cols = columns(rows, ["ttft_p50_ms", "concurrency"])
+    return [rows[i] for i in rank(cols["ttft_p50_ms"], mask=cols["concurrency"] == 1)]
 
 
 def print_table(title, rows, key_field, key_label, top_n=10):
@@ -89,15 +219,21 @@ def print_table(title, rows, key_field, key_label, top_n=10):
         print(f"{i:>4}  {row['framework']:<8}  {row['quantization']:<10}  {row['technique']:<16}  {row['combo']:<14}  {row['concurrency']:>3}  {val_str}  {gpu_str}  {pwr_str}")
 
 
-def save_summary(rows, results_dir):
-    by_throughput = rank_throughput(rows)
-    by_latency = rank_latency(rows)
+def save_summary(rows, results_dir, knees=None, pareto=None, by_throughput=None, by_latency=None):
+    if by_throughput is None:
+        by_throughput = rank_throughput(rows)
+    if by_latency is None:
+        by_latency = rank_latency(rows)
 
     summary = {
         "best_throughput": by_throughput[:5] if by_throughput else [],
         "best_latency": by_latency[:5] if by_latency else [],
         "total_rows": len(rows),
     }
+    if knees:
+        summary["knees"] = knees
+    if pareto:
+        summary["pareto_frontier"] = {combo: data["frontier"] for combo, data in pareto["combos"].items()}
     out_path = results_dir / "qwen35-27b-summary.json"
     with open(out_path, "w") as f:
         json.dump(summary, f, indent=2)
@@ -107,20 +243,35 @@ def save_summary(rows, results_dir):
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--results-dir", default=str(RESULTS_DIR))
+    parser.add_argument("--from-store", action="store_true",
+                        help="Read rows from the Parquet warehouse (knees are not stored there)")
+    parser.add_argument("--no-cache", action="store_true", help="Re-parse every result file, ignoring the row cache")
+    parser.add_argument("--pareto-json", help="Write the Pareto frontier JSON here (e.g. docs/qwen35-27b-pareto.json)")
     args = parser.parse_args()
 
     results_dir = Path(args.results_dir)
-    records = load_results(results_dir)
-    if not records:
+    by_throughput = by_latency = None
+    knees = []
+    if args.from_store:
+        rows = load_rows_from_store(results_dir)
+    elif args.no_cache:
+        records = load_results(results_dir)
+        if not records:
+            print(f"No results found in {results_dir}")
+            return
+        print(f"Loaded {len(records)} result files")
+        rows = extract_rows(records)
+        knees = extract_knees(records)
+    else:
+        rows, knees, by_throughput, by_latency = load_rows_cached(results_dir)
+    if not rows:
         print(f"No results found in {results_dir}")
         return
-
-    print(f"Loaded {len(records)} result files")
-    rows = extract_rows(records)
     print(f"Extracted {len(rows)} data points")
 
-    by_throughput = rank_throughput(rows)
-    by_latency = rank_latency(rows)
+    if by_throughput is None:
+        by_throughput = rank_throughput(rows)
+        by_latency = rank_latency(rows)
 
     print_table("BEST THROUGHPUT (all combos x concurrency)", by_throughput, "throughput_tok_s", "Throughput tok/s")
     print_table("BEST LATENCY -- TTFT p50 @ concurrency=1", by_latency, "ttft_p50_ms", "TTFT p50 (ms)")
@@ -134,7 +285,22 @@ def main():
             print(f"\nBest throughput {combo}: {best['framework']}/{best['quantization']}/{best['technique']} "
                   f"c={best['concurrency']} -> {best['throughput_tok_s']:.1f} tok/s")
 
-    save_summary(rows, results_dir)
+    print_knees(knees)
+
+    # Trade-off view: which config × concurrency points are not beaten on every axis,
+    # among configs that keep their accuracy.
+    annotate(rows)
+    kept, excluded = accuracy_filter(rows)
+    pareto = pareto_report(kept, excluded_configs=excluded)
+    print_frontier(pareto)
+    frontier_keys = {(p["source_file"], p["concurrency"], combo)
+                     for combo, data in pareto["combos"].items() for p in data["frontier"]}
+    for row in rows:
+        row["pareto_optimal"] = (row["source_file"], row["concurrency"], row["combo"]) in frontier_keys
+    if args.pareto_json:
+        save_report(pareto, args.pareto_json)
+
+    save_summary(rows, results_dir, knees, pareto, by_throughput, by_latency)
 
 
 if __name__ == "__main__":
@@ -9,6 +9,19 @@ Usage:
         --pod qwen35-27b-vllm-bf16-leader --container vllm \
         --output /path/to/results.json
 
+Adaptive concurrency (double until throughput plateaus or the SLO breaks, then
+bisect to the knee instead of running every CONCURRENCY_LEVELS entry):
+    python3 bench_qwen35_27b.py ... --adaptive --slo-itl-p99-ms 250
+
+Pruned sweep (measure the corners of every combo, then only the cells the
+performance model is least sure about; the rest are stored as predictions
+under each combo's "predicted" list, never mixed into "levels"):
+    python3 bench_qwen35_27b.py ... --prune --prune-tolerance 0.10
+
+Accuracy on the same warm pod (fast stratified IFEval via evaluate_accuracy.py
+right after the performance cells; stored under "accuracy" next to the combos):
+    python3 bench_qwen35_27b.py ... --accuracy-samples 100
+
 Print technique flags (used by orchestrator):
     python3 bench_qwen35_27b.py --print-technique-flags vllm kv-fp8
 """
@@ -18,11 +31,20 @@ import math
 import re
 import subprocess
 import sys
+import tempfile
 import time
 from datetime import datetime, timezone
+from pathlib import Path
 
 import requests
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "common"))
+from concurrency_ladder import (  # noqa: E402
+    DEFAULT_MAX_CONCURRENCY, DEFAULT_MIN_GAIN, explore_concurrency,
+)
+from engine_metrics import DEFAULT_INTERVAL_S, EngineMetricsPoller  # noqa: E402
+from perf_model import DEFAULT_TOLERANCE, prune_sweep  # noqa: E402
+
 # ── Constants ────────────────────────────────────────────────────────────────
 
 SPARK01_VLLM = "/home/nvidia/src/github.com/sara4dev/ai-dynamo-the-hard-way/.venv/bin/vllm"
@@ -31,6 +53,11 @@ SPARK01_HOST = "nvidia@192.168.1.76"
 SPARK02_HOST = "nvidia@192.168.1.77"
 PROM_URL     = "http://10.111.136.60:9090"
 NAMESPACE    = "token-labs"
+EVALUATE_ACCURACY = Path(__file__).resolve().parent.parent / "common" / "evaluate_accuracy.py"
+ACCURACY_KEYS = (
+    "num_samples", "prompt_level_accuracy", "prompt_level_accuracy_loose",
+    "instruction_level_accuracy", "instruction_level_accuracy_loose", "ci", "confidence", "counts",
+)
 
 NODE_CONFIG = {
     "spark-01": {"host": SPARK01_HOST, "vllm": SPARK01_VLLM, "prom_hostname": "spark-01", "hardware": "DGX Spark GB10 spark-01 (SM 12.1, 128GB)", "ld_path": ""},
@@ -208,7 +235,8 @@ def warmup(pod, container, num_warmups, model, node_cfg, framework="vllm"):
 
 # ── Benchmark ────────────────────────────────────────────────────────────────
 
-def run_bench(pod, isl, osl, concurrency, framework, model, node_cfg, container="", dataset="random", num_prompts_override=None):
+def run_bench(pod, isl, osl, concurrency, framework, model, node_cfg, container="", dataset="random",
+              num_prompts_override=None, engine_metrics_interval=DEFAULT_INTERVAL_S):
     np, to = run_params(isl, osl, concurrency)
     if num_prompts_override is not None:
         np = num_prompts_override
@@ -226,8 +254,17 @@ def run_bench(pod, isl, osl, concurrency, framework, model, node_cfg, container=
         f"(n={np}, timeout={to}s, url={bench_url})...",
         flush=True,
     )
+    # Scrape the engine's own /metrics alongside the client-side measurement.
+    poller = None
+    if engine_metrics_interval > 0 and pod_ip:
+        poller = EngineMetricsPoller(bench_url, framework=framework, interval_s=engine_metrics_interval).start()
+
     start_ts = time.time()
-    result = subprocess.run(cmd, capture_output=True, text=True, timeout=to)
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=to)
+    finally:
+        if poller:
+            poller.stop()
     end_ts = time.time()
 
     if result.returncode != 0:
@@ -235,9 +272,69 @@ def run_bench(pod, isl, osl, concurrency, framework, model, node_cfg, container=
         return None, start_ts, end_ts
 
     metrics = parse_output(result.stdout + result.stderr)
+    metrics["num_prompts"] = np
+    engine = poller.summary() if poller else None
+    if engine:
+        metrics["engine"] = engine
     return metrics, start_ts, end_ts
 
 
+# ── Accuracy ─────────────────────────────────────────────────────────────────
+
+def run_accuracy(pod, model, num_samples, concurrency=32, timeout=3600):
+    """
+    Fast IFEval run against the pod that was just benchmarked.
+
+    Runs evaluate_accuracy.py in a subprocess (its ifeval dependency stays out
+    of this script) with a stratified sample and no generation cache, since
+    outputs depend on the technique flags the pod was started with. Returns
+    the accuracy block for the results JSON, or None on failure.
+    """
+    pod_ip = get_pod_ip(pod)
+    base_url = f"http://{pod_ip}:8000" if pod_ip else "http://localhost:8000"
+    # The report is copied into the results JSON; keep it and the generation
+    # checkpoint out of results/ (aggregate globs *.json). A rerun after a crash
+    # regenerates, which is cheap at --accuracy-samples sizes.
+    report_dir = tempfile.TemporaryDirectory(prefix="bench-ifeval-")
+    report_path = str(Path(report_dir.name) / "ifeval_results.json")
+    cmd = [
+        sys.executable, str(EVALUATE_ACCURACY),
+        "--base-url", base_url,
+        "--model", model,
+        "--num-samples", str(num_samples),
+        "--concurrency", str(concurrency),
+        "--output", report_path,
+        "--checkpoint", str(Path(report_dir.name) / "ifeval.checkpoint.jsonl"),
+        "--no-cache",
+    ]
+    print(f"\n=== accuracy: IFEval n={num_samples} (url={base_url}) ===", flush=True)
+    start_ts = time.time()
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        print(f"    ERROR: accuracy run timed out after {timeout}s", flush=True)
+        report_dir.cleanup()
+        return None
+    try:
+        with open(report_path) as f:
+            report = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        print(f"    ERROR: {(result.stderr or result.stdout)[-600:]}", flush=True)
+        return None
+    finally:
+        report_dir.cleanup()
+
+    accuracy = {"suite": "ifeval", **{k: report.get(k) for k in ACCURACY_KEYS},
+                "duration_s": round(time.time() - start_ts, 1)}
+    print(
+        f"    prompt-level={accuracy['prompt_level_accuracy']:.1f}%  "
+        f"instruction-level={accuracy['instruction_level_accuracy']:.1f}%  "
+        f"({accuracy['duration_s']:.0f}s)",
+        flush=True,
+    )
+    return accuracy
+
+
 # ── Main ─────────────────────────────────────────────────────────────────────
 
 def main():
@@ -262,6 +359,40 @@ def main():
                         help="Node running the inference pod (controls SSH target and DCGM labels)")
     parser.add_argument("--dataset", default="random", choices=["random", "sharegpt"],
                         help="Benchmark dataset: random (synthetic) or sharegpt (real conversations)")
+    parser.add_argument("--engine-metrics-interval", type=float, default=DEFAULT_INTERVAL_S,
+                        help=f"Seconds between engine /metrics scrapes during a cell, 0 to disable "
+                             f"(default: {DEFAULT_INTERVAL_S})")
+
+    # Adaptive concurrency ladder
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Double concurrency until throughput plateaus or the SLO breaks, "
+                             "then bisect to the knee (replaces CONCURRENCY_LEVELS)")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help=f"Adaptive mode: highest concurrency to try (default: {DEFAULT_MAX_CONCURRENCY})")
+    parser.add_argument("--min-gain", type=float, default=DEFAULT_MIN_GAIN,
+                        help=f"Adaptive mode: stop doubling when throughput gain falls below this "
+                             f"fraction (default: {DEFAULT_MIN_GAIN})")
+    parser.add_argument("--slo-ttft-p99-ms", type=float, default=None,
+                        help="Adaptive mode: TTFT p99 SLO in ms (default: none)")
+    parser.add_argument("--slo-itl-p99-ms", type=float, default=None,
+                        help="Adaptive mode: ITL p99 SLO in ms (default: none)")
+
+    # Pruned sweep
+    parser.add_argument("--prune", action="store_true",
+                        help="Measure only the most informative combo × concurrency cells and predict "
+                             "the rest with perf_model.py")
+    parser.add_argument("--prune-tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"Prune mode: stop once every predicted cell is within this relative "
+                             f"uncertainty (default: {DEFAULT_TOLERANCE})")
+    parser.add_argument("--prune-budget", type=int, default=None,
+                        help="Prune mode: maximum number of cells to measure (default: the full grid)")
+
+    # Accuracy on the same warm pod
+    parser.add_argument("--accuracy-samples", type=int, default=0,
+                        help="Run a stratified IFEval of this many prompts after the performance cells "
+                             "(default: 0 = off)")
+    parser.add_argument("--accuracy-concurrency", type=int, default=32,
+                        help="Accuracy run: generation requests in flight (default: 32)")
 
     args = parser.parse_args()
 
@@ -280,6 +411,8 @@ def main():
     missing = [f for f in required if not getattr(args, f.replace("-", "_"), None)]
     if missing:
         parser.error(f"Missing required arguments: {', '.join('--' + m for m in missing)}")
+    if args.prune and (args.adaptive or args.dataset == "sharegpt"):
+        parser.error("--prune needs the fixed random-dataset grid (not --adaptive or --dataset sharegpt)")
 
     node_cfg = NODE_CONFIG[args.node]
     output_path = args.output
@@ -291,20 +424,188 @@ def main():
         results = existing.get("combos", {})
         print(f"Resuming from {output_path}", flush=True)
     except FileNotFoundError:
+        existing = {}
         results = {}
 
+    # Written by pod_readiness.py next to the result before the benchmark started;
+    # resuming on a warm pod keeps the real cold start already in the result.
+    cold_start = existing.get("cold_start")
+    cold_start_file = Path(output_path).with_suffix(".cold-start.json")
+    try:
+        with open(cold_start_file) as f:
+            fresh = json.load(f)
+        if not (fresh.get("already_ready") and cold_start):
+            cold_start = fresh
+    except FileNotFoundError:
+        pass
+
     active_combos = [(0, 0)] if args.dataset == "sharegpt" else COMBOS
-    total = len(active_combos) * len(CONCURRENCY_LEVELS)
-    done  = sum(len(v.get("levels", [])) for v in results.values())
+    if args.adaptive:
+        # Cell count is unknown up front — progress counts finished combos instead.
+        total = len(active_combos)
+        done  = sum(1 for v in results.values() if v.get("knee"))
+    else:
+        total = len(active_combos) * len(CONCURRENCY_LEVELS)
+        done  = sum(len(v.get("levels", [])) for v in results.values())
     print(f"Starting at {done}/{total} (dataset={args.dataset})", flush=True)
 
+    perf_summary = {}
+    accuracy = dict(existing.get("accuracy") or {})
+
+    def save():
+        payload = {
+            "model":         args.model,
+            "framework":     args.framework,
+            "quantization":  args.quantization,
+            "technique":     args.technique,
+            "dataset":       args.dataset,
+            "hardware":      node_cfg["hardware"],
+            "timestamp":     datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "progress":      f"{done}/{total}",
+            "combos":        results,
+        }
+        if cold_start:
+            payload["cold_start"] = cold_start
+        if perf_summary:
+            payload["perf_model"] = perf_summary
+        if accuracy:
+            payload["accuracy"] = accuracy
+        with open(output_path, "w") as f:
+            json.dump(payload, f, indent=2)
+        cold_start_file.unlink(missing_ok=True)
+        print(f"    saved ({done}/{total})", flush=True)
+
+    def measure(isl, osl, c):
+        np_override = max(40, c * 4) if args.dataset == "sharegpt" else None
+        metrics, start_ts, end_ts = run_bench(
+            args.pod, isl, osl, c, args.framework, args.model, node_cfg,
+            container=args.container, dataset=args.dataset, num_prompts_override=np_override,
+            engine_metrics_interval=args.engine_metrics_interval,
+        )
+        if metrics:
+            dcgm = collect_dcgm(start_ts, end_ts, node_cfg["prom_hostname"])
+            metrics["concurrency"] = c
+            metrics["dcgm"] = dcgm
+            print(
+                f"    tput={metrics.get('throughput_tok_s')} tok/s  "
+                f"TTFT_p50={metrics.get('ttft_p50_ms')}ms  "
+                f"ITL_p50={metrics.get('itl_p50_ms')}ms  "
+                f"gpu={dcgm.get('gpu_util_avg_pct')}%  "
+                f"pwr={dcgm.get('power_avg_w')}W",
+                flush=True,
+            )
+            engine = metrics.get("engine")
+            if engine:
+                gauges = engine["gauges"]
+                print(
+                    f"    engine: waiting_max={gauges.get('waiting', {}).get('max')}  "
+                    f"kv_max={gauges.get('kv_cache_usage', {}).get('max')}  "
+                    f"preemptions={engine['deltas'].get('preemptions')}  "
+                    f"{'  '.join(f'{k}={v}' for k, v in engine['derived'].items())}",
+                    flush=True,
+                )
+        return metrics
+
+    def measure_accuracy():
+        if not args.accuracy_samples:
+            return
+        if accuracy.get("num_samples"):
+            print(f"\n=== accuracy already measured (n={accuracy['num_samples']}) ===", flush=True)
+            return
+        measured = run_accuracy(args.pod, args.model, args.accuracy_samples,
+                                concurrency=args.accuracy_concurrency)
+        if measured:
+            accuracy.update(measured)
+            save()
+
     # ── Warmup ──
     warmup(args.pod, args.container, args.num_warmups, args.model, node_cfg, framework=args.framework)
 
+    # ── Pruned sweep ──
+    if args.prune:
+        grid = [(isl, osl, c) for isl, osl in active_combos for c in CONCURRENCY_LEVELS]
+        known = {(v["isl"], v["osl"], lv["concurrency"]): lv for v in results.values() for lv in v.get("levels", [])}
+
+        def measure_cell(isl, osl, c):
+            nonlocal done
+            key = f"ISL{isl}/OSL{osl}"
+            entry = results.setdefault(key, {"isl": isl, "osl": osl, "dataset": args.dataset, "levels": []})
+            print(f"\n=== {key} c={c} (prune) ===", flush=True)
+            metrics = measure(isl, osl, c)
+            if metrics:
+                entry["levels"].append(metrics)
+                entry["levels"].sort(key=lambda lv: lv["concurrency"])
+            done += 1
+            save()
+            return metrics
+
+        pruned = prune_sweep(
+            measure_cell, grid, known=known, tolerance=args.prune_tolerance, budget=args.prune_budget,
+            num_prompts=lambda isl, osl, c: run_params(isl, osl, c)[0],
+        )
+        for isl, osl in active_combos:
+            entry = results.setdefault(f"ISL{isl}/OSL{osl}", {"isl": isl, "osl": osl, "dataset": args.dataset, "levels": []})
+            entry["predicted"] = [p for p in pruned["predicted"] if (p["isl"], p["osl"]) == (isl, osl)]
+        perf_summary.update(
+            pruned["model"].summary(),
+            stop_reason=pruned["stop_reason"],
+            tolerance=args.prune_tolerance,
+            max_rel_uncertainty=pruned["max_rel_uncertainty"],
+            measured_cells=len(pruned["measured"]),
+            predicted_cells=len(pruned["predicted"]),
+        )
+        # Every cell is now measured or predicted: report the grid as complete so
+        # orchestrate.sh skips this config; perf_model.predicted_cells holds the pruned count.
+        done = total
+        print(
+            f"\n    prune: {pruned['stop_reason']} after {len(pruned['measured'])}/{len(grid)} cells "
+            f"(max predicted uncertainty ±{(pruned['max_rel_uncertainty'] or 0):.0%})",
+            flush=True,
+        )
+        save()
+        measure_accuracy()
+        print(f"\nDone. Results at {output_path}", flush=True)
+        return
+
     # ── Benchmark loop ──
     for isl, osl in active_combos:
         key = "sharegpt" if args.dataset == "sharegpt" else f"ISL{isl}/OSL{osl}"
         existing_levels = results.get(key, {}).get("levels", [])
+        levels = list(existing_levels)
+
+        if args.adaptive:
+            if results.get(key, {}).get("knee"):
+                print(f"\n=== {key} already complete ===", flush=True)
+                continue
+            print(f"\n=== {key} (adaptive, up to c={args.max_concurrency}) ===", flush=True)
+
+            def measure_and_save(c):
+                metrics = measure(isl, osl, c)
+                if metrics:
+                    levels.append(metrics)
+                    levels.sort(key=lambda lv: lv["concurrency"])
+                results[key] = {"isl": isl, "osl": osl, "dataset": args.dataset, "levels": levels}
+                save()
+                return metrics
+
+            knee = explore_concurrency(
+                measure_and_save,
+                max_concurrency=args.max_concurrency,
+                min_gain=args.min_gain,
+                slo={"ttft_p99_ms": args.slo_ttft_p99_ms, "itl_p99_ms": args.slo_itl_p99_ms},
+                known={lv["concurrency"]: lv for lv in existing_levels},
+            )
+            done += 1
+            results[key] = {"isl": isl, "osl": osl, "dataset": args.dataset, "levels": levels, "knee": knee}
+            print(
+                f"    knee c={knee['knee_concurrency']} ({knee['stop_reason']})  "
+                f"peak={knee['peak_throughput_tok_s']} tok/s @ c={knee['peak_concurrency']}  "
+                f"skipped c={knee['skipped']}",
+                flush=True,
+            )
+            save()
+            continue
+
         completed_c = {lv["concurrency"] for lv in existing_levels}
         remaining = [c for c in CONCURRENCY_LEVELS if c not in completed_c]
 
@@ -313,46 +614,17 @@ def main():
             continue
 
         print(f"\n=== {key} (remaining: c={remaining}) ===", flush=True)
-        levels = list(existing_levels)
 
         for c in remaining:
-            np_override = max(40, c * 4) if args.dataset == "sharegpt" else None
-            metrics, start_ts, end_ts = run_bench(
-                args.pod, isl, osl, c, args.framework, args.model, node_cfg,
-                container=args.container, dataset=args.dataset, num_prompts_override=np_override,
-            )
+            metrics = measure(isl, osl, c)
             if metrics:
-                dcgm = collect_dcgm(start_ts, end_ts, node_cfg["prom_hostname"])
-                metrics["concurrency"] = c
-                metrics["dcgm"] = dcgm
                 levels.append(metrics)
-                print(
-                    f"    tput={metrics.get('throughput_tok_s')} tok/s  "
-                    f"TTFT_p50={metrics.get('ttft_p50_ms')}ms  "
-                    f"ITL_p50={metrics.get('itl_p50_ms')}ms  "
-                    f"gpu={dcgm.get('gpu_util_avg_pct')}%  "
-                    f"pwr={dcgm.get('power_avg_w')}W",
-                    flush=True,
-                )
 
             done += 1
             results[key] = {"isl": isl, "osl": osl, "dataset": args.dataset, "levels": levels}
+            save()
 
-            payload = {
-                "model":         args.model,
-                "framework":     args.framework,
-                "quantization":  args.quantization,
-                "technique":     args.technique,
-                "dataset":       args.dataset,
-                "hardware":      node_cfg["hardware"],
-                "timestamp":     datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
-                "progress":      f"{done}/{total}",
-                "combos":        results,
-            }
-            with open(output_path, "w") as f:
-                json.dump(payload, f, indent=2)
-            print(f"    saved ({done}/{total})", flush=True)
-
+    measure_accuracy()
     print(f"\nDone. Results at {output_path}", flush=True)
 
 
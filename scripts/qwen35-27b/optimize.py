@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Qwen3.5-27B server-flag optimizer.
+
+Searches combinations of server flags (KV cache dtype, speculative decoding,
+KV offload size, max-num-seqs, CUDA graphs) with flag_optimizer.py instead of
+the fixed technique list: each trial deploys the proposed flags the same way
+orchestrate.sh deploys a technique, runs bench.py, scores the result and asks
+the Gaussian process for the next config. It stops when the best objective
+has not improved for --patience trials.
+
+Every trial is a normal bench.py result file in results/ (technique = the
+config label, e.g. kv-fp8+spec-ngram+seqs-128), so it lands in the results
+warehouse and aggregate.py like any other run. The trial log with configs,
+flags and objectives goes to results/optimizer-qwen35-27b-<fw>-<quant>-<node>.json.
+
+Usage:
+    python3 optimize.py --framework vllm --model Qwen/Qwen3.5-27B-GPTQ-Int4 --quantization gptq-int4 \\
+        --pod qwen35-27b-vllm-gptq-int4-spark01-leader --container vllm \\
+        --manifest deploy/models/qwen35-27b/pods-vllm-gptq-int4.yaml \\
+        --objective goodput --slo-ttft-p99-ms 30000 --slo-itl-p99-ms 200 --prune
+
+End-to-end dry run against the simulated backend (no cluster needed):
+    python3 optimize.py --framework vllm --quantization gptq-int4 --simulate --seed 3
+"""
+import argparse
+import json
+import re
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "common"))
+from bench import COMBOS, CONCURRENCY_LEVELS, NAMESPACE, NODE_CONFIG, TECHNIQUE_FLAGS  # noqa: E402
+from flag_optimizer import (  # noqa: E402
+    DEFAULT_MIN_IMPROVEMENT, DEFAULT_N_INIT, DEFAULT_PATIENCE, OBJECTIVES,
+    FlagOptimizer, SimulatedBackend, config_flags, config_label, enumerate_configs, objective_value,
+)
+from results_store import ingest, query_rows  # noqa: E402
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+REPO = SCRIPTS_DIR.parent.parent
+RESULTS_DIR = REPO / "results"
+COMMON_DIR = REPO / "scripts" / "common"
+SIM_RESULTS_DIR = Path("/tmp/qwen35-27b-optimizer-sim")
+
+_V, _S = TECHNIQUE_FLAGS["vllm"], TECHNIQUE_FLAGS["sglang"]
+
+# One choice per dimension; the default choice is what the pod runs with no extra flags.
+SEARCH_SPACE = {
+    "vllm": {
+        "kv_cache":    {"choices": {"kv-auto": [], "kv-fp8": _V["kv-fp8"]}, "default": "kv-auto"},
+        "speculative": {"choices": {"spec-none": [], "spec-ngram": _V["spec-ngram"], "spec-mtp": _V["spec-mtp"]},
+                        "default": "spec-none"},
+        "kv_offload":  {"choices": {"lmcache-off": [], "lmcache-8g": _V["lmcache-8g"], "lmcache-20g": _V["lmcache-20g"]},
+                        "default": "lmcache-off", "ordinal": True},
+        "max_seqs":    {"choices": {"seqs-64": ["--max-num-seqs", "64"], "seqs-128": ["--max-num-seqs", "128"],
+                                    "seqs-256": []},
+                        "default": "seqs-256", "ordinal": True},
+        "cuda_graph":  {"choices": {"cuda-graph": [], "no-cuda-graph": _V["no-cuda-graph"]}, "default": "cuda-graph"},
+    },
+    "sglang": {
+        "kv_cache":    {"choices": {"kv-auto": [], "kv-fp8": _S["kv-fp8"]}, "default": "kv-auto"},
+        "speculative": {"choices": {"spec-none": [], "spec-ngram": _S["spec-ngram"], "spec-mtp": _S["spec-mtp"]},
+                        "default": "spec-none"},
+        "overlap":     {"choices": {"overlap-off": [], "overlap-schedule": _S["overlap-schedule"]},
+                        "default": "overlap-off"},
+        "max_running": {"choices": {"running-64": ["--max-running-requests", "64"],
+                                    "running-128": ["--max-running-requests", "128"], "running-auto": []},
+                        "default": "running-auto", "ordinal": True},
+        "cuda_graph":  {"choices": {"cuda-graph": [], "no-cuda-graph": _S["no-cuda-graph"]}, "default": "cuda-graph"},
+    },
+}
+
+
+def log(msg):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}", flush=True)
+
+
+# ── Real deployment (mirrors run_benchmark in orchestrate.sh) ──
+
+def teardown_pod(pod):
+    subprocess.run(["kubectl", "delete", "pod", "-n", NAMESPACE, pod, "--ignore-not-found",
+                    "--wait=true", "--timeout=120s"], check=False)
+    subprocess.run(["sleep", "30"], check=False)   # allow GPU memory to release
+
+
+def deploy(manifest: Path, framework: str, flags: list[str]) -> None:
+    text = manifest.read_text()
+    if flags:
+        fw_upper = framework.upper()
+        text = re.sub(rf'(EXTRA_{fw_upper}_ARGS.*value:\s*)""', lambda m: f'{m.group(1)}"{" ".join(flags)}"', text)
+    subprocess.run(["kubectl", "apply", "-n", NAMESPACE, "-f", "-"], input=text, text=True, check=True)
+
+
+def run_trial(args, label: str, flags: list[str], output: Path) -> dict | None:
+    teardown_pod(args.pod)
+    try:
+        deploy(Path(args.manifest), args.framework, flags)
+        log(f"  Applied manifest with EXTRA_{args.framework.upper()}_ARGS='{' '.join(flags)}'")
+        ready = subprocess.run([sys.executable, str(COMMON_DIR / "pod_readiness.py"), "--namespace", NAMESPACE,
+                                "--pod", args.pod, "--container", args.container, "--timeout", "1800",
+                                "--output", str(output)])
+        if ready.returncode != 0:
+            log(f"ERROR: {args.pod} not ready with {label}")
+            return None
+        cmd = [sys.executable, str(SCRIPTS_DIR / "bench.py"),
+               "--framework", args.framework, "--model", args.model, "--quantization", args.quantization,
+               "--technique", label, "--pod", args.pod, "--container", args.container,
+               "--node", args.node, "--output", str(output), "--num-warmups", "10"]
+        if args.prune:
+            cmd.append("--prune")
+        if subprocess.run(cmd).returncode != 0:
+            return None
+        with open(output) as f:
+            return json.load(f)
+    except (subprocess.CalledProcessError, FileNotFoundError, ValueError) as e:
+        log(f"ERROR: trial {label} failed: {e}")
+        return None
+    finally:
+        teardown_pod(args.pod)
+
+
+def run_simulated(args, backend: SimulatedBackend, label: str, config: dict, output: Path) -> dict | None:
+    result = backend.run(config)
+    if result is None:
+        log(f"  (simulated) {label} failed to start")
+        return None
+    result.update({
+        "model": args.model, "framework": args.framework, "quantization": args.quantization,
+        "technique": label, "dataset": "random", "hardware": "simulated",
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "progress": f"{len(COMBOS) * len(CONCURRENCY_LEVELS)}/{len(COMBOS) * len(CONCURRENCY_LEVELS)}",
+    })
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    return result
+
+
+# ── Main ──
+
+def main():
+    parser = argparse.ArgumentParser(description="Bayesian optimization over Qwen3.5-27B server flags")
+    parser.add_argument("--framework", choices=sorted(SEARCH_SPACE), required=True)
+    parser.add_argument("--model", default="Qwen/Qwen3.5-27B-GPTQ-Int4", help="HuggingFace model ID")
+    parser.add_argument("--quantization", choices=["bf16", "fp8", "gptq-int4"], required=True)
+    parser.add_argument("--node", choices=sorted(NODE_CONFIG), default="spark-01")
+    parser.add_argument("--pod", help="Kubernetes pod name (real mode)")
+    parser.add_argument("--container", help="Container name in the pod (real mode)")
+    parser.add_argument("--manifest", help="Pod manifest with an EXTRA_<FRAMEWORK>_ARGS env var (real mode)")
+    parser.add_argument("--prune", action="store_true", help="Run each trial with bench.py --prune")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="goodput")
+    parser.add_argument("--slo-ttft-p99-ms", type=float, default=None)
+    parser.add_argument("--slo-itl-p99-ms", type=float, default=None)
+    parser.add_argument("--max-trials", type=int, default=30)
+    parser.add_argument("--n-init", type=int, default=DEFAULT_N_INIT,
+                        help=f"Baseline plus random configs before the GP takes over (default: {DEFAULT_N_INIT})")
+    parser.add_argument("--patience", type=int, default=DEFAULT_PATIENCE,
+                        help=f"Stop after this many trials without improvement (default: {DEFAULT_PATIENCE})")
+    parser.add_argument("--min-improvement", type=float, default=DEFAULT_MIN_IMPROVEMENT,
+                        help=f"Relative gain that counts as improvement (default: {DEFAULT_MIN_IMPROVEMENT})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--simulate", action="store_true",
+                        help="Use the simulated backend instead of deploying pods")
+    parser.add_argument("--results-dir", help=f"Where trial results go (default: results/, "
+                                              f"or {SIM_RESULTS_DIR} with --simulate)")
+    args = parser.parse_args()
+
+    if not args.simulate:
+        missing = [f for f in ("pod", "container", "manifest") if not getattr(args, f)]
+        if missing:
+            parser.error(f"Missing required arguments: {', '.join('--' + m for m in missing)} (or use --simulate)")
+
+    results_dir = Path(args.results_dir) if args.results_dir else (SIM_RESULTS_DIR if args.simulate else RESULTS_DIR)
+    results_dir.mkdir(parents=True, exist_ok=True)
+    # results/ feeds the shared warehouse together with docs/; any other directory
+    # (e.g. --simulate) gets a warehouse of its own so trials never mix with real results
+    store = {} if results_dir.resolve() == RESULTS_DIR.resolve() else {
+        "results_dir": results_dir, "docs_dir": results_dir / "_no_docs", "warehouse": results_dir / "warehouse"}
+    node_suffix = args.node.replace("-", "")
+    trials_path = results_dir / f"optimizer-qwen35-27b-{args.framework}-{args.quantization}-{node_suffix}.json"
+    space = SEARCH_SPACE[args.framework]
+    slo = {"ttft_p99_ms": args.slo_ttft_p99_ms, "itl_p99_ms": args.slo_itl_p99_ms}
+
+    # ── Resume ──
+    try:
+        with open(trials_path) as f:
+            trials = json.load(f).get("trials", [])
+        log(f"Resuming {len(trials)} trials from {trials_path}")
+    except FileNotFoundError:
+        trials = []
+
+    opt = FlagOptimizer(space, n_init=args.n_init, patience=args.patience, min_improvement=args.min_improvement,
+                        max_trials=args.max_trials, seed=args.seed, trials=trials)
+    backend = SimulatedBackend(space, combos=COMBOS, concurrency_levels=CONCURRENCY_LEVELS, seed=args.seed) \
+        if args.simulate else None
+    log(f"Search space: {len(opt.candidates)} configs over {', '.join(space)}; objective={args.objective}")
+
+    def save(stop_reason=None):
+        best = opt.best()
+        with open(trials_path, "w") as f:
+            json.dump({
+                "framework": args.framework, "quantization": args.quantization, "model": args.model,
+                "node": args.node, "simulated": args.simulate, "objective": args.objective, "slo": slo,
+                "space": {d: {**spec, "choices": list(spec["choices"])} for d, spec in space.items()},
+                "updated": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "stop_reason": stop_reason,
+                "best": best,
+                "trials": opt.trials,
+            }, f, indent=2)
+
+    # ── Optimization loop ──
+    while not opt.stop_reason():
+        config = opt.propose()
+        if config is None:
+            break
+        label, flags = config_label(space, config), config_flags(space, config)
+        date = datetime.now().strftime("%Y-%m-%d")
+        suffix = "sim" if args.simulate else ("spark02" if args.node == "spark-02" else "")
+        name = "-".join(p for p in ("qwen35-27b", args.framework, args.quantization, label, suffix, date) if p)
+        output = results_dir / f"{name}.json"
+
+        ei = f" (EI={opt.last_ei})" if len(opt.trials) >= args.n_init else ""
+        log(f"=== TRIAL {len(opt.trials) + 1}: {label}{ei} flags={' '.join(flags) or '(none)'} ===")
+        result = run_simulated(args, backend, label, config, output) if args.simulate \
+            else run_trial(args, label, flags, output)
+        value = objective_value(result, args.objective, slo)
+        trial = opt.observe(config, value, flags=flags, result_file=str(output) if result else None,
+                            timestamp=datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"))
+        best = opt.best()
+        log(f"    {args.objective}={value}  best={best['objective'] if best else None} ({best['label'] if best else '-'})")
+        save()
+        if trial["result_file"]:
+            # Track the trial in the results store right away
+            ingest(**store)
+
+    stop = opt.stop_reason() or "exhausted"
+    save(stop)
+
+    # ── Summary ──
+    best = opt.best()
+    print(f"\n{'='*80}")
+    print(f"  OPTIMIZER {args.framework}/{args.quantization}  objective={args.objective}  stop={stop}")
+    print(f"{'='*80}")
+    for t in opt.trials:
+        mark = "*" if best and t["trial"] == best["trial"] else " "
+        print(f" {mark}{t['trial']:>3}  {t['objective'] if t['objective'] is not None else 'FAILED':>10}  {t['label']}")
+    if best:
+        print(f"\n  Best: {best['label']}  {args.objective}={best['objective']}")
+        print(f"  Flags: {' '.join(best['flags']) or '(none)'}")
+    stored = query_rows({"framework": args.framework, "quantization": args.quantization},
+                        columns=["technique"], **({"warehouse": store["warehouse"]} if store else {}))
+    print(f"  Results store: {len({r['technique'] for r in stored})} trial configs, {len(stored)} rows")
+    if args.simulate and best:
+        truth = sorted(((backend.true_objective(c, args.objective, slo) or 0.0, config_label(space, c))
+                        for c in enumerate_configs(space)), reverse=True)
+        rank = [label for _, label in truth].index(best["label"]) + 1
+        print(f"  Simulated optimum: {truth[0][1]} ({truth[0][0]}); best found ranks {rank}/{len(truth)} "
+              f"after {len(opt.trials)} trials")
+    print(f"\nTrial log saved to {trials_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,12 +8,26 @@
 #           ./orchestrate_qwen35_27b.sh           # Technique sweep on best winner
 #   PHASE=C ...same env vars...                   # Best combo runs
 #   PHASE=ALL ./orchestrate_qwen35_27b.sh         # All phases sequentially
+#
+# Adaptive concurrency (knee search instead of the fixed CONCURRENCY_LEVELS):
+#   ADAPTIVE=1 SLO_ITL_P99_MS=250 PHASE=B ./orchestrate_qwen35_27b.sh
+#
+# Every bench.py run (one per framework/quant/technique config, not per
+# ISL/OSL × concurrency cell) ends with a fast stratified IFEval run on the same
+# warm pod, stored as "accuracy" in the result JSON. ACCURACY_SAMPLES defaults
+# to 100, so every sweep pays for one IFEval run per config: a few minutes of
+# generation at concurrency 32, on top of the perf cells. aggregate.py and
+# pareto.py drop configs whose accuracy falls too far below the reference.
+# ACCURACY_SAMPLES=0 skips it and restores the old perf-only sweep:
+#   ACCURACY_SAMPLES=200 PHASE=B ./orchestrate_qwen35_27b.sh
+#   ACCURACY_SAMPLES=0 PHASE=B ./orchestrate_qwen35_27b.sh
 set -euo pipefail
 
 REPO="/home/nvidia/src/github.com/elizabetht/token-labs"
 NAMESPACE="token-labs"
 RESULTS_DIR="$REPO/results"
 SCRIPTS_DIR="$REPO/scripts/qwen35-27b"
+COMMON_DIR="$REPO/scripts/common"
 DEPLOY_DIR="$REPO/deploy/models/qwen35-27b"
 DATE=$(date +%Y-%m-%d)
 
@@ -26,32 +40,37 @@ BEST_QUANT=${BEST_QUANT:-fp8}
 BEST_MODEL=${BEST_MODEL:-Qwen/Qwen3.5-27B-FP8}
 BEST_NODE=${BEST_NODE:-spark-01}   # spark-01 or spark-02
 
+# Adaptive concurrency ladder — forwarded to every bench.py invocation
+ADAPTIVE=${ADAPTIVE:-0}
+LADDER_ARGS=()
+if [[ "$ADAPTIVE" == "1" ]]; then
+    LADDER_ARGS=(--adaptive)
+    [[ -n "${SLO_TTFT_P99_MS:-}" ]] && LADDER_ARGS+=(--slo-ttft-p99-ms "$SLO_TTFT_P99_MS")
+    [[ -n "${SLO_ITL_P99_MS:-}" ]] && LADDER_ARGS+=(--slo-itl-p99-ms "$SLO_ITL_P99_MS")
+fi
+
+# Accuracy per technique config — forwarded to every bench.py invocation.
+# Default 100: one IFEval run per config run (extra minutes per sweep) unless ACCURACY_SAMPLES=0
+ACCURACY_SAMPLES=${ACCURACY_SAMPLES:-100}
+ACCURACY_ARGS=(--accuracy-samples "$ACCURACY_SAMPLES")
+
 log() { echo "[$(date +%H:%M:%S)] $*"; }
 
 # ── Pod lifecycle helpers ────────────────────────────────────────────────────
 
 wait_pod_ready() {
-    local pod=$1 container=$2 timeout=${3:-900}
+    # Watch-based wait + direct health probe; cold-start phases go next to $output
+    # (<result>.cold-start.json, folded into the result by bench.py).
+    local pod=$1 container=$2 timeout=${3:-900} output=${4:-}
     log "Waiting for $pod/$container (up to ${timeout}s)..."
-    local deadline=$((SECONDS + timeout))
-    while [[ $SECONDS -lt $deadline ]]; do
-        local phase
-        phase=$(kubectl get pod -n "$NAMESPACE" "$pod" -o jsonpath='{.status.phase}' 2>/dev/null || echo "")
-        if [[ "$phase" == "Failed" ]]; then
-            log "ERROR: pod $pod entered Failed state"
-            kubectl logs -n "$NAMESPACE" "$pod" -c "$container" --tail=50 || true
-            return 1
-        fi
-        if kubectl exec -n "$NAMESPACE" "$pod" -c "$container" -- \
-               curl -sf http://localhost:8000/health &>/dev/null; then
-            log "$pod is ready"
-            return 0
-        fi
-        local remaining=$(( deadline - SECONDS ))
-        log "  Not ready yet (phase=$phase, ${remaining}s remaining)..."
-        sleep 20
-    done
-    log "Timeout waiting for $pod"
+    if python3 "$COMMON_DIR/pod_readiness.py" \
+           --namespace "$NAMESPACE" --pod "$pod" --container "$container" \
+           --timeout "$timeout" ${output:+--output "$output"}; then
+        log "$pod is ready"
+        return 0
+    fi
+    log "ERROR: $pod did not become ready"
+    kubectl logs -n "$NAMESPACE" "$pod" -c "$container" --tail=50 || true
     return 1
 }
 
@@ -148,7 +167,7 @@ except Exception:
         kubectl apply -f "$manifest" -n "$NAMESPACE"
     fi
 
-    if ! wait_pod_ready "$pod" "$container" 1800; then
+    if ! wait_pod_ready "$pod" "$container" 1800 "$output"; then
         log "ERROR: $pod not ready, skipping"
         teardown_pod "$pod"
         return 1
@@ -164,7 +183,9 @@ except Exception:
         --container   "$container" \
         --node        spark-01 \
         --output      "$output" \
-        --num-warmups 10
+        --num-warmups 10 \
+        ${LADDER_ARGS[@]+"${LADDER_ARGS[@]}"} \
+        "${ACCURACY_ARGS[@]}"
 
     teardown_pod "$pod"
     log "=== DONE: $output ==="
@@ -233,7 +254,7 @@ except Exception:
         kubectl apply -f "$manifest" -n "$NAMESPACE"
     fi
 
-    if ! wait_pod_ready "$pod" "$container" 1800; then
+    if ! wait_pod_ready "$pod" "$container" 1800 "$output"; then
         log "ERROR: $pod not ready, skipping"
         teardown_pod "$pod"
         return 1
@@ -249,7 +270,9 @@ except Exception:
         --container   "$container" \
         --node        spark-02 \
         --output      "$output" \
-        --num-warmups 10
+        --num-warmups 10 \
+        ${LADDER_ARGS[@]+"${LADDER_ARGS[@]}"} \
+        "${ACCURACY_ARGS[@]}"
 
     teardown_pod "$pod"
     log "=== DONE (spark-02): $output ==="
@@ -377,7 +400,7 @@ run_phase_d() {
             kubectl apply -f "$manifest" -n "$NAMESPACE"
         fi
 
-        if ! wait_pod_ready "${pod_base}-leader" "$BEST_FRAMEWORK" 1800; then
+        if ! wait_pod_ready "${pod_base}-leader" "$BEST_FRAMEWORK" 1800 "$output"; then
             log "ERROR: ${pod_base}-leader not ready, skipping"; teardown_pod "${pod_base}-leader"; continue
         fi
 
@@ -391,7 +414,9 @@ run_phase_d() {
             --container    "$BEST_FRAMEWORK" \
             --node         "$BEST_NODE" \
             --output       "$output" \
-            --num-warmups  5
+            --num-warmups  5 \
+            ${LADDER_ARGS[@]+"${LADDER_ARGS[@]}"} \
+            "${ACCURACY_ARGS[@]}"
 
         teardown_pod "${pod_base}-leader"
         log "=== DONE (sharegpt): $output ==="